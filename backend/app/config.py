@@ -4,7 +4,7 @@ Application configuration loaded from environment variables.
 
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Optional
+from typing import Literal, Optional
 from google.cloud import secretmanager
 import logging
 
@@ -17,12 +17,39 @@ class Settings(BaseSettings):
     # Database
     database_url: str = ""  # Loaded from GCP Secret Manager; fallback to local dev if empty after fetch
     redis_url: str = "redis://localhost:6379/0"
+    # "null" = NullPool for transaction-mode PgBouncer/Supavisor (:6543);
+    # "queue" = in-process pool for session-mode poolers (:5432) or direct Postgres
+    db_pool_mode: Literal["null", "queue"] = "null"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0  # Seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # Seconds before a pooled connection is replaced
 
     # Gemini (Default LLM)
     gemini_api_key: str = ""
     gemini_model: str = "gemini-2.5-flash"
     gemini_embedding_model: str = "gemini-embedding-001"
     embedding_dimensions: int = 768
+    embedding_cache_size: int = 4096  # In-process LRU entries for query embeddings
+    embedding_cache_redis_ttl: int = 7 * 24 * 3600  # Redis tier TTL in seconds; 0 = in-process only
+    embedding_batch_size: int = 100  # Chunks per multi-input embedding request (Gemini max is 100)
+    embedding_batch_concurrency: int = 4  # Embedding batch requests in flight during KB ingestion
+
+    # In-memory per-business KB vector index (falls back to pgvector on a miss)
+    kb_index_enabled: bool = True
+    kb_index_max_businesses: int = 500
+    kb_index_max_docs: int = 2000  # Larger KBs always use pgvector
+    kb_index_ttl_seconds: int = 900
+
+    # Compiled per-business system prompt sections (rebuilt when settings change)
+    prompt_context_max_businesses: int = 1000
+    prompt_context_ttl_seconds: int = 900
+
+    # In-memory webhook routing cache (phone number / slug → business)
+    business_routing_max_entries: int = 10000
+    business_routing_ttl_seconds: int = 600
+    business_routing_negative_ttl_seconds: int = 60  # Unknown numbers/slugs
+    shadow_heartbeat_write_interval_seconds: int = 60  # Min gap between last_seen writes per business
 
     # OpenAI (Fallback)
     openai_api_key: str = ""
@@ -36,6 +63,38 @@ class Settings(BaseSettings):
     # AI behavior
     ai_confidence_threshold: float = 0.7  # Handoff if below this
 
+    # LLM hedged dispatch — race the next provider when the current one is slow
+    llm_hedging_enabled: bool = True
+    llm_hedge_delay_ms: int = 0  # Fixed hedge delay; 0 = derive from provider latency percentile
+    llm_hedge_percentile: float = 0.95
+    llm_hedge_min_delay_ms: int = 800
+    llm_hedge_max_delay_ms: int = 4000
+
+    # Per-turn input token budget (system prompt + summary + KB + history);
+    # LLM_INPUT_TOKEN_BUDGETS overrides it per model, e.g. {"gpt-4o-mini": 12000}
+    llm_input_token_budget: int = 8000
+    llm_input_token_budgets: dict[str, int] = {}
+    llm_kb_budget_share: float = 0.4  # Max share of the remaining budget for KB hits
+    conversation_history_max_messages: int = 40  # Recent messages considered for packing
+    # Rolling conversation summary, refreshed after the reply every N guest turns
+    conversation_summary_every_turns: int = 8  # 0 = off
+    conversation_summary_keep_recent: int = 6  # Newest messages left out of the summary
+    conversation_summary_max_output_tokens: int = 1024  # A truncated summary is discarded, not stored
+
+    # Semantic answer cache for repeat concierge questions. Opt-in per business
+    # via knowledge_base_config["semantic_cache"]; this is the default when unset
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.95  # Min cosine similarity for a hit
+    semantic_cache_ttl_seconds: int = 24 * 3600
+    semantic_cache_max_entries_per_business: int = 256  # Per (business, KB version, language)
+    semantic_cache_max_buckets: int = 2000
+    semantic_cache_max_question_chars: int = 300  # Longer turns always go to the LLM
+
+    # Provider-side caching of the stable system prompt prefix
+    llm_prompt_cache_enabled: bool = True
+    llm_prompt_cache_max_handles: int = 2000  # Gemini cached-content handles (per business + mode)
+    gemini_prompt_cache_ttl_seconds: int = 3600  # Handles stop being used 5 min before this
+
     # SendGrid
     sendgrid_api_key: str = ""
     sendgrid_from_email: str = ""  # Loaded from Secret Manager as SENDGRID_FROM_EMAIL
@@ -84,6 +143,65 @@ class Settings(BaseSettings):
     allowed_origins: str = "http://localhost:3000"
     frontend_url: str = "http://localhost:3000"  # Used for magic link redirect; set to deployed frontend URL
 
+    # Inbound message queue (webhook → AI engine). Redis Streams when Redis is
+    # connected, otherwise an in-process stand-in with the same semantics.
+    inbound_queue_partitions: int = 32  # Ordering shards; a guest's messages always share one
+    inbound_queue_workers: int = 8  # Concurrent handler executions per instance
+    inbound_queue_max_attempts: int = 4
+    inbound_queue_retry_backoff_seconds: float = 2.0  # Doubles per attempt
+    inbound_queue_lease_seconds: int = 30  # Partition ownership lease (Redis mode)
+    inbound_queue_dead_letter_max: int = 10000
+    # Merge a guest's rapid-fire messages into one AI turn: wait until the
+    # conversation is quiet this long (0 = off), but never longer than the max.
+    # Every reply waits at least the window, so keep it sub-second if enabled.
+    inbound_coalesce_window_seconds: float = 0.0
+    inbound_coalesce_max_wait_seconds: float = 3.0
+    # Post-reply work (lead extraction, rolling summaries) has its own queue and
+    # worker pool; nobody waits on it, so a burst of turns is merged over a longer window
+    post_reply_queue_partitions: int = 16
+    post_reply_queue_workers: int = 4
+    post_reply_coalesce_window_seconds: float = 2.0
+    post_reply_coalesce_max_wait_seconds: float = 10.0
+    # Seen-set TTL for provider message IDs (Meta wamid / Twilio MessageSid);
+    # later retries are still rejected by the message_provider_ids primary key
+    webhook_dedup_ttl_seconds: int = 3600
+
+    # Automated follow-ups (hourly) — due conversations are selected in SQL and
+    # handled by a bounded worker pool, one session per conversation
+    follow_up_workers: int = 8
+    follow_up_max_per_run: int = 500
+    follow_up_max_per_business: int = 50  # Fairness cap per business per run
+    follow_up_time_budget_seconds: int = 600  # Stop taking new work after this; the rest stays due
+
+    # Post-reply lead extraction — messages sent to the extractor per LLM call
+    lead_extraction_batch_messages: int = 50
+
+    # Lead export — rows fetched per keyset batch while streaming
+    leads_export_batch_size: int = 1000
+
+    # Data retention (weekly) — keyset-batched deletes, optionally archived first
+    retention_days: int = 90
+    retention_batch_size: int = 1000  # Rows per delete transaction
+    retention_batch_sleep_seconds: float = 0.5  # Pause between batches
+    # Cold archive: local path, s3://bucket/prefix or gs://bucket/prefix; "" = no archive
+    retention_archive_uri: str = ""
+    retention_archive_format: str = "parquet"  # "parquet" (zstd) | "ndjson" (gzipped)
+    # messages is partitioned by month; partitions are created this far ahead
+    message_partitions_ahead_months: int = 3
+    # Partition DDL waits at most this long for its lock, then backs off and retries,
+    # so a long reader on messages never queues inserts behind CREATE/DROP
+    message_partition_lock_timeout_ms: int = 2000
+    message_partition_ddl_attempts: int = 5
+
+    # Monthly insights map-reduce over the period's transcripts
+    insights_chunk_tokens: int = 6000  # Transcript tokens per map call
+    insights_chunk_conversations: int = 25  # Average conversations per content-defined chunk
+    insights_map_concurrency: int = 4  # Gemini calls in flight
+    insights_reduce_tokens: int = 12000  # Summaries merged further until they fit this
+    insights_stream_batch_size: int = 1000  # Rows per server-side cursor fetch
+    insights_chunk_cache_ttl_seconds: int = 45 * 24 * 3600
+    insights_llm_timeout_seconds: float = 120.0
+
     # Report scheduling
     daily_report_hour: int = 7
     daily_report_minute: int = 30
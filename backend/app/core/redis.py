@@ -28,8 +28,13 @@ settings = get_settings()
 class _InMemoryStore:
     """Minimal Redis-compatible in-memory store with TTL support."""
 
+    # Expired keys are only dropped when read; sweep every N writes so
+    # write-once keys (e.g. webhook dedup IDs) don't accumulate forever
+    _SWEEP_EVERY = 1000
+
     def __init__(self):
         self._data: dict[str, tuple[Any, float | None]] = {}  # key → (value, expires_at)
+        self._writes = 0
 
     def _expired(self, key: str) -> bool:
         if key not in self._data:
@@ -43,9 +48,30 @@ class _InMemoryStore:
             return None
         return self._data[key][0]
 
-    def set(self, key: str, value: str, ex: int | None = None):
+    def set(self, key: str, value: str, ex: int | None = None, nx: bool = False) -> bool:
+        if nx and self.get(key) is not None:
+            return False
         expires_at = time.time() + ex if ex else None
         self._data[key] = (value, expires_at)
+        self._writes += 1
+        if self._writes % self._SWEEP_EVERY == 0:
+            self._sweep()
+        return True
+
+    def _sweep(self):
+        now = time.time()
+        for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and now > expires_at]:
+            del self._data[key]
+
+    def incr(self, key: str, ex: int | None = None) -> int:
+        current = self.get(key)
+        value = int(current or 0) + 1
+        # Like INCR + EXPIRE NX: the TTL is set when the counter is created
+        if current is None:
+            self.set(key, str(value), ex=ex)
+        else:
+            self._data[key] = (str(value), self._data[key][1])
+        return value
 
     def delete(self, key: str):
         self._data.pop(key, None)
@@ -96,13 +122,28 @@ class RedisClient:
                 pass
         return _mem_store.get(key)
 
-    async def set(self, key: str, value: str, expire: int | None = None):
+    async def set(self, key: str, value: str, expire: int | None = None, nx: bool = False) -> bool:
+        """Set a key. With nx=True, only set if absent; returns whether it was set."""
+        if self.client:
+            try:
+                return bool(await self.client.set(key, value, ex=expire, nx=nx))
+            except Exception:
+                pass
+        return _mem_store.set(key, value, ex=expire, nx=nx)
+
+    async def incr(self, key: str, expire: int | None = None) -> int:
+        """Atomically increment a counter; `expire` applies when the counter is created."""
         if self.client:
             try:
-                return await self.client.set(key, value, ex=expire)
+                pipe = self.client.pipeline(transaction=True)
+                pipe.incr(key)
+                if expire:
+                    pipe.expire(key, expire, nx=True)
+                results = await pipe.execute()
+                return int(results[0])
             except Exception:
                 pass
-        _mem_store.set(key, value, ex=expire)
+        return _mem_store.incr(key, ex=expire)
 
     async def delete(self, key: str):
         if self.client:
@@ -2,35 +2,140 @@
 Async SQLAlchemy database engine and session management.
 """
 
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
 from uuid import uuid4
 
+import structlog
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.pool import NullPool
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.util import await_only
 from app.config import get_settings
 
 settings = get_settings()
+logger = structlog.get_logger()
 
-# NullPool: SQLAlchemy does not maintain its own connection pool.
+# Matches no row under the RLS policies (current_setting(...)::uuid must stay castable)
+_NO_TENANT = "00000000-0000-0000-0000-000000000000"
+
+
+class PoolMetrics:
+    """Checkout wait-time counters for the in-process pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, waited: float, timed_out: bool = False):
+        if timed_out:
+            self.timeouts += 1
+            return
+        self.checkouts += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - started)
+        return connection
+
+
+# Pooling mode (DB_POOL_MODE):
+#
+# "null" (default) — NullPool: SQLAlchemy does not maintain its own connection pool.
 # Each session opens a fresh connection and closes it on release.
 # Supabase's Supavisor (PgBouncer-compatible) handles the actual pooling in
 # transaction mode. SQLAlchemy's own pooling + PgBouncer transaction mode causes
 # "prepared statement does not exist" errors because named prepared statements
 # created on one server connection are not visible on another.
 #
+# "queue" — InstrumentedQueuePool: connections are kept open and reused in-process,
+# skipping the TCP+TLS+auth handshake per session. Only for session-mode poolers
+# (Supavisor :5432) or direct Postgres, where a client connection is pinned to one
+# server connection for its lifetime.
+#
+# In both modes:
 # statement_cache_size=0: disable asyncpg's client-side prepared statement cache.
 # prepared_statement_name_func: even with cache disabled, asyncpg still uses named
 # prepared statements internally.  Supplying a UUID-based name function ensures each
 # statement gets a globally unique name so PgBouncer never sees a duplicate across
 # connections, regardless of pool mode.
-engine = create_async_engine(
-    settings.database_url,
-    echo=not settings.is_production,
-    poolclass=NullPool,
-    connect_args={
-        "statement_cache_size": 0,
-        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
-    },
-)
+_connect_args = {
+    "statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+}
+
+if settings.db_pool_mode == "queue":
+    engine = create_async_engine(
+        settings.database_url,
+        echo=not settings.is_production,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+        connect_args=_connect_args,
+    )
+
+    @event.listens_for(engine.sync_engine.pool, "reset")
+    def _clear_tenant_context(dbapi_connection, connection_record, reset_state):
+        """
+        set_db_context() sets a session-level GUC; a pooled connection would carry
+        one tenant's RLS context into the next checkout. Clear it on return.
+        """
+        if reset_state.terminate_only:
+            return
+        await_only(
+            dbapi_connection.driver_connection.execute(
+                f"select set_config('app.current_property_id', '{_NO_TENANT}', false)"
+            )
+        )
+else:
+    engine = create_async_engine(
+        settings.database_url,
+        echo=not settings.is_production,
+        poolclass=NullPool,
+        connect_args=_connect_args,
+    )
+
+
+def get_pool_status() -> dict:
+    """Pool occupancy and checkout wait times (empty counters in NullPool mode)."""
+    pool = engine.sync_engine.pool
+    status = {"mode": settings.db_pool_mode}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": settings.db_max_overflow,
+            "checkouts": pool_metrics.checkouts,
+            "timeouts": pool_metrics.timeouts,
+            "avg_wait_ms": round(pool_metrics.total_wait_seconds / pool_metrics.checkouts * 1000, 2)
+            if pool_metrics.checkouts else None,
+            "max_wait_ms": round(pool_metrics.max_wait_seconds * 1000, 2),
+        })
+    return status
+
 
 async_session = async_sessionmaker(
     engine,
@@ -44,6 +149,45 @@ async_session_factory = async_session
 from sqlalchemy import text
 
 
+_AFTER_COMMIT_JOBS = "after_commit_jobs"
+_after_commit_tasks: set[asyncio.Task] = set()
+
+
+def run_after_commit(session: AsyncSession, job: Callable[[], Awaitable[Any]]):
+    """
+    Run `job()` once the session's current transaction has committed; it is
+    dropped if the transaction rolls back. For side effects that must only
+    see committed rows, e.g. queueing post-reply work or invalidating caches.
+    """
+    session.sync_session.info.setdefault(_AFTER_COMMIT_JOBS, []).append(job)
+
+
+async def _run_after_commit_job(job: Callable[[], Awaitable[Any]]):
+    try:
+        await job()
+    except Exception as e:
+        logger.warning("After-commit job failed", job=getattr(job, "__name__", repr(job)), error=str(e))
+
+
+@event.listens_for(Session, "after_commit")
+def _start_after_commit_jobs(session: Session):
+    jobs = session.info.pop(_AFTER_COMMIT_JOBS, None)
+    if not jobs:
+        return
+    loop = asyncio.get_running_loop()
+    for job in jobs:
+        task = loop.create_task(_run_after_commit_job(job))
+        _after_commit_tasks.add(task)
+        task.add_done_callback(_after_commit_tasks.discard)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_after_commit_jobs(session: Session, transaction):
+    # Jobs still pending when the outermost transaction ends were rolled back or closed
+    if transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT_JOBS, None)
+
+
 async def set_db_context(session: AsyncSession, business_id: str):
     """Sets the RLS context for the current session."""
     await session.execute(
@@ -21,6 +21,7 @@ from sqlalchemy import (
     JSON,
     UniqueConstraint,
     func,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -396,9 +397,16 @@ class Conversation(Base):
     follow_up_stage: Mapped[int] = mapped_column(
         Integer, default=0, server_default="0"
     )
+    # When the next automated follow-up is due; NULL once all have been sent
+    next_follow_up_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     ended_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     message_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Incremental lead extraction state: {"details": {...}, "cursor": [sent_at, message_id], ...}
+    lead_extraction: Mapped[dict | None] = mapped_column(JSON)
+    # Rolling summary of the messages before summary_state["cursor"] ([sent_at, message_id])
+    summary: Mapped[str | None] = mapped_column(Text)
+    summary_state: Mapped[dict | None] = mapped_column(JSON)
 
     # Relationships
     business: Mapped["Business"] = relationship(back_populates="conversations")
@@ -415,6 +423,12 @@ class Conversation(Base):
         Index("ix_conversations_property_status", "business_id", "status"),
         Index("ix_conversations_property_after_hours", "business_id", "is_after_hours"),
         Index("ix_conversations_guest", "business_id", "guest_identifier"),
+        Index("ix_conversations_started_at", "started_at"),  # Retention keyset scans
+        Index(
+            "ix_conversations_next_follow_up",
+            "next_follow_up_at",
+            postgresql_where=text("status = 'active'"),
+        ),
     )
 
 
@@ -437,8 +451,10 @@ class Message(Base):
     content: Mapped[str] = mapped_column(Text, nullable=False)
     metadata_: Mapped[dict | None] = mapped_column("metadata", JSON)
     # Metadata can include: response_time_ms, llm_tokens_used, confidence_score
+    # Partition key: messages is range-partitioned by month on sent_at, so the
+    # table's primary key is (id, sent_at); the mapper still identifies rows by id
     sent_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now()
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
     )
     deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
@@ -447,6 +463,24 @@ class Message(Base):
 
     __table_args__ = (
         Index("ix_messages_conversation", "conversation_id", "sent_at"),
+        # Monthly partitions are created and dropped by services/partitions.py
+        {"postgresql_partition_by": "RANGE (sent_at)"},
+    )
+    __mapper_args__ = {"primary_key": ["id"]}
+
+
+class MessageProviderId(Base):
+    """
+    Idempotent webhook ingestion: one stored message per provider message ID
+    (e.g. 'whatsapp:wamid...'). Kept outside the partitioned messages table,
+    whose unique indexes would have to include sent_at.
+    """
+    __tablename__ = "message_provider_ids"
+
+    provider_message_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    message_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    received_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
     )
 
 
@@ -503,6 +537,7 @@ class Lead(Base):
     __table_args__ = (
         Index("ix_leads_property_status", "business_id", "status"),
         Index("ix_leads_property_date", "business_id", "captured_at"),
+        Index("ix_leads_captured_at", "captured_at"),  # Retention keyset scans
     )
 
 
@@ -527,6 +562,8 @@ class KBDocument(Base):
     embedding: Mapped[list] = mapped_column(
         Vector(settings.embedding_dimensions), nullable=True
     )
+    # sha256 of embedding model + doc_type + title + content; NULL = re-embed on next ingest
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
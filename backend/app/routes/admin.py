@@ -11,6 +11,7 @@ import structlog
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import get_settings
 from app.database import get_db
 from app.models import Business, Announcement, TenantMembership
 from app.schemas import (
@@ -20,9 +21,12 @@ from app.schemas import (
     KBIngestResponse,
 )
 from app.services import ingest_knowledge_base
+from app.services.business_routing import invalidate_business_routes
+from app.services.prompt_context import invalidate_prompt_context
 from app.auth import verify_jwt, check_property_access
 
 logger = structlog.get_logger()
+settings = get_settings()
 router = APIRouter()
 
 
@@ -52,7 +56,9 @@ async def create_property(
         required_questions=body.required_questions,
     )
     db.add(prop)
-    await db.flush()
+    await db.commit()
+    await db.refresh(prop)
+    await invalidate_business_routes()
 
     return BusinessResponse(
         id=str(prop.id),
@@ -116,6 +122,9 @@ async def get_property_settings(
         "hourly_rate": float(prop.hourly_rate) if prop.hourly_rate else 25.00,
         "brand_vocabulary": prop.brand_vocabulary,
         "required_questions": prop.required_questions,
+        "semantic_answer_cache": bool(
+            (prop.knowledge_base_config or {}).get("semantic_cache", settings.semantic_cache_enabled)
+        ),
         "whatsapp_number": prop.whatsapp_number,
         "website_url": prop.website_url,
     }
@@ -147,8 +156,16 @@ async def update_property_settings(
         prop.brand_vocabulary = body.brand_vocabulary
     if body.required_questions is not None:
         prop.required_questions = body.required_questions
+    if body.semantic_answer_cache is not None:
+        prop.knowledge_base_config = {
+            **(prop.knowledge_base_config or {}),
+            "semantic_cache": body.semantic_answer_cache,
+        }
 
-    await db.flush()
+    # Commit first: an invalidation before the commit lets another instance re-cache the old row
+    await db.commit()
+    await invalidate_business_routes()
+    await invalidate_prompt_context(prop.id)
     return {"status": "success"}
 
 
@@ -166,10 +183,14 @@ async def upload_knowledge_base(
     if not result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Business not found")
 
+    def _log_progress(done: int, total: int):
+        logger.info("KB ingest progress", business_id=business_id, embedded=done, total=total)
+
     count = await ingest_knowledge_base(
         db=db,
         business_id=pid,
         documents=[doc.model_dump() for doc in body.documents],
+        progress=_log_progress,
     )
 
     return KBIngestResponse(documents_ingested=count, business_id=business_id)
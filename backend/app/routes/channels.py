@@ -1,9 +1,13 @@
 """
 Guest Channel routes — WhatsApp, Web Chat, Email webhooks.
+
+Webhooks only resolve the business and enqueue the message on the inbound
+queue (app.services.inbound_queue); the handlers below run on its workers,
+in order per guest conversation.
 """
 
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form
 import structlog
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -16,9 +20,12 @@ from app.schemas import (
     WebChatStartRequest,
 )
 from app.services.conversation import process_guest_message, FALLBACK_RESPONSE
-from app.services.whatsapp import send_whatsapp_message, normalize_whatsapp_message
+from app.services.whatsapp import send_whatsapp_message, iter_whatsapp_messages
 from app.services.twilio_whatsapp import normalize_twilio_webhook, send_twilio_message
 from app.services.email import send_email, notify_staff_handoff, normalize_email_message
+from app.services.inbound_queue import inbound_queue
+from app.services.business_routing import business_routing
+from app.services.webhook_dedup import claim_message_ids, provider_message_id, release_message_ids
 from app.limiter import limiter
 from app.auth import verify_whatsapp_signature, verify_sendgrid_signature, verify_twilio_signature
 
@@ -40,60 +47,103 @@ _MEDIA_NOT_SUPPORTED_MSG = (
 @limiter.limit("3000/minute")
 async def whatsapp_webhook(
     request: Request,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     _: None = Depends(verify_whatsapp_signature)
 ):
     """
     WhatsApp Cloud API webhook receiver.
     Handles verification (GET) and incoming messages (POST).
+
+    Meta may batch many messages (across entries and phone numbers) into one
+    delivery: every message is enqueued, with each business resolved once.
     """
     body = await request.json()
 
-    normalized_data = normalize_whatsapp_message(body)
-    if not normalized_data:
+    messages = list(iter_whatsapp_messages(body))
+    if not messages:
         return {"status": "ignored"}
 
+    # Drop Meta retries of messages we already accepted — before any DB or LLM work
+    message_ids = [
+        provider_message_id("whatsapp", m["metadata"].get("whatsapp_message_id")) for m in messages
+    ]
+    claimed = await claim_message_ids(message_ids)
+    messages = [m for m, mid in zip(messages, message_ids) if mid is None or mid in claimed]
+    if not messages:
+        return {"status": "duplicate"}
+
     # Prefer display_phone_number (e.g. +15557220306) for business lookup as it
     # matches the human-readable sender number stored in Business.whatsapp_number.
     # Fall back to phone_number_id (Meta's internal ID) for backwards compatibility.
-    display_phone_number = normalized_data["metadata"].get("display_phone_number")
-    phone_number_id = normalized_data["metadata"].get("phone_number_id")
-    lookup_number = display_phone_number or phone_number_id
-    prop_result = await db.execute(
-        select(Business).where(Business.whatsapp_number == lookup_number)
-    )
-    prop = prop_result.scalar_one_or_none()
-
-    if not prop:
-        logger.warning(
-            "WhatsApp webhook: Business not found",
-            display_phone_number=display_phone_number,
-            phone_number_id=phone_number_id,
-        )
+    def lookup_number(normalized: dict) -> str | None:
+        meta = normalized["metadata"]
+        return meta.get("display_phone_number") or meta.get("phone_number_id")
+
+    numbers = {n for n in map(lookup_number, messages) if n}
+    businesses = await business_routing.resolve_many(db, "whatsapp", numbers)
+
+    jobs = []
+    has_text = False
+    for normalized_data in messages:
+        prop = businesses.get(lookup_number(normalized_data))
+        if not prop:
+            logger.warning(
+                "WhatsApp webhook: Business not found",
+                display_phone_number=normalized_data["metadata"].get("display_phone_number"),
+                phone_number_id=normalized_data["metadata"].get("phone_number_id"),
+            )
+            continue
+
+        from_number = normalized_data["guest_identifier"]
+
+        # Non-text messages (images, audio, etc.) — send canned reply, skip AI
+        if normalized_data["metadata"].get("is_unsupported_media"):
+            jobs.append((
+                "unsupported_media",
+                _ordering_key(prop.id, from_number),
+                {
+                    "from_number": from_number,
+                    "whatsapp_provider": prop.whatsapp_provider,
+                    "twilio_from_number": prop.twilio_phone_number,
+                },
+            ))
+            continue
+
+        has_text = True
+        jobs.append((
+            "whatsapp",
+            _ordering_key(prop.id, from_number),
+            {
+                "business_id": str(prop.id),
+                "from_number": from_number,
+                "text": normalized_data["content"],
+                "guest_name": normalized_data["guest_name"],
+                "whatsapp_provider": prop.whatsapp_provider,
+                "twilio_from_number": prop.twilio_phone_number,
+                "message_id": provider_message_id(
+                    "whatsapp", normalized_data["metadata"].get("whatsapp_message_id")
+                ),
+            },
+        ))
+
+    if not jobs:
         return {"status": "property_not_found"}
 
-    # Non-text messages (images, audio, etc.) — send canned reply, skip AI
-    if normalized_data["metadata"].get("is_unsupported_media"):
-        background_tasks.add_task(
-            _handle_unsupported_media_async,
-            from_number=normalized_data["guest_identifier"],
-            whatsapp_provider=prop.whatsapp_provider,
-            twilio_from_number=prop.twilio_phone_number,
-        )
-        return {"status": "media_not_supported"}
-
-    background_tasks.add_task(
-        _handle_whatsapp_message_async,
-        business_id=prop.id,
-        from_number=normalized_data["guest_identifier"],
-        text=normalized_data["content"],
-        guest_name=normalized_data["guest_name"],
-        whatsapp_provider=prop.whatsapp_provider,
-        twilio_from_number=prop.twilio_phone_number,
-    )
+    try:
+        await inbound_queue.enqueue_many(jobs)
+    except Exception:
+        # Let Meta's retry through instead of dropping it as a duplicate
+        await release_message_ids(list(claimed))
+        raise
+    if len(messages) > 1:
+        logger.info("WhatsApp webhook batch enqueued", messages=len(messages), enqueued=len(jobs))
 
-    return {"status": "processing"}
+    return {"status": "processing"} if has_text else {"status": "media_not_supported"}
+
+
+def _ordering_key(business_id, guest_identifier: str) -> str:
+    """Inbound queue ordering key: one guest's messages to one business are processed in order."""
+    return f"{business_id}:{guest_identifier}"
 
 
 async def _handle_unsupported_media_async(
@@ -101,7 +151,7 @@ async def _handle_unsupported_media_async(
     whatsapp_provider: str,
     twilio_from_number: str | None,
 ):
-    """Background task: reply to unsupported media (images, audio, etc.) with a canned message."""
+    """Queue handler: reply to unsupported media (images, audio, etc.) with a canned message."""
     try:
         if whatsapp_provider == "twilio":
             await send_twilio_message(
@@ -119,82 +169,136 @@ async def _handle_unsupported_media_async(
         )
 
 
+async def _send_whatsapp_reply(
+    to_number: str,
+    message_text: str,
+    whatsapp_provider: str,
+    twilio_from_number: str | None,
+):
+    """Route a reply through the business's configured WhatsApp provider."""
+    if whatsapp_provider == "twilio":
+        await send_twilio_message(
+            to_number=to_number,
+            message_text=message_text,
+            from_number=twilio_from_number,
+        )
+    else:
+        await send_whatsapp_message(to_number=to_number, message_text=message_text)
+
+
 async def _handle_whatsapp_message_async(
-    business_id: uuid.UUID,
+    business_id: uuid.UUID | str,
     from_number: str,
     text: str,
     guest_name: str | None,
     whatsapp_provider: str = "meta",
     twilio_from_number: str | None = None,
+    preceding_texts: list[str] | None = None,
+    message_id: str | None = None,
+    preceding_message_ids: list[str | None] | None = None,
 ):
-    """Background task to process WhatsApp message and send reply."""
+    """
+    Queue handler: process a WhatsApp message and send the reply.
+
+    `preceding_texts` holds earlier messages of a rapid-fire burst merged by
+    _coalesce_whatsapp_jobs; they are stored individually and answered in one turn.
+    `message_id` / `preceding_message_ids` are the provider IDs of those messages
+    (see webhook_dedup); an already-stored message is not answered again.
+
+    Errors before the commit propagate so the queue retries the job (nothing
+    was persisted). Once the turn is committed, reply delivery is best-effort:
+    retrying would run the AI turn a second time.
+    """
     from app.database import async_session, set_db_context
 
+    business_id = uuid.UUID(str(business_id))
+
     async with async_session() as db:
-        try:
-            await set_db_context(db, str(business_id))
+        await set_db_context(db, str(business_id))
+
+        result = await process_guest_message(
+            db=db,
+            business_id=business_id,
+            guest_identifier=from_number,
+            channel="whatsapp",
+            message_text=text,
+            guest_name=guest_name,
+            preceding_messages=preceding_texts,
+            provider_message_id=message_id,
+            preceding_message_ids=preceding_message_ids,
+        )
+
+        await db.commit()
 
-            result = await process_guest_message(
-                db=db,
-                business_id=business_id,
+    # Shadow pilot / audit-only mode: message logged, no reply sent.
+    # Duplicate delivery: the original turn already replied.
+    if result.get("audit_only") or result.get("duplicate"):
+        return
+
+    response_text = result["response"]
+
+    try:
+        await _send_whatsapp_reply(from_number, response_text, whatsapp_provider, twilio_from_number)
+
+        if result.get("mode") == "handoff":
+            await notify_staff_handoff(
+                business_id=str(business_id),
+                conversation_id=result["conversation_id"],
                 guest_identifier=from_number,
                 channel="whatsapp",
-                message_text=text,
                 guest_name=guest_name,
+                conversation_summary=f"Last message: {' / '.join([*(preceding_texts or []), text])}\nAI Reply: {response_text}"
             )
+    except Exception as e:
+        logger.error(
+            "Failed to deliver WhatsApp reply",
+            error=str(e),
+            business_id=str(business_id),
+            from_number=from_number,
+            exc_info=True,
+        )
 
-            await db.commit()
-
-            # Shadow pilot / audit-only mode: message logged, no reply sent
-            if result.get("audit_only"):
-                return
-
-            response_text = result["response"]
-
-            # Route reply based on business configuration
-            if whatsapp_provider == "twilio":
-                await send_twilio_message(
-                    to_number=from_number,
-                    message_text=response_text,
-                    from_number=twilio_from_number,
-                )
-            else:
-                await send_whatsapp_message(to_number=from_number, message_text=response_text)
-
-            if result.get("mode") == "handoff":
-                await notify_staff_handoff(
-                    business_id=str(business_id),
-                    conversation_id=result["conversation_id"],
-                    guest_identifier=from_number,
-                    channel="whatsapp",
-                    guest_name=guest_name,
-                    conversation_summary=f"Last message: {text}\nAI Reply: {response_text}"
-                )
-
-        except Exception as e:
-            logger.error(
-                "Error processing WhatsApp message",
-                error=str(e),
-                business_id=str(business_id),
-                from_number=from_number,
-                exc_info=True,
-            )
-            # Best-effort fallback: ensure guest gets at least a reply
-            try:
-                if whatsapp_provider == "twilio":
-                    await send_twilio_message(
-                        to_number=from_number,
-                        message_text=FALLBACK_RESPONSE,
-                        from_number=twilio_from_number,
-                    )
-                else:
-                    await send_whatsapp_message(to_number=from_number, message_text=FALLBACK_RESPONSE)
-            except Exception as send_err:
-                logger.error(
-                    "Failed to send fallback reply after processing error",
-                    error=str(send_err),
-                    from_number=from_number,
-                )
+
+def _coalesce_whatsapp_jobs(payloads: list[dict]) -> dict:
+    """Merge a burst of WhatsApp payloads (oldest first) into one job answered by a single AI turn."""
+    latest = payloads[-1]
+    preceding, preceding_ids = [], []
+    for payload in payloads[:-1]:
+        texts = payload.get("preceding_texts") or []
+        preceding.extend(texts)
+        preceding_ids.extend(payload.get("preceding_message_ids") or [None] * len(texts))
+        preceding.append(payload["text"])
+        preceding_ids.append(payload.get("message_id"))
+    guest_name = next((p["guest_name"] for p in reversed(payloads) if p.get("guest_name")), None)
+    return {
+        **latest,
+        "guest_name": guest_name,
+        "preceding_texts": preceding,
+        "preceding_message_ids": preceding_ids,
+    }
+
+
+async def _handle_whatsapp_dead_letter(
+    business_id: uuid.UUID | str,
+    from_number: str,
+    whatsapp_provider: str = "meta",
+    twilio_from_number: str | None = None,
+    **_,
+):
+    """Best-effort fallback once a WhatsApp job has exhausted its retries: ensure the guest gets a reply."""
+    logger.error(
+        "WhatsApp message could not be processed",
+        business_id=str(business_id),
+        from_number=from_number,
+    )
+    try:
+        await _send_whatsapp_reply(from_number, FALLBACK_RESPONSE, whatsapp_provider, twilio_from_number)
+    except Exception as send_err:
+        logger.error(
+            "Failed to send fallback reply after processing error",
+            error=str(send_err),
+            from_number=from_number,
+        )
 
 
 @router.get("/webhook/whatsapp")
@@ -217,7 +321,6 @@ async def whatsapp_verify(request: Request):
 @limiter.limit("3000/minute")
 async def twilio_whatsapp_webhook(
     request: Request,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     _: None = Depends(verify_twilio_signature)
 ):
@@ -230,36 +333,52 @@ async def twilio_whatsapp_webhook(
     if not normalized_data:
         return {"status": "ignored"}
 
+    # Drop Twilio retries of a MessageSid we already accepted — before any DB or LLM work
+    message_id = provider_message_id("twilio", normalized_data["metadata"].get("twilio_message_sid"))
+    if message_id and not await claim_message_ids([message_id]):
+        return {"status": "duplicate"}
+
     to_number = normalized_data["metadata"].get("twilio_to_number")
     # Lookup the business by the Twilio Phone Number
-    prop_result = await db.execute(
-        select(Business).where(Business.twilio_phone_number == to_number)
-    )
-    prop = prop_result.scalar_one_or_none()
+    prop = await business_routing.resolve(db, "twilio", to_number)
 
     if not prop:
         logger.warning("Twilio webhook: Business not found", to_number=to_number)
         return {"status": "property_not_found"}
 
-    # Non-text messages (images, audio, etc.) — send canned reply, skip AI
-    if normalized_data["metadata"].get("is_unsupported_media"):
-        background_tasks.add_task(
-            _handle_unsupported_media_async,
-            from_number=normalized_data["guest_identifier"],
-            whatsapp_provider="twilio",
-            twilio_from_number=prop.twilio_phone_number,
+    from_number = normalized_data["guest_identifier"]
+
+    try:
+        # Non-text messages (images, audio, etc.) — send canned reply, skip AI
+        if normalized_data["metadata"].get("is_unsupported_media"):
+            await inbound_queue.enqueue(
+                "unsupported_media",
+                _ordering_key(prop.id, from_number),
+                {
+                    "from_number": from_number,
+                    "whatsapp_provider": "twilio",
+                    "twilio_from_number": prop.twilio_phone_number,
+                },
+            )
+            return {"status": "media_not_supported"}
+
+        await inbound_queue.enqueue(
+            "whatsapp",
+            _ordering_key(prop.id, from_number),
+            {
+                "business_id": str(prop.id),
+                "from_number": from_number,
+                "text": normalized_data["content"],
+                "guest_name": normalized_data["guest_name"],
+                "whatsapp_provider": "twilio",
+                "twilio_from_number": prop.twilio_phone_number,
+                "message_id": message_id,
+            },
         )
-        return {"status": "media_not_supported"}
-
-    background_tasks.add_task(
-        _handle_whatsapp_message_async,
-        business_id=prop.id,
-        from_number=normalized_data["guest_identifier"],
-        text=normalized_data["content"],
-        guest_name=normalized_data["guest_name"],
-        whatsapp_provider="twilio",
-        twilio_from_number=prop.twilio_phone_number,
-    )
+    except Exception:
+        # Let Twilio's retry through instead of dropping it as a duplicate
+        await release_message_ids([message_id])
+        raise
 
     return {"status": "processing"}
 
@@ -271,7 +390,6 @@ async def twilio_whatsapp_webhook(
 @router.post("/webhook/email", response_model=None)
 @limiter.limit("100/minute")
 async def email_webhook(
-    background_tasks: BackgroundTasks,
     subject: str = Form(None),
     text: str = Form(None),
     html: str = Form(None),
@@ -298,67 +416,85 @@ async def email_webhook(
         logger.warning("Email webhook: Business not found", to_address=to_address)
         return {"status": "no_property"}
 
-    background_tasks.add_task(
-        _handle_email_message_async,
-        business_id=prop.id,
-        from_address=normalized_data["guest_identifier"],
-        subject=normalized_data["metadata"].get("subject"),
-        text=normalized_data["content"],
-        guest_name=normalized_data["guest_name"]
+    from_address = normalized_data["guest_identifier"]
+    await inbound_queue.enqueue(
+        "email",
+        _ordering_key(prop.id, from_address),
+        {
+            "business_id": str(prop.id),
+            "from_address": from_address,
+            "subject": normalized_data["metadata"].get("subject"),
+            "text": normalized_data["content"],
+            "guest_name": normalized_data["guest_name"],
+        },
     )
 
     return {"status": "processing"}
 
 
 async def _handle_email_message_async(
-    business_id: uuid.UUID,
+    business_id: uuid.UUID | str,
     from_address: str,
     subject: str,
     text: str,
     guest_name: str | None
 ):
-    """Background task to process inbound email and send reply."""
+    """
+    Queue handler: process inbound email and send reply.
+    Same retry contract as _handle_whatsapp_message_async.
+    """
     from app.database import async_session, set_db_context
 
+    business_id = uuid.UUID(str(business_id))
+
     async with async_session() as db:
-        try:
-            await set_db_context(db, str(business_id))
+        await set_db_context(db, str(business_id))
+
+        result = await process_guest_message(
+            db=db,
+            business_id=business_id,
+            guest_identifier=from_address,
+            channel="email",
+            message_text=text,
+            guest_name=guest_name,
+        )
 
-            result = await process_guest_message(
-                db=db,
-                business_id=business_id,
+        await db.commit()
+
+    response_text = result["response"]
+    try:
+        await send_email(
+            to_email=from_address,
+            subject=f"Re: {subject}",
+            content=response_text
+        )
+
+        if result.get("mode") == "handoff":
+            await notify_staff_handoff(
+                business_id=str(business_id),
+                conversation_id=result["conversation_id"],
                 guest_identifier=from_address,
                 channel="email",
-                message_text=text,
                 guest_name=guest_name,
+                conversation_summary=f"Message: {text}\n\nAI Reply: {response_text}"
             )
+    except Exception as e:
+        logger.error(
+            "Error delivering email reply",
+            error=str(e),
+            business_id=str(business_id),
+            guest_email=from_address
+        )
 
-            await db.commit()
 
-            response_text = result["response"]
-            await send_email(
-                to_email=from_address,
-                subject=f"Re: {subject}",
-                content=response_text
-            )
-
-            if result.get("mode") == "handoff":
-                await notify_staff_handoff(
-                    business_id=str(business_id),
-                    conversation_id=result["conversation_id"],
-                    guest_identifier=from_address,
-                    channel="email",
-                    guest_name=guest_name,
-                    conversation_summary=f"Message: {text}\n\nAI Reply: {response_text}"
-                )
-
-        except Exception as e:
-            logger.error(
-                "Error processing email message",
-                error=str(e),
-                business_id=str(business_id),
-                guest_email=from_address
-            )
+inbound_queue.register_handler(
+    "whatsapp",
+    _handle_whatsapp_message_async,
+    on_dead_letter=_handle_whatsapp_dead_letter,
+    coalesce=_coalesce_whatsapp_jobs,
+)
+inbound_queue.register_handler("unsupported_media", _handle_unsupported_media_async)
+inbound_queue.register_handler("email", _handle_email_message_async)
 
 
 # ─────────────────────────────────────────────────────────────
@@ -10,22 +10,30 @@ Cloud Scheduler job targets:
   POST /api/v1/internal/run-followups       (hourly)
   POST /api/v1/internal/run-insights        (1st of month 08:00)
   POST /api/v1/internal/cleanup-leads       (weekly Sunday 03:00)
+  POST /api/v1/internal/maintain-partitions (daily 02:30)
+
+On-demand (not scheduled):
+  POST /api/v1/internal/backfill-analytics  (recompute AnalyticsDaily for a date range)
 """
 
 import logging
-from datetime import datetime, timezone
+import uuid
+from datetime import date, datetime, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
 from app.database import get_db
+from app.services.analytics import backfill_analytics
+from app.services.business_routing import business_routing
 from app.services.scheduler import (
     delete_old_leads,
     generate_monthly_insights,
+    maintain_message_partitions,
     process_automated_follow_ups,
     run_daily_reports,
     run_weekly_audit_report,
@@ -138,6 +146,49 @@ async def cleanup_leads(
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@router.post("/maintain-partitions", include_in_schema=False)
+async def maintain_partitions_endpoint(
+    x_internal_secret: str | None = Header(default=None),
+):
+    """Triggered by Cloud Scheduler — creates upcoming messages partitions, drops expired ones."""
+    _verify(x_internal_secret)
+    try:
+        await maintain_message_partitions()
+        return {"status": "ok", "job": "partition_maintenance"}
+    except Exception as exc:
+        logger.error("Partition maintenance job failed: %s", exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+class AnalyticsBackfillPayload(BaseModel):
+    start_date: date
+    end_date: date
+    business_ids: Optional[list[uuid.UUID]] = None  # None = all businesses
+
+
+@router.post("/backfill-analytics", include_in_schema=False)
+async def backfill_analytics_endpoint(
+    payload: AnalyticsBackfillPayload,
+    x_internal_secret: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+):
+    """Recomputes AnalyticsDaily for a date range (business-local days) in one pass."""
+    _verify(x_internal_secret)
+    try:
+        rows = await backfill_analytics(
+            db,
+            start_date=payload.start_date,
+            end_date=payload.end_date,
+            business_ids=payload.business_ids,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        logger.error("Analytics backfill failed: %s", exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+    return {"status": "ok", "job": "analytics_backfill", "rows_upserted": rows}
+
+
 # ─────────────────────────────────────────────────────────────
 # Shadow Pilot Bridge Endpoints
 # ─────────────────────────────────────────────────────────────
@@ -171,6 +222,9 @@ async def shadow_event_endpoint(
 ):
     """Receives message events from Baileys bridge."""
     _verify(x_internal_secret)
+    if not await business_routing.resolve(db, "slug", payload.business_slug):
+        logger.warning("Shadow event for unknown business slug: %s", payload.business_slug)
+        return {"status": "unknown_business"}
     if payload.event_type == "message.received":
         await handle_message_received(
             db=db,
@@ -201,10 +255,16 @@ async def shadow_session_status(
     """Updates Baileys session connection status for a business."""
     _verify(x_internal_secret)
     from app.models import Business
-    prop = await db.scalar(select(Business).where(Business.slug == payload.business_slug))
-    if prop:
-        prop.shadow_pilot_session_active = (payload.status == "connected")
-        prop.shadow_pilot_session_last_seen = datetime.now(timezone.utc)
+    route = await business_routing.resolve(db, "slug", payload.business_slug)
+    if route:
+        await db.execute(
+            update(Business)
+            .where(Business.id == route.id)
+            .values(
+                shadow_pilot_session_active=(payload.status == "connected"),
+                shadow_pilot_session_last_seen=datetime.now(timezone.utc),
+            )
+        )
         await db.commit()
     return {"status": "ok"}
 
@@ -215,16 +275,39 @@ async def shadow_heartbeat(
     x_internal_secret: str | None = Header(default=None),
     db: AsyncSession = Depends(get_db),
 ):
-    """Receives periodic heartbeat from Baileys bridge to confirm session is alive."""
+    """
+    Receives periodic heartbeat from Baileys bridge to confirm session is alive.
+    last_seen is written at most once per SHADOW_HEARTBEAT_WRITE_INTERVAL_SECONDS
+    per business; heartbeats in between cost no DB round trip.
+    """
     _verify(x_internal_secret)
     from app.models import Business
-    prop = await db.scalar(select(Business).where(Business.slug == payload.business_slug))
-    if prop:
-        prop.shadow_pilot_session_last_seen = datetime.now(timezone.utc)
+    route = await business_routing.resolve(db, "slug", payload.business_slug)
+    if route and await _heartbeat_write_due(route.id):
+        await db.execute(
+            update(Business)
+            .where(Business.id == route.id)
+            .values(shadow_pilot_session_last_seen=datetime.now(timezone.utc))
+        )
         await db.commit()
     return {"status": "ok"}
 
 
+async def _heartbeat_write_due(business_id: uuid.UUID) -> bool:
+    """True for the first heartbeat in each write interval (shared across instances via Redis)."""
+    from app.core.redis import get_redis
+    try:
+        redis = await get_redis()
+        return await redis.set(
+            f"shadow:heartbeat:{business_id}",
+            "1",
+            expire=settings.shadow_heartbeat_write_interval_seconds,
+            nx=True,
+        )
+    except Exception:
+        return True
+
+
 @router.get("/shadow-active-businesses", include_in_schema=False)
 async def shadow_active_properties(
     x_internal_secret: str | None = Header(default=None),
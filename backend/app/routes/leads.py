@@ -1,9 +1,7 @@
 """
-Lead management routes — CRUD, CSV export.
+Lead management routes — CRUD, streaming export (CSV / NDJSON / Parquet).
 """
 
-import csv
-import io
 import uuid
 from datetime import date, datetime
 
@@ -20,6 +18,13 @@ from app.models import Lead
 from app.schemas import LeadResponse, LeadUpdateRequest, LeadConvertRequest
 from app.auth import verify_jwt, check_property_access
 from app.services.stripe_service import create_fpx_payment_link
+from app.services.lead_export import (
+    LeadExportFilters,
+    check_export_format,
+    export_filename,
+    export_media_type,
+    stream_leads_export,
+)
 
 settings = get_settings()
 
@@ -187,58 +192,32 @@ async def export_leads_csv(
     intent: str = Query(None),
     from_date: date = Query(None),
     to_date: date = Query(None),
-    db: AsyncSession = Depends(get_db),
+    fmt: str = Query("csv", alias="format", description="csv | ndjson | parquet"),
+    gzip: bool = Query(False),
     token: dict = Depends(check_property_access),
 ):
-    """Export leads as CSV file."""
-    query = (
-        select(Lead)
-        .where(Lead.business_id == uuid.UUID(business_id))
-        .order_by(Lead.captured_at.desc())
+    """
+    Export leads as CSV (default), NDJSON or Parquet, optionally gzipped.
+    Rows are streamed in keyset batches as they are fetched.
+    """
+    try:
+        check_export_format(fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    pid = uuid.UUID(business_id)
+    filters = LeadExportFilters(
+        business_id=pid,
+        status=status,
+        intent=intent,
+        from_date=from_date,
+        to_date=to_date,
     )
-
-    if status:
-        query = query.where(Lead.status == status)
-    if intent:
-        query = query.where(Lead.intent == intent)
-    if from_date:
-        query = query.where(Lead.captured_at >= datetime.combine(from_date, datetime.min.time()))
-    if to_date:
-        query = query.where(Lead.captured_at <= datetime.combine(to_date, datetime.max.time()))
-
-    result = await db.execute(query)
-    leads = result.scalars().all()
-
-    # Generate CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "Name", "Phone", "Email", "Intent", "Status",
-        "Estimated Value (RM)", "Actual Revenue (RM)", "Priority", "Channel",
-        "After Hours", "Captured At"
-    ])
-
-    for lead in leads:
-        writer.writerow([
-            lead.guest_name or "",
-            lead.guest_phone or "",
-            lead.guest_email or "",
-            lead.intent or "",
-            lead.status or "",
-            float(lead.estimated_value) if lead.estimated_value else "",
-            float(lead.actual_revenue) if lead.actual_revenue else "",
-            lead.priority or "",
-            lead.source_channel or "",
-            "Yes" if lead.is_after_hours else "No",
-            lead.captured_at.isoformat() if lead.captured_at else "",
-        ])
-
-    output.seek(0)
-    filename = f"leads_{business_id}_{date.today().isoformat()}.csv"
+    filename = export_filename(pid, fmt, gzip)
 
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        stream_leads_export(filters, fmt=fmt, gzipped=gzip),
+        media_type=export_media_type(fmt, gzip),
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
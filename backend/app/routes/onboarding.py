@@ -18,6 +18,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
+from app.services.business_routing import invalidate_business_routes
 from app.config import get_settings
 from app.auth import require_superadmin, get_current_user, check_tenant_access
 from app.models import (
@@ -233,6 +234,7 @@ async def provision_tenant(
         db.add(doc)
 
     await db.commit()
+    await invalidate_business_routes()
 
     # 7. Trigger async channel setup
     background_tasks.add_task(
@@ -3,7 +3,6 @@ Portal routes — Tenant self-service API.
 Covers home dashboard, team management, channel status, and KB management.
 """
 
-import asyncio
 import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Any
@@ -21,7 +20,8 @@ from app.models import (
     Tenant, Business, TenantMembership, OnboardingProgress,
     KBDocument, AnalyticsDaily, User,
 )
-from app.services import generate_embedding
+from app.services import generate_embedding, generate_embeddings_batch
+from app.services.kb_index import invalidate_kb_index
 
 logger = structlog.get_logger()
 router = APIRouter()
@@ -454,6 +454,7 @@ async def create_kb_document(
 
     await db.commit()
     await db.refresh(doc)
+    await invalidate_kb_index(business_id)
 
     logger.info("KB document created", doc_id=str(doc.id), business_id=str(business_id))
 
@@ -489,16 +490,19 @@ async def update_kb_document(
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    if body.title is not None:
+    if body.title is not None and body.title != doc.title:
         doc.title = body.title
+        doc.content_hash = None  # No longer matches a bulk-ingested chunk
 
     if body.content is not None and body.content != doc.content:
         doc.content = body.content
         doc.embedding = await generate_embedding(body.content)
+        doc.content_hash = None
 
     doc.updated_at = datetime.now(timezone.utc)
     await db.commit()
     await db.refresh(doc)
+    await invalidate_kb_index(business_id)
 
     return {
         "id": str(doc.id),
@@ -533,6 +537,7 @@ async def delete_kb_document(
 
     await db.delete(doc)
     await db.commit()
+    await invalidate_kb_index(business_id)
 
     logger.info("KB document deleted", doc_id=str(doc_id), business_id=str(business_id))
     return {"message": "Document deleted"}
@@ -548,7 +553,7 @@ async def ingest_kb_wizard(
     """
     Bulk-ingest structured business info as KB documents.
     Creates separate documents for rooms, facilities, FAQs, policies, and contact.
-    Embeddings are generated in parallel (batched to max 10 at a time).
+    Embeddings are generated with batched multi-input embedding requests.
     Sets OnboardingProgress.kb_populated = True.
     """
     await _verify_property_access(db, business_id, user)
@@ -600,15 +605,8 @@ async def ingest_kb_wizard(
     if not docs_to_create:
         return {"docs_created": 0, "message": "No content provided to ingest."}
 
-    # Generate embeddings in parallel, batched to max 10 at a time
-    BATCH_SIZE = 10
-    embeddings: list[list[float]] = []
-    for i in range(0, len(docs_to_create), BATCH_SIZE):
-        batch = docs_to_create[i : i + BATCH_SIZE]
-        batch_embeddings = await asyncio.gather(
-            *[generate_embedding(content) for _, _, content in batch]
-        )
-        embeddings.extend(batch_embeddings)
+    # Generate embeddings with multi-input batch requests
+    embeddings = await generate_embeddings_batch([content for _, _, content in docs_to_create])
 
     # Persist all documents
     for (doc_type, title, content), embedding in zip(docs_to_create, embeddings):
@@ -632,6 +630,7 @@ async def ingest_kb_wizard(
         progress.kb_populated = True
 
     await db.commit()
+    await invalidate_kb_index(business_id)
 
     logger.info(
         "KB wizard ingest complete",
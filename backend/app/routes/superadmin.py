@@ -28,6 +28,11 @@ from app.schemas import (
     ApplicationCreateRequest, PlatformMetricsResponse,
 )
 
+from app.services.business_routing import business_routing, invalidate_business_routes
+from app.services.prompt_context import invalidate_prompt_context, prompt_contexts
+from app.services.llm_prompt_cache import gemini_prefix_cache, prompt_cache_stats
+from app.services.semantic_cache import semantic_cache
+
 logger = structlog.get_logger()
 router = APIRouter()
 
@@ -300,6 +305,15 @@ async def get_service_health(
 
     results = await asyncio.gather(*[_check_service(name, fn) for name, fn in checks])
 
+    # Shared (cross-instance) circuit breaker state and LLM latency percentiles
+    from app.services.circuit_breaker import get_all_breaker_statuses
+    from app.services.llm_latency import get_all_latency_statuses
+    from app.services.embedding_cache import embedding_cache
+    from app.services.kb_index import kb_index
+    from app.database import get_pool_status
+    from app.services.inbound_queue import inbound_queue, post_reply_queue
+    breakers = await get_all_breaker_statuses()
+
     overall = "ok"
     for r in results:
         if r["status"] == "error":
@@ -307,11 +321,27 @@ async def get_service_health(
             break
         if r["status"] == "timeout":
             overall = "degraded"
+    if any(b["state"] != "closed" for b in breakers):
+        overall = "degraded"
 
     payload = {
         "overall": overall,
         "checked_at": datetime.now(timezone.utc).isoformat(),
         "services": results,
+        "circuit_breakers": breakers,
+        "llm_latency": get_all_latency_statuses(),
+        "embedding_cache": embedding_cache.get_stats(),
+        "kb_index": kb_index.get_stats(),
+        "db_pool": get_pool_status(),
+        "inbound_queue": inbound_queue.get_stats(),
+        "post_reply_queue": post_reply_queue.get_stats(),
+        "business_routing": business_routing.get_stats(),
+        "prompt_context": prompt_contexts.get_stats(),
+        "semantic_cache": semantic_cache.get_stats(),
+        "prompt_cache": {
+            "gemini_handles": gemini_prefix_cache.get_stats(),
+            "providers": prompt_cache_stats.get_stats(),
+        },
     }
 
     _health_cache["value"] = payload
@@ -319,6 +349,20 @@ async def get_service_health(
     return payload
 
 
+@router.get("/superadmin/inbound-queue/dead-letters")
+async def list_inbound_dead_letters(
+    limit: int = 50,
+    queue: str = "inbound",
+    admin=Depends(require_superadmin),
+):
+    """Most recent jobs that exhausted their retries, from the inbound (default) or post_reply queue."""
+    from app.services.inbound_queue import inbound_queue, post_reply_queue
+    queues = {q.name: q for q in (inbound_queue, post_reply_queue)}
+    if queue not in queues:
+        raise HTTPException(status_code=400, detail=f"Unknown queue '{queue}'")
+    return {"dead_letters": await queues[queue].get_dead_letters(min(limit, 500))}
+
+
 # ─────────────────────────────────────────────────────────────
 # Tenant Management
 # ─────────────────────────────────────────────────────────────
@@ -512,6 +556,7 @@ async def retry_channel_setup(
         channels=[channel],
         whatsapp_provider=prop.whatsapp_provider if prop else "meta",
     )
+    await invalidate_business_routes()
 
     if errors:
         return {"status": "failed", "errors": errors}
@@ -1050,6 +1095,8 @@ async def update_shadow_pilot(
             prop.shadow_pilot_start_date = None
 
     await db.commit()
+    await invalidate_business_routes()
+    await invalidate_prompt_context(prop.id)
     await db.refresh(prop)
 
     return {
@@ -1128,6 +1175,8 @@ async def provision_shadow_pilot(
         )
 
     await db.commit()
+    await invalidate_business_routes()
+    await invalidate_prompt_context(prop.id)
 
     # Trigger Baileys bridge to start session
     bridge_url = getattr(_settings, 'baileys_bridge_url', None)
@@ -1207,6 +1256,7 @@ async def stop_shadow_pilot(
     prop.shadow_pilot_mode = False
     prop.shadow_pilot_session_active = False
     await db.commit()
+    await invalidate_business_routes()
     return {"status": "stopped", "business_id": business_id}
 
 
@@ -28,7 +28,6 @@ class ConversationResponse(BaseModel):
     mode: str
     is_after_hours: bool
     response_time_ms: int
-    lead_created: bool
 
 
 class WebChatStartRequest(BaseModel):
@@ -157,6 +156,7 @@ class BusinessSettingsUpdateRequest(BaseModel):
     booking_link: str | None = None
     brand_vocabulary: str | None = None
     required_questions: list[str] | None = None
+    semantic_answer_cache: bool | None = None  # Reuse answers to repeat FAQ questions
 
 
 # ─── Knowledge Base ───
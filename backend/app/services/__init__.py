@@ -3,9 +3,13 @@ Knowledge Base service — handles document ingestion and RAG retrieval via pgve
 """
 
 import asyncio
+import hashlib
+import inspect
 import uuid
+from typing import Awaitable, Callable
+
 import structlog
-from sqlalchemy import select, text
+from sqlalchemy import select, delete, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from openai import AsyncOpenAI
 from google import genai
@@ -13,6 +17,10 @@ from google.genai import types as genai_types
 
 from app.models import KBDocument
 from app.config import get_settings
+from app.database import run_after_commit
+from app.services.circuit_breaker import gemini_embedding_breaker, openai_embedding_breaker
+from app.services.embedding_cache import embedding_cache
+from app.services.kb_index import kb_index, invalidate_kb_index
 
 settings = get_settings()
 logger = structlog.get_logger()
@@ -20,8 +28,11 @@ logger = structlog.get_logger()
 openai_client = AsyncOpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
 gemini_client = genai.Client(api_key=settings.gemini_api_key) if settings.gemini_api_key else None
 
-async def generate_embedding(text_content: str) -> list[float]:
-    """Generate an embedding vector for a text chunk using Gemini or OpenAI."""
+async def _embed_with_model(text_content: str) -> tuple[list[float], str | None]:
+    """
+    Embed a text chunk using Gemini or OpenAI.
+    Returns (vector, model); model is None for the zero-vector demo fallback.
+    """
     if settings.gemini_api_key and gemini_client:
         # Gemini embedding client is synchronous — run in a thread to avoid blocking the event loop
         def _sync_embed():
@@ -33,23 +44,155 @@ async def generate_embedding(text_content: str) -> list[float]:
                 ),
             )
         try:
-            response = await asyncio.to_thread(_sync_embed)
-            return list(response.embeddings[0].values)
+            response = await gemini_embedding_breaker.call(asyncio.to_thread, _sync_embed)
+            return list(response.embeddings[0].values), settings.gemini_embedding_model
         except Exception as e:
             logger.warning("Gemini embedding failed, trying OpenAI fallback", error=str(e))
 
     if settings.openai_api_key and openai_client:
         try:
-            response = await openai_client.embeddings.create(
+            response = await openai_embedding_breaker.call(
+                openai_client.embeddings.create,
                 model=settings.openai_embedding_model,
                 input=text_content,
             )
-            return response.data[0].embedding
+            return response.data[0].embedding, settings.openai_embedding_model
         except Exception as e:
             logger.warning("OpenAI embedding failed", error=str(e))
 
     # Return a zero vector for mock/demo mode to avoid timeouts
-    return [0.0] * settings.embedding_dimensions
+    return [0.0] * settings.embedding_dimensions, None
+
+
+async def _embed_batch_with_model(texts: list[str]) -> tuple[list[list[float]], str | None]:
+    """
+    Embed several chunks in one provider request (Gemini batch embed / OpenAI multi-input).
+    Returns (vectors in input order, model); model is None for the zero-vector fallback.
+    """
+    if settings.gemini_api_key and gemini_client:
+        def _sync_embed_batch():
+            return gemini_client.models.embed_content(
+                model=settings.gemini_embedding_model,
+                contents=texts,
+                config=genai_types.EmbedContentConfig(
+                    output_dimensionality=settings.embedding_dimensions
+                ),
+            )
+        try:
+            response = await gemini_embedding_breaker.call(asyncio.to_thread, _sync_embed_batch)
+            return [list(e.values) for e in response.embeddings], settings.gemini_embedding_model
+        except Exception as e:
+            logger.warning("Gemini batch embedding failed, trying OpenAI fallback", error=str(e), batch_size=len(texts))
+
+    if settings.openai_api_key and openai_client:
+        try:
+            response = await openai_embedding_breaker.call(
+                openai_client.embeddings.create,
+                model=settings.openai_embedding_model,
+                input=texts,
+            )
+            ordered = sorted(response.data, key=lambda d: d.index)
+            return [d.embedding for d in ordered], settings.openai_embedding_model
+        except Exception as e:
+            logger.warning("OpenAI batch embedding failed", error=str(e), batch_size=len(texts))
+
+    return [[0.0] * settings.embedding_dimensions for _ in texts], None
+
+
+ProgressCallback = Callable[[int, int], Awaitable[None] | None]
+
+
+async def _embed_texts_batched(
+    texts: list[str],
+    progress: ProgressCallback | None = None,
+) -> tuple[list[list[float]], list[str | None]]:
+    """Batched, bounded-concurrency embedding. Returns (vectors, model used per text)."""
+    total = len(texts)
+    if not total:
+        return [], []
+
+    batch_size = max(1, settings.embedding_batch_size)
+    semaphore = asyncio.Semaphore(max(1, settings.embedding_batch_concurrency))
+    vectors: list[list[float] | None] = [None] * total
+    models: list[str | None] = [None] * total
+    done = 0
+
+    async def _run(start: int):
+        nonlocal done
+        batch = texts[start : start + batch_size]
+        async with semaphore:
+            batch_vectors, model = await _embed_batch_with_model(batch)
+        vectors[start : start + len(batch)] = batch_vectors
+        models[start : start + len(batch)] = [model] * len(batch)
+        done += len(batch)
+        if progress:
+            outcome = progress(done, total)
+            if inspect.isawaitable(outcome):
+                await outcome
+
+    await asyncio.gather(*[_run(start) for start in range(0, total, batch_size)])
+    return vectors, models
+
+
+async def generate_embeddings_batch(
+    texts: list[str],
+    progress: ProgressCallback | None = None,
+) -> list[list[float]]:
+    """
+    Embed many chunks using the providers' multi-input endpoints.
+
+    Texts are split into EMBEDDING_BATCH_SIZE requests, at most
+    EMBEDDING_BATCH_CONCURRENCY of which run at once. `progress(done, total)`
+    (sync or async) is called after each batch completes.
+    """
+    vectors, _ = await _embed_texts_batched(texts, progress=progress)
+    return vectors
+
+
+async def generate_embedding(text_content: str) -> list[float]:
+    """Generate an embedding vector for a text chunk using Gemini or OpenAI."""
+    vector, _ = await _embed_with_model(text_content)
+    return vector
+
+
+def _primary_embedding_model() -> str | None:
+    if settings.gemini_api_key and gemini_client:
+        return settings.gemini_embedding_model
+    if settings.openai_api_key and openai_client:
+        return settings.openai_embedding_model
+    return None
+
+
+async def generate_query_embedding(query: str) -> list[float]:
+    """
+    Embedding for a guest query, served from the query embedding cache when possible.
+
+    Only vectors produced by the primary (configured) model are cached, so a
+    temporary fallback to another provider never poisons the cache with
+    vectors from a different embedding space.
+    """
+    model = _primary_embedding_model()
+    if model:
+        cached = await embedding_cache.get(query, model, settings.embedding_dimensions)
+        if cached is not None:
+            return cached
+
+    vector, used_model = await _embed_with_model(query)
+    if model and used_model == model:
+        await embedding_cache.set(query, model, settings.embedding_dimensions, vector)
+    return vector
+
+
+def kb_content_hash(doc_type: str, title: str, content: str, model: str | None) -> str | None:
+    """
+    Fingerprint of a KB chunk and the embedding model that produced its vector.
+    None when there is no real embedding (zero-vector fallback), so the chunk
+    is re-embedded on the next ingest.
+    """
+    if not model:
+        return None
+    payload = "\x1f".join([model, str(settings.embedding_dimensions), doc_type, title, content])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
 async def ingest_document(
@@ -69,7 +212,7 @@ async def ingest_document(
         title: Short descriptive title
         content: The full text content of the document chunk
     """
-    embedding = await generate_embedding(f"{title}\n{content}")
+    embedding, model = await _embed_with_model(f"{title}\n{content}")
 
     doc = KBDocument(
         business_id=business_id,
@@ -77,6 +220,7 @@ async def ingest_document(
         title=title,
         content=content,
         embedding=embedding,
+        content_hash=kb_content_hash(doc_type, title, content, model),
     )
     db.add(doc)
     await db.flush()
@@ -87,34 +231,84 @@ async def ingest_knowledge_base(
     db: AsyncSession,
     business_id: uuid.UUID,
     documents: list[dict],
+    progress: ProgressCallback | None = None,
 ) -> int:
     """
-    Bulk ingest a business's knowledge base.
+    Sync a business's knowledge base to `documents`.
+
+    The ingest is a diff against what is stored: chunks whose content hash
+    already exists are kept as-is, added or changed chunks are embedded in
+    concurrent multi-input batches and bulk-inserted, and chunks no longer
+    present are deleted. Everything happens in the caller's transaction, so
+    readers never see an empty KB mid-ingest; the KB index is invalidated once
+    that transaction commits, so no instance can re-warm it from the old rows.
 
     Args:
         documents: List of dicts with keys: doc_type, title, content
+        progress: Optional callback(done, total) invoked as embedding batches complete
 
     Returns:
-        Number of documents ingested
+        Number of documents in the knowledge base after ingest
     """
-    # Clear existing KB for this business (full refresh)
-    await db.execute(
-        text("DELETE FROM kb_documents WHERE business_id = :pid"),
-        {"pid": business_id},
+    model = _primary_embedding_model()
+
+    result = await db.execute(
+        select(KBDocument.id, KBDocument.content_hash).where(KBDocument.business_id == business_id)
     )
+    # hash -> stored row ids (duplicate chunks are matched one-for-one)
+    existing: dict[str, list[uuid.UUID]] = {}
+    stale_ids: list[uuid.UUID] = []
+    for row in result.all():
+        if row.content_hash:
+            existing.setdefault(row.content_hash, []).append(row.id)
+        else:
+            stale_ids.append(row.id)
 
-    count = 0
+    to_embed: list[dict] = []
     for doc in documents:
-        await ingest_document(
-            db=db,
-            business_id=business_id,
-            doc_type=doc["doc_type"],
-            title=doc["title"],
-            content=doc["content"],
+        doc_hash = kb_content_hash(doc["doc_type"], doc["title"], doc["content"], model)
+        matches = existing.get(doc_hash) if doc_hash else None
+        if matches:
+            matches.pop()
+        else:
+            to_embed.append(doc)
+
+    removed_ids = stale_ids + [doc_id for ids in existing.values() for doc_id in ids]
+    if removed_ids:
+        await db.execute(delete(KBDocument).where(KBDocument.id.in_(removed_ids)))
+
+    embeddings, models = await _embed_texts_batched(
+        [f"{doc['title']}\n{doc['content']}" for doc in to_embed],
+        progress=progress,
+    )
+
+    if to_embed:
+        await db.execute(
+            insert(KBDocument),
+            [
+                {
+                    "business_id": business_id,
+                    "doc_type": doc["doc_type"],
+                    "title": doc["title"],
+                    "content": doc["content"],
+                    "embedding": embedding,
+                    "content_hash": kb_content_hash(doc["doc_type"], doc["title"], doc["content"], used_model),
+                }
+                for doc, embedding, used_model in zip(to_embed, embeddings, models)
+            ],
         )
-        count += 1
 
-    return count
+    logger.info(
+        "KB ingest diff applied",
+        business_id=str(business_id),
+        unchanged=len(documents) - len(to_embed),
+        embedded=len(to_embed),
+        removed=len(removed_ids),
+    )
+
+    if to_embed or removed_ids:
+        run_after_commit(db, lambda: invalidate_kb_index(business_id))
+    return len(documents)
 
 
 async def search_knowledge_base(
@@ -124,13 +318,19 @@ async def search_knowledge_base(
     limit: int = 5,
 ) -> list[KBDocument]:
     """
-    Semantic search over a business's knowledge base using pgvector.
+    Semantic search over a business's knowledge base.
 
-    Uses cosine distance for similarity ranking.
+    Served from the in-memory per-business index when it is warm (see
+    app.services.kb_index), otherwise via pgvector cosine distance.
     Returns the top `limit` most relevant documents.
     """
     try:
-        query_embedding = await generate_embedding(query)
+        query_embedding = await generate_query_embedding(query)
+
+        if settings.kb_index_enabled:
+            indexed = await kb_index.search(business_id, query_embedding, limit)
+            if indexed is not None:
+                return indexed
 
         # pgvector cosine distance operator: <=>
         result = await db.execute(
@@ -2,13 +2,15 @@
 Analytics aggregation service.
 Computes daily analytics from raw conversation + lead data.
 Populates the analytics_daily table for dashboard and email reports.
+Days are bucketed in each business's own timezone (Business.timezone).
 """
 
 import uuid
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 
-from sqlalchemy import select, func, case, and_, text
+from sqlalchemy import select, func, case, and_, text, cast, exists, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import (
@@ -19,229 +21,315 @@ from app.models import (
     AnalyticsDaily,
 )
 
+CHANNELS = ("whatsapp", "email", "web", "facebook", "instagram", "tiktok")
+
+# Applied to after-hours lead value to estimate recovered revenue
+DEFAULT_CONVERSION_RATE = Decimal("0.20")
+# Staff time saved per AI-handled inquiry (hours), priced at Business.hourly_rate
+HOURS_SAVED_PER_AI_INQUIRY = Decimal("0.25")
+DEFAULT_HOURLY_RATE = Decimal("25.00")
+
+# Rows per INSERT ... ON CONFLICT statement (14 bind params per row)
+UPSERT_BATCH_SIZE = 1000
+
+# Longest range a single backfill call will recompute
+MAX_BACKFILL_DAYS = 400
 
-async def compute_daily_analytics(
-    db: AsyncSession,
-    business_id: uuid.UUID,
-    report_date: date,
-) -> AnalyticsDaily:
-    """
-    Compute analytics for a single business for a single day.
-    Uses raw conversation and lead data to build aggregates.
 
-    This is called by the daily cron job and can also be called
-    retroactively to backfill analytics.
+def _local_day(column):
+    """Calendar day of a timestamptz column in the business's timezone (Business must be joined)."""
+    return cast(func.timezone(func.coalesce(Business.timezone, "UTC"), column), Date)
+
+
+def _utc_window(start_date: date, end_date: date) -> tuple[datetime, datetime]:
+    """
+    Index-friendly UTC bounds that cover [start_date, end_date] in every
+    timezone (UTC-12 .. UTC+14); the exact local-day filter is applied on top.
     """
-    # Date range for the report day
-    day_start = datetime.combine(report_date, datetime.min.time()).replace(
+    window_start = datetime.combine(start_date - timedelta(days=1), datetime.min.time()).replace(
         tzinfo=timezone.utc
     )
-    day_end = datetime.combine(report_date + timedelta(days=1), datetime.min.time()).replace(
+    window_end = datetime.combine(end_date + timedelta(days=2), datetime.min.time()).replace(
         tzinfo=timezone.utc
     )
+    return window_start, window_end
 
-    # 1. Total inquiries (conversations started on this day)
-    total_result = await db.execute(
-        select(func.count(Conversation.id)).where(
-            Conversation.business_id == business_id,
-            Conversation.started_at >= day_start,
-            Conversation.started_at < day_end,
-        )
-    )
-    total_inquiries = total_result.scalar() or 0
 
-    # 2. After-hours inquiries
-    after_hours_result = await db.execute(
-        select(func.count(Conversation.id)).where(
-            Conversation.business_id == business_id,
-            Conversation.started_at >= day_start,
-            Conversation.started_at < day_end,
-            Conversation.is_after_hours == True,
-        )
-    )
-    after_hours_inquiries = after_hours_result.scalar() or 0
+async def _aggregate_conversations(
+    db: AsyncSession,
+    business_ids: list[uuid.UUID] | None,
+    start_date: date,
+    end_date: date,
+) -> dict[tuple[uuid.UUID, date], dict]:
+    """
+    One grouped statement: conversation counts (FILTER clauses) joined with the
+    average AI response time, per (business_id, local day).
+    """
+    window_start, window_end = _utc_window(start_date, end_date)
+    conv_day = _local_day(Conversation.started_at)
+    conv_filters = [
+        Conversation.started_at >= window_start,
+        Conversation.started_at < window_end,
+        conv_day.between(start_date, end_date),
+    ]
+    if business_ids is not None:
+        conv_filters.append(Conversation.business_id.in_(business_ids))
 
-    # 3. After-hours responded (conversations that have at least one AI message)
-    after_hours_responded_result = await db.execute(
-        select(func.count(Conversation.id.distinct())).where(
-            Conversation.business_id == business_id,
-            Conversation.started_at >= day_start,
-            Conversation.started_at < day_end,
-            Conversation.is_after_hours == True,
-            Conversation.id.in_(
-                select(Message.conversation_id).where(Message.role == "ai")
-            ),
-        )
+    has_ai_reply = exists().where(
+        Message.conversation_id == Conversation.id,
+        Message.role == "ai",
     )
-    after_hours_responded = after_hours_responded_result.scalar() or 0
-
-    # 4. Leads captured
-    leads_result = await db.execute(
-        select(func.count(Lead.id)).where(
-            Lead.business_id == business_id,
-            Lead.captured_at >= day_start,
-            Lead.captured_at < day_end,
+    counts = (
+        select(
+            Conversation.business_id,
+            conv_day.label("day"),
+            func.count().label("total_inquiries"),
+            func.count().filter(Conversation.is_after_hours.is_(True)).label("after_hours_inquiries"),
+            func.count()
+            .filter(and_(Conversation.is_after_hours.is_(True), has_ai_reply))
+            .label("after_hours_responded"),
+            func.count().filter(Conversation.status == "handed_off").label("handoffs"),
+            *[
+                func.count().filter(Conversation.channel == channel).label(f"channel_{channel}")
+                for channel in CHANNELS
+            ],
         )
+        .join(Business, Business.id == Conversation.business_id)
+        .where(*conv_filters)
+        .group_by(Conversation.business_id, conv_day)
+        .subquery("counts")
     )
-    leads_captured = leads_result.scalar() or 0
 
-    # 5. Handoffs
-    handoffs_result = await db.execute(
-        select(func.count(Conversation.id)).where(
-            Conversation.business_id == business_id,
-            Conversation.started_at >= day_start,
-            Conversation.started_at < day_end,
-            Conversation.status == "handed_off",
+    # response_time_ms is stored in AI message metadata
+    response_time_ms = Message.metadata_["response_time_ms"].as_float()
+    response = (
+        select(
+            Conversation.business_id,
+            conv_day.label("day"),
+            func.avg(response_time_ms).label("avg_response_time_ms"),
         )
+        .join(Business, Business.id == Conversation.business_id)
+        .join(Message, Message.conversation_id == Conversation.id)
+        .where(*conv_filters, Message.role == "ai", response_time_ms.isnot(None))
+        .group_by(Conversation.business_id, conv_day)
+        .subquery("response")
     )
-    handoffs = handoffs_result.scalar() or 0
 
-    # 6. Average response time (from AI messages metadata)
-    # We stored response_time_ms in message metadata
-    response_times_result = await db.execute(
-        select(Message.metadata_["response_time_ms"]).where(
-            Message.conversation_id.in_(
-                select(Conversation.id).where(
-                    Conversation.business_id == business_id,
-                    Conversation.started_at >= day_start,
-                    Conversation.started_at < day_end,
-                )
+    result = await db.execute(
+        select(counts, response.c.avg_response_time_ms).outerjoin(
+            response,
+            and_(
+                response.c.business_id == counts.c.business_id,
+                response.c.day == counts.c.day,
             ),
-            Message.role == "ai",
-            Message.metadata_["response_time_ms"].isnot(None),
         )
     )
-    response_times = [
-        float(r[0]) / 1000.0  # Convert ms to seconds
-        for r in response_times_result.fetchall()
-        if r[0] is not None
+    return {(row.business_id, row.day): row._asdict() for row in result}
+
+
+async def _aggregate_leads(
+    db: AsyncSession,
+    business_ids: list[uuid.UUID] | None,
+    start_date: date,
+    end_date: date,
+) -> dict[tuple[uuid.UUID, date], dict]:
+    """One grouped statement: leads captured and revenue, per (business_id, local day)."""
+    window_start, window_end = _utc_window(start_date, end_date)
+    lead_day = _local_day(Lead.captured_at)
+    filters = [
+        Lead.captured_at >= window_start,
+        Lead.captured_at < window_end,
+        lead_day.between(start_date, end_date),
     ]
-    avg_response_time = (
-        Decimal(str(sum(response_times) / len(response_times)))
-        if response_times
-        else Decimal("0")
-    )
+    if business_ids is not None:
+        filters.append(Lead.business_id.in_(business_ids))
 
-    # 7. Channel breakdown
-    channel_result = await db.execute(
+    result = await db.execute(
         select(
-            Conversation.channel,
-            func.count(Conversation.id),
+            Lead.business_id,
+            lead_day.label("day"),
+            func.count(Lead.id).label("leads_captured"),
+            func.sum(Lead.estimated_value)
+            .filter(Conversation.is_after_hours.is_(True))
+            .label("after_hours_lead_value"),
+            func.sum(Lead.actual_revenue)
+            .filter(Lead.status == "converted")
+            .label("actual_revenue_recovered"),
         )
-        .where(
-            Conversation.business_id == business_id,
-            Conversation.started_at >= day_start,
-            Conversation.started_at < day_end,
-        )
-        .group_by(Conversation.channel)
+        .join(Business, Business.id == Lead.business_id)
+        .outerjoin(Conversation, Conversation.id == Lead.conversation_id)
+        .where(*filters)
+        .group_by(Lead.business_id, lead_day)
     )
-    raw_breakdown = {row[0]: row[1] for row in channel_result.fetchall()}
-    channel_breakdown = {
-        "whatsapp": raw_breakdown.get("whatsapp", 0),
-        "email": raw_breakdown.get("email", 0),
-        "web": raw_breakdown.get("web", 0),
-        "facebook": raw_breakdown.get("facebook", 0),
-        "instagram": raw_breakdown.get("instagram", 0),
-        "tiktok": raw_breakdown.get("tiktok", 0),
+    return {(row.business_id, row.day): row._asdict() for row in result}
+
+
+def _build_daily_row(
+    business_id: uuid.UUID,
+    report_date: date,
+    hourly_rate: Decimal | None,
+    conv: dict | None,
+    leads: dict | None,
+) -> dict:
+    """Derive every AnalyticsDaily column from the grouped aggregates."""
+    conv = conv or {}
+    leads = leads or {}
+
+    total_inquiries = conv.get("total_inquiries", 0)
+    handoffs = conv.get("handoffs", 0)
+    inquiries_handled_manually = handoffs
+    inquiries_handled_by_ai = total_inquiries - inquiries_handled_manually
+
+    avg_ms = conv.get("avg_response_time_ms")
+    avg_response_time = Decimal(str(avg_ms / 1000.0)) if avg_ms is not None else Decimal("0")
+
+    after_hours_value = leads.get("after_hours_lead_value") or Decimal("0")
+    rate = hourly_rate or DEFAULT_HOURLY_RATE
+
+    return {
+        "business_id": business_id,
+        "report_date": report_date,
+        "total_inquiries": total_inquiries,
+        "after_hours_inquiries": conv.get("after_hours_inquiries", 0),
+        "after_hours_responded": conv.get("after_hours_responded", 0),
+        "leads_captured": leads.get("leads_captured", 0),
+        "handoffs": handoffs,
+        "inquiries_handled_by_ai": inquiries_handled_by_ai,
+        "inquiries_handled_manually": inquiries_handled_manually,
+        "avg_response_time_sec": avg_response_time,
+        "estimated_revenue_recovered": after_hours_value * DEFAULT_CONVERSION_RATE,
+        "actual_revenue_recovered": leads.get("actual_revenue_recovered") or Decimal("0"),
+        "cost_savings": Decimal(str(inquiries_handled_by_ai)) * HOURS_SAVED_PER_AI_INQUIRY * rate,
+        "channel_breakdown": {
+            channel: conv.get(f"channel_{channel}", 0) for channel in CHANNELS
+        },
     }
 
-    # 8. Estimated revenue recovered
-    # Logic: Sum of (Lead.estimated_value OR Business.ADR) for all after-hours leads
-    prop_result = await db.execute(
-        select(Business.id).where(Business.id == business_id)
-    )
-    adr = Decimal("0")
 
-    # Fetch after-hours leads with their values
-    leads_revenue_result = await db.execute(
-        select(Lead.estimated_value).where(
-            Lead.business_id == business_id,
-            Lead.captured_at >= day_start,
-            Lead.captured_at < day_end,
-            Lead.conversation_id.in_(
-                select(Conversation.id).where(
-                    Conversation.is_after_hours == True
-                )
-            ),
-        )
+def _upsert_statement(columns):
+    stmt = pg_insert(AnalyticsDaily)
+    return stmt.on_conflict_do_update(
+        index_elements=[AnalyticsDaily.business_id, AnalyticsDaily.report_date],
+        set_={
+            col: stmt.excluded[col]
+            for col in columns
+            if col not in ("business_id", "report_date")
+        },
     )
-    
-    total_revenue = Decimal("0")
-    for row in leads_revenue_result.fetchall():
-        val = row[0]
-        if val is not None:
-            total_revenue += val
+
+
+async def upsert_analytics_daily(
+    db: AsyncSession,
+    rows: list[dict],
+    returning: bool = True,
+) -> list[AnalyticsDaily]:
+    """
+    Bulk INSERT ... ON CONFLICT (business_id, report_date) DO UPDATE.
+    With returning=False (large backfills) nothing is loaded back and [] is returned.
+    """
+    if not rows:
+        return []
+    stmt = _upsert_statement(rows[0])
+    records: list[AnalyticsDaily] = []
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i : i + UPSERT_BATCH_SIZE]
+        if returning:
+            result = await db.scalars(
+                stmt.returning(AnalyticsDaily),
+                batch,
+                execution_options={"populate_existing": True},
+            )
+            records.extend(result.all())
         else:
-            pass
+            await db.execute(stmt, batch)
+    return records
 
-    estimated_revenue = total_revenue * Decimal("0.20") # Apply default conversion rate 20%
 
-    # Actual revenue recovered (only from converted leads)
-    leads_actual_result = await db.execute(
-        select(func.sum(Lead.actual_revenue)).where(
-            Lead.business_id == business_id,
-            Lead.captured_at >= day_start,
-            Lead.captured_at < day_end,
-            Lead.status == "converted"
-        )
-    )
-    actual_revenue_recovered = leads_actual_result.scalar() or Decimal("0")
+async def _compute_range_rows(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    business_ids: list[uuid.UUID] | None,
+) -> list[dict]:
+    """
+    Every AnalyticsDaily row for the selected businesses (all when None) and
+    every local day in [start_date, end_date], from two grouped statements.
+    Days without activity get zeroed rows.
+    """
+    business_query = select(Business.id, Business.hourly_rate)
+    if business_ids is not None:
+        business_query = business_query.where(Business.id.in_(business_ids))
+    businesses = (await db.execute(business_query)).all()
+    if not businesses:
+        return []
 
-    # Calculate AI vs Manual handling
-    inquiries_handled_manually = handoffs
-    inquiries_handled_by_ai = total_inquiries - inquiries_handled_manually
+    conv_stats = await _aggregate_conversations(db, business_ids, start_date, end_date)
+    lead_stats = await _aggregate_leads(db, business_ids, start_date, end_date)
 
-    # Calculate cost savings -> (0.25 hours saved per AI inquiry) * business.hourly_rate
-    prop_result2 = await db.execute(
-        select(Business.hourly_rate).where(Business.id == business_id)
-    )
-    hourly_rate = prop_result2.scalar() or Decimal("25.00")
-    hours_saved = Decimal(str(inquiries_handled_by_ai)) * Decimal("0.25")
-    cost_savings = hours_saved * hourly_rate
-
-    # 9. Upsert analytics record
-    existing = await db.execute(
-        select(AnalyticsDaily).where(
-            AnalyticsDaily.business_id == business_id,
-            AnalyticsDaily.report_date == report_date,
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    return [
+        _build_daily_row(
+            business.id,
+            day,
+            business.hourly_rate,
+            conv_stats.get((business.id, day)),
+            lead_stats.get((business.id, day)),
         )
-    )
-    record = existing.scalar_one_or_none()
-
-    if record:
-        record.total_inquiries = total_inquiries
-        record.after_hours_inquiries = after_hours_inquiries
-        record.after_hours_responded = after_hours_responded
-        record.leads_captured = leads_captured
-        record.handoffs = handoffs
-        record.inquiries_handled_by_ai = inquiries_handled_by_ai
-        record.inquiries_handled_manually = inquiries_handled_manually
-        record.avg_response_time_sec = avg_response_time
-        record.estimated_revenue_recovered = estimated_revenue
-        record.actual_revenue_recovered = actual_revenue_recovered
-        record.cost_savings = cost_savings
-        record.channel_breakdown = channel_breakdown
-    else:
-        record = AnalyticsDaily(
-            business_id=business_id,
-            report_date=report_date,
-            total_inquiries=total_inquiries,
-            after_hours_inquiries=after_hours_inquiries,
-            after_hours_responded=after_hours_responded,
-            leads_captured=leads_captured,
-            handoffs=handoffs,
-            inquiries_handled_by_ai=inquiries_handled_by_ai,
-            inquiries_handled_manually=inquiries_handled_manually,
-            avg_response_time_sec=avg_response_time,
-            estimated_revenue_recovered=estimated_revenue,
-            actual_revenue_recovered=actual_revenue_recovered,
-            cost_savings=cost_savings,
-            channel_breakdown=channel_breakdown,
-        )
-        db.add(record)
+        for business in businesses
+        for day in days
+    ]
+
+
+async def compute_analytics_for_businesses(
+    db: AsyncSession,
+    report_date: date,
+    business_ids: list[uuid.UUID] | None = None,
+) -> list[AnalyticsDaily]:
+    """
+    Set-based daily analytics: every AnalyticsDaily field for every selected
+    business (all businesses when `business_ids` is None) in two grouped
+    statements, written with one bulk upsert.
+    """
+    rows = await _compute_range_rows(db, report_date, report_date, business_ids)
+    return await upsert_analytics_daily(db, rows)
 
-    await db.flush()
-    return record
+
+async def backfill_analytics(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    business_ids: list[uuid.UUID] | None = None,
+) -> int:
+    """
+    Recompute AnalyticsDaily for a whole date range in one pass over
+    conversations/messages/leads, grouped by day in each business's timezone.
+
+    Returns the number of rows upserted. Raises ValueError for an invalid range.
+    """
+    if end_date < start_date:
+        raise ValueError("end_date must be on or after start_date")
+    if (end_date - start_date).days + 1 > MAX_BACKFILL_DAYS:
+        raise ValueError(f"Backfill range is limited to {MAX_BACKFILL_DAYS} days")
+
+    rows = await _compute_range_rows(db, start_date, end_date, business_ids)
+    await upsert_analytics_daily(db, rows, returning=False)
+    return len(rows)
+
+
+async def compute_daily_analytics(
+    db: AsyncSession,
+    business_id: uuid.UUID,
+    report_date: date,
+) -> AnalyticsDaily | None:
+    """
+    Compute analytics for a single business for a single day.
+    Uses raw conversation and lead data to build aggregates.
+
+    This is called by the daily cron job; use backfill_analytics to
+    recompute ranges retroactively.
+    """
+    records = await compute_analytics_for_businesses(db, report_date, [business_id])
+    return records[0] if records else None
 
 
 async def compute_all_properties_daily(
@@ -255,15 +343,8 @@ async def compute_all_properties_daily(
     if report_date is None:
         report_date = date.today() - timedelta(days=1)  # Yesterday
 
-    result = await db.execute(select(Business.id))
-    property_ids = [row[0] for row in result.fetchall()]
+    return await compute_analytics_for_businesses(db, report_date)
 
-    records = []
-    for pid in property_ids:
-        record = await compute_daily_analytics(db, pid, report_date)
-        records.append(record)
-
-    return records
 
 async def get_realtime_stats(
     db: AsyncSession,
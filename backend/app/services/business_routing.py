@@ -0,0 +1,181 @@
+"""
+Business Routing Cache — resolve webhook and bridge traffic to a business without a DB hit.
+
+Every WhatsApp/Twilio webhook and every Baileys bridge call (shadow events,
+heartbeats, session status) starts by finding the business behind a phone
+number or slug. That data changes maybe once a month, so lookups are answered
+from an in-process map of compact, immutable BusinessRoute records.
+
+Keys: ("whatsapp", number) — Meta display number or phone_number_id, both
+matched against Business.whatsapp_number; ("twilio", number); ("slug", slug).
+
+Lifecycle:
+- A miss loads the business from the database and caches its route under all
+  of its keys. Unknown keys are cached as negative entries for a shorter TTL,
+  so a newly configured number is picked up quickly.
+- Any write to a business's routing fields calls invalidate_business_routes().
+  That clears the local map and bumps routing:version in Redis, so other
+  instances drop their copy on their next lookup.
+- Entries also expire after BUSINESS_ROUTING_TTL_SECONDS as a safety net.
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import structlog
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.core.redis import get_redis
+from app.models import Business
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+VERSION_KEY = "routing:version"
+
+_COLUMNS = {
+    "whatsapp": Business.whatsapp_number,
+    "twilio": Business.twilio_phone_number,
+    "slug": Business.slug,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class BusinessRoute:
+    """What a webhook needs to route a message to a business."""
+    id: uuid.UUID
+    slug: str | None
+    whatsapp_number: str | None
+    whatsapp_provider: str
+    twilio_phone_number: str | None
+
+    @classmethod
+    def from_row(cls, row) -> "BusinessRoute":
+        return cls(
+            id=row.id,
+            slug=row.slug,
+            whatsapp_number=row.whatsapp_number,
+            whatsapp_provider=row.whatsapp_provider or "meta",
+            twilio_phone_number=row.twilio_phone_number,
+        )
+
+    def keys(self) -> list[tuple[str, str]]:
+        return [
+            (kind, value)
+            for kind, value in (
+                ("whatsapp", self.whatsapp_number),
+                ("twilio", self.twilio_phone_number),
+                ("slug", self.slug),
+            )
+            if value
+        ]
+
+
+class BusinessRoutingCache:
+    """LRU of routing records keyed by (kind, value), with Redis-versioned invalidation."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, negative_ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # (kind, value) → (route or None for "no such business", expires_at)
+        self._entries: OrderedDict[tuple[str, str], tuple[BusinessRoute | None, float]] = OrderedDict()
+        self._version: int | None = None
+        self.hits = 0
+        self.misses = 0
+
+    async def _sync_version(self):
+        """Drop everything if another instance invalidated since we last looked."""
+        try:
+            redis = await get_redis()
+            version = int(await redis.get(VERSION_KEY) or 0)
+        except Exception as e:
+            logger.warning("Routing cache version check failed", error=str(e))
+            return
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    async def resolve_many(
+        self, db: AsyncSession, kind: str, values: set[str]
+    ) -> dict[str, BusinessRoute]:
+        """Routes for `values` of one key kind; values without a business are left out."""
+        await self._sync_version()
+        now = time.monotonic()
+        found: dict[str, BusinessRoute] = {}
+        missing = set()
+        for value in values:
+            entry = self._entries.get((kind, value))
+            if entry is None or entry[1] < now:
+                missing.add(value)
+                continue
+            self._entries.move_to_end((kind, value))
+            self.hits += 1
+            if entry[0] is not None:
+                found[value] = entry[0]
+
+        if missing:
+            self.misses += len(missing)
+            column = _COLUMNS[kind]
+            result = await db.execute(
+                select(
+                    Business.id,
+                    Business.slug,
+                    Business.whatsapp_number,
+                    Business.whatsapp_provider,
+                    Business.twilio_phone_number,
+                ).where(column.in_(missing))
+            )
+            for row in result.all():
+                route = BusinessRoute.from_row(row)
+                self._store(route)
+                found[getattr(row, column.key)] = route
+            for value in missing - found.keys():
+                self._put((kind, value), None, self.negative_ttl_seconds)
+        return found
+
+    async def resolve(self, db: AsyncSession, kind: str, value: str | None) -> BusinessRoute | None:
+        if not value:
+            return None
+        return (await self.resolve_many(db, kind, {value})).get(value)
+
+    def _store(self, route: BusinessRoute):
+        for key in route.keys():
+            self._put(key, route, self.ttl_seconds)
+
+    def _put(self, key: tuple[str, str], route: BusinessRoute | None, ttl: int):
+        self._entries[key] = (route, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self):
+        self._entries.clear()
+        redis = await get_redis()
+        self._version = await redis.incr(VERSION_KEY)
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+business_routing = BusinessRoutingCache(
+    max_entries=settings.business_routing_max_entries,
+    ttl_seconds=settings.business_routing_ttl_seconds,
+    negative_ttl_seconds=settings.business_routing_negative_ttl_seconds,
+)
+
+
+async def invalidate_business_routes():
+    """Call after any write that can change a business's number, provider or slug."""
+    try:
+        await business_routing.invalidate()
+    except Exception as e:
+        logger.warning("Business routing invalidation failed", error=str(e))
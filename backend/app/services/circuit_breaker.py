@@ -1,21 +1,32 @@
 """
 Circuit Breaker — Protects against cascading failures from external APIs.
 
-When an external service (OpenAI, SendGrid, WhatsApp) fails repeatedly,
+When an external service (Gemini, OpenAI, SendGrid, WhatsApp) fails repeatedly,
 the circuit opens and requests fail fast instead of timing out.
 
 States:
 - CLOSED: Normal operation, requests pass through
 - OPEN: Service is down, requests fail immediately
 - HALF_OPEN: Testing if service recovered
+
+Breaker state lives in Redis (via app.core.redis) so every Cloud Run instance
+trips and recovers together. Without Redis the in-memory fallback store keeps
+the same semantics per instance.
+
+Redis keys per service:
+- circuit:{service}:failures   — failure counter, expires after failure_window
+- circuit:{service}:opened_at  — epoch seconds the circuit opened (absent = CLOSED)
+- circuit:{service}:probe      — NX lock so only one half-open test request runs
 """
 
 import time
 from enum import Enum
-from collections import defaultdict
 
+import httpx
 import structlog
 
+from app.core.redis import get_redis
+
 logger = structlog.get_logger()
 
 
@@ -25,22 +36,51 @@ class CircuitState(Enum):
     HALF_OPEN = "half_open"
 
 
+class CircuitOpenError(Exception):
+    """Raised by CircuitBreaker.call when the circuit is open."""
+
+    def __init__(self, service_name: str):
+        super().__init__(f"Circuit open for {service_name}")
+        self.service_name = service_name
+
+
+class RequestRejected(httpx.HTTPStatusError):
+    """A 4xx response: the request was at fault, not the service, so it never trips a breaker."""
+
+
+def raise_for_server_status(response: httpx.Response):
+    """Like response.raise_for_status(), but a 4xx raises RequestRejected for `call(excluded=...)`."""
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        if response.is_client_error:
+            raise RequestRejected(str(e), request=e.request, response=response) from e
+        raise
+
+
 class CircuitBreaker:
     """
-    Per-service circuit breaker.
+    Per-service circuit breaker with state shared across instances.
 
     Usage:
-        breaker = CircuitBreaker("openai", failure_threshold=3, recovery_timeout=60)
+        breaker = get_breaker("openai")
+
+        try:
+            result = await breaker.call(call_openai, ...)
+        except CircuitOpenError:
+            return fallback_response()
+
+    Or, when the call site needs finer control:
 
-        if not breaker.can_execute():
+        if not await breaker.can_execute():
             return fallback_response()
 
         try:
             result = await call_openai(...)
-            breaker.record_success()
+            await breaker.record_success()
             return result
         except Exception:
-            breaker.record_failure()
+            await breaker.record_failure()
             return fallback_response()
     """
 
@@ -49,60 +89,115 @@ class CircuitBreaker:
         service_name: str,
         failure_threshold: int = 5,
         recovery_timeout: int = 60,
+        failure_window: int = 60,
     ):
         self.service_name = service_name
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
+        self.failure_window = failure_window
 
+        # Last observed shared state (for monitoring without a Redis round trip)
         self.state = CircuitState.CLOSED
         self.failure_count = 0
         self.last_failure_time = 0.0
         self.success_count = 0
 
-    def can_execute(self) -> bool:
+    def _key(self, suffix: str) -> str:
+        return f"circuit:{self.service_name}:{suffix}"
+
+    async def _load_state(self) -> CircuitState:
+        """Derive the shared state from Redis and mirror it locally."""
+        redis = await get_redis()
+        opened_at = await redis.get(self._key("opened_at"))
+        failures = await redis.get(self._key("failures"))
+        self.failure_count = int(failures or 0)
+
+        if opened_at is None:
+            self.state = CircuitState.CLOSED
+        elif time.time() - float(opened_at) >= self.recovery_timeout:
+            self.state = CircuitState.HALF_OPEN
+        else:
+            self.state = CircuitState.OPEN
+        return self.state
+
+    async def _open(self, redis):
+        now = time.time()
+        # Keep the marker well past recovery so HALF_OPEN is observable;
+        # if nobody probes for that long, the circuit quietly closes.
+        await redis.set(self._key("opened_at"), str(now), expire=self.recovery_timeout * 10)
+        await redis.delete(self._key("probe"))
+        self.state = CircuitState.OPEN
+
+    async def can_execute(self) -> bool:
         """Check if the circuit allows a request."""
-        if self.state == CircuitState.CLOSED:
+        state = await self._load_state()
+        if state == CircuitState.CLOSED:
             return True
 
-        if self.state == CircuitState.OPEN:
-            # Check if recovery timeout has elapsed
-            if time.time() - self.last_failure_time >= self.recovery_timeout:
-                self.state = CircuitState.HALF_OPEN
-                logger.info(
-                    "CIRCUIT_HALF_OPEN",
-                    service=self.service_name,
-                )
-                return True
+        if state == CircuitState.OPEN:
             return False
 
-        # HALF_OPEN: allow one test request
-        return True
+        # HALF_OPEN: allow one test request across all instances
+        redis = await get_redis()
+        acquired = await redis.set(
+            self._key("probe"), "1", expire=self.recovery_timeout, nx=True
+        )
+        if acquired:
+            logger.info("CIRCUIT_HALF_OPEN", service=self.service_name)
+        return acquired
 
-    def record_success(self):
+    async def record_success(self):
         """Record a successful request."""
+        self.success_count += 1
+        if self.state == CircuitState.CLOSED and self.failure_count == 0:
+            return
+
+        redis = await get_redis()
         if self.state == CircuitState.HALF_OPEN:
-            self.state = CircuitState.CLOSED
-            self.failure_count = 0
-            self.success_count = 0
             logger.info("CIRCUIT_CLOSED", service=self.service_name)
-        self.success_count += 1
+        await redis.delete(self._key("opened_at"))
+        await redis.delete(self._key("probe"))
+        await redis.delete(self._key("failures"))
+        self.state = CircuitState.CLOSED
+        self.failure_count = 0
 
-    def record_failure(self):
+    async def record_failure(self):
         """Record a failed request."""
-        self.failure_count += 1
+        redis = await get_redis()
         self.last_failure_time = time.time()
 
         if self.state == CircuitState.HALF_OPEN:
-            self.state = CircuitState.OPEN
+            await self._open(redis)
             logger.warning("CIRCUIT_REOPENED", service=self.service_name)
-        elif self.failure_count >= self.failure_threshold:
-            self.state = CircuitState.OPEN
+            return
+
+        self.failure_count = await redis.incr(self._key("failures"), expire=self.failure_window)
+        if self.failure_count >= self.failure_threshold and self.state == CircuitState.CLOSED:
+            await self._open(redis)
             logger.warning(
                 "CIRCUIT_OPEN",
                 service=self.service_name,
                 failures=self.failure_count,
             )
 
+    async def call(self, fn, *args, excluded: tuple[type[BaseException], ...] = (), **kwargs):
+        """
+        Run `fn(*args, **kwargs)` through the breaker.
+        Raises CircuitOpenError without calling `fn` when the circuit is open.
+        Exceptions listed in `excluded` propagate without counting as failures.
+        """
+        if not await self.can_execute():
+            raise CircuitOpenError(self.service_name)
+        try:
+            result = await fn(*args, **kwargs)
+        except excluded:
+            raise
+        except Exception:
+            await self.record_failure()
+            raise
+        await self.record_success()
+        return result
+
     def get_status(self) -> dict:
         """Get circuit breaker status for monitoring."""
         return {
@@ -127,13 +222,24 @@ def get_breaker(service_name: str, **kwargs) -> CircuitBreaker:
     return _breakers[service_name]
 
 
-def get_all_breaker_statuses() -> list[dict]:
-    """Get status of all circuit breakers (for health/monitoring)."""
-    return [b.get_status() for b in _breakers.values()]
+async def get_all_breaker_statuses() -> list[dict]:
+    """Get shared status of all circuit breakers (for health/monitoring)."""
+    statuses = []
+    for breaker in _breakers.values():
+        try:
+            await breaker._load_state()
+        except Exception as e:
+            logger.warning("Circuit state refresh failed", service=breaker.service_name, error=str(e))
+        statuses.append(breaker.get_status())
+    return statuses
 
 
 # Pre-initialize common breakers
+gemini_breaker = get_breaker("gemini", failure_threshold=3, recovery_timeout=30)
 openai_breaker = get_breaker("openai", failure_threshold=3, recovery_timeout=30)
 anthropic_breaker = get_breaker("anthropic", failure_threshold=3, recovery_timeout=30)
+gemini_embedding_breaker = get_breaker("gemini_embedding", failure_threshold=3, recovery_timeout=30)
+openai_embedding_breaker = get_breaker("openai_embedding", failure_threshold=3, recovery_timeout=30)
 sendgrid_breaker = get_breaker("sendgrid", failure_threshold=5, recovery_timeout=60)
 whatsapp_breaker = get_breaker("whatsapp", failure_threshold=5, recovery_timeout=60)
+twilio_breaker = get_breaker("twilio", failure_threshold=5, recovery_timeout=60)
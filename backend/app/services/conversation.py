@@ -8,9 +8,11 @@ Handles:
 - Bilingual support (EN/BM)
 """
 
+import asyncio
+import time
 import uuid
 from datetime import datetime, timezone, timedelta
-from decimal import Decimal
+from typing import AsyncIterator, Awaitable, Callable
 
 import structlog
 from sqlalchemy import select, func
@@ -19,9 +21,25 @@ from sqlalchemy.orm import selectinload
 from openai import AsyncOpenAI
 from google import genai
 
-from app.models import Conversation, Message, Lead, Business
+from app.models import Conversation, Message, MessageProviderId
 from app.services import search_knowledge_base
 from app.services.sanitizer import sanitize_guest_message
+from app.services.prompt_context import BusinessPromptContext, SystemPrompt, prompt_contexts
+from app.services.lead_extraction import schedule_lead_extraction
+from app.services.follow_ups import next_follow_up_at
+from app.services.semantic_cache import MODEL_NAME as SEMANTIC_CACHE_MODEL, semantic_cache
+from app.services.conversation_memory import (
+    TURN_OVERHEAD_TOKENS,
+    estimate_tokens,
+    fetch_recent_messages,
+    input_token_budget,
+    pack_context,
+    schedule_summary,
+    summary_due,
+)
+from app.services.llm_prompt_cache import LLMUsage, gemini_prefix_cache, is_stale_handle_error, prompt_cache_stats
+from app.services.llm_latency import get_histogram, get_hedge_delay_seconds
+from app.services.circuit_breaker import get_breaker, gemini_breaker, openai_breaker
 from app.config import get_settings
 
 logger = structlog.get_logger()
@@ -43,205 +61,442 @@ FALLBACK_RESPONSE_BM = (
 )
 
 
-async def _call_llm(messages: list[dict], max_tokens: int = 512, temperature: float = 0.7) -> tuple:
+# Receives each text delta of a streamed reply
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+
+class _EmptyLLMResponse(Exception):
+    """Raised when a provider answers with no text, so the dispatcher moves on."""
+
+
+def _system_prompt(messages: list[dict]) -> str | SystemPrompt:
+    """The system message's content: a plain string, or a SystemPrompt split for prefix caching."""
+    for msg in messages:
+        if msg["role"] == "system":
+            return msg["content"]
+    return ""
+
+
+def _prefix_cacheable(system: str | SystemPrompt) -> bool:
+    return settings.llm_prompt_cache_enabled and isinstance(system, SystemPrompt)
+
+
+def _gemini_request(
+    messages: list[dict], max_tokens: int, temperature: float, cached_content: str | None = None
+) -> tuple:
     """
-    Call LLM with automatic fallback.
-    1. Try Gemini
-    2. If Gemini fails, try Anthropic Claude Haiku
-    3. If Anthropic fails, try OpenAI GPT-4o-mini
-    4. If all fail, return template fallback response
+    Convert OpenAI-format messages into Gemini (contents, config).
+    With `cached_content`, the prompt prefix comes from that handle; Gemini
+    won't take a system instruction alongside it, so the per-turn suffix
+    leads the contents instead.
     """
-    # Attempt 1: Gemini
-    if settings.gemini_api_key and gemini_client:
+    from google.genai import types
+    system = _system_prompt(messages)
+    gemini_contents = []
+    if cached_content:
+        gemini_contents.append(
+            types.Content(role="user", parts=[types.Part.from_text(text=system.suffix)])
+        )
+
+    for msg in messages:
+        if msg["role"] != "system":
+            # Map roles: 'assistant' -> 'model', 'user' -> 'user'
+            role = "model" if msg["role"] == "assistant" else "user"
+            gemini_contents.append(
+                types.Content(
+                    role=role,
+                    parts=[types.Part.from_text(text=msg["content"])]
+                )
+            )
+
+    config = types.GenerateContentConfig(
+        system_instruction=None if cached_content else str(system),
+        cached_content=cached_content,
+        temperature=temperature,
+        max_output_tokens=max_tokens,
+    )
+    return gemini_contents, config
+
+
+async def _prepare_gemini_request(messages: list[dict], max_tokens: int, temperature: float) -> tuple:
+    """_gemini_request with the business's cached prefix handle, when there is one."""
+    system = _system_prompt(messages)
+    cached_content = None
+    if _prefix_cacheable(system):
+        cached_content = await gemini_prefix_cache.resolve(gemini_client, settings.gemini_model, system)
+    return _gemini_request(messages, max_tokens, temperature, cached_content)
+
+
+async def _evict_stale_handle(error: Exception, messages: list[dict], config) -> bool:
+    """Evict the prefix handle `config` used if Gemini rejected it as expired/missing; True if it did."""
+    if not config.cached_content or not is_stale_handle_error(error):
+        return False
+    await gemini_prefix_cache.evict(settings.gemini_model, _system_prompt(messages), config.cached_content)
+    return True
+
+
+async def _call_gemini(messages: list[dict], max_tokens: int, temperature: float) -> tuple:
+    """
+    Single Gemini attempt. Raises on failure or empty output. A stale prefix
+    handle is evicted and the call retried once uncached, so it never counts
+    against the Gemini circuit.
+    """
+    contents, config = await _prepare_gemini_request(messages, max_tokens, temperature)
+    # Since _call_llm is async, we use the async client 'aio'
+    try:
+        response = await gemini_client.aio.models.generate_content(
+            model=settings.gemini_model,
+            contents=contents,
+            config=config,
+        )
+    except Exception as e:
+        if not await _evict_stale_handle(e, messages, config):
+            raise
+        contents, config = _gemini_request(messages, max_tokens, temperature)
+        response = await gemini_client.aio.models.generate_content(
+            model=settings.gemini_model,
+            contents=contents,
+            config=config,
+        )
+    text = response.text.strip() if response.text else ""
+    if not text:
+        raise _EmptyLLMResponse("Gemini returned empty response")
+    return text, LLMUsage.from_gemini(response.usage_metadata), settings.gemini_model
+
+
+async def _stream_gemini(messages: list[dict], max_tokens: int, temperature: float) -> AsyncIterator[str | LLMUsage]:
+    """
+    Gemini token stream: yields text deltas as they arrive, then the reply's usage.
+    A stale prefix handle rejected before the first delta is evicted and the
+    stream restarted uncached.
+    """
+    contents, config = await _prepare_gemini_request(messages, max_tokens, temperature)
+    usage_metadata = None
+    started = False
+    for attempt in range(2):
         try:
-            from google.genai import types
-            system_msg = ""
-            gemini_contents = []
-
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_msg = msg["content"]
-                else:
-                    # Map roles: 'assistant' -> 'model', 'user' -> 'user'
-                    role = "model" if msg["role"] == "assistant" else "user"
-                    gemini_contents.append(
-                        types.Content(
-                            role=role,
-                            parts=[types.Part.from_text(text=msg["content"])]
-                        )
-                    )
-
-            # Since _call_llm is async, we use the async client 'aio'
-            response = await gemini_client.aio.models.generate_content(
+            stream = await gemini_client.aio.models.generate_content_stream(
                 model=settings.gemini_model,
-                contents=gemini_contents,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_msg,
-                    temperature=temperature,
-                    max_output_tokens=max_tokens,
-                )
+                contents=contents,
+                config=config,
             )
-            text = response.text.strip() if response.text else ""
-            if not text:
-                logger.warning("Gemini returned empty response, trying fallback")
-            else:
-                return text, None, settings.gemini_model
+            async for chunk in stream:
+                if chunk.usage_metadata:
+                    usage_metadata = chunk.usage_metadata
+                if chunk.text:
+                    started = True
+                    yield chunk.text
+            break
         except Exception as e:
-            logger.warning("Gemini LLM call failed, trying fallback", error=str(e))
+            if started or attempt or not await _evict_stale_handle(e, messages, config):
+                raise
+            contents, config = _gemini_request(messages, max_tokens, temperature)
+    if usage := LLMUsage.from_gemini(usage_metadata):
+        yield usage
+
+
+def _anthropic_request(messages: list[dict]) -> tuple[str | list[dict], list[dict]]:
+    """
+    Convert OpenAI format to Anthropic format: (system, messages).
+    A cacheable prompt becomes two system blocks, the prefix marked with cache_control.
+    """
+    system = _system_prompt(messages)
+    claude_messages = [msg for msg in messages if msg["role"] != "system"]
+    if _prefix_cacheable(system):
+        return [
+            {"type": "text", "text": system.prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": system.suffix},
+        ], claude_messages
+    return str(system), claude_messages
+
+
+async def _call_anthropic(messages: list[dict], max_tokens: int, temperature: float) -> tuple:
+    """Single Anthropic Claude attempt. Raises on failure."""
+    import anthropic
+    client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
+    system_msg, claude_messages = _anthropic_request(messages)
+
+    response = await client.messages.create(
+        model=settings.anthropic_model,
+        max_tokens=max_tokens,
+        system=system_msg,
+        messages=claude_messages,
+    )
+    return response.content[0].text.strip(), LLMUsage.from_anthropic(response.usage), settings.anthropic_model
+
+
+async def _stream_anthropic(messages: list[dict], max_tokens: int, temperature: float) -> AsyncIterator[str | LLMUsage]:
+    """Anthropic Claude token stream: yields text deltas as they arrive, then the reply's usage."""
+    import anthropic
+    client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
+    system_msg, claude_messages = _anthropic_request(messages)
+
+    async with client.messages.stream(
+        model=settings.anthropic_model,
+        max_tokens=max_tokens,
+        system=system_msg,
+        messages=claude_messages,
+    ) as stream:
+        async for text in stream.text_stream:
+            yield text
+        final = await stream.get_final_message()
+    if usage := LLMUsage.from_anthropic(final.usage):
+        yield usage
+
+
+def _openai_messages(messages: list[dict]) -> list[dict]:
+    """OpenAI caches prompt prefixes automatically; a split prompt is sent as prefix then suffix."""
+    converted = []
+    for msg in messages:
+        if msg["role"] == "system" and isinstance(msg["content"], SystemPrompt):
+            converted.append({"role": "system", "content": msg["content"].prefix})
+            converted.append({"role": "system", "content": msg["content"].suffix})
+        else:
+            converted.append(msg)
+    return converted
+
+
+async def _call_openai(messages: list[dict], max_tokens: int, temperature: float) -> tuple:
+    """Single OpenAI attempt. Raises on failure or empty output."""
+    response = await openai_client.chat.completions.create(
+        model=settings.openai_model,
+        messages=_openai_messages(messages),
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+    content = response.choices[0].message.content
+    if not content or not content.strip():
+        raise _EmptyLLMResponse("OpenAI returned empty response")
+    return content.strip(), LLMUsage.from_openai(response.usage), settings.openai_model
+
+
+async def _stream_openai(messages: list[dict], max_tokens: int, temperature: float) -> AsyncIterator[str | LLMUsage]:
+    """OpenAI token stream: yields text deltas as they arrive, then the reply's usage."""
+    stream = await openai_client.chat.completions.create(
+        model=settings.openai_model,
+        messages=_openai_messages(messages),
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        if chunk.usage:
+            yield LLMUsage.from_openai(chunk.usage)
+
+
+def _llm_providers(streaming: bool = False) -> list[tuple[str, callable]]:
+    """
+    Configured providers in fallback order: Gemini → Anthropic → OpenAI.
+    With `streaming`, each entry is the provider's token-iterator function instead.
+    """
+    providers = []
+    if settings.gemini_api_key and gemini_client:
+        providers.append(("gemini", _stream_gemini if streaming else _call_gemini))
     else:
         logger.warning("Gemini API key missing, skipping to fallback")
-
-    # Attempt 2: Anthropic Claude Haiku
     if settings.anthropic_api_key:
-        try:
-            import anthropic
-            client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
-
-            # Convert OpenAI format to Anthropic format
-            system_msg = ""
-            claude_messages = []
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_msg = msg["content"]
-                else:
-                    claude_messages.append(msg)
-
-            response = await client.messages.create(
-                model=settings.anthropic_model,
-                max_tokens=max_tokens,
-                system=system_msg,
-                messages=claude_messages,
-            )
-            return response.content[0].text.strip(), None, settings.anthropic_model
-        except Exception as e:
-            logger.warning("Anthropic LLM call failed, trying fallback", error=str(e))
+        providers.append(("anthropic", _stream_anthropic if streaming else _call_anthropic))
     else:
         logger.warning("Anthropic API key missing, skipping to fallback")
-
-    # Attempt 3: OpenAI
     if settings.openai_api_key and openai_client:
-        try:
-            response = await openai_client.chat.completions.create(
-                model=settings.openai_model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-            content = response.choices[0].message.content
-            if not content or not content.strip():
-                logger.warning("OpenAI returned empty response, trying fallback")
-            else:
-                return content.strip(), response.usage, settings.openai_model
-        except Exception as e:
-            logger.warning("OpenAI LLM call failed, trying fallback", error=str(e))
+        providers.append(("openai", _stream_openai if streaming else _call_openai))
     else:
         logger.warning("OpenAI API key missing, skipping to fallback")
+    return providers
 
-    # Attempt 4: Template fallback
-    logger.error("All LLM providers failed, using template fallback")
-    return FALLBACK_RESPONSE, None, "fallback_template"
-
-
-# ─────────────────────────────────────────────────────────────
-# System Prompts — The personality and rules of the AI
-# ─────────────────────────────────────────────────────────────
-
-SYSTEM_PROMPT_BASE = """You are the AI Concierge for {business_name}. You are NOT a generic chatbot — you are a knowledgeable, proactive hotel professional powered by advanced AI. You should respond the way a skilled reservations manager would: warmly, efficiently, and with contextual intelligence.
-
-### CURRENT DATE & TIME:
-{current_datetime}
-
-### GUEST CONTEXT:
-{guest_context}
 
-### INFORMATION GATHERED SO FAR:
-{lead_progress}
-
-### INTELLIGENT BEHAVIOR RULES (CRITICAL — follow these precisely):
-
-1. **IMPLICIT INFORMATION**: If the guest says "use this number", "you already have my number", "same number", or "you can reach me here" — look at GUEST CONTEXT above and CONFIRM the phone/email shown. NEVER re-ask for information you already have. Say: "Got it, I have your number as {guest_phone_placeholder} — is that correct?"
+async def _timed_provider_call(provider: str, call, messages: list[dict], max_tokens: int, temperature: float) -> tuple:
+    """
+    Run one provider call through its circuit breaker and feed its latency into
+    the provider's histogram. An open circuit raises CircuitOpenError at once, so
+    the dispatcher moves to the next provider without waiting on a dead one.
+    Empty answers (e.g. safety blocks) don't count against the provider's circuit.
+    A call cancelled as a hedge loser records its elapsed time as a lower bound:
+    dropping it would cut the slow tail at the hedge delay and drag p95 down.
+    """
+    start = time.monotonic()
+    try:
+        result = await get_breaker(provider).call(
+            call, messages, max_tokens, temperature, excluded=(_EmptyLLMResponse,)
+        )
+    except asyncio.CancelledError:
+        get_histogram(provider).record((time.monotonic() - start) * 1000)
+        raise
+    get_histogram(provider).record((time.monotonic() - start) * 1000)
+    return result
 
-2. **DATE RESOLUTION**: ALWAYS convert relative dates to specific calendar dates using CURRENT DATE above:
-   - "tomorrow" → calculate the exact date and state it ("That would be {tomorrow_date}")
-   - "this weekend" → calculate Saturday-Sunday dates
-   - "next Friday" → calculate the exact date
-   - "for 3 nights from tomorrow" → calculate check-in AND check-out dates
-   Never leave a date ambiguous. Always confirm: "So that's check-in on [DATE], check-out on [DATE] — [N] nights. Does that work?"
 
-3. **PAX INFERENCE**: Extract number of guests from context clues:
-   - "me and my wife" → 2 adults
-   - "family of 4" → assume 2 adults + 2 children
-   - "with the kids" → at least 2 adults + children, ask how many children
-   - "couple" → 2 adults
-   - "business trip" → likely 1 adult
-   State your assumption: "I'll note that as 2 adults. Will any children be joining?"
+async def _call_llm_sequential(providers: list, messages: list[dict], max_tokens: int, temperature: float) -> tuple | None:
+    """Try each provider strictly in order; return the first answer or None."""
+    for provider, call in providers:
+        try:
+            return await _timed_provider_call(provider, call, messages, max_tokens, temperature)
+        except Exception as e:
+            logger.warning("LLM call failed, trying fallback", provider=provider, error=str(e))
+    return None
 
-4. **PROACTIVE ROOM SUGGESTIONS**: When a guest mentions their occasion or needs, recommend the BEST-FIT room from the PROPERTY KNOWLEDGE BASE:
-   - Anniversary/honeymoon → suggest the most premium suite
-   - Family → suggest family rooms or interconnecting rooms
-   - Business → suggest rooms with work desk, wifi emphasis
-   - Budget → suggest the best value option
-   Don't just list rates. RECOMMEND: "For an anniversary, I'd suggest our Grand Suite — it has a private balcony and complimentary champagne."
 
-5. **PRICE FRAMING**: When quoting rates, always provide context:
-   - Include what's included (breakfast, wifi, pool, parking)
-   - Show per-night AND total stay cost if dates are known
-   - Compare value: "That's RM 380/night including breakfast for two — great value for a sea-view room."
+async def _call_llm_hedged(providers: list, messages: list[dict], max_tokens: int, temperature: float) -> tuple | None:
+    """
+    Hedged dispatch: start the primary provider; if it hasn't answered within
+    its hedge delay (p95-derived, see llm_latency), start the next provider too
+    and take whichever answers first. A failure launches the next provider
+    immediately. Losers are cancelled.
+    """
+    remaining = list(providers)
+    in_flight: dict[asyncio.Task, str] = {}
+    last_launched = None
+
+    def launch():
+        nonlocal last_launched
+        provider, call = remaining.pop(0)
+        task = asyncio.create_task(
+            _timed_provider_call(provider, call, messages, max_tokens, temperature)
+        )
+        in_flight[task] = provider
+        last_launched = provider
 
-6. **NO INTERROGATION**: NEVER ask more than 2 questions in a single message. Prioritize the most important missing info first. If you need name, dates, and pax — ask for dates first (the most time-sensitive), then name + pax together next.
+    launch()
+    try:
+        while in_flight:
+            timeout = get_hedge_delay_seconds(last_launched) if remaining else None
+            done, _ = await asyncio.wait(
+                in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
 
-7. **CONFIRMATION SUMMARIES**: Once you have all key details (name, dates, room, pax), summarize naturally:
-   "Perfect! Let me confirm: [Name], [N] nights from [check-in] to [check-out], [Room Type] for [N adults]. I'll pass this to our reservations team and they'll send you a confirmation shortly!"
+            if not done:
+                logger.info(
+                    "LLM hedge fired",
+                    slow_provider=last_launched,
+                    hedge_provider=remaining[0][0],
+                    hedge_delay_ms=int(timeout * 1000),
+                )
+                launch()
+                continue
+
+            for task in done:
+                provider = in_flight.pop(task)
+                try:
+                    return task.result()
+                except Exception as e:
+                    logger.warning("LLM call failed, trying fallback", provider=provider, error=str(e))
+
+            if remaining:
+                launch()
+        return None
+    finally:
+        for task in in_flight:
+            task.cancel()
 
-8. **PROACTIVE UPSELLS**: After handling the main query, offer ONE relevant add-on:
-   - Airport pickup
-   - Spa package
-   - Dining reservation
-   - Early check-in / late check-out
-   Keep it brief: "By the way, we offer complimentary airport shuttle — would you like me to arrange that?"
 
-9. **PARTIAL ANSWERS**: Extract implicit info without re-asking:
-   - "I arrive on the 10am flight from KL" → check-in is that day, likely afternoon
-   - "I'm checking out on Sunday" → calculate dates backward
-   - "Just one night" → check-out = check-in + 1
+async def _call_llm_streaming(
+    providers: list, messages: list[dict], max_tokens: int, temperature: float, on_delta: DeltaCallback
+) -> tuple | None:
+    """
+    Stream from each provider in order, forwarding deltas to `on_delta`.
 
-10. **CONTEXTUAL MEMORY**: Review INFORMATION GATHERED SO FAR. NEVER re-ask for details already collected. If the guest provided their name 3 messages ago, use it — don't ask again.
+    A provider that fails before its first token falls through to the next one,
+    exactly like the sequential path. Once tokens have reached the guest we
+    can't switch providers, so a mid-stream failure keeps the partial text.
+    `on_delta` errors never fail the provider: the stream is read to the end
+    without the listener.
+    """
+    for provider, stream_fn in providers:
+        breaker = get_breaker(provider)
+        if not await breaker.can_execute():
+            logger.warning("LLM call failed, trying fallback", provider=provider, error=f"Circuit open for {provider}")
+            continue
+
+        parts: list[str] = []
+        usage = None
+        try:
+            async for delta in stream_fn(messages, max_tokens, temperature):
+                if isinstance(delta, LLMUsage):
+                    usage = delta
+                    continue
+                if not parts:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                parts.append(delta)
+                if on_delta is not None:
+                    try:
+                        await on_delta(delta)
+                    except Exception as e:
+                        # The listener went away (e.g. widget closed); finish the reply so it's still saved
+                        logger.info("LLM stream listener failed, continuing without it", error=str(e))
+                        on_delta = None
+        except Exception as e:
+            await breaker.record_failure()
+            if not parts:
+                logger.warning("LLM call failed, trying fallback", provider=provider, error=str(e))
+                continue
+            logger.error("LLM stream interrupted, keeping partial response", provider=provider, error=str(e))
+            return "".join(parts).strip(), usage, _provider_model(provider)
+
+        if not parts:
+            # Empty answers (e.g. safety blocks) don't count against the provider's circuit
+            logger.warning("LLM call failed, trying fallback", provider=provider, error=f"{provider} returned empty response")
+            continue
+        await breaker.record_success()
+        return "".join(parts).strip(), usage, _provider_model(provider)
+    return None
 
-### CORE BEHAVIORS:
-- **Stick to Facts**: ONLY use the PROPERTY KNOWLEDGE BASE below. If unsure, say: "Let me check with our reservations team and get back to you."
-- **After Hours**: It is currently {after_hours_state}. If after hours, reassure: "Our team is away for the night, but I'm here to take care of everything — they'll follow up first thing in the morning."
-- **Language**: Match the guest's language (English or Bahasa Malaysia). If they switch, switch with them.
 
-### BRAND PERSONA & VOCABULARY:
-{brand_vocabulary_context}
+def _provider_model(provider: str) -> str:
+    return {
+        "gemini": settings.gemini_model,
+        "anthropic": settings.anthropic_model,
+        "openai": settings.openai_model,
+    }[provider]
+
+
+async def _call_llm(
+    messages: list[dict],
+    max_tokens: int = 512,
+    temperature: float = 0.7,
+    on_delta: DeltaCallback | None = None,
+) -> tuple:
+    """
+    Call LLM with automatic fallback.
+    1. Try Gemini
+    2. If Gemini fails, try Anthropic Claude Haiku
+    3. If Anthropic fails, try OpenAI GPT-4o-mini
+    4. If all fail, return template fallback response
 
-### PROPERTY KNOWLEDGE BASE:
-{knowledge_base_context}
-"""
+    With LLM_HEDGING_ENABLED, a provider that is slower than its usual p95 is
+    raced against the next one instead of being waited out to its timeout.
 
-LEAD_CAPTURE_ADDENDUM = """
-### ACTIVE LEAD CAPTURE MODE
-The guest is interested. Your goal is to gather booking details efficiently — like a real reservations manager.
+    With `on_delta`, the reply is token-streamed: each text delta is awaited
+    through `on_delta` as it arrives (no hedging — the first provider to produce
+    a token owns the reply) and the full text is still returned at the end.
+    """
+    if on_delta is not None:
+        result = await _call_llm_streaming(
+            _llm_providers(streaming=True), messages, max_tokens, temperature, on_delta
+        )
+        if result:
+            return result
+        logger.error("All LLM providers failed, using template fallback")
+        await on_delta(FALLBACK_RESPONSE)
+        return FALLBACK_RESPONSE, None, "fallback_template"
 
-Check INFORMATION GATHERED SO FAR above. Only ask for what's MISSING:
-1. **Name** — skip if already in GUEST CONTEXT or gathered earlier
-2. **Dates of Stay** — resolve to specific dates, confirm check-in + check-out + number of nights
-3. **Number of Guests** — infer from context when possible
-4. **Room Preference** — suggest based on their stated needs
-5. **Contact** — skip if phone/email is already in GUEST CONTEXT (WhatsApp number counts!)
+    providers = _llm_providers()
 
-{required_questions_context}
+    if settings.llm_hedging_enabled and len(providers) > 1:
+        result = await _call_llm_hedged(providers, messages, max_tokens, temperature)
+    else:
+        result = await _call_llm_sequential(providers, messages, max_tokens, temperature)
 
-Remember: Maximum 2 questions per message. Lead with the most important missing piece.
-"""
+    if result:
+        return result
 
-HANDOFF_ADDENDUM = """
-### HANDOFF MODE
-The guest needs a human. Handle this gracefully:
-1. **Acknowledge**: "I completely understand, and I want to make sure you're taken care of."
-2. **Assure**: "I'm flagging this conversation for our Business Manager right now, with all the details."
-3. **Set expectations**: "They will reach out to you within [timeframe based on operating hours]. In the meantime, is there anything else I can note down for them?"
-"""
+    # Attempt 4: Template fallback
+    logger.error("All LLM providers failed, using template fallback")
+    return FALLBACK_RESPONSE, None, "fallback_template"
 
 
 def _detect_intent(message_text: str) -> str | None:
@@ -285,33 +540,17 @@ def _detect_intent(message_text: str) -> str | None:
     return None
 
 
-def _is_after_hours(business: Business) -> bool:
-    """Check if current time is outside the business's operating hours."""
-    if not business.operating_hours:
-        return False
-
-    try:
-        import zoneinfo
-        tz = zoneinfo.ZoneInfo(
-            business.operating_hours.get("timezone", "Asia/Kuala_Lumpur")
-        )
-        now = datetime.now(tz)
-        start_hour = int(business.operating_hours.get("start", "09:00").split(":")[0])
-        end_hour = int(business.operating_hours.get("end", "18:00").split(":")[0])
-        return now.hour < start_hour or now.hour >= end_hour
-    except Exception:
-        return False
-
-
 async def get_or_create_conversation(
     db: AsyncSession,
     business_id: uuid.UUID,
     guest_identifier: str,
     channel: str,
+    context: BusinessPromptContext | None = None,
 ) -> Conversation:
     """
     Get an existing active conversation or create a new one.
     A conversation is considered active if it hasn't been resolved/expired.
+    `context` (the business's compiled prompt context) is looked up if not given.
     """
     result = await db.execute(
         select(Conversation)
@@ -320,10 +559,8 @@ async def get_or_create_conversation(
             Conversation.guest_identifier == guest_identifier,
             Conversation.status == "active",
         )
-        .options(
-            selectinload(Conversation.messages),
-            selectinload(Conversation.lead)
-        )
+        # Messages are fetched per turn within the token budget, never all at once
+        .options(selectinload(Conversation.lead))
         .order_by(Conversation.started_at.desc())
         .limit(1)
     )
@@ -332,19 +569,15 @@ async def get_or_create_conversation(
     if conversation:
         return conversation
 
-    # Get business to check after-hours
-    prop_result = await db.execute(
-        select(Business).where(Business.id == business_id)
-    )
-    prop = prop_result.scalar_one_or_none()
-    if not prop:
-        raise ValueError(f"Business {business_id} not found")
+    # Business operating hours decide after-hours (raises ValueError if the business is gone)
+    if context is None:
+        context = await prompt_contexts.get(db, business_id)
 
     conversation = Conversation(
         business_id=business_id,
         guest_identifier=guest_identifier,
         channel=channel,
-        is_after_hours=_is_after_hours(prop),
+        is_after_hours=context.is_after_hours(),
     )
     db.add(conversation)
     await db.flush()
@@ -353,6 +586,27 @@ async def get_or_create_conversation(
     return conversation
 
 
+async def _stored_provider_message_ids(db: AsyncSession, message_ids: list[str | None]) -> set[str]:
+    """Provider message IDs from `message_ids` that already have a stored Message."""
+    message_ids = [m for m in message_ids if m]
+    if not message_ids:
+        return set()
+    result = await db.execute(
+        select(MessageProviderId.provider_message_id)
+        .where(MessageProviderId.provider_message_id.in_(message_ids))
+    )
+    return set(result.scalars().all())
+
+
+def _add_message(db: AsyncSession, message: Message, provider_message_id: str | None = None) -> Message:
+    """Add `message`, registering its provider message ID (the primary key rejects a duplicate delivery)."""
+    if provider_message_id:
+        message.id = message.id or uuid.uuid4()
+        db.add(MessageProviderId(provider_message_id=provider_message_id, message_id=message.id))
+    db.add(message)
+    return message
+
+
 async def process_guest_message(
     db: AsyncSession,
     business_id: uuid.UUID,
@@ -361,22 +615,72 @@ async def process_guest_message(
     message_text: str,
     guest_name: str | None = None,
     is_follow_up: bool = False,
+    preceding_messages: list[str] | None = None,
+    on_delta: DeltaCallback | None = None,
+    provider_message_id: str | None = None,
+    preceding_message_ids: list[str | None] | None = None,
 ) -> dict:
     """
     Process an incoming guest message and generate an AI response.
 
     This is the main entry point for all channels (WhatsApp, Web, Email).
 
+    `preceding_messages` are earlier messages from the same burst (coalesced by
+    the inbound queue). Each is stored as its own guest Message, and the turn
+    answers them together with `message_text` in a single LLM call.
+
+    `provider_message_id` / `preceding_message_ids` (e.g. 'whatsapp:wamid...')
+    are stored on the guest Messages and registered in message_provider_ids
+    (primary key on the ID); messages already
+    stored are skipped, and if nothing new remains the call returns
+    {"duplicate": True, "response": None} without touching the LLM.
+
+    `on_delta` switches the LLM call to token streaming (website widget): each
+    text delta is passed to it as it arrives, and the full reply is persisted
+    once the stream ends.
+
     Returns:
-        dict with keys: response, conversation_id, mode, lead_created
+        dict with keys: response, conversation_id, mode, is_after_hours, response_time_ms
     """
     # 1. Sanitize input (Audit R4)
     message_text = sanitize_guest_message(message_text)
+    preceding_messages = preceding_messages or []
+    preceding_message_ids = preceding_message_ids or [None] * len(preceding_messages)
+    burst = [
+        (text, message_id)
+        for text, message_id in zip(map(sanitize_guest_message, preceding_messages), preceding_message_ids)
+        if text
+    ]
 
-    # 2. Get or create conversation
+    # 1b. Idempotency: skip raw messages already stored by an earlier delivery
+    # (a webhook retry that got past the dedup seen-set, or a queue redelivery)
+    stored_ids = await _stored_provider_message_ids(
+        db, [provider_message_id, *(message_id for _, message_id in burst)]
+    )
+    if stored_ids:
+        burst = [(text, message_id) for text, message_id in burst if message_id not in stored_ids]
+        if provider_message_id in stored_ids:
+            if not burst:
+                logger.info("Duplicate guest message skipped", provider_message_id=provider_message_id)
+                return {
+                    "response": None,
+                    "duplicate": True,
+                    "conversation_id": None,
+                    "mode": None,
+                    "is_after_hours": False,
+                    "response_time_ms": 0,
+                }
+            message_text, provider_message_id = burst.pop()
+
+    # Intent, KB search and lead extraction see the whole burst
+    turn_text = "\n".join([*(text for text, _ in burst), message_text])
+
+    # 2. Business prompt context (cached per config version) and conversation
+    context = await prompt_contexts.get(db, business_id)
     conversation = await get_or_create_conversation(
-        db, business_id, guest_identifier, channel
+        db, business_id, guest_identifier, channel, context=context
     )
+    opens_conversation = not conversation.message_count and not conversation.summary
 
     # Update conversation stats (Audit M1)
     conversation.last_message_at = datetime.now(timezone.utc)
@@ -384,38 +688,49 @@ async def process_guest_message(
     # meaning the guest actually replied, or a staff sent a real message
     if not is_follow_up:
         conversation.last_interaction_at = datetime.now(timezone.utc)
-    conversation.message_count += 1
+        conversation.next_follow_up_at = next_follow_up_at(
+            conversation.last_interaction_at, conversation.follow_up_stage or 0
+        )
+    conversation.message_count += 1 + len(burst)
 
     if guest_name and not conversation.guest_name:
         conversation.guest_name = guest_name
 
     # 2. Save guest message (or system message if it's a follow up trigger without text from guest)
+    for i, (text, message_id) in enumerate(burst):
+        # Step back from the transaction timestamp so the burst keeps its order before message_text
+        metadata = {"channel": channel, "is_follow_up": False, "coalesced": True}
+        if message_id:
+            metadata["provider_message_id"] = message_id
+        _add_message(db, Message(
+            conversation_id=conversation.id,
+            role="guest",
+            content=text,
+            metadata_=metadata,
+            sent_at=func.now() - timedelta(microseconds=len(burst) - i),
+        ), message_id)
     if message_text:
         role = "ai" if is_follow_up else "guest"
-        guest_msg = Message(
+        metadata = {"channel": channel, "is_follow_up": is_follow_up}
+        if provider_message_id:
+            metadata["provider_message_id"] = provider_message_id
+        _add_message(db, Message(
             conversation_id=conversation.id,
             role=role,
             content=message_text,
-            metadata_={"channel": channel, "is_follow_up": is_follow_up},
-        )
-        db.add(guest_msg)
+            metadata_=metadata,
+        ), provider_message_id)
         await db.flush()
 
     # 3. Detect intent and update AI mode
-    detected_intent = _detect_intent(message_text)
+    detected_intent = _detect_intent(turn_text)
     if detected_intent:
         conversation.ai_mode = detected_intent
 
-    # 4. Get business info
-    prop_result = await db.execute(
-        select(Business).where(Business.id == business_id)
-    )
-    prop = prop_result.scalar_one()
-
-    # 4b. Shadow Pilot / Audit-Only Mode — log message, skip AI response entirely.
+    # 4. Shadow Pilot / Audit-Only Mode — log message, skip AI response entirely.
     # The weekly audit report job reads from Conversations to generate the
     # "You received X after-hours inquiries" email. No reply is sent to the guest.
-    if prop.audit_only_mode:
+    if context.audit_only_mode:
         await db.flush()
         logger.info(
             "audit_only_mode: message logged, AI response suppressed",
@@ -429,74 +744,74 @@ async def process_guest_message(
             "mode": conversation.ai_mode,
             "is_after_hours": conversation.is_after_hours,
             "response_time_ms": 0,
-            "lead_created": False,
         }
 
+    # 4b. Semantic answer cache (opt-in): a conversation-opening concierge question
+    # answered earlier today for this KB version, language and after-hours state skips the LLM
+    semantic_key = None
+    if (
+        context.semantic_cache_enabled
+        and conversation.ai_mode == "concierge"
+        and not is_follow_up
+        and opens_conversation
+    ):
+        semantic_key = await semantic_cache.prepare(
+            business_id, turn_text, context.now().date(), conversation.is_after_hours
+        )
+        cached = semantic_cache.lookup(semantic_key) if semantic_key else None
+        if cached:
+            logger.info(
+                "Semantic cache hit",
+                conversation_id=str(conversation.id),
+                similarity=round(cached.similarity, 4),
+            )
+            if on_delta is not None:
+                await on_delta(cached.answer)
+            return await _finish_turn(
+                db,
+                conversation,
+                cached.answer,
+                guest_identifier,
+                channel,
+                {
+                    "response_time_ms": 0,
+                    "llm_tokens_used": 0,
+                    "mode": conversation.ai_mode,
+                    "model": SEMANTIC_CACHE_MODEL,
+                    "semantic_cache": {
+                        "similarity": round(cached.similarity, 4),
+                        "age_seconds": int(cached.age_seconds),
+                    },
+                },
+            )
+
     # 5. RAG: Search knowledge base for relevant context
-    kb_docs = await search_knowledge_base(db, business_id, message_text, limit=5)
-    kb_context = "\n\n".join(
-        f"[{doc.doc_type.upper()}] {doc.title}:\n{doc.content}"
-        for doc in kb_docs
-    ) if kb_docs else "No business information available yet."
-
-    # 6. Build conversation history for LLM context
-    # Use explicit select to avoid MissingGreenlet / lazy load issues
-    msgs_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation.id)
-        .order_by(Message.sent_at.desc())  # Newest first
-        .limit(15)  # Increased from 10 for longer conversations (weddings, events)
+    kb_docs = await search_knowledge_base(db, business_id, turn_text, limit=5)
+
+    # 6. Pack the rolling summary, KB hits and recent messages into the turn's
+    # input token budget (messages already in the summary are never fetched)
+    recent_messages = await fetch_recent_messages(db, conversation)
+    reserved_tokens = estimate_tokens(context.prompt_prefix(conversation.ai_mode)) + TURN_OVERHEAD_TOKENS
+    packed = pack_context(
+        input_token_budget() - reserved_tokens,
+        recent_messages,
+        conversation.summary,
+        kb_docs,
     )
-    # Reverse to get chronological order
-    recent_messages = list(msgs_result.scalars().all())[::-1]
-
-    history = []
-    # Wrap guest message in XML tags for robustness (Audit R4)
-    for m in recent_messages:
-        content = m.content
-        role = "user"
-        if m.role == "guest":
-            content = f"<guest_message>{content}</guest_message>"
-        elif m.role == "ai":
-            role = "assistant"
-        history.append({"role": role, "content": content})
-
-    # 7. Build system prompt based on current AI mode
-    operating_hours_str = "9am - 6pm"
-    if prop.operating_hours:
-        operating_hours_str = (
-            f"{prop.operating_hours.get('start', '09:00')} - "
-            f"{prop.operating_hours.get('end', '18:00')}"
-        )
-    
-    after_hours_state = "during operating hours"
-    if conversation.is_after_hours:
-        after_hours_state = f"AFTER HOURS (Operating hours are {operating_hours_str})"
-        
-    brand_vocab_str = "Standard hotel professional and helpful."
-    if prop.brand_vocabulary:
-        brand_vocab_str = prop.brand_vocabulary
-        
-    # Build guest context from channel metadata
-    import zoneinfo
-    try:
-        prop_tz = zoneinfo.ZoneInfo(
-            prop.operating_hours.get("timezone", "Asia/Kuala_Lumpur") if prop.operating_hours else "Asia/Kuala_Lumpur"
-        )
-    except Exception:
-        prop_tz = zoneinfo.ZoneInfo("Asia/Kuala_Lumpur")
-    now_local = datetime.now(prop_tz)
+    history = packed.history
+
+    # 7. Build system prompt: the cacheable prefix comes compiled from the business
+    # context; this turn's fields only go into the suffix
+    now_local = context.now()
     current_dt_str = now_local.strftime("%A, %B %d, %Y at %I:%M %p %Z")
     # Pre-compute tomorrow for the prompt placeholder
     tomorrow_local = now_local + timedelta(days=1)
     tomorrow_str = tomorrow_local.strftime("%A, %B %d")
 
     guest_context_parts = []
-    guest_phone_for_prompt = "(not available)"
     if channel == "whatsapp" and guest_identifier:
         guest_context_parts.append(f"Channel: WhatsApp")
         guest_context_parts.append(f"Phone number: {guest_identifier}")
-        guest_phone_for_prompt = guest_identifier
     elif channel == "email" and guest_identifier:
         guest_context_parts.append(f"Channel: Email")
         guest_context_parts.append(f"Email: {guest_identifier}")
@@ -508,7 +823,7 @@ async def process_guest_message(
 
     # Build lead progress tracker from conversation history
     lead_progress_parts = []
-    full_text = " ".join(m.content for m in recent_messages).lower()
+    full_text = " ".join([packed.summary or "", *(m.content for m in packed.messages)]).lower()
     # Check what info has been gathered
     if conversation.guest_name:
         lead_progress_parts.append(f"- Name: {conversation.guest_name} ✓")
@@ -539,31 +854,18 @@ async def process_guest_message(
         lead_progress_parts.append("- Number of guests: Not yet discussed")
     lead_progress_str = "\n".join(lead_progress_parts)
 
-    system_prompt = SYSTEM_PROMPT_BASE.format(
-        business_name=prop.name,
+    system_prompt = context.render_system_prompt(
+        conversation.ai_mode,
+        is_follow_up=is_follow_up,
         current_datetime=current_dt_str,
         guest_context=guest_context_str,
         lead_progress=lead_progress_str,
-        guest_phone_placeholder=guest_phone_for_prompt,
         tomorrow_date=tomorrow_str,
-        after_hours_state=after_hours_state,
-        brand_vocabulary_context=brand_vocab_str,
-        knowledge_base_context=kb_context,
+        after_hours_state=context.after_hours_state(conversation.is_after_hours),
+        conversation_summary=packed.summary or "Nothing earlier — the whole conversation is included below.",
+        knowledge_base_context=packed.kb_context,
     )
 
-    if conversation.ai_mode == "lead_capture":
-        required_qs_str = ""
-        if prop.required_questions and len(prop.required_questions) > 0:
-            qs_list = "\n".join(f"- {q}" for q in prop.required_questions)
-            required_qs_str = f"Additionally, ensure you ask these REQUIRED QUESTIONS before passing to reservations:\n{qs_list}"
-            
-        system_prompt += LEAD_CAPTURE_ADDENDUM.format(required_questions_context=required_qs_str)
-    elif conversation.ai_mode == "handoff":
-        system_prompt += HANDOFF_ADDENDUM
-        
-    if is_follow_up:
-        system_prompt += "\n\n### RE-ENGAGEMENT MODE\nThis guest has gone quiet. Your goal is to politely and warmly follow up. Keep it short, reference their previous interest, and ask if they still need help."
-
     # 8. Call LLM (with retry + fallback)
     start_time = datetime.now(timezone.utc)
 
@@ -574,41 +876,67 @@ async def process_guest_message(
     # Use lower temperature in lead capture for more focused, goal-oriented responses
     temp = 0.5 if conversation.ai_mode == "lead_capture" else 0.7
     response_text, usage, model_used = await _call_llm(
-        llm_messages, max_tokens=800, temperature=temp
+        llm_messages, max_tokens=800, temperature=temp, on_delta=on_delta
     )
 
     end_time = datetime.now(timezone.utc)
     response_time_ms = int((end_time - start_time).total_seconds() * 1000)
+    prompt_cache_stats.record(model_used, usage)
 
     logger.info(
         "LLM response generated",
         model=model_used,
         response_time_ms=response_time_ms,
+        packed_context_tokens=packed.tokens,
+        history_messages=len(packed.messages),
+        cached_prompt_tokens=usage.cached_tokens if usage else 0,
         conversation_id=str(conversation.id),
     )
 
-    # 9. Save AI response
-    ai_msg = Message(
-        conversation_id=conversation.id,
-        role="ai",
-        content=response_text,
-        metadata_={
+    if semantic_key and model_used != "fallback_template" and conversation.ai_mode == "concierge":
+        # Personalized answers (the guest's name, number or email) are never stored
+        semantic_cache.store(semantic_key, response_text, (guest_identifier, conversation.guest_name))
+
+    return await _finish_turn(
+        db,
+        conversation,
+        response_text,
+        guest_identifier,
+        channel,
+        {
             "response_time_ms": response_time_ms,
             "llm_tokens_used": usage.total_tokens if usage else 0,
             "mode": conversation.ai_mode,
             "model": model_used,
+            "prompt_cache": usage.cache_metadata() if usage else None,
         },
     )
+
+
+async def _finish_turn(
+    db: AsyncSession,
+    conversation: Conversation,
+    response_text: str,
+    guest_identifier: str,
+    channel: str,
+    metadata: dict,
+) -> dict:
+    """Persist the AI reply, schedule post-reply stages and build process_guest_message's result."""
+    # 9. Save AI response
+    ai_msg = Message(
+        conversation_id=conversation.id,
+        role="ai",
+        content=response_text,
+        metadata_=metadata,
+    )
     db.add(ai_msg)
 
-    # 10. Auto-extract lead info if in lead_capture mode
-    lead_created = False
+    # 10. Lead extraction and the rolling summary run after the reply, off the
+    # critical path; they are queued once the caller commits this turn
     if conversation.ai_mode == "lead_capture" and not conversation.lead:
-        lead = await _try_extract_lead(
-            db, conversation, prop, message_text, guest_identifier, channel
-        )
-        if lead:
-            lead_created = True
+        schedule_lead_extraction(db, conversation, guest_identifier, channel)
+    if summary_due(conversation):
+        schedule_summary(db, conversation)
 
     # 11. Handle handoff mode
     if conversation.ai_mode == "handoff":
@@ -621,160 +949,10 @@ async def process_guest_message(
         "conversation_id": str(conversation.id),
         "mode": conversation.ai_mode,
         "is_after_hours": conversation.is_after_hours,
-        "response_time_ms": response_time_ms,
-        "lead_created": lead_created,
+        "response_time_ms": metadata["response_time_ms"],
     }
 
 
-async def _try_extract_lead(
-    db: AsyncSession,
-    conversation: Conversation,
-    prop: Business,
-    message_text: str,
-    guest_identifier: str,
-    channel: str,
-) -> Lead | None:
-    """
-    Attempt to create a lead from the conversation.
-    Uses a lightweight LLM call to extract structured info.
-    """
-    # Build the full conversation text
-    # Explicitly fetch all messages
-    msgs_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation.id)
-        .order_by(Message.sent_at)
-    )
-    messages = msgs_result.scalars().all()
-    
-    full_conversation = "\n".join(
-        f"{msg.role}: {msg.content}" for msg in messages
-    )
-
-    system_instruction = (
-        "Extract guest info from this hotel inquiry conversation. "
-        "Return ONLY a JSON object (no markdown) with keys: "
-        "guest_name (string or null), guest_email (string or null), "
-        "guest_phone (string or null), intent (one of: room_booking, "
-        "event, fb_inquiry, general), estimated_nights (number or null). "
-        "If info is not available, use null."
-    )
-
-    raw = None
-
-    # Attempt 1: Gemini
-    if settings.gemini_api_key and gemini_client:
-        try:
-            from google.genai import types
-            response = await gemini_client.aio.models.generate_content(
-                model=settings.gemini_model,
-                contents=full_conversation,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=0,
-                    max_output_tokens=150,
-                )
-            )
-            raw = response.text.strip()
-        except Exception as e:
-            logger.warning("Gemini lead extraction failed, trying fallback", error=str(e))
-
-    # Attempt 2: OpenAI (Fallback)
-    if not raw and settings.openai_api_key and openai_client:
-        try:
-            extraction_response = await openai_client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[
-                    {"role": "system", "content": system_instruction},
-                    {"role": "user", "content": full_conversation},
-                ],
-                max_tokens=150,
-                temperature=0,
-            )
-            raw = extraction_response.choices[0].message.content.strip()
-        except Exception as e:
-            logger.warning("OpenAI lead extraction failed", error=str(e))
-
-    if not raw:
-        logger.warning("Lead extraction skipped: No LLM available or both failed")
-        return None
-
-    try:
-        import json
-        # Handle potential markdown code block wrapping
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[1].rsplit("```", 1)[0]
-            if raw.startswith("json\n"):
-                raw = raw[5:]
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[1].rsplit("```", 1)[0]
-        extracted = json.loads(raw)
-    except Exception as e:
-        logger.warning("Lead extraction LLM call failed", error=str(e))
-        return None
-
-    # Only create lead if we have at least a name or contact
-    guest_name = extracted.get("guest_name")
-    guest_phone = extracted.get("guest_phone")
-    guest_email = extracted.get("guest_email")
-
-    # Use channel-provided info as fallback
-    if channel == "whatsapp" and not guest_phone:
-        guest_phone = guest_identifier
-    if channel == "email" and not guest_email:
-        guest_email = guest_identifier
-
-    if not guest_name and not guest_phone and not guest_email:
-        return None
-
-    # Estimate value based on intent and business ADR
-    estimated_nights = extracted.get("estimated_nights") or 1
-    estimated_value = Decimal(str(estimated_nights)) * Decimal("0")
-
-    # Rule-based Lead Scoring
-    intent = extracted.get("intent", "general")
-    priority = "standard"
-    flag_reason = None
-    
-    # 1. High Value Keywords
-    high_value_keywords = ["wedding", "group", "corporate", "event", "conference"]
-    if any(kw in message_text.lower() for kw in high_value_keywords):
-        priority = "high_value"
-        flag_reason = "Keyword match (Event/Group)"
-        
-    # 2. Stay Duration
-    elif estimated_nights > 5:
-        priority = "high_value"
-        flag_reason = "Long stay (>5 nights)"
-        
-    # 3. Calculated Value
-    elif estimated_value > (Decimal("0") * 3):
-        # Allow override if value is significantly high even if short stay (e.g. multiple rooms implied? 
-        # For now, simplistic check: if raw estimate is > 3x ADR. 
-        # Actually logic is nights * ADR, so >3 nights is > 3x ADR.
-        # Let's keep it simple: > 3 nights or high value custom quote
-        priority = "high_value"
-        flag_reason = "High estimated value"
-
-    lead = Lead(
-        conversation_id=conversation.id,
-        business_id=conversation.business_id,
-        guest_name=guest_name,
-        guest_phone=guest_phone,
-        guest_email=guest_email,
-        intent=intent,
-        source_channel=channel,
-        is_after_hours=conversation.is_after_hours,
-        estimated_value=estimated_value,
-        priority=priority,
-        flag_reason=flag_reason,
-    )
-    db.add(lead)
-    conversation.guest_name = guest_name or conversation.guest_name
-
-    return lead
-
-
 async def _call_llm_simple(prompt: str) -> str:
     """
     Simple single-turn LLM call returning raw text.
@@ -787,7 +965,8 @@ async def _call_llm_simple(prompt: str) -> str:
     if settings.gemini_api_key and gemini_client:
         try:
             from google.genai import types as _types
-            response = await gemini_client.aio.models.generate_content(
+            response = await gemini_breaker.call(
+                gemini_client.aio.models.generate_content,
                 model=settings.gemini_model,
                 contents=[_types.Content(role="user", parts=[_types.Part.from_text(text=prompt)])],
                 config=_types.GenerateContentConfig(temperature=0.0, max_output_tokens=256),
@@ -801,7 +980,8 @@ async def _call_llm_simple(prompt: str) -> str:
     # Attempt 2: OpenAI
     if settings.openai_api_key and openai_client:
         try:
-            resp = await openai_client.chat.completions.create(
+            resp = await openai_breaker.call(
+                openai_client.chat.completions.create,
                 model=settings.openai_model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=256,
@@ -0,0 +1,336 @@
+"""
+Conversation Memory — rolling summaries and token-budgeted prompt packing.
+
+Long threads (weddings, events) used to send a fixed 15 verbatim messages and
+still lose anything older. Instead each turn's prompt is packed into a fixed
+input-token budget per model:
+
+1. the newest message (always sent),
+2. the conversation's rolling summary of everything older,
+3. KB hits, up to LLM_KB_BUDGET_SHARE of what is left,
+4. as many recent messages as still fit, newest first.
+
+The rolling summary lives on Conversation.summary. Every
+CONVERSATION_SUMMARY_EVERY_TURNS guest turns a post-reply job (kind
+"conversation_summary" on the post-reply queue, queued once the turn commits)
+folds the messages since the last
+summary into it, keeping the newest CONVERSATION_SUMMARY_KEEP_RECENT verbatim.
+Conversation.summary_state records the (sent_at, id) cursor of the last
+summarized message, so history queries only read what comes after it. The
+summary call runs with thinking disabled, and an answer cut off at
+CONVERSATION_SUMMARY_MAX_OUTPUT_TOKENS is discarded with the cursor left in
+place, so a truncated summary never replaces the messages it covered.
+"""
+
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import structlog
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import run_after_commit
+from app.models import Conversation, Message
+from app.services.circuit_breaker import gemini_breaker, openai_breaker
+from app.services.inbound_queue import post_reply_queue
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+JOB_KIND = "conversation_summary"
+
+# Tokens reserved for the per-turn prompt sections other than summary and KB
+# (time, operating status, guest context, lead progress, headings)
+TURN_OVERHEAD_TOKENS = 300
+
+SUMMARY_PROMPT = """You keep a running summary of a hotel guest conversation for the AI concierge.
+Merge the CURRENT SUMMARY with the NEW MESSAGES into one updated summary of at most 150 words.
+Keep every concrete fact: guest name and contacts, dates, nights, number of guests, room
+preferences, occasion, budget, requests, prices quoted, promises made and open questions.
+Drop greetings and small talk. Write plain sentences, no headings.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}
+
+UPDATED SUMMARY:"""
+
+
+# ─────────────────────────────────────────────────────────────
+# Token estimation
+# ─────────────────────────────────────────────────────────────
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base, loaded once; None if unavailable (e.g. no network for its BPE file)."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("tiktoken unavailable, estimating tokens from length", error=str(e))
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of `text`. cl100k_base is a close enough proxy for every provider we use."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def input_token_budget() -> int:
+    """Per-turn input budget: the smallest budget among the configured providers' models."""
+    models = [
+        model
+        for model, configured in (
+            (settings.gemini_model, settings.gemini_api_key),
+            (settings.anthropic_model, settings.anthropic_api_key),
+            (settings.openai_model, settings.openai_api_key),
+        )
+        if configured
+    ]
+    budgets = [settings.llm_input_token_budgets.get(model, settings.llm_input_token_budget) for model in models]
+    return min(budgets, default=settings.llm_input_token_budget)
+
+
+# ─────────────────────────────────────────────────────────────
+# Packing
+# ─────────────────────────────────────────────────────────────
+
+def _history_entry(message) -> dict:
+    # Wrap guest message in XML tags for robustness (Audit R4)
+    if message.role == "guest":
+        return {"role": "user", "content": f"<guest_message>{message.content}</guest_message>"}
+    if message.role == "ai":
+        return {"role": "assistant", "content": message.content}
+    return {"role": "user", "content": message.content}
+
+
+def _kb_entry(doc) -> str:
+    return f"[{doc.doc_type.upper()}] {doc.title}:\n{doc.content}"
+
+
+@dataclass
+class PackedContext:
+    """What fits in the turn's budget."""
+    history: list[dict]  # Chronological LLM messages
+    messages: list = field(default_factory=list)  # The Message rows behind `history`
+    summary: str | None = None
+    kb_context: str = "No business information available yet."
+    tokens: int = 0  # Estimated tokens of history + summary + KB
+
+
+def pack_context(
+    budget_tokens: int,
+    recent_messages: list,
+    summary: str | None,
+    kb_docs: list,
+) -> PackedContext:
+    """
+    Fit summary, KB hits and recent messages (newest first) into `budget_tokens`.
+    The newest message is always included, even if it alone exceeds the budget.
+    """
+    packed = PackedContext(history=[])
+    remaining = budget_tokens
+    kept = []
+
+    if recent_messages:
+        newest = recent_messages[0]
+        kept.append(newest)
+        remaining -= estimate_tokens(_history_entry(newest)["content"])
+
+    if summary:
+        cost = estimate_tokens(summary)
+        if cost <= remaining:
+            packed.summary = summary
+            remaining -= cost
+
+    kb_budget = int(max(remaining, 0) * settings.llm_kb_budget_share)
+    kb_parts = []
+    for doc in kb_docs:
+        cost = estimate_tokens(_kb_entry(doc))
+        if cost > kb_budget:
+            break
+        kb_parts.append(_kb_entry(doc))
+        kb_budget -= cost
+        remaining -= cost
+    if kb_parts:
+        packed.kb_context = "\n\n".join(kb_parts)
+
+    for message in recent_messages[1:]:
+        cost = estimate_tokens(_history_entry(message)["content"])
+        if cost > remaining:
+            break
+        kept.append(message)
+        remaining -= cost
+
+    kept.reverse()
+    # Anthropic and Gemini expect the history to open with a user turn
+    while len(kept) > 1 and kept[0].role == "ai":
+        remaining += estimate_tokens(kept.pop(0).content)
+    packed.messages = kept
+    packed.history = [_history_entry(m) for m in kept]
+    packed.tokens = budget_tokens - remaining
+    return packed
+
+
+async def fetch_recent_messages(db: AsyncSession, conversation: Conversation) -> list:
+    """Newest-first messages not yet covered by the rolling summary (at most CONVERSATION_HISTORY_MAX_MESSAGES)."""
+    query = select(Message).where(Message.conversation_id == conversation.id)
+    query = _after_cursor(query, (conversation.summary_state or {}).get("cursor"))
+    result = await db.execute(
+        query.order_by(Message.sent_at.desc(), Message.id.desc()).limit(settings.conversation_history_max_messages)
+    )
+    return list(result.scalars().all())
+
+
+def _after_cursor(query, cursor: list | None):
+    if not cursor:
+        return query
+    sent_at, last_id = datetime.fromisoformat(cursor[0]), uuid.UUID(cursor[1])
+    return query.where(
+        or_(
+            Message.sent_at > sent_at,
+            and_(Message.sent_at == sent_at, Message.id > last_id),
+        )
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+# Rolling summary
+# ─────────────────────────────────────────────────────────────
+
+def summary_due(conversation: Conversation) -> bool:
+    every = settings.conversation_summary_every_turns
+    if every <= 0:
+        return False
+    summarized_turns = (conversation.summary_state or {}).get("turns", 0)
+    return (conversation.message_count or 0) - summarized_turns >= every
+
+
+def schedule_summary(db: AsyncSession, conversation: Conversation):
+    """Queue a rolling-summary update once this turn commits. Failures are logged; a later turn retries."""
+    payload = {"business_id": str(conversation.business_id), "conversation_id": str(conversation.id)}
+
+    async def enqueue():
+        try:
+            await post_reply_queue.enqueue(JOB_KIND, f"summary:{payload['conversation_id']}", payload)
+        except Exception as e:
+            logger.warning("Conversation summary scheduling failed", conversation_id=payload["conversation_id"], error=str(e))
+
+    run_after_commit(db, enqueue)
+
+
+async def _handle_summary(business_id: str, conversation_id: str):
+    """Queue handler: fold older messages into the summary in its own session."""
+    from app.database import async_session, set_db_context
+
+    async with async_session() as db:
+        await set_db_context(db, business_id)
+        conversation = await db.get(Conversation, uuid.UUID(conversation_id))
+        if conversation is None or not summary_due(conversation):
+            return
+        await update_summary(db, conversation)
+        await db.commit()
+
+
+async def _call_summary_llm(prompt: str) -> str | None:
+    """
+    Summary text from Gemini, then OpenAI, each through its shared circuit
+    breaker. None if both fail or the answer was truncated.
+    """
+    from app.services.conversation import gemini_client, openai_client
+
+    max_tokens = settings.conversation_summary_max_output_tokens
+
+    if settings.gemini_api_key and gemini_client:
+        try:
+            from google.genai import types
+            response = await gemini_breaker.call(
+                gemini_client.aio.models.generate_content,
+                model=settings.gemini_model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=0,
+                    max_output_tokens=max_tokens,
+                    # Thinking tokens count against max_output_tokens and would crowd out the summary
+                    thinking_config=types.ThinkingConfig(thinking_budget=0),
+                ),
+            )
+            if response.candidates and response.candidates[0].finish_reason == types.FinishReason.MAX_TOKENS:
+                logger.warning("Gemini conversation summary truncated, discarding it", max_tokens=max_tokens)
+            elif text := (response.text or "").strip():
+                return text
+        except Exception as e:
+            logger.warning("Gemini conversation summary failed, trying fallback", error=str(e))
+
+    if settings.openai_api_key and openai_client:
+        try:
+            response = await openai_breaker.call(
+                openai_client.chat.completions.create,
+                model=settings.openai_model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=0,
+            )
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                logger.warning("OpenAI conversation summary truncated, discarding it", max_tokens=max_tokens)
+            elif text := (choice.message.content or "").strip():
+                return text
+        except Exception as e:
+            logger.warning("OpenAI conversation summary failed", error=str(e))
+
+    return None
+
+
+async def update_summary(db: AsyncSession, conversation: Conversation) -> bool:
+    """
+    Summarize the messages after the cursor except the newest KEEP_RECENT.
+    Returns True if the summary changed. A failed or truncated LLM call leaves
+    everything as it was, so the next due turn retries.
+    """
+    state = dict(conversation.summary_state or {})
+    query = _after_cursor(
+        select(Message.id, Message.role, Message.content, Message.sent_at)
+        .where(Message.conversation_id == conversation.id),
+        state.get("cursor"),
+    )
+    rows = (await db.execute(query.order_by(Message.sent_at, Message.id))).all()
+    to_fold = rows[: max(len(rows) - settings.conversation_summary_keep_recent, 0)]
+
+    changed = False
+    if to_fold:
+        prompt = SUMMARY_PROMPT.format(
+            summary=conversation.summary or "(none yet)",
+            messages="\n".join(f"{row.role}: {row.content}" for row in to_fold),
+        )
+        summary = await _call_summary_llm(prompt)
+        if summary is None:
+            logger.warning("Conversation summary skipped", conversation_id=str(conversation.id))
+            return False
+        conversation.summary = summary
+        state["cursor"] = [to_fold[-1].sent_at.isoformat(), str(to_fold[-1].id)]
+        state["messages"] = state.get("messages", 0) + len(to_fold)
+        changed = True
+
+    # Count the turns as handled even when everything is still recent, so we don't reschedule every turn
+    state["turns"] = conversation.message_count or 0
+    conversation.summary_state = state
+    return changed
+
+
+post_reply_queue.register_handler(JOB_KIND, _handle_summary, coalesce=lambda payloads: payloads[-1])
@@ -13,6 +13,7 @@ from sendgrid.helpers.mail import Mail, Email, To, Content, Cc
 
 from app.config import get_settings
 from app.services.response_formatter import format_response
+from app.services.circuit_breaker import sendgrid_breaker
 
 settings = get_settings()
 logger = structlog.get_logger()
@@ -89,6 +90,10 @@ async def send_email(
             body=formatted,
         )
 
+    if not await sendgrid_breaker.can_execute():
+        logger.warning("SendGrid circuit open, email skipped", to_email=to_email, subject=subject)
+        return {"status": "skipped", "reason": "circuit_open"}
+
     try:
         sg = SendGridAPIClient(settings.sendgrid_api_key)
         from_email = Email(settings.sendgrid_from_email)
@@ -103,11 +108,13 @@ async def send_email(
 
         loop = asyncio.get_running_loop()
         response = await loop.run_in_executor(None, sg.send, mail)
+        await sendgrid_breaker.record_success()
 
         logger.info("Email sent", to_email=to_email, status_code=response.status_code)
         return {"status": "sent", "status_code": response.status_code}
 
     except Exception as e:
+        await sendgrid_breaker.record_failure()
         logger.error("SendGrid email failed", error=str(e), to_email=to_email)
         return {"status": "error", "detail": str(e)}
 
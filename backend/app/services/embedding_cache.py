@@ -0,0 +1,141 @@
+"""
+Query Embedding Cache — skips the embedding round trip for repeat guest questions.
+
+Two tiers:
+- In-process LRU (always on, bounded by EMBEDDING_CACHE_SIZE)
+- Redis (optional, EMBEDDING_CACHE_REDIS_TTL > 0 and a real Redis connection)
+
+Keys are derived from the normalized query text plus the embedding model and
+dimension, so changing either setting naturally starts a fresh cache.
+The Redis tier is skipped when app.core.redis is on its in-memory fallback:
+that store has no eviction and would just duplicate the LRU without a bound.
+"""
+
+import base64
+import hashlib
+import re
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+import structlog
+
+from app.config import get_settings
+from app.core.redis import get_redis
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.,;:~]+$")
+
+
+def normalize_query(text_content: str) -> str:
+    """Canonical form for cache lookups: NFKC, case-folded, collapsed whitespace, no trailing punctuation."""
+    normalized = unicodedata.normalize("NFKC", text_content).casefold()
+    normalized = _WHITESPACE_RE.sub(" ", normalized).strip()
+    return _TRAILING_PUNCT_RE.sub("", normalized)
+
+
+def _encode(vector: list[float]) -> str:
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def _decode(payload: str) -> list[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(payload))
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    Normalized text → embedding vector cache with hit/miss counters.
+
+    Usage:
+        vector = await embedding_cache.get(query, model, dims)
+        if vector is None:
+            vector = await embed(query)
+            await embedding_cache.set(query, model, dims, vector)
+    """
+
+    def __init__(self, max_size: int, redis_ttl: int = 0):
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(text_content: str, model: str, dimensions: int) -> str:
+        digest = hashlib.sha256(normalize_query(text_content).encode("utf-8")).hexdigest()
+        return f"emb:{model}:{dimensions}:{digest}"
+
+    async def _redis(self):
+        if self.redis_ttl <= 0:
+            return None
+        redis = await get_redis()
+        return redis if redis.client else None
+
+    def _remember(self, key: str, vector: list[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, text_content: str, model: str, dimensions: int) -> list[float] | None:
+        key = self.make_key(text_content, model, dimensions)
+
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+
+        redis = await self._redis()
+        if redis:
+            try:
+                payload = await redis.get(key)
+            except Exception as e:
+                logger.warning("Embedding cache Redis read failed", error=str(e))
+                payload = None
+            if payload:
+                vector = _decode(payload)
+                self._remember(key, vector)
+                self.redis_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    async def set(self, text_content: str, model: str, dimensions: int, vector: list[float]):
+        key = self.make_key(text_content, model, dimensions)
+        self._remember(key, vector)
+
+        redis = await self._redis()
+        if redis:
+            try:
+                await redis.set(key, _encode(vector), expire=self.redis_ttl)
+            except Exception as e:
+                logger.warning("Embedding cache Redis write failed", error=str(e))
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters for monitoring."""
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._lru),
+            "max_size": self.max_size,
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.memory_hits + self.redis_hits) / lookups, 4) if lookups else None,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    max_size=settings.embedding_cache_size,
+    redis_ttl=settings.embedding_cache_redis_ttl,
+)
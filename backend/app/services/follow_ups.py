@@ -0,0 +1,207 @@
+"""
+Automated Follow-ups — 24h / 72h / 7d nudges for conversations that went quiet.
+
+Conversation.next_follow_up_at holds when the next follow-up is due: the last
+real interaction plus the delay for the current follow_up_stage, or NULL once
+all three have been sent. process_guest_message keeps it current on every
+guest turn, so due selection is a single indexed range scan
+(ix_conversations_next_follow_up, partial on status = 'active').
+
+Each run takes at most FOLLOW_UP_MAX_PER_RUN due conversations, no more than
+FOLLOW_UP_MAX_PER_BUSINESS from any one business, interleaved so that a large
+backlog at one business can't starve the others. A bounded pool of
+FOLLOW_UP_WORKERS handles them, one session per conversation. Workers stop
+taking new conversations once FOLLOW_UP_TIME_BUDGET_SECONDS have passed;
+whatever is left stays due and is picked up by the next run.
+"""
+
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import structlog
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models import Business, Conversation
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+# Delay after the last real interaction before follow-up stage N+1 is sent
+FOLLOW_UP_DELAYS = (timedelta(hours=24), timedelta(hours=72), timedelta(days=7))
+
+
+def next_follow_up_at(last_interaction_at: datetime | None, follow_up_stage: int) -> datetime | None:
+    """When the follow-up after `follow_up_stage` is due; None once all have been sent."""
+    if last_interaction_at is None or follow_up_stage >= len(FOLLOW_UP_DELAYS):
+        return None
+    return last_interaction_at + FOLLOW_UP_DELAYS[follow_up_stage]
+
+
+@dataclass(frozen=True)
+class _Delivery:
+    """The business fields needed to send a follow-up, read once per run."""
+    name: str
+    whatsapp_provider: str | None
+    twilio_phone_number: str | None
+
+
+async def select_due_follow_ups(db: AsyncSession, now: datetime) -> list[tuple[uuid.UUID, uuid.UUID]]:
+    """(conversation_id, business_id) of due conversations, round-robin across businesses."""
+    ranked = (
+        select(
+            Conversation.id,
+            Conversation.business_id,
+            Conversation.next_follow_up_at,
+            func.row_number()
+            .over(partition_by=Conversation.business_id, order_by=Conversation.next_follow_up_at)
+            .label("business_rank"),
+        )
+        .where(
+            Conversation.status == "active",
+            Conversation.next_follow_up_at <= now,
+        )
+        .subquery()
+    )
+    result = await db.execute(
+        select(ranked.c.id, ranked.c.business_id)
+        .where(ranked.c.business_rank <= settings.follow_up_max_per_business)
+        .order_by(ranked.c.business_rank, ranked.c.next_follow_up_at)
+        .limit(settings.follow_up_max_per_run)
+    )
+    return [(row.id, row.business_id) for row in result.all()]
+
+
+async def _load_deliveries(db: AsyncSession, business_ids: set[uuid.UUID]) -> dict[uuid.UUID, _Delivery]:
+    result = await db.execute(
+        select(Business.id, Business.name, Business.whatsapp_provider, Business.twilio_phone_number)
+        .where(Business.id.in_(business_ids))
+    )
+    return {
+        row.id: _Delivery(row.name, row.whatsapp_provider, row.twilio_phone_number)
+        for row in result.all()
+    }
+
+
+async def run_follow_ups() -> dict:
+    """Send every due follow-up this run's budget allows. Returns counters for logging."""
+    from app.database import async_session
+
+    started = time.monotonic()
+    deadline = started + settings.follow_up_time_budget_seconds
+    now = datetime.now(timezone.utc)
+
+    async with async_session() as db:
+        due = await select_due_follow_ups(db, now)
+        deliveries = await _load_deliveries(db, {business_id for _, business_id in due}) if due else {}
+
+    stats = {"due": len(due), "sent": 0, "skipped": 0, "failed": 0, "deferred": 0}
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in due:
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            conversation_id, business_id = queue.get_nowait()
+            if time.monotonic() >= deadline:
+                stats["deferred"] += 1
+                continue
+            delivery = deliveries.get(business_id)
+            if delivery is None:
+                stats["skipped"] += 1
+                continue
+            try:
+                sent = await _follow_up_conversation(conversation_id, business_id, delivery, now)
+                stats["sent" if sent else "skipped"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.error("Failed to send follow up", conversation_id=str(conversation_id), error=str(e))
+
+    workers = min(settings.follow_up_workers, len(due))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    stats["elapsed_seconds"] = round(time.monotonic() - started, 1)
+    return stats
+
+
+async def _follow_up_conversation(
+    conversation_id: uuid.UUID,
+    business_id: uuid.UUID,
+    delivery: _Delivery,
+    now: datetime,
+) -> bool:
+    """
+    Generate and send the next follow-up for one conversation in its own session.
+    The row is locked (SKIP LOCKED) and re-checked, so overlapping runs or a
+    guest reply in the meantime never produce a duplicate or stale nudge.
+    Returns False if the conversation was no longer due.
+    """
+    from app.database import async_session, set_db_context
+    from app.services.conversation import process_guest_message
+
+    async with async_session() as db:
+        await set_db_context(db, str(business_id))
+        result = await db.execute(
+            select(Conversation)
+            .where(
+                Conversation.id == conversation_id,
+                Conversation.status == "active",
+                Conversation.next_follow_up_at <= now,
+            )
+            .with_for_update(skip_locked=True)
+        )
+        conversation = result.scalar_one_or_none()
+        if conversation is None:
+            return False
+
+        target_stage = conversation.follow_up_stage + 1
+        conversation.follow_up_stage = target_stage
+        conversation.next_follow_up_at = next_follow_up_at(conversation.last_interaction_at, target_stage)
+        guest_identifier, channel = conversation.guest_identifier, conversation.channel
+
+        # Process system triggered follow up
+        response = await process_guest_message(
+            db=db,
+            business_id=business_id,
+            guest_identifier=guest_identifier,
+            channel=channel,
+            message_text="",  # System triggered
+            guest_name=conversation.guest_name,
+            is_follow_up=True,
+        )
+        await db.commit()
+
+    await _deliver(channel, guest_identifier, response["response"], delivery)
+    logger.info("Sent follow-up", conversation_id=str(conversation_id), stage=target_stage)
+    return True
+
+
+async def _deliver(channel: str, guest_identifier: str, reply_text: str, delivery: _Delivery):
+    """Deliver via correct channel integration"""
+    from app.services.email import send_email
+    from app.services.twilio_whatsapp import send_twilio_message
+    from app.services.whatsapp import send_whatsapp_message
+
+    if channel == "whatsapp":
+        if delivery.whatsapp_provider == "twilio":
+            await send_twilio_message(
+                to_number=guest_identifier,
+                message_text=reply_text,
+                from_number=delivery.twilio_phone_number,
+            )
+        else:
+            await send_whatsapp_message(
+                to_number=guest_identifier,
+                message_text=reply_text,
+            )
+    elif channel == "email":
+        await send_email(
+            to_email=guest_identifier,
+            subject="Following up on your inquiry",
+            content=reply_text,
+            hotel_name=delivery.name,
+        )
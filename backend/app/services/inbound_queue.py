@@ -0,0 +1,657 @@
+"""
+Inbound Message Queue — durable, per-conversation-ordered webhook processing.
+
+Webhooks enqueue a job and return immediately; workers run the AI engine and
+send the reply. Guarantees:
+
+- Ordering per conversation: a job's ordering key (business_id:guest) picks a
+  partition, and each partition is consumed by exactly one worker at a time,
+  so two messages from the same guest are never processed concurrently or out
+  of order.
+- Concurrency across conversations: partitions run in parallel, bounded by
+  INBOUND_QUEUE_WORKERS concurrent handler executions per instance.
+- Ack/retry: a failed job is retried in place (exponential backoff) up to
+  INBOUND_QUEUE_MAX_ATTEMPTS, then moved to the dead-letter store and the
+  kind's on_dead_letter hook runs (e.g. send the guest a fallback reply).
+- Coalescing (opt-in per kind, off unless INBOUND_COALESCE_WINDOW_SECONDS > 0):
+  rapid-fire jobs for the same ordering key are merged into one handler call.
+  Each key's burst is held by its own debounce timer, outside the partition
+  buffer, until the conversation has been quiet for the window (measured from
+  webhook receipt, capped at INBOUND_COALESCE_MAX_WAIT_SECONDS); then the
+  kind's `coalesce` function gets every payload of the burst. The partition
+  worker never waits on a burst, so other guests on the partition are not
+  delayed. A job of another kind for the same key releases the burst first,
+  so it stays ordered after it.
+
+Two queues run on this class, each with its own streams, leases and worker
+pool: inbound_queue for guest messages, and post_reply_queue for work that
+follows a committed turn (lead extraction, rolling summaries), so slow
+background LLM calls never hold an inbound partition or worker slot. Redis
+keys below are shown for "inbound"; post_reply_queue uses "post_reply".
+
+Backends:
+- Redis Streams (real Redis connection): one stream per partition
+  (inbound:p{n}) with a consumer group. Instances take a renewable lease per
+  partition, so a partition has one owner cluster-wide, and the owner runs a
+  blocking reader per partition that hands entries to the partition worker as
+  soon as they arrive (an idle partition never delays a busy one). Each instance
+  heartbeats into inbound:instances and holds at most its fair share,
+  ceil(partitions / live instances): when an instance joins, the others hand
+  off surplus partitions between jobs. A lease whose renewal fails is dropped
+  locally at once, since it may already belong to someone else. Un-acked
+  entries stay pending and are re-read by the next lease owner after a
+  restart, crash or hand-off. Dead letters go to the inbound:dead stream.
+- In-process stand-in (app.core.redis on its in-memory fallback): per-partition
+  asyncio queues with the same ordering, pool bound and retry semantics, but
+  jobs do not survive an instance restart. Dead letters are kept in memory.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+import structlog
+
+from app.config import get_settings
+from app.core.redis import get_redis
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+
+# Entries read ahead per partition before the reader waits for the worker to catch up
+_READ_AHEAD = 10
+_READ_BLOCK_MS = 2000
+
+# Extend the lease only if we still own it
+_RENEW_LEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+Handler = Callable[..., Awaitable[Any]]
+Coalescer = Callable[[list[dict]], dict]
+
+
+@dataclass(frozen=True)
+class _HandlerSpec:
+    handler: Handler
+    on_dead_letter: Handler | None = None
+    coalesce: Coalescer | None = None
+
+
+Batch = list[tuple[str | None, dict]]  # (entry_id, job) handled by one handler call
+
+
+class _PartitionBuffer:
+    """FIFO of batches for one partition."""
+
+    def __init__(self):
+        self._items: deque[Batch] = deque()
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+
+    def put(self, batch: Batch):
+        self._items.append(batch)
+        self._ready.set()
+
+    async def get(self) -> Batch:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        self._room.set()
+        return self._items.popleft()
+
+    async def wait_for_room(self, limit: int):
+        """Wait until fewer than `limit` batches are queued."""
+        while len(self._items) >= limit:
+            self._room.clear()
+            await self._room.wait()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+
+@dataclass
+class _Burst:
+    """A conversation's coalescable jobs, held until it has been quiet for the window."""
+    kind: str
+    items: Batch
+    timer: asyncio.TimerHandle | None = None
+
+
+class InboundQueue:
+    """Partitioned work queue for inbound guest messages."""
+
+    def __init__(
+        self,
+        partitions: int,
+        workers: int,
+        max_attempts: int,
+        retry_backoff_seconds: float,
+        lease_seconds: int,
+        dead_letter_max: int,
+        coalesce_window_seconds: float = 0.0,
+        coalesce_max_wait_seconds: float = 0.0,
+        name: str = "inbound",
+    ):
+        self.name = name
+        self.partitions = partitions
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.dead_letter_max = dead_letter_max
+        self.coalesce_window_seconds = coalesce_window_seconds
+        self.coalesce_max_wait_seconds = max(coalesce_max_wait_seconds, coalesce_window_seconds)
+        self.instance_id = uuid.uuid4().hex
+
+        self._handlers: dict[str, _HandlerSpec] = {}
+        self._semaphore = asyncio.Semaphore(workers)
+        self._local: dict[int, _PartitionBuffer] = {}
+        self._bursts: dict[int, dict[str, _Burst]] = {}
+        self._partition_tasks: dict[int, asyncio.Task] = {}
+        self._reader_tasks: dict[int, asyncio.Task] = {}
+        self._owned: set[int] = set()
+        self._busy: set[int] = set()
+        self._live_instances = 1
+        self._background: set[asyncio.Task] = set()
+        self._dead_letters: deque[dict] = deque(maxlen=dead_letter_max)
+        self._redis = None
+        self._started = False
+
+        self.enqueued = 0
+        self.processed = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.coalesced = 0
+        self.in_flight = 0
+
+    # ── Registration / enqueue ────────────────────────────────────────────────
+
+    def register_handler(
+        self,
+        kind: str,
+        handler: Handler,
+        on_dead_letter: Handler | None = None,
+        coalesce: Coalescer | None = None,
+    ):
+        """
+        Route jobs of `kind` to `handler(**payload)`; `on_dead_letter(**payload)` runs after the final failure.
+        With `coalesce`, jobs for the same ordering key arriving within the coalescing
+        window are merged via `coalesce([payload, ...]) -> payload` (oldest first).
+        """
+        self._handlers[kind] = _HandlerSpec(handler, on_dead_letter, coalesce)
+
+    def partition_for(self, ordering_key: str) -> int:
+        return zlib.crc32(ordering_key.encode("utf-8")) % self.partitions
+
+    async def enqueue(self, kind: str, ordering_key: str, payload: dict) -> str:
+        """Enqueue one job. `payload` must be JSON-serializable (UUIDs are sent as strings)."""
+        ids = await self.enqueue_many([(kind, ordering_key, payload)])
+        return ids[0]
+
+    async def enqueue_many(self, jobs: list[tuple[str, str, dict]]) -> list[str]:
+        """Enqueue (kind, ordering_key, payload) jobs, preserving their order within each partition."""
+        if not self._started:
+            await self.start()
+
+        built = []
+        for kind, ordering_key, payload in jobs:
+            if kind not in self._handlers:
+                raise ValueError(f"No inbound queue handler registered for '{kind}'")
+            built.append({
+                "id": uuid.uuid4().hex,
+                "kind": kind,
+                "ordering_key": ordering_key,
+                "payload": payload,
+                "enqueued_at": time.time(),
+            })
+
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for job in built:
+                    stream = self._stream(self.partition_for(job["ordering_key"]))
+                    pipe.xadd(stream, {"job": json.dumps(job, default=str)})
+                await pipe.execute()
+                self.enqueued += len(built)
+                return [job["id"] for job in built]
+            except Exception as e:
+                # Never drop a webhook: degrade to in-process delivery for this batch
+                logger.error("Inbound queue XADD failed, processing in-process", error=str(e))
+
+        for job in built:
+            self._dispatch(self.partition_for(job["ordering_key"]), None, job)
+        self.enqueued += len(built)
+        return [job["id"] for job in built]
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        redis = await get_redis()
+        if redis.client is None:
+            logger.info("Inbound queue using in-process stand-in (no Redis)")
+            return
+
+        self._redis = redis.client
+        try:
+            for partition in range(self.partitions):
+                try:
+                    await self._redis.xgroup_create(
+                        self._stream(partition), self._group, id="0", mkstream=True
+                    )
+                except Exception as e:
+                    if "BUSYGROUP" not in str(e):
+                        raise
+        except Exception as e:
+            logger.warning("Inbound queue Redis setup failed, using in-process stand-in", error=str(e))
+            self._redis = None
+            return
+
+        self._spawn(self._lease_loop())
+        logger.info(
+            "Inbound queue started on Redis Streams",
+            queue=self.name, partitions=self.partitions, instance=self.instance_id,
+        )
+
+    async def stop(self):
+        """Stop consuming and release partition leases (pending entries stay in Redis)."""
+        tasks = list(self._background) + list(self._partition_tasks.values()) + list(self._reader_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._partition_tasks.clear()
+        self._reader_tasks.clear()
+        for partition in list(self._bursts):
+            self._drop_bursts(partition)
+        if self._redis is not None:
+            for partition in list(self._owned):
+                try:
+                    await self._redis.eval(_RELEASE_LEASE_LUA, 1, self._lease_key(partition), self.instance_id)
+                except Exception:
+                    pass
+            try:
+                await self._redis.zrem(self._instances_key, self.instance_id)
+            except Exception:
+                pass
+        self._owned.clear()
+        self._started = False
+
+    # ── Redis Streams consumer ────────────────────────────────────────────────
+
+    def _stream(self, partition: int) -> str:
+        return f"{self.name}:p{partition}"
+
+    def _lease_key(self, partition: int) -> str:
+        return f"{self.name}:lease:{partition}"
+
+    @property
+    def _instances_key(self) -> str:
+        return f"{self.name}:instances"
+
+    @property
+    def _dead_letter_stream(self) -> str:
+        return f"{self.name}:dead"
+
+    @property
+    def _group(self) -> str:
+        return f"{self.name}-workers"
+
+    @staticmethod
+    def _consumer(partition: int) -> str:
+        # One consumer name per partition (not per instance), so the next lease
+        # owner can re-read entries a crashed owner left pending.
+        return f"p{partition}"
+
+    async def _lease_loop(self):
+        while True:
+            await self._renew_leases()
+            try:
+                await self._balance_leases()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Inbound queue lease refresh failed", error=str(e))
+            await asyncio.sleep(max(1, self.lease_seconds // 3))
+
+    async def _renew_leases(self):
+        for partition in sorted(self._owned):
+            try:
+                renewed = await self._redis.eval(
+                    _RENEW_LEASE_LUA, 1, self._lease_key(partition), self.instance_id, self.lease_seconds
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The lease may expire and be taken over before we can tell; stop processing now
+                logger.warning("Inbound queue lease renewal failed, releasing partition", partition=partition, error=str(e))
+                renewed = False
+            if not renewed:
+                logger.warning("Inbound queue lease lost", partition=partition)
+                self._release_local(partition)
+
+    async def _heartbeat(self) -> int:
+        """Register this instance as live; returns the number of live instances."""
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zadd(self._instances_key, {self.instance_id: now})
+        pipe.zremrangebyscore(self._instances_key, "-inf", now - self.lease_seconds)
+        pipe.zcard(self._instances_key)
+        results = await pipe.execute()
+        return max(int(results[-1]), 1)
+
+    def fair_share(self, live_instances: int) -> int:
+        return -(-self.partitions // max(live_instances, 1))
+
+    async def _balance_leases(self):
+        """Hand off partitions above the fair share (between jobs), then acquire free ones up to it."""
+        self._live_instances = await self._heartbeat()
+        share = self.fair_share(self._live_instances)
+
+        for partition in sorted(self._owned, reverse=True):
+            if len(self._owned) <= share:
+                break
+            if partition in self._busy:
+                continue  # Handed off on a later round, once its current job is done
+            await self._redis.eval(_RELEASE_LEASE_LUA, 1, self._lease_key(partition), self.instance_id)
+            self._release_local(partition)
+            logger.info("Inbound queue partition handed off", partition=partition, fair_share=share)
+
+        # Start from an instance-specific offset so instances don't all race for partition 0
+        offset = int(self.instance_id, 16) % self.partitions
+        for i in range(self.partitions):
+            if len(self._owned) >= share:
+                break
+            partition = (offset + i) % self.partitions
+            if partition in self._owned:
+                continue
+            if await self._redis.set(self._lease_key(partition), self.instance_id, nx=True, ex=self.lease_seconds):
+                self._owned.add(partition)
+                self._ensure_partition_worker(partition)
+                await self._load_pending(partition)
+                self._reader_tasks[partition] = self._spawn(self._partition_reader(partition))
+
+    def _release_local(self, partition: int):
+        self._owned.discard(partition)
+        for tasks in (self._reader_tasks, self._partition_tasks):
+            task = tasks.pop(partition, None)
+            if task:
+                task.cancel()
+        # Entries still queued or held locally remain pending in Redis for the new owner
+        self._local.pop(partition, None)
+        self._drop_bursts(partition)
+
+    async def _load_pending(self, partition: int):
+        """Re-read entries delivered to this partition's consumer but never acked."""
+        response = await self._redis.xreadgroup(
+            self._group, self._consumer(partition), {self._stream(partition): "0"}, count=1000
+        )
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                self._deliver(partition, entry_id, fields)
+
+    async def _partition_reader(self, partition: int):
+        """
+        Read one owned partition's new entries and deliver them as soon as the
+        blocking read returns. Runs until the lease is released; entries read
+        but not yet handled stay pending for the partition's consumer name.
+        """
+        buffer = self._local[partition]
+        while True:
+            await buffer.wait_for_room(_READ_AHEAD)
+            try:
+                response = await self._redis.xreadgroup(
+                    self._group,
+                    self._consumer(partition),
+                    {self._stream(partition): ">"},
+                    count=_READ_AHEAD,
+                    block=_READ_BLOCK_MS,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Inbound queue read failed", partition=partition, error=str(e))
+                await asyncio.sleep(1)
+                continue
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    self._deliver(partition, entry_id, fields)
+
+    def _deliver(self, partition: int, entry_id: str, fields: dict):
+        if partition not in self._owned:
+            return
+        try:
+            job = json.loads(fields["job"])
+        except Exception:
+            logger.error("Inbound queue dropped undecodable entry", entry_id=entry_id)
+            self._spawn(self._ack(partition, entry_id))
+            return
+        self._dispatch(partition, entry_id, job)
+
+    async def _ack(self, partition: int, entry_id: str | None):
+        if entry_id is None or self._redis is None:
+            return
+        try:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.xack(self._stream(partition), self._group, entry_id)
+            pipe.xdel(self._stream(partition), entry_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Inbound queue ack failed", partition=partition, entry_id=entry_id, error=str(e))
+
+    # ── Workers ───────────────────────────────────────────────────────────────
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _ensure_partition_worker(self, partition: int):
+        if partition not in self._local:
+            self._local[partition] = _PartitionBuffer()
+        task = self._partition_tasks.get(partition)
+        if task is None or task.done():
+            self._partition_tasks[partition] = asyncio.create_task(self._partition_worker(partition))
+
+    def _dispatch(self, partition: int, entry_id: str | None, job: dict):
+        """Queue a job on its partition, or hold it in its conversation's burst if its kind coalesces."""
+        self._ensure_partition_worker(partition)
+        key = job["ordering_key"]
+        burst = self._bursts.get(partition, {}).get(key)
+        if burst is not None and burst.kind != job["kind"]:
+            self._flush_burst(partition, key)  # This job must stay ordered after the burst
+            burst = None
+
+        spec = self._handlers.get(job["kind"])
+        if not (spec and spec.coalesce and self.coalesce_window_seconds > 0):
+            self._local[partition].put([(entry_id, job)])
+            return
+
+        if burst is None:
+            burst = self._bursts.setdefault(partition, {})[key] = _Burst(job["kind"], [])
+        burst.items.append((entry_id, job))
+        if burst.timer is not None:
+            burst.timer.cancel()
+        quiet_until = job["enqueued_at"] + self.coalesce_window_seconds
+        deadline_cap = burst.items[0][1]["enqueued_at"] + self.coalesce_max_wait_seconds
+        delay = min(quiet_until, deadline_cap) - time.time()
+        if delay <= 0:
+            self._flush_burst(partition, key)
+        else:
+            burst.timer = asyncio.get_running_loop().call_later(delay, self._flush_burst, partition, key)
+
+    def _flush_burst(self, partition: int, key: str):
+        burst = self._bursts.get(partition, {}).pop(key, None)
+        if burst is None:
+            return
+        if burst.timer is not None:
+            burst.timer.cancel()
+        buffer = self._local.get(partition)
+        if buffer is not None:
+            buffer.put(burst.items)
+
+    def _drop_bursts(self, partition: int):
+        for burst in self._bursts.pop(partition, {}).values():
+            if burst.timer is not None:
+                burst.timer.cancel()
+
+    async def _partition_worker(self, partition: int):
+        buffer = self._local[partition]
+        while True:
+            batch = await buffer.get()
+            job = batch[0][1]
+            if len(batch) > 1:
+                job = self._merge(self._handlers[job["kind"]], [j for _, j in batch])
+            self._busy.add(partition)
+            try:
+                await self._process(job)
+                for batch_entry_id, _ in batch:
+                    await self._ack(partition, batch_entry_id)
+            finally:
+                self._busy.discard(partition)
+
+    def _merge(self, spec: _HandlerSpec, jobs: list[dict]) -> dict:
+        self.coalesced += len(jobs) - 1
+        logger.info(
+            "Inbound jobs coalesced",
+            kind=jobs[0]["kind"],
+            ordering_key=jobs[0]["ordering_key"],
+            count=len(jobs),
+        )
+        return {**jobs[-1], "payload": spec.coalesce([j["payload"] for j in jobs])}
+
+    async def _process(self, job: dict):
+        spec = self._handlers.get(job["kind"])
+        if spec is None:
+            await self._dead_letter(job, f"No handler registered for '{job['kind']}'", attempts=0)
+            return
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self._semaphore:
+                    self.in_flight += 1
+                    try:
+                        await spec.handler(**job["payload"])
+                    finally:
+                        self.in_flight -= 1
+                self.processed += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_attempts:
+                    await self._dead_letter(job, str(e), attempts=attempt)
+                    if spec.on_dead_letter:
+                        try:
+                            await spec.on_dead_letter(**job["payload"])
+                        except Exception as hook_err:
+                            logger.error("Inbound queue dead-letter hook failed", kind=job["kind"], error=str(hook_err))
+                    return
+                self.retries += 1
+                delay = self.retry_backoff_seconds * (2 ** (attempt - 1))
+                logger.warning(
+                    "Inbound job failed, retrying",
+                    kind=job["kind"],
+                    job_id=job["id"],
+                    attempt=attempt,
+                    retry_in=delay,
+                    error=str(e),
+                )
+                await asyncio.sleep(delay)
+
+    async def _dead_letter(self, job: dict, error: str, attempts: int):
+        self.dead_lettered += 1
+        record = {
+            "job": job,
+            "error": error,
+            "attempts": attempts,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        logger.error("Inbound job dead-lettered", kind=job["kind"], job_id=job["id"], error=error)
+        if self._redis is not None:
+            try:
+                await self._redis.xadd(
+                    self._dead_letter_stream,
+                    {"record": json.dumps(record, default=str)},
+                    maxlen=self.dead_letter_max,
+                    approximate=True,
+                )
+                return
+            except Exception as e:
+                logger.warning("Inbound queue dead-letter write failed, keeping in memory", error=str(e))
+        self._dead_letters.append(record)
+
+    # ── Introspection ─────────────────────────────────────────────────────────
+
+    async def get_dead_letters(self, limit: int = 50) -> list[dict]:
+        """Most recent dead-lettered jobs (newest first)."""
+        records = list(reversed(self._dead_letters))[:limit]
+        if self._redis is not None and len(records) < limit:
+            try:
+                entries = await self._redis.xrevrange(self._dead_letter_stream, count=limit - len(records))
+                records.extend(json.loads(fields["record"]) for _, fields in entries)
+            except Exception as e:
+                logger.warning("Inbound queue dead-letter read failed", error=str(e))
+        return records
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": "redis_streams" if self._redis is not None else "in_process",
+            "partitions": self.partitions,
+            "owned_partitions": len(self._owned) if self._redis is not None else len(self._local),
+            "live_instances": self._live_instances,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued_locally": sum(q.qsize() for q in self._local.values()),
+            "held_for_coalescing": sum(len(b.items) for bursts in self._bursts.values() for b in bursts.values()),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "coalesced": self.coalesced,
+        }
+
+
+inbound_queue = InboundQueue(
+    partitions=settings.inbound_queue_partitions,
+    workers=settings.inbound_queue_workers,
+    max_attempts=settings.inbound_queue_max_attempts,
+    retry_backoff_seconds=settings.inbound_queue_retry_backoff_seconds,
+    lease_seconds=settings.inbound_queue_lease_seconds,
+    dead_letter_max=settings.inbound_queue_dead_letter_max,
+    coalesce_window_seconds=settings.inbound_coalesce_window_seconds,
+    coalesce_max_wait_seconds=settings.inbound_coalesce_max_wait_seconds,
+)
+
+post_reply_queue = InboundQueue(
+    name="post_reply",
+    partitions=settings.post_reply_queue_partitions,
+    workers=settings.post_reply_queue_workers,
+    max_attempts=settings.inbound_queue_max_attempts,
+    retry_backoff_seconds=settings.inbound_queue_retry_backoff_seconds,
+    lease_seconds=settings.inbound_queue_lease_seconds,
+    dead_letter_max=settings.inbound_queue_dead_letter_max,
+    coalesce_window_seconds=settings.post_reply_coalesce_window_seconds,
+    coalesce_max_wait_seconds=settings.post_reply_coalesce_max_wait_seconds,
+)
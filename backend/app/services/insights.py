@@ -1,17 +1,41 @@
 """
 Insights service for determining guest sentiment and extracting common FAQs over time.
 Used to generate the '30-Day Guest Insight Report' marketed to businesses.
+
+The report is a streaming map-reduce, so busy properties fit in bounded memory
+and LLM context:
+
+1. Stream messages of the period's conversations in (started_at, conversation,
+   sent_at) order through a server-side cursor.
+2. Pack whole conversations into chunks of at most INSIGHTS_CHUNK_TOKENS
+   (a conversation longer than that is split). Chunk boundaries are content
+   defined: a chunk also ends after any conversation whose ID hashes to
+   0 mod INSIGHTS_CHUNK_CONVERSATIONS, so when the 30-day window moves or a
+   conversation grows, the other chunks stay byte-identical.
+3. Map: summarize chunks with at most INSIGHTS_MAP_CONCURRENCY Gemini calls in
+   flight. Summaries are cached in Redis by chunk digest
+   (insights:chunk:v{N}:{model}:{sha256}), so a rerun only summarizes new or
+   changed chunks.
+4. Reduce: merge the summaries in token-budgeted groups until they fit
+   INSIGHTS_REDUCE_TOKENS, then write the report from them.
 """
 
+import asyncio
+import hashlib
 import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 import structlog
 from google import genai
 
+from app.core.redis import get_redis
 from app.models import Conversation, Message
 from app.config import get_settings
+from app.services.conversation_memory import estimate_tokens
 
 settings = get_settings()
 logger = structlog.get_logger()
@@ -20,7 +44,7 @@ logger = structlog.get_logger()
 gemini_client = genai.Client(api_key=settings.gemini_api_key) if settings.gemini_api_key else None
 
 INSIGHT_SYSTEM_INSTRUCTION = """
-Analyze the following batch of hotel guest inquiry transcripts from the last 30 days.
+Analyze the following summaries of hotel guest inquiry transcripts from the last 30 days.
 Extract the following insights into a clear, professional summary report:
 1. Top 3 most frequently asked questions.
 2. Top 3 common objections or reasons for handoff (e.g., "Price too high", "Requested early check-in not available").
@@ -29,13 +53,234 @@ Extract the following insights into a clear, professional summary report:
 Output format should be clean markdown that can be sent directly in an email block.
 """
 
+CHUNK_SYSTEM_INSTRUCTION = """
+Summarize the following batch of hotel guest inquiry transcripts for a monthly insight report.
+List, with approximate counts:
+- the questions guests asked,
+- objections and reasons for handoff,
+- sentiment signals (praise, complaints, frustration).
+Be factual and concise (at most 200 words). Plain text, no preamble.
+"""
+
+MERGE_SYSTEM_INSTRUCTION = """
+Merge the following partial summaries of hotel guest conversations into one summary.
+Add up counts of the same question, objection or sentiment signal.
+Be factual and concise (at most 300 words). Plain text, no preamble.
+"""
+
+# Bump when the chunk prompt or transcript format changes, so cached summaries are not reused
+CHUNK_CACHE_VERSION = 1
+
+_MIN_TRANSCRIPT_WORDS = 50
+
+
+@dataclass(frozen=True)
+class TranscriptChunk:
+    index: int
+    text: str
+    conversations: int
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+
+def _closes_chunk(conversation_id: uuid.UUID) -> bool:
+    every = settings.insights_chunk_conversations
+    return every > 0 and conversation_id.int % every == 0
+
+
+def _split_lines(lines: list[str], budget: int) -> list[list[str]]:
+    """Split one oversized conversation into pieces that fit `budget`."""
+    pieces, current, tokens = [], [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if current and tokens + cost > budget:
+            pieces.append(current)
+            current, tokens = [], 0
+        current.append(line)
+        tokens += cost
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+async def _stream_conversations(
+    db: AsyncSession, business_id: uuid.UUID, cutoff_date: datetime
+) -> AsyncIterator[tuple[uuid.UUID, list[str]]]:
+    """(conversation_id, transcript lines) per conversation, read through a server-side cursor."""
+    result = await db.stream(
+        select(Message.conversation_id, Message.role, Message.content)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(
+            Conversation.business_id == business_id,
+            Conversation.started_at >= cutoff_date,
+        )
+        .order_by(Conversation.started_at, Conversation.id, Message.sent_at, Message.id)
+        .execution_options(yield_per=settings.insights_stream_batch_size)
+    )
+    current, lines = None, []
+    async for conversation_id, role, content in result:
+        if conversation_id != current:
+            if lines:
+                yield current, lines
+            current = conversation_id
+            lines = [f"--- Conversation {conversation_id} ---"]
+        lines.append(f"{role}: {content}")
+    if lines:
+        yield current, lines
+
+
+async def iter_transcript_chunks(
+    conversations: AsyncIterator[tuple[uuid.UUID, list[str]]],
+    stats: dict,
+) -> AsyncIterator[TranscriptChunk]:
+    """Pack streamed conversations into token-budgeted, content-defined chunks."""
+    budget = settings.insights_chunk_tokens
+    lines, tokens, count, index = [], 0, 0, 0
+
+    def _emit() -> TranscriptChunk:
+        nonlocal lines, tokens, count, index
+        chunk = TranscriptChunk(index, "\n".join(lines), count)
+        lines, tokens, count, index = [], 0, 0, index + 1
+        return chunk
+
+    async for conversation_id, conversation_lines in conversations:
+        stats["conversations"] += 1
+        stats["words"] += sum(len(line.split()) for line in conversation_lines[1:])
+        cost = sum(estimate_tokens(line) for line in conversation_lines)
+
+        if cost > budget:
+            if lines:
+                yield _emit()
+            for piece in _split_lines(conversation_lines, budget):
+                lines, count = piece, 1
+                yield _emit()
+            continue
+
+        if lines and tokens + cost > budget:
+            yield _emit()
+        lines.extend(conversation_lines)
+        tokens += cost
+        count += 1
+        if _closes_chunk(conversation_id):
+            yield _emit()
+
+    if lines:
+        yield _emit()
+
+
+async def _generate(contents: str, instruction: str, temperature: float = 0.3) -> str:
+    from google.genai import types
+    response = await asyncio.wait_for(
+        gemini_client.aio.models.generate_content(
+            model=settings.gemini_model,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                system_instruction=instruction,
+                temperature=temperature,
+            ),
+        ),
+        timeout=settings.insights_llm_timeout_seconds,
+    )
+    return response.text.strip()
+
+
+def _chunk_cache_key(chunk: TranscriptChunk) -> str:
+    return f"insights:chunk:v{CHUNK_CACHE_VERSION}:{settings.gemini_model}:{chunk.digest}"
+
+
+async def summarize_chunk(chunk: TranscriptChunk, stats: dict) -> str | None:
+    """Cached chunk summary, or a fresh one. None if the LLM call failed (not cached, retried next run)."""
+    key = _chunk_cache_key(chunk)
+    try:
+        redis = await get_redis()
+        cached = await redis.get(key)
+    except Exception as e:
+        logger.warning("Insights chunk cache lookup failed", error=str(e))
+        redis, cached = None, None
+    if cached:
+        stats["cached_chunks"] += 1
+        return cached
+
+    try:
+        summary = await _generate(chunk.text, CHUNK_SYSTEM_INSTRUCTION, temperature=0.2)
+    except Exception as e:
+        stats["failed_chunks"] += 1
+        logger.warning("Insights chunk summary failed", chunk=chunk.index, error=str(e))
+        return None
+    stats["summarized_chunks"] += 1
+
+    if redis is not None and summary:
+        try:
+            await redis.set(key, summary, expire=settings.insights_chunk_cache_ttl_seconds)
+        except Exception as e:
+            logger.warning("Insights chunk cache store failed", error=str(e))
+    return summary
+
+
+async def map_chunks(chunks: AsyncIterator[TranscriptChunk], stats: dict) -> list[str]:
+    """
+    Summarize chunks as they are produced, at most INSIGHTS_MAP_CONCURRENCY at a
+    time. The queue is bounded too, so only a few chunk texts are ever in memory.
+    """
+    concurrency = max(settings.insights_map_concurrency, 1)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    summaries: dict[int, str] = {}
+
+    async def worker():
+        while (chunk := await queue.get()) is not None:
+            if summary := await summarize_chunk(chunk, stats):
+                summaries[chunk.index] = summary
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for chunk in chunks:
+            stats["chunks"] += 1
+            await queue.put(chunk)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    return [summaries[i] for i in sorted(summaries)]
+
+
+async def reduce_summaries(summaries: list[str]) -> str:
+    """Merge summaries group by group until they fit the reduce budget, then write the report."""
+    budget = settings.insights_reduce_tokens
+    semaphore = asyncio.Semaphore(max(settings.insights_map_concurrency, 1))
+
+    async def _merge(group: list[str]) -> str:
+        if len(group) == 1:
+            return group[0]
+        async with semaphore:
+            return await _generate("\n\n---\n\n".join(group), MERGE_SYSTEM_INSTRUCTION, temperature=0.2)
+
+    while len(summaries) > 1 and sum(estimate_tokens(s) for s in summaries) > budget:
+        groups, current, tokens = [], [], 0
+        for summary in summaries:
+            cost = estimate_tokens(summary)
+            if current and tokens + cost > budget:
+                groups.append(current)
+                current, tokens = [], 0
+            current.append(summary)
+            tokens += cost
+        groups.append(current)
+        if len(groups) == len(summaries):
+            break  # Every summary alone fills the budget; merging can't shrink further
+        summaries = await asyncio.gather(*(_merge(group) for group in groups))
+    return await _generate("\n\n---\n\n".join(summaries), INSIGHT_SYSTEM_INSTRUCTION)
+
+
 async def compute_monthly_insights(
     db: AsyncSession,
     business_id: uuid.UUID,
     days_back: int = 30
 ) -> str | None:
     """
-    Fetch all conversations over the last N days and run them through Gemini to
+    Stream the last N days of conversations through a map-reduce over Gemini to
     extract high-level insights for the business manager.
     """
     if not gemini_client:
@@ -43,62 +288,37 @@ async def compute_monthly_insights(
         return None
 
     cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_back)
+    stats = {
+        "conversations": 0, "words": 0, "chunks": 0,
+        "cached_chunks": 0, "summarized_chunks": 0, "failed_chunks": 0,
+    }
 
-    # 1. Fetch conversations from the last 30 days
-    conv_result = await db.execute(
-        select(Conversation.id)
-        .where(
-            Conversation.business_id == business_id,
-            Conversation.started_at >= cutoff_date
-        )
-    )
-    conversation_ids = [row[0] for row in conv_result.fetchall()]
-
-    if not conversation_ids:
+    chunks = iter_transcript_chunks(_stream_conversations(db, business_id, cutoff_date), stats)
+    # Hold back the first chunks until the data is known to be worth an LLM call
+    leading = []
+    async for chunk in chunks:
+        leading.append(chunk)
+        if stats["words"] >= _MIN_TRANSCRIPT_WORDS:
+            break
+    if not leading:
         return "Not enough data collected in the last 30 days to generate an insight report."
+    if stats["words"] < _MIN_TRANSCRIPT_WORDS:
+        return "Insufficient conversational data to extract meaningful insights."
 
-    # 2. Fetch messages for these conversations
-    msg_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id.in_(conversation_ids))
-        .order_by(Message.conversation_id, Message.sent_at)
-    )
-    messages = msg_result.scalars().all()
-
-    # 3. Build a massive transcript block
-    transcript_blocks = []
-    current_conv = None
-    current_block = []
-
-    for msg in messages:
-        if msg.conversation_id != current_conv:
-            if current_block:
-                transcript_blocks.append("\n".join(current_block))
-            current_conv = msg.conversation_id
-            current_block = [f"\n--- Conversation {current_conv} ---"]
-        current_block.append(f"{msg.role}: {msg.content}")
-
-    if current_block:
-        transcript_blocks.append("\n".join(current_block))
-
-    full_transcript = "\n".join(transcript_blocks)
+    async def _all_chunks():
+        for chunk in leading:
+            yield chunk
+        async for chunk in chunks:
+            yield chunk
 
-    if len(full_transcript.split()) < 50:
-        return "Insufficient conversational data to extract meaningful insights."
+    summaries = await map_chunks(_all_chunks(), stats)
+    logger.info("Generating Monthly Insights Report", business_id=str(business_id), **stats)
+    if not summaries:
+        logger.error("Failed to generate insights report", business_id=str(business_id), error="no chunk summaries")
+        return "Error analyzing transcripts. Please try again later."
 
-    # 4. Generate Insight Report using Gemini
-    logger.info("Generating Monthly Insights Report", business_id=str(business_id), transcript_words=len(full_transcript.split()))
     try:
-        from google.genai import types
-        response = await gemini_client.aio.models.generate_content(
-            model=settings.gemini_model,
-            contents=full_transcript,
-            config=types.GenerateContentConfig(
-                system_instruction=INSIGHT_SYSTEM_INSTRUCTION,
-                temperature=0.3,
-            )
-        )
-        return response.text.strip()
+        return await reduce_summaries(summaries)
     except Exception as e:
         logger.error("Failed to generate insights report", business_id=str(business_id), error=str(e))
         return "Error analyzing transcripts. Please try again later."
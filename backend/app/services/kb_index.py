@@ -0,0 +1,236 @@
+"""
+In-memory Knowledge Base Vector Index — per-business NumPy retrieval.
+
+A hotel's KB is small (tens to a few hundred chunks), so instead of a pgvector
+query per guest message we hold each business's embeddings as a row-normalized
+float32 matrix and answer top-k with a single dot product.
+
+Lifecycle:
+- search_knowledge_base asks the index first; on a miss it answers via pgvector
+  and warms the index in the background with its own session.
+- Every KB write calls invalidate_kb_index(business_id). That drops the local
+  copy and bumps kb:version:{business_id} in Redis, so other instances notice
+  their copy is stale on the next lookup.
+- Entries also expire after KB_INDEX_TTL_SECONDS as a safety net (e.g. a write
+  that committed after an invalidation raced a background warm).
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import structlog
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.core.redis import get_redis
+from app.models import KBDocument
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+# Same relevance cut-off as the pgvector query in search_knowledge_base
+MAX_COSINE_DISTANCE = 0.8
+
+
+def _version_key(business_id: uuid.UUID) -> str:
+    return f"kb:version:{business_id}"
+
+
+async def get_kb_version(business_id: uuid.UUID) -> int:
+    """Current KB version for a business (bumped on every KB write)."""
+    redis = await get_redis()
+    return int(await redis.get(_version_key(business_id)) or 0)
+
+
+@dataclass(frozen=True)
+class _IndexedDoc:
+    id: uuid.UUID
+    business_id: uuid.UUID
+    doc_type: str
+    title: str
+    content: str
+
+
+class BusinessVectorIndex:
+    """Row-normalized embedding matrix plus the document fields needed for prompts."""
+
+    def __init__(
+        self,
+        business_id: uuid.UUID,
+        version: int,
+        docs: list[_IndexedDoc],
+        matrix: np.ndarray,
+        oversized: bool = False,
+    ):
+        self.business_id = business_id
+        self.version = version
+        self.docs = docs
+        self.matrix = matrix
+        # Oversized KBs are remembered (so we don't reload them on every message)
+        # but always answered by pgvector.
+        self.oversized = oversized
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def build(cls, business_id: uuid.UUID, version: int, rows: list) -> "BusinessVectorIndex":
+        docs, vectors = [], []
+        for row in rows:
+            if row.embedding is None:
+                continue
+            vector = np.asarray(row.embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            # Zero vectors (demo-mode embeddings) have no direction; pgvector never matches them either
+            if norm == 0:
+                continue
+            vectors.append(vector / norm)
+            docs.append(_IndexedDoc(row.id, row.business_id, row.doc_type, row.title, row.content))
+
+        dims = settings.embedding_dimensions
+        matrix = np.vstack(vectors) if vectors else np.empty((0, dims), dtype=np.float32)
+        return cls(business_id, version, docs, matrix)
+
+    def search(self, query_embedding: list[float], limit: int) -> list[KBDocument]:
+        """Top-`limit` docs by cosine similarity, same cut-off as the pgvector path."""
+        if not self.docs:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != self.matrix.shape[1]:
+            return []
+
+        similarities = self.matrix @ (query / norm)
+        candidates = np.flatnonzero(1.0 - similarities < MAX_COSINE_DISTANCE)
+        if candidates.size > limit:
+            top = np.argpartition(-similarities[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        ordered = candidates[np.argsort(-similarities[candidates], kind="stable")]
+
+        # Transient (never session-attached) KBDocuments keep the caller's contract
+        return [
+            KBDocument(
+                id=self.docs[i].id,
+                business_id=self.docs[i].business_id,
+                doc_type=self.docs[i].doc_type,
+                title=self.docs[i].title,
+                content=self.docs[i].content,
+            )
+            for i in ordered
+        ]
+
+
+class KnowledgeBaseIndex:
+    """LRU of per-business vector indexes with Redis-versioned invalidation."""
+
+    def __init__(self, max_businesses: int, ttl_seconds: int, max_docs: int):
+        self.max_businesses = max_businesses
+        self.ttl_seconds = ttl_seconds
+        self.max_docs = max_docs
+        self._indexes: OrderedDict[uuid.UUID, BusinessVectorIndex] = OrderedDict()
+        self._warming: set[uuid.UUID] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+
+    async def search(self, business_id: uuid.UUID, query_embedding: list[float], limit: int) -> list[KBDocument] | None:
+        """Answer from memory, or return None on a miss (caller falls back to pgvector)."""
+        index = self._indexes.get(business_id)
+        if index is not None:
+            expired = time.monotonic() - index.loaded_at > self.ttl_seconds
+            if expired or index.version != await get_kb_version(business_id):
+                self._indexes.pop(business_id, None)
+                index = None
+
+        if index is None:
+            self.misses += 1
+            self._schedule_warm(business_id)
+            return None
+
+        self._indexes.move_to_end(business_id)
+        if index.oversized:
+            return None
+        self.hits += 1
+        return index.search(query_embedding, limit)
+
+    async def load(self, db: AsyncSession, business_id: uuid.UUID) -> BusinessVectorIndex:
+        """Load a business's embeddings into memory. KBs above KB_INDEX_MAX_DOCS are marked oversized."""
+        version = await get_kb_version(business_id)
+        result = await db.execute(
+            select(
+                KBDocument.id,
+                KBDocument.business_id,
+                KBDocument.doc_type,
+                KBDocument.title,
+                KBDocument.content,
+                KBDocument.embedding,
+            )
+            .where(KBDocument.business_id == business_id)
+            .limit(self.max_docs + 1)
+        )
+        rows = result.all()
+        if len(rows) > self.max_docs:
+            logger.info("KB too large for in-memory index, using pgvector", business_id=str(business_id))
+            index = BusinessVectorIndex(
+                business_id, version, [], np.empty((0, 0), dtype=np.float32), oversized=True
+            )
+        else:
+            index = BusinessVectorIndex.build(business_id, version, rows)
+
+        self._indexes[business_id] = index
+        self._indexes.move_to_end(business_id)
+        while len(self._indexes) > self.max_businesses:
+            self._indexes.popitem(last=False)
+        return index
+
+    def _schedule_warm(self, business_id: uuid.UUID):
+        if business_id in self._warming:
+            return
+        self._warming.add(business_id)
+        task = asyncio.create_task(self._warm(business_id))
+        # Hold a reference so the task isn't garbage-collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _warm(self, business_id: uuid.UUID):
+        from app.database import async_session, set_db_context
+        try:
+            async with async_session() as db:
+                await set_db_context(db, str(business_id))
+                await self.load(db, business_id)
+        except Exception as e:
+            logger.warning("KB index warm failed", business_id=str(business_id), error=str(e))
+        finally:
+            self._warming.discard(business_id)
+
+    async def invalidate(self, business_id: uuid.UUID):
+        self._indexes.pop(business_id, None)
+        redis = await get_redis()
+        await redis.incr(_version_key(business_id))
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": settings.kb_index_enabled,
+            "businesses": len(self._indexes),
+            "documents": sum(len(i.docs) for i in self._indexes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+kb_index = KnowledgeBaseIndex(
+    max_businesses=settings.kb_index_max_businesses,
+    ttl_seconds=settings.kb_index_ttl_seconds,
+    max_docs=settings.kb_index_max_docs,
+)
+
+
+async def invalidate_kb_index(business_id: uuid.UUID):
+    """Call after any KB write for `business_id` (create/update/delete/ingest)."""
+    try:
+        await kb_index.invalidate(business_id)
+    except Exception as e:
+        logger.warning("KB index invalidation failed", business_id=str(business_id), error=str(e))
@@ -0,0 +1,277 @@
+"""
+Streaming lead export — CSV, NDJSON or Parquet, optionally gzipped.
+
+Leads are read in keyset batches (captured_at DESC, id DESC) with a session
+owned by the generator, so the export outlives the request's get_db session
+and never holds more than one batch in memory. Each batch is encoded and
+yielded to StreamingResponse as soon as it is fetched.
+"""
+
+import csv
+import io
+import json
+import uuid
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import AsyncIterator
+
+import structlog
+from sqlalchemy import and_, or_, select
+
+from app.config import get_settings
+from app.database import async_session, set_db_context
+from app.models import Lead
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+
+# (CSV header, NDJSON/Parquet field name)
+EXPORT_COLUMNS = [
+    ("Name", "guest_name"),
+    ("Phone", "guest_phone"),
+    ("Email", "guest_email"),
+    ("Intent", "intent"),
+    ("Status", "status"),
+    ("Estimated Value (RM)", "estimated_value"),
+    ("Actual Revenue (RM)", "actual_revenue"),
+    ("Priority", "priority"),
+    ("Channel", "source_channel"),
+    ("After Hours", "is_after_hours"),
+    ("Captured At", "captured_at"),
+]
+
+_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+@dataclass(frozen=True)
+class LeadExportFilters:
+    business_id: uuid.UUID
+    status: str | None = None
+    intent: str | None = None
+    from_date: date | None = None
+    to_date: date | None = None
+
+
+def export_filename(business_id: uuid.UUID, fmt: str, gzipped: bool) -> str:
+    name = f"leads_{business_id}_{date.today().isoformat()}.{fmt}"
+    return f"{name}.gz" if gzipped else name
+
+
+def export_media_type(fmt: str, gzipped: bool) -> str:
+    return "application/gzip" if gzipped else _MEDIA_TYPES[fmt]
+
+
+async def iter_lead_batches(filters: LeadExportFilters, batch_size: int) -> AsyncIterator[list]:
+    """Yield lists of lead rows (newest first) using keyset pagination."""
+    columns = [getattr(Lead, field) for _, field in EXPORT_COLUMNS]
+    base = select(*columns, Lead.id).where(Lead.business_id == filters.business_id)
+    if filters.status:
+        base = base.where(Lead.status == filters.status)
+    if filters.intent:
+        base = base.where(Lead.intent == filters.intent)
+    if filters.from_date:
+        base = base.where(Lead.captured_at >= datetime.combine(filters.from_date, datetime.min.time()))
+    if filters.to_date:
+        base = base.where(Lead.captured_at <= datetime.combine(filters.to_date, datetime.max.time()))
+    base = base.order_by(Lead.captured_at.desc(), Lead.id.desc()).limit(batch_size)
+
+    async with async_session() as db:
+        await set_db_context(db, str(filters.business_id))
+        cursor = None
+        while True:
+            query = base
+            if cursor is not None:
+                last_captured_at, last_id = cursor
+                query = query.where(
+                    or_(
+                        Lead.captured_at < last_captured_at,
+                        and_(Lead.captured_at == last_captured_at, Lead.id < last_id),
+                    )
+                )
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            cursor = (rows[-1].captured_at, rows[-1].id)
+
+
+def _money(value) -> float | None:
+    return float(value) if value is not None else None
+
+
+class _CsvEncoder:
+    def header(self) -> bytes:
+        return self._encode([[h for h, _ in EXPORT_COLUMNS]])
+
+    def encode(self, rows: list) -> bytes:
+        return self._encode(
+            [
+                row.guest_name or "",
+                row.guest_phone or "",
+                row.guest_email or "",
+                row.intent or "",
+                row.status or "",
+                float(row.estimated_value) if row.estimated_value else "",
+                float(row.actual_revenue) if row.actual_revenue else "",
+                row.priority or "",
+                row.source_channel or "",
+                "Yes" if row.is_after_hours else "No",
+                row.captured_at.isoformat() if row.captured_at else "",
+            ]
+            for row in rows
+        )
+
+    def finish(self) -> bytes:
+        return b""
+
+    @staticmethod
+    def _encode(rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+
+class _NdjsonEncoder:
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: list) -> bytes:
+        lines = []
+        for row in rows:
+            record = {field: getattr(row, field) for _, field in EXPORT_COLUMNS}
+            record["estimated_value"] = _money(row.estimated_value)
+            record["actual_revenue"] = _money(row.actual_revenue)
+            record["captured_at"] = row.captured_at.isoformat() if row.captured_at else None
+            lines.append(json.dumps(record, ensure_ascii=False))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each batch."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _ParquetEncoder:
+    """One Parquet row group per batch, streamed through a ParquetWriter."""
+
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ("guest_name", pa.string()),
+            ("guest_phone", pa.string()),
+            ("guest_email", pa.string()),
+            ("intent", pa.string()),
+            ("status", pa.string()),
+            ("estimated_value", pa.float64()),
+            ("actual_revenue", pa.float64()),
+            ("priority", pa.string()),
+            ("source_channel", pa.string()),
+            ("is_after_hours", pa.bool_()),
+            ("captured_at", pa.timestamp("us", tz="UTC")),
+        ])
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema, compression="zstd")
+
+    def header(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows: list) -> bytes:
+        columns = {field: [getattr(row, field) for row in rows] for _, field in EXPORT_COLUMNS}
+        columns["estimated_value"] = [_money(v) for v in columns["estimated_value"]]
+        columns["actual_revenue"] = [_money(v) for v in columns["actual_revenue"]]
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def _make_encoder(fmt: str):
+    if fmt == "csv":
+        return _CsvEncoder()
+    if fmt == "ndjson":
+        return _NdjsonEncoder()
+    return _ParquetEncoder()
+
+
+def check_export_format(fmt: str):
+    """Raise ValueError if `fmt` is unknown or its optional dependency is missing."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow to be installed")
+
+
+async def stream_leads_export(
+    filters: LeadExportFilters,
+    fmt: str = "csv",
+    gzipped: bool = False,
+) -> AsyncIterator[bytes]:
+    """Encode leads batch by batch and yield the bytes for StreamingResponse."""
+    encoder = _make_encoder(fmt)
+    # wbits=31 → gzip container, so the download is a regular .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzipped else None
+    exported = 0
+
+    def _emit(chunk: bytes) -> bytes:
+        return compressor.compress(chunk) if compressor and chunk else chunk
+
+    if data := _emit(encoder.header()):
+        yield data
+
+    async for rows in iter_lead_batches(filters, settings.leads_export_batch_size):
+        exported += len(rows)
+        if data := _emit(encoder.encode(rows)):
+            yield data
+
+    if data := _emit(encoder.finish()):
+        yield data
+    if compressor:
+        yield compressor.flush()
+
+    logger.info(
+        "Leads export streamed",
+        business_id=str(filters.business_id),
+        format=fmt,
+        gzipped=gzipped,
+        rows=exported,
+    )
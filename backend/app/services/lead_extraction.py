@@ -0,0 +1,303 @@
+"""
+Incremental Lead Extraction — pulls guest details out of lead_capture conversations after the reply.
+
+Extraction is a post-reply stage: process_guest_message only schedules it, so
+the guest's reply never waits on a second LLM round trip. The job is queued
+once the turn's transaction commits (so it always sees the turn) on the
+post-reply queue (kind "lead_extraction", ordered per conversation), which
+gives it retries and coalesces a burst of turns into a single extraction
+without occupying the inbound queue's partitions or workers.
+
+Each run is incremental. Conversation.lead_extraction holds the details
+extracted so far plus a (sent_at, id) cursor of the last message read; the
+LLM only sees those known details and the messages after the cursor, and
+returns the complete updated details as JSON-schema structured output. Once a
+name or contact is known the Lead is created and extraction stops.
+"""
+
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import structlog
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.config import get_settings
+from app.database import run_after_commit
+from app.models import Conversation, Lead, Message
+from app.services.circuit_breaker import gemini_breaker, openai_breaker
+from app.services.inbound_queue import post_reply_queue
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+JOB_KIND = "lead_extraction"
+
+INTENTS = ["room_booking", "event", "fb_inquiry", "general"]
+
+# Strict JSON schema: every key present, null when unknown
+LEAD_DETAILS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "guest_name": {"type": ["string", "null"]},
+        "guest_email": {"type": ["string", "null"]},
+        "guest_phone": {"type": ["string", "null"]},
+        "intent": {"type": ["string", "null"], "enum": [*INTENTS, None]},
+        "estimated_nights": {"type": ["integer", "null"]},
+    },
+    "required": ["guest_name", "guest_email", "guest_phone", "intent", "estimated_nights"],
+    "additionalProperties": False,
+}
+
+EXTRACTION_INSTRUCTION = (
+    "You maintain the guest details for a hotel inquiry conversation. "
+    "KNOWN DETAILS were extracted from earlier messages; NEW MESSAGES are the "
+    "messages since then. Return the complete, updated details: keep known "
+    "values unless the new messages correct them, and use null for anything "
+    "still unknown. intent is one of: room_booking, event, fb_inquiry, general."
+)
+
+HIGH_VALUE_KEYWORDS = ["wedding", "group", "corporate", "event", "conference"]
+
+
+def _ordering_key(conversation_id: uuid.UUID) -> str:
+    return f"lead:{conversation_id}"
+
+
+def schedule_lead_extraction(db: AsyncSession, conversation: Conversation, guest_identifier: str, channel: str):
+    """
+    Queue an extraction for `conversation` once the current turn commits
+    (nothing is queued if it rolls back). Enqueue failures are logged, never
+    raised: the next turn reschedules.
+    """
+    payload = {
+        "business_id": str(conversation.business_id),
+        "conversation_id": str(conversation.id),
+        "guest_identifier": guest_identifier,
+        "channel": channel,
+    }
+
+    async def enqueue():
+        try:
+            await post_reply_queue.enqueue(JOB_KIND, _ordering_key(conversation.id), payload)
+        except Exception as e:
+            logger.warning("Lead extraction scheduling failed", conversation_id=payload["conversation_id"], error=str(e))
+
+    run_after_commit(db, enqueue)
+
+
+def _coalesce_extraction_jobs(payloads: list[dict]) -> dict:
+    """A burst of turns needs one extraction."""
+    return payloads[-1]
+
+
+async def _handle_lead_extraction(
+    business_id: str,
+    conversation_id: str,
+    guest_identifier: str,
+    channel: str,
+):
+    """Queue handler: run one incremental extraction in its own session."""
+    from app.database import async_session, set_db_context
+
+    async with async_session() as db:
+        await set_db_context(db, business_id)
+        result = await db.execute(
+            select(Conversation)
+            .options(selectinload(Conversation.lead))
+            .where(Conversation.id == uuid.UUID(conversation_id))
+        )
+        conversation = result.scalar_one_or_none()
+        if conversation is None or conversation.lead is not None:
+            return
+
+        lead = await extract_lead_incrementally(db, conversation, guest_identifier, channel)
+        await db.commit()
+
+    if lead:
+        logger.info("Lead captured", conversation_id=conversation_id, lead_id=str(lead.id), priority=lead.priority)
+
+
+async def _new_messages(db: AsyncSession, conversation_id: uuid.UUID, cursor: list | None, limit: int) -> list:
+    query = select(Message.id, Message.role, Message.content, Message.sent_at).where(
+        Message.conversation_id == conversation_id
+    )
+    if cursor:
+        sent_at, last_id = datetime.fromisoformat(cursor[0]), uuid.UUID(cursor[1])
+        query = query.where(
+            or_(
+                Message.sent_at > sent_at,
+                and_(Message.sent_at == sent_at, Message.id > last_id),
+            )
+        )
+    query = query.order_by(Message.sent_at, Message.id).limit(limit)
+    return (await db.execute(query)).all()
+
+
+async def extract_lead_incrementally(
+    db: AsyncSession,
+    conversation: Conversation,
+    guest_identifier: str,
+    channel: str,
+) -> Lead | None:
+    """
+    Fold the messages since the last run into conversation.lead_extraction and
+    create the Lead once there is a name or contact. Returns the new Lead, if any.
+    """
+    state = dict(conversation.lead_extraction or {})
+    details = dict(state.get("details") or {})
+    batch_size = settings.lead_extraction_batch_messages
+    extracted_any = False
+
+    while True:
+        rows = await _new_messages(db, conversation.id, state.get("cursor"), batch_size)
+        if not rows:
+            break
+
+        new_text = "\n".join(f"{row.role}: {row.content}" for row in rows)
+        extracted = await _call_extraction_llm(details, new_text)
+        if extracted is None:
+            # Leave the cursor where it was so these messages are retried next turn
+            break
+        extracted_any = True
+        for key, value in extracted.items():
+            if key in LEAD_DETAILS_SCHEMA["properties"] and value not in (None, ""):
+                details[key] = value
+
+        guest_text = " ".join(row.content for row in rows if row.role == "guest").lower()
+        if any(kw in guest_text for kw in HIGH_VALUE_KEYWORDS):
+            state["high_value_keyword"] = True
+        state["cursor"] = [rows[-1].sent_at.isoformat(), str(rows[-1].id)]
+        state["messages_read"] = state.get("messages_read", 0) + len(rows)
+        if len(rows) < batch_size:
+            break
+
+    if not extracted_any:
+        return None
+    state["details"] = details
+    conversation.lead_extraction = state
+    return _create_lead(db, conversation, details, state, guest_identifier, channel)
+
+
+async def _call_extraction_llm(known: dict, new_messages: str) -> dict | None:
+    """
+    Structured-output extraction: Gemini first, then OpenAI, each through its
+    shared circuit breaker so an outage fails queued jobs fast. None if both fail.
+    """
+    from app.services.conversation import gemini_client, openai_client
+
+    contents = f"KNOWN DETAILS:\n{json.dumps(known, ensure_ascii=False)}\n\nNEW MESSAGES:\n{new_messages}"
+
+    if settings.gemini_api_key and gemini_client:
+        try:
+            from google.genai import types
+            response = await gemini_breaker.call(
+                gemini_client.aio.models.generate_content,
+                model=settings.gemini_model,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    system_instruction=EXTRACTION_INSTRUCTION,
+                    temperature=0,
+                    max_output_tokens=200,
+                    # Thinking tokens count against max_output_tokens and would truncate the JSON
+                    thinking_config=types.ThinkingConfig(thinking_budget=0),
+                    response_mime_type="application/json",
+                    response_json_schema=LEAD_DETAILS_SCHEMA,
+                ),
+            )
+            return json.loads(response.text)
+        except Exception as e:
+            logger.warning("Gemini lead extraction failed, trying fallback", error=str(e))
+
+    if settings.openai_api_key and openai_client:
+        try:
+            response = await openai_breaker.call(
+                openai_client.chat.completions.create,
+                model=settings.openai_model,
+                messages=[
+                    {"role": "system", "content": EXTRACTION_INSTRUCTION},
+                    {"role": "user", "content": contents},
+                ],
+                max_tokens=200,
+                temperature=0,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": "lead_details", "strict": True, "schema": LEAD_DETAILS_SCHEMA},
+                },
+            )
+            return json.loads(response.choices[0].message.content)
+        except Exception as e:
+            logger.warning("OpenAI lead extraction failed", error=str(e))
+
+    logger.warning("Lead extraction skipped: No LLM available or both failed")
+    return None
+
+
+def _create_lead(
+    db: AsyncSession,
+    conversation: Conversation,
+    details: dict,
+    state: dict,
+    guest_identifier: str,
+    channel: str,
+) -> Lead | None:
+    # Only create lead if we have at least a name or contact
+    guest_name = details.get("guest_name")
+    guest_phone = details.get("guest_phone")
+    guest_email = details.get("guest_email")
+
+    # Use channel-provided info as fallback
+    if channel == "whatsapp" and not guest_phone:
+        guest_phone = guest_identifier
+    if channel == "email" and not guest_email:
+        guest_email = guest_identifier
+
+    if not guest_name and not guest_phone and not guest_email:
+        return None
+
+    # Estimate value based on intent and business ADR
+    estimated_nights = details.get("estimated_nights") or 1
+    estimated_value = Decimal(str(estimated_nights)) * Decimal("0")
+
+    # Rule-based Lead Scoring
+    intent = details.get("intent") or "general"
+    priority = "standard"
+    flag_reason = None
+
+    # 1. High Value Keywords
+    if state.get("high_value_keyword"):
+        priority = "high_value"
+        flag_reason = "Keyword match (Event/Group)"
+
+    # 2. Stay Duration
+    elif estimated_nights > 5:
+        priority = "high_value"
+        flag_reason = "Long stay (>5 nights)"
+
+    # 3. Calculated Value
+    elif estimated_value > (Decimal("0") * 3):
+        priority = "high_value"
+        flag_reason = "High estimated value"
+
+    lead = Lead(
+        conversation_id=conversation.id,
+        business_id=conversation.business_id,
+        guest_name=guest_name,
+        guest_phone=guest_phone,
+        guest_email=guest_email,
+        intent=intent,
+        source_channel=channel,
+        is_after_hours=conversation.is_after_hours,
+        estimated_value=estimated_value,
+        priority=priority,
+        flag_reason=flag_reason,
+    )
+    db.add(lead)
+    conversation.guest_name = guest_name or conversation.guest_name
+    return lead
+
+
+post_reply_queue.register_handler(JOB_KIND, _handle_lead_extraction, coalesce=_coalesce_extraction_jobs)
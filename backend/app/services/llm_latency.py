@@ -0,0 +1,113 @@
+"""
+LLM Latency Tracking — Per-provider latency windows that drive hedged dispatch.
+
+Every successful LLM call records its wall-clock latency against the provider.
+The hedged dispatcher in conversation._call_llm asks for the provider's p95
+and, if the primary has not answered by then, races the next provider.
+
+Only successful calls are recorded: a provider failing fast (e.g. 401, quota)
+would otherwise drag its p95 down and make us hedge too eagerly. A call
+cancelled because the other side of a hedge won is recorded too, with its
+elapsed time as a lower bound on its latency, so the slow tail the hedge cuts
+off still counts toward p95.
+"""
+
+import math
+import time
+from collections import deque
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Below this many samples the percentile is too noisy to trust
+MIN_SAMPLES_FOR_PERCENTILE = 20
+
+
+class LatencyHistogram:
+    """
+    Rolling latency window for a single provider.
+
+    Usage:
+        histogram = get_histogram("gemini")
+        start = time.monotonic()
+        result = await call_gemini(...)
+        histogram.record((time.monotonic() - start) * 1000)
+
+        delay_ms = histogram.percentile(0.95)
+    """
+
+    def __init__(self, provider: str, window_size: int = 200):
+        self.provider = provider
+        self.window_size = window_size
+        self._samples: deque[float] = deque(maxlen=window_size)
+        self.total_count = 0
+        self.last_recorded_at = 0.0
+
+    def record(self, latency_ms: float):
+        """Record a call's latency (or, for a cancelled hedge loser, a lower bound) in milliseconds."""
+        self._samples.append(float(latency_ms))
+        self.total_count += 1
+        self.last_recorded_at = time.time()
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Nearest-rank percentile over the rolling window (q in 0..1).
+        Returns None until MIN_SAMPLES_FOR_PERCENTILE samples are available.
+        """
+        if len(self._samples) < MIN_SAMPLES_FOR_PERCENTILE:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(q * len(ordered)))
+        return ordered[rank - 1]
+
+    def get_status(self) -> dict:
+        """Get latency summary for monitoring."""
+        return {
+            "provider": self.provider,
+            "samples": len(self._samples),
+            "total_count": self.total_count,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+        }
+
+
+# ─── Global Histograms ──────────────────────────────────────
+
+_histograms: dict[str, LatencyHistogram] = {}
+
+
+def get_histogram(provider: str) -> LatencyHistogram:
+    """Get or create the latency histogram for a provider."""
+    if provider not in _histograms:
+        _histograms[provider] = LatencyHistogram(provider)
+    return _histograms[provider]
+
+
+def get_all_latency_statuses() -> list[dict]:
+    """Get latency summaries of all providers (for health/monitoring)."""
+    return [h.get_status() for h in _histograms.values()]
+
+
+def get_hedge_delay_seconds(provider: str) -> float:
+    """
+    How long to wait on `provider` before racing the next one.
+
+    A fixed LLM_HEDGE_DELAY_MS overrides everything. Otherwise the provider's
+    observed percentile (LLM_HEDGE_PERCENTILE, default p95) is used, clamped to
+    [LLM_HEDGE_MIN_DELAY_MS, LLM_HEDGE_MAX_DELAY_MS]. Until enough samples exist
+    the max delay is used so a cold instance doesn't double-bill every call.
+    """
+    if settings.llm_hedge_delay_ms > 0:
+        return settings.llm_hedge_delay_ms / 1000
+
+    observed = get_histogram(provider).percentile(settings.llm_hedge_percentile)
+    if observed is None:
+        return settings.llm_hedge_max_delay_ms / 1000
+
+    delay_ms = min(
+        max(observed, settings.llm_hedge_min_delay_ms),
+        settings.llm_hedge_max_delay_ms,
+    )
+    return delay_ms / 1000
@@ -0,0 +1,288 @@
+"""
+LLM Prompt Prefix Caching — provider-side caching of the stable system prompt prefix.
+
+The system prompt is split into a per-business prefix (rules, brand persona,
+mode addendum) and a per-turn suffix (see prompt_context.SystemPrompt). Each
+provider caches the prefix its own way:
+
+- Gemini: an explicit cached-content handle holding the prefix as its system
+  instruction. Handles are managed here, one per business and mode
+  ("{business_id}:{ai_mode}"), shared across instances through Redis and
+  replaced when the prefix changes (a config write changes its digest).
+  Superseded handles are left to expire on their TTL rather than deleted,
+  since another instance may still be mid-call with one. The shared entry
+  carries the handle's absolute expiry, so every instance stops using it
+  HANDLE_REFRESH_MARGIN_SECONDS before Gemini expires it. A call that Gemini
+  rejects because the handle is gone evicts it (see is_stale_handle_error).
+- Anthropic: cache_control on the prefix block (no handle to manage).
+- OpenAI: automatic prefix caching; it only needs the prefix to come first.
+
+Every reply's usage is normalized into LLMUsage, so cached-token counts can be
+stored on the Message and summed into per-provider hit rates.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import structlog
+
+from app.config import get_settings
+from app.core.redis import get_redis
+from app.services.prompt_context import SystemPrompt
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+# Stop handing out a Gemini handle this long before it expires server-side
+HANDLE_REFRESH_MARGIN_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class LLMUsage:
+    """Token usage of one LLM reply, normalized across providers."""
+    prompt_tokens: int = 0  # All input tokens, cached or not
+    output_tokens: int = 0
+    cached_tokens: int = 0  # Input tokens served from the provider's prefix cache
+    cache_write_tokens: int = 0  # Input tokens written to the cache (Anthropic only)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+    @classmethod
+    def from_gemini(cls, usage_metadata) -> "LLMUsage | None":
+        if usage_metadata is None:
+            return None
+        return cls(
+            prompt_tokens=usage_metadata.prompt_token_count or 0,
+            output_tokens=usage_metadata.candidates_token_count or 0,
+            cached_tokens=usage_metadata.cached_content_token_count or 0,
+        )
+
+    @classmethod
+    def from_anthropic(cls, usage) -> "LLMUsage | None":
+        if usage is None:
+            return None
+        # Anthropic's input_tokens excludes the cached and cache-written parts
+        cache_read = usage.cache_read_input_tokens or 0
+        cache_write = usage.cache_creation_input_tokens or 0
+        return cls(
+            prompt_tokens=(usage.input_tokens or 0) + cache_read + cache_write,
+            output_tokens=usage.output_tokens or 0,
+            cached_tokens=cache_read,
+            cache_write_tokens=cache_write,
+        )
+
+    @classmethod
+    def from_openai(cls, usage) -> "LLMUsage | None":
+        if usage is None:
+            return None
+        details = usage.prompt_tokens_details
+        return cls(
+            prompt_tokens=usage.prompt_tokens or 0,
+            output_tokens=usage.completion_tokens or 0,
+            cached_tokens=(details.cached_tokens or 0) if details else 0,
+        )
+
+    def cache_metadata(self) -> dict:
+        """Prompt cache figures for Message.metadata_."""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "hit": self.cached_tokens > 0,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+        }
+
+
+def is_stale_handle_error(error: Exception) -> bool:
+    """True if Gemini rejected a call because its cached-content handle expired or was deleted."""
+    from google.genai import errors
+
+    if not isinstance(error, errors.APIError) or error.code not in (400, 403, 404):
+        return False
+    return "cachedcontent" in str(error).lower().replace(" ", "").replace("_", "")
+
+
+@dataclass(frozen=True)
+class _Handle:
+    digest: str
+    name: str
+    expires_at: float  # time.monotonic() deadline for handing it out
+
+
+class GeminiPrefixCache:
+    """Gemini cached-content handles for system prompt prefixes, one per business and mode."""
+
+    def __init__(self, ttl_seconds: int, max_handles: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_handles = max_handles
+        self._handles: OrderedDict[str, _Handle] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        # Prefix digests Gemini refused to cache (e.g. below its minimum size) → retry after
+        self._refused: dict[str, float] = {}
+        self.hits = 0
+        self.created = 0
+        self.failures = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _shared_key(model: str, digest: str) -> str:
+        return f"llm:prefix:gemini:{model}:{digest}"
+
+    def _lookup(self, prompt: SystemPrompt) -> str | None:
+        handle = self._handles.get(prompt.cache_slot)
+        if handle is None or handle.digest != prompt.digest or handle.expires_at <= time.monotonic():
+            return None
+        self._handles.move_to_end(prompt.cache_slot)
+        return handle.name
+
+    def _store(self, slot: str, digest: str, name: str, usable_until: float):
+        """Remember a handle until `usable_until` (wall-clock epoch seconds)."""
+        self._handles[slot] = _Handle(digest, name, time.monotonic() + usable_until - time.time())
+        self._handles.move_to_end(slot)
+        while len(self._handles) > self.max_handles:
+            self._handles.popitem(last=False)
+
+    async def resolve(self, client, model: str, prompt: SystemPrompt) -> str | None:
+        """
+        Cached-content name holding `prompt.prefix` for `model`, creating it if
+        needed. Returns None when the prefix can't be cached; the caller then
+        sends the whole prompt uncached.
+        """
+        if name := self._lookup(prompt):
+            self.hits += 1
+            return name
+        if self._refused.get(prompt.digest, 0) > time.monotonic():
+            return None
+
+        lock = self._locks.setdefault(prompt.cache_slot, asyncio.Lock())
+        async with lock:
+            # Another turn for this business may have created it while we waited
+            if name := self._lookup(prompt):
+                self.hits += 1
+                return name
+
+            shared_key = self._shared_key(model, prompt.digest)
+            try:
+                redis = await get_redis()
+                shared = _parse_shared(await redis.get(shared_key))
+            except Exception as e:
+                logger.warning("Prompt prefix handle lookup failed", error=str(e))
+                redis, shared = None, None
+            if shared:
+                # Keep the creator's expiry: a fresh TTL here would outlive the handle
+                name, usable_until = shared
+                self._store(prompt.cache_slot, prompt.digest, name, usable_until)
+                self.hits += 1
+                return name
+
+            from google.genai import types
+            try:
+                cached = await client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=prompt.prefix,
+                        ttl=f"{self.ttl_seconds}s",
+                        display_name=f"prompt:{prompt.cache_slot}",
+                    ),
+                )
+            except Exception as e:
+                self.failures += 1
+                self._refused[prompt.digest] = time.monotonic() + self.ttl_seconds
+                logger.info("Gemini prompt prefix not cached", cache_slot=prompt.cache_slot, error=str(e))
+                return None
+
+            self.created += 1
+            expire_time = getattr(cached, "expire_time", None)
+            expires_at = expire_time.timestamp() if expire_time else time.time() + self.ttl_seconds
+            usable_until = expires_at - HANDLE_REFRESH_MARGIN_SECONDS
+            self._store(prompt.cache_slot, prompt.digest, cached.name, usable_until)
+            if redis is not None and usable_until > time.time():
+                try:
+                    await redis.set(
+                        shared_key,
+                        json.dumps({"name": cached.name, "usable_until": usable_until}),
+                        expire=max(int(usable_until - time.time()), 1),
+                    )
+                except Exception as e:
+                    logger.warning("Prompt prefix handle share failed", error=str(e))
+            logger.info("Gemini prompt prefix cached", cache_slot=prompt.cache_slot, name=cached.name)
+            return cached.name
+
+    async def evict(self, model: str, prompt: SystemPrompt, name: str):
+        """Forget handle `name` after Gemini rejected it, locally and (if still shared) in Redis."""
+        self.evicted += 1
+        handle = self._handles.get(prompt.cache_slot)
+        if handle is not None and handle.name == name:
+            del self._handles[prompt.cache_slot]
+        shared_key = self._shared_key(model, prompt.digest)
+        try:
+            redis = await get_redis()
+            shared = _parse_shared(await redis.get(shared_key))
+            if shared and shared[0] == name:
+                await redis.delete(shared_key)
+        except Exception as e:
+            logger.warning("Prompt prefix handle eviction failed", error=str(e))
+        logger.info("Gemini prompt prefix handle evicted", cache_slot=prompt.cache_slot, name=name)
+
+    def get_stats(self) -> dict:
+        return {
+            "handles": len(self._handles),
+            "hits": self.hits,
+            "created": self.created,
+            "failures": self.failures,
+            "evicted": self.evicted,
+        }
+
+
+def _parse_shared(value: str | None) -> tuple[str, float] | None:
+    """(name, usable_until) from a shared Redis entry, or None if missing, unreadable or expired."""
+    if not value:
+        return None
+    try:
+        entry = json.loads(value)
+        name, usable_until = entry["name"], float(entry["usable_until"])
+    except (ValueError, TypeError, KeyError):
+        return None  # Entries from before expiries were shared; recreate
+    if usable_until <= time.time():
+        return None
+    return name, usable_until
+
+
+class PromptCacheStats:
+    """Per-provider prompt cache hit rate and token savings, from reply usage."""
+
+    def __init__(self):
+        self._providers: dict[str, dict[str, int]] = {}
+
+    def record(self, provider: str, usage: LLMUsage | None):
+        if usage is None or not usage.prompt_tokens:
+            return
+        counters = self._providers.setdefault(
+            provider, {"calls": 0, "hits": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        )
+        counters["calls"] += 1
+        counters["hits"] += usage.cached_tokens > 0
+        counters["prompt_tokens"] += usage.prompt_tokens
+        counters["cached_tokens"] += usage.cached_tokens
+
+    def get_stats(self) -> dict:
+        return {
+            provider: {
+                **counters,
+                "hit_rate": round(counters["hits"] / counters["calls"], 3),
+                "cached_token_ratio": round(counters["cached_tokens"] / counters["prompt_tokens"], 3),
+            }
+            for provider, counters in self._providers.items()
+        }
+
+
+gemini_prefix_cache = GeminiPrefixCache(
+    ttl_seconds=settings.gemini_prompt_cache_ttl_seconds,
+    max_handles=settings.llm_prompt_cache_max_handles,
+)
+prompt_cache_stats = PromptCacheStats()
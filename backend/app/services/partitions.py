@@ -0,0 +1,313 @@
+"""
+Message Partitions — monthly range partitions of messages on sent_at.
+
+messages is partitioned by RANGE (sent_at), one partition per calendar month
+(UTC) named messages_yYYYYmMM. Rows written before the table was converted
+live in messages_legacy, which covers everything before the month after the
+conversion (it keeps taking inserts until that month starts).
+
+maintain_partitions() runs daily (and once at startup):
+
+1. creates every missing monthly partition from the retention cutoff's month
+   through MESSAGE_PARTITIONS_AHEAD_MONTHS ahead, so inserts never hit a
+   missing range;
+2. retires partitions whose upper bound is at or before the retention cutoff
+   (RETENTION_DAYS) — DETACH PARTITION ... CONCURRENTLY, then DROP TABLE,
+   instead of a DELETE. With RETENTION_ARCHIVE_URI set, a partition is
+   archived batch by batch first;
+3. prunes message_provider_ids rows older than the cutoff.
+
+Retention rule: messages expire by calendar month. Once a whole month lies
+before the cutoff its messages are gone, including those of a conversation
+that a retained lead keeps (the conversation and lead survive with their newer
+messages). run_retention applies the same rule to an unpartitioned table.
+
+Locking: CREATE TABLE ... PARTITION OF and DROP TABLE need ACCESS EXCLUSIVE
+locks, which would queue every insert behind a long reader such as the
+insights cursor. They run under MESSAGE_PARTITION_LOCK_TIMEOUT_MS and are
+retried with backoff instead. DETACH ... CONCURRENTLY only takes SHARE UPDATE
+EXCLUSIVE on messages, so reads and inserts continue while it waits for
+readers of the partition; it can't run inside a transaction, so it gets its
+own autocommit connection.
+
+Conversations are not partitioned: messages and leads reference
+conversations.id, and a foreign key to a partitioned table has to include its
+partition key.
+"""
+
+import asyncio
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+import structlog
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models import Message, MessageProviderId
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+PARENT_TABLE = "messages"
+
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+_PARTITION_NAME = re.compile(r"^messages_(legacy|y(\d{4})m(\d{2}))$")
+
+_LOCK_NOT_AVAILABLE = "55P03"
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    lower: datetime | None  # None = MINVALUE
+    upper: datetime | None  # None = MAXVALUE, or the DEFAULT partition
+    detach_pending: bool = False  # An interrupted DETACH ... CONCURRENTLY
+
+    def overlaps(self, lower: datetime, upper: datetime) -> bool:
+        if self.lower is None and self.upper is None:
+            return False  # DEFAULT partition
+        return (self.lower is None or self.lower < upper) and (self.upper is None or lower < self.upper)
+
+
+def month_start(value: datetime | date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def _month_bound(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def expiry_bound(cutoff: datetime) -> datetime:
+    """Messages sent before this are expired: the start of the cutoff's month."""
+    return _month_bound(month_start(cutoff))
+
+
+def _parse_bound(value: str) -> datetime | None:
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def parse_partition_bound(name: str, expression: str, detach_pending: bool = False) -> Partition:
+    """Partition from pg_get_expr(relpartbound), e.g. FOR VALUES FROM ('2025-03-01 00:00:00+00') TO (...)."""
+    match = _BOUND.search(expression)
+    if not match:
+        return Partition(name, None, None, detach_pending)
+    return Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2)), detach_pending)
+
+
+async def is_partitioned(db: AsyncSession) -> bool:
+    result = await db.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+        {"table": PARENT_TABLE},
+    )
+    return bool(result.scalar())
+
+
+async def list_partitions(db: AsyncSession) -> list[Partition]:
+    result = await db.execute(
+        text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:table)
+            """
+        ),
+        {"table": PARENT_TABLE},
+    )
+    return [parse_partition_bound(name, expression, pending) for name, expression, pending in result.all()]
+
+
+async def list_detached_tables(db: AsyncSession) -> list[str]:
+    """Partition-named plain tables: detached partitions whose DROP didn't happen."""
+    result = await db.execute(
+        text(
+            """
+            SELECT relname FROM pg_class
+            WHERE relnamespace = current_schema()::regnamespace
+              AND relkind = 'r' AND NOT relispartition AND left(relname, length(:prefix)) = :prefix
+            """
+        ),
+        {"prefix": f"{PARENT_TABLE}_"},
+    )
+    return [name for (name,) in result.all() if _PARTITION_NAME.match(name)]
+
+
+def missing_months(partitions: list[Partition], first: date, last: date) -> list[date]:
+    """Months in [first, last] not covered by any existing partition."""
+    months, month = [], first
+    while month <= last:
+        lower, upper = _month_bound(month), _month_bound(add_months(month, 1))
+        if not any(p.overlaps(lower, upper) for p in partitions):
+            months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def _is_lock_timeout(error: DBAPIError) -> bool:
+    return getattr(error.orig, "sqlstate", None) == _LOCK_NOT_AVAILABLE
+
+
+async def _execute_ddl(db: AsyncSession, statement: str):
+    """
+    Run one DDL statement in its own transaction under a short lock_timeout.
+    A lock timeout rolls back and retries with backoff, so writers queue behind
+    the DDL for at most MESSAGE_PARTITION_LOCK_TIMEOUT_MS at a time.
+    """
+    attempts = max(settings.message_partition_ddl_attempts, 1)
+    for attempt in range(1, attempts + 1):
+        try:
+            await db.execute(text(f"SET LOCAL lock_timeout = '{int(settings.message_partition_lock_timeout_ms)}ms'"))
+            await db.execute(text(statement))
+            await db.commit()
+            return
+        except DBAPIError as e:
+            await db.rollback()
+            if not _is_lock_timeout(e) or attempt == attempts:
+                raise
+            logger.info("Partition DDL lock timeout, retrying", statement=statement, attempt=attempt)
+            await asyncio.sleep(min(2 ** attempt, 30))
+
+
+async def _detach_partition(partition: Partition):
+    """DETACH ... CONCURRENTLY (FINALIZE after an interrupted one), on an autocommit connection."""
+    from app.database import engine
+
+    mode = "FINALIZE" if partition.detach_pending else "CONCURRENTLY"
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition.name} {mode}"))
+
+
+async def ensure_partitions(db: AsyncSession, now: datetime) -> list[str]:
+    """Create the missing monthly partitions around `now`. Returns the created names."""
+    cutoff = now - timedelta(days=settings.retention_days)
+    months = missing_months(
+        await list_partitions(db),
+        month_start(cutoff),
+        add_months(month_start(now), settings.message_partitions_ahead_months),
+    )
+    created = []
+    for month in months:
+        name = partition_name(month)
+        await _execute_ddl(
+            db,
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ('{_month_bound(month).isoformat()}') "
+            f"TO ('{_month_bound(add_months(month, 1)).isoformat()}')",
+        )
+        created.append(name)
+    return created
+
+
+async def _archive_partition(db: AsyncSession, archive, partition: Partition):
+    """Write a partition's rows to the retention archive in keyset batches."""
+    from app.services.retention import _after
+
+    cursor = None
+    while True:
+        query = select(*Message.__table__.columns).where(Message.sent_at < partition.upper)
+        if partition.lower is not None:
+            query = query.where(Message.sent_at >= partition.lower)
+        if cursor:
+            query = query.where(_after(Message.sent_at, Message.id, cursor))
+        rows = (
+            await db.execute(query.order_by(Message.sent_at, Message.id).limit(settings.retention_batch_size))
+        ).all()
+        if not rows:
+            return
+        await archive.write(PARENT_TABLE, [dict(row._mapping) for row in rows])
+        cursor = (rows[-1].sent_at, rows[-1].id)
+
+
+def _detached_table_expired(name: str, expiry: datetime) -> bool:
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return False
+    if match.group(1) == "legacy":
+        return True  # Only ever detached once expired
+    month = date(int(match.group(2)), int(match.group(3)), 1)
+    return _month_bound(add_months(month, 1)) <= expiry
+
+
+async def drop_expired_partitions(db: AsyncSession, now: datetime) -> list[str]:
+    """Detach and drop (after archiving, if configured) partitions entirely before the retention cutoff."""
+    from app.services.retention import RetentionArchive
+
+    expiry = expiry_bound(now - timedelta(days=settings.retention_days))
+    expired = sorted(
+        (p for p in await list_partitions(db) if p.upper is not None and p.upper <= expiry),
+        key=lambda p: p.upper,
+    )
+    dropped = []
+    for partition in expired:
+        if settings.retention_archive_uri and not partition.detach_pending:
+            archive = RetentionArchive(
+                settings.retention_archive_uri,
+                settings.retention_archive_format,
+                f"{now:%Y-%m-%d}/{partition.name}",
+            )
+            await _archive_partition(db, archive, partition)
+        # End this session's transaction: DETACH CONCURRENTLY waits for every open one on messages
+        await db.commit()
+        await _detach_partition(partition)
+        await _execute_ddl(db, f"DROP TABLE IF EXISTS {partition.name}")
+        dropped.append(partition.name)
+
+    # Partitions detached by an earlier run whose DROP failed
+    for name in await list_detached_tables(db):
+        if name not in dropped and _detached_table_expired(name, expiry):
+            await _execute_ddl(db, f"DROP TABLE IF EXISTS {name}")
+            dropped.append(name)
+    return dropped
+
+
+async def prune_provider_message_ids(db: AsyncSession, now: datetime) -> int:
+    """Delete dedup registry rows older than the retention cutoff, in batches."""
+    cutoff = now - timedelta(days=settings.retention_days)
+    pruned = 0
+    while True:
+        batch = (
+            select(MessageProviderId.provider_message_id)
+            .where(MessageProviderId.received_at < cutoff)
+            .limit(settings.retention_batch_size)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            delete(MessageProviderId).where(MessageProviderId.provider_message_id.in_(batch))
+        )
+        await db.commit()
+        pruned += result.rowcount or 0
+        if (result.rowcount or 0) < settings.retention_batch_size:
+            return pruned
+
+
+async def maintain_partitions(drop_expired: bool = True, now: datetime | None = None) -> dict:
+    """Create upcoming partitions and (optionally) retire expired ones."""
+    from app.database import async_session
+
+    now = now or datetime.now(timezone.utc)
+    async with async_session() as db:
+        if not await is_partitioned(db):
+            logger.warning("messages is not partitioned; partition maintenance skipped")
+            return {"partitioned": False}
+
+        stats = {"partitioned": True, "created": await ensure_partitions(db, now)}
+        if drop_expired:
+            stats["dropped"] = await drop_expired_partitions(db, now)
+            stats["provider_ids_pruned"] = await prune_provider_message_ids(db, now)
+
+    logger.info("Message partition maintenance complete", **stats)
+    return stats
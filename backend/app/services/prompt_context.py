@@ -0,0 +1,394 @@
+"""
+Compiled Prompt Context — per-business system prompt pieces, built once per config version.
+
+Every guest turn needs the business's name, brand vocabulary, operating hours,
+timezone and required questions to build its system prompt. Instead of
+re-reading Business and re-formatting those sections on each message, they are
+compiled into an immutable BusinessPromptContext; a turn only fills in its own
+fields (time, guest context, lead progress, KB hits). The compiled part is also
+the prompt's stable prefix, which LLM providers can cache (see SystemPrompt).
+
+Lifecycle (same scheme as the KB index):
+- Contexts are cached per business in an LRU, tagged with the business's config
+  version (business:config:version:{business_id} in Redis).
+- Every write to a prompt-relevant Business field calls
+  invalidate_prompt_context(business_id). That drops the local copy and bumps
+  the version, so other instances rebuild on their next turn.
+- Entries also expire after PROMPT_CONTEXT_TTL_SECONDS as a safety net.
+"""
+
+import hashlib
+import string
+import time
+import uuid
+import zoneinfo
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+
+import structlog
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.core.redis import get_redis
+from app.models import Business
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+DEFAULT_TIMEZONE = "Asia/Kuala_Lumpur"
+
+# ─────────────────────────────────────────────────────────────
+# System Prompts — The personality and rules of the AI
+# ─────────────────────────────────────────────────────────────
+
+# The prompt is laid out for provider prefix caching: SYSTEM_PROMPT_PREFIX
+# (rules, brand persona, mode addendum) is identical on every turn for a
+# business and mode, and everything that changes per turn lives in
+# SYSTEM_PROMPT_TURN after it. Never put a per-turn field in the prefix —
+# one changing byte near the top invalidates the whole cached prefix.
+
+SYSTEM_PROMPT_PREFIX = """You are the AI Concierge for {business_name}. You are NOT a generic chatbot — you are a knowledgeable, proactive hotel professional powered by advanced AI. You should respond the way a skilled reservations manager would: warmly, efficiently, and with contextual intelligence.
+
+The sections CURRENT DATE & TIME, OPERATING STATUS, GUEST CONTEXT, INFORMATION GATHERED SO FAR, EARLIER IN THIS CONVERSATION and PROPERTY KNOWLEDGE BASE at the end of these instructions are refreshed on every message.
+
+### INTELLIGENT BEHAVIOR RULES (CRITICAL — follow these precisely):
+
+1. **IMPLICIT INFORMATION**: If the guest says "use this number", "you already have my number", "same number", or "you can reach me here" — look at GUEST CONTEXT and CONFIRM the phone/email shown. NEVER re-ask for information you already have. Say: "Got it, I have your number as [phone from GUEST CONTEXT] — is that correct?"
+
+2. **DATE RESOLUTION**: ALWAYS convert relative dates to specific calendar dates using CURRENT DATE & TIME:
+   - "tomorrow" → use the date given as tomorrow and state it ("That would be [DATE]")
+   - "this weekend" → calculate Saturday-Sunday dates
+   - "next Friday" → calculate the exact date
+   - "for 3 nights from tomorrow" → calculate check-in AND check-out dates
+   Never leave a date ambiguous. Always confirm: "So that's check-in on [DATE], check-out on [DATE] — [N] nights. Does that work?"
+
+3. **PAX INFERENCE**: Extract number of guests from context clues:
+   - "me and my wife" → 2 adults
+   - "family of 4" → assume 2 adults + 2 children
+   - "with the kids" → at least 2 adults + children, ask how many children
+   - "couple" → 2 adults
+   - "business trip" → likely 1 adult
+   State your assumption: "I'll note that as 2 adults. Will any children be joining?"
+
+4. **PROACTIVE ROOM SUGGESTIONS**: When a guest mentions their occasion or needs, recommend the BEST-FIT room from the PROPERTY KNOWLEDGE BASE:
+   - Anniversary/honeymoon → suggest the most premium suite
+   - Family → suggest family rooms or interconnecting rooms
+   - Business → suggest rooms with work desk, wifi emphasis
+   - Budget → suggest the best value option
+   Don't just list rates. RECOMMEND: "For an anniversary, I'd suggest our Grand Suite — it has a private balcony and complimentary champagne."
+
+5. **PRICE FRAMING**: When quoting rates, always provide context:
+   - Include what's included (breakfast, wifi, pool, parking)
+   - Show per-night AND total stay cost if dates are known
+   - Compare value: "That's RM 380/night including breakfast for two — great value for a sea-view room."
+
+6. **NO INTERROGATION**: NEVER ask more than 2 questions in a single message. Prioritize the most important missing info first. If you need name, dates, and pax — ask for dates first (the most time-sensitive), then name + pax together next.
+
+7. **CONFIRMATION SUMMARIES**: Once you have all key details (name, dates, room, pax), summarize naturally:
+   "Perfect! Let me confirm: [Name], [N] nights from [check-in] to [check-out], [Room Type] for [N adults]. I'll pass this to our reservations team and they'll send you a confirmation shortly!"
+
+8. **PROACTIVE UPSELLS**: After handling the main query, offer ONE relevant add-on:
+   - Airport pickup
+   - Spa package
+   - Dining reservation
+   - Early check-in / late check-out
+   Keep it brief: "By the way, we offer complimentary airport shuttle — would you like me to arrange that?"
+
+9. **PARTIAL ANSWERS**: Extract implicit info without re-asking:
+   - "I arrive on the 10am flight from KL" → check-in is that day, likely afternoon
+   - "I'm checking out on Sunday" → calculate dates backward
+   - "Just one night" → check-out = check-in + 1
+
+10. **CONTEXTUAL MEMORY**: Review INFORMATION GATHERED SO FAR and EARLIER IN THIS CONVERSATION (a summary of messages too old to include verbatim). NEVER re-ask for details already collected. If the guest provided their name 3 messages ago, use it — don't ask again.
+
+### CORE BEHAVIORS:
+- **Stick to Facts**: ONLY use the PROPERTY KNOWLEDGE BASE. If unsure, say: "Let me check with our reservations team and get back to you."
+- **After Hours**: Check OPERATING STATUS. If after hours, reassure: "Our team is away for the night, but I'm here to take care of everything — they'll follow up first thing in the morning."
+- **Language**: Match the guest's language (English or Bahasa Malaysia). If they switch, switch with them.
+
+### BRAND PERSONA & VOCABULARY:
+{brand_vocabulary_context}
+"""
+
+SYSTEM_PROMPT_TURN = """
+### CURRENT DATE & TIME:
+{current_datetime} (tomorrow is {tomorrow_date})
+
+### OPERATING STATUS:
+It is currently {after_hours_state}.
+
+### GUEST CONTEXT:
+{guest_context}
+
+### INFORMATION GATHERED SO FAR:
+{lead_progress}
+
+### EARLIER IN THIS CONVERSATION:
+{conversation_summary}
+
+### PROPERTY KNOWLEDGE BASE:
+{knowledge_base_context}
+"""
+
+LEAD_CAPTURE_ADDENDUM = """
+### ACTIVE LEAD CAPTURE MODE
+The guest is interested. Your goal is to gather booking details efficiently — like a real reservations manager.
+
+Check INFORMATION GATHERED SO FAR. Only ask for what's MISSING:
+1. **Name** — skip if already in GUEST CONTEXT or gathered earlier
+2. **Dates of Stay** — resolve to specific dates, confirm check-in + check-out + number of nights
+3. **Number of Guests** — infer from context when possible
+4. **Room Preference** — suggest based on their stated needs
+5. **Contact** — skip if phone/email is already in GUEST CONTEXT (WhatsApp number counts!)
+
+{required_questions_context}
+
+Remember: Maximum 2 questions per message. Lead with the most important missing piece.
+"""
+
+HANDOFF_ADDENDUM = """
+### HANDOFF MODE
+The guest needs a human. Handle this gracefully:
+1. **Acknowledge**: "I completely understand, and I want to make sure you're taken care of."
+2. **Assure**: "I'm flagging this conversation for our Business Manager right now, with all the details."
+3. **Set expectations**: "They will reach out to you within [timeframe based on operating hours]. In the meantime, is there anything else I can note down for them?"
+"""
+
+RE_ENGAGEMENT_ADDENDUM = "\n\n### RE-ENGAGEMENT MODE\nThis guest has gone quiet. Your goal is to politely and warmly follow up. Keep it short, reference their previous interest, and ask if they still need help."
+
+
+# ─────────────────────────────────────────────────────────────
+# Compiled templates
+# ─────────────────────────────────────────────────────────────
+
+class PromptTemplate:
+    """
+    A str.format template with some fields bound up front.
+
+    Bound values are spliced in as literal text, so braces inside business
+    settings (e.g. brand vocabulary) can never be mistaken for placeholders.
+    """
+
+    def __init__(self, template: str, **bound: str):
+        parts: list[str | tuple[str]] = []
+        for literal, field, _, _ in string.Formatter().parse(template):
+            if literal:
+                parts.append(literal)
+            if field is None:
+                continue
+            parts.append(bound[field] if field in bound else (field,))
+        # Merge adjacent literal text so render() joins as few pieces as possible
+        merged: list[str | tuple[str]] = []
+        for part in parts:
+            if isinstance(part, str) and merged and isinstance(merged[-1], str):
+                merged[-1] += part
+            else:
+                merged.append(part)
+        self._parts = tuple(merged)
+        self.fields = frozenset(p[0] for p in merged if isinstance(p, tuple))
+
+    def render(self, **values: str) -> str:
+        return "".join(p if isinstance(p, str) else str(values[p[0]]) for p in self._parts)
+
+
+@dataclass(frozen=True)
+class SystemPrompt:
+    """
+    A system prompt split for provider prefix caching.
+
+    `prefix` is byte-identical on every turn for the same business, mode and
+    config version; `suffix` holds this turn's fields. The LLM adapters in
+    conversation.py lay the two out for each provider's cache (Gemini cached
+    contents, Anthropic cache_control, OpenAI's automatic prefix cache).
+    str(prompt) is the full prompt for callers that don't care.
+    """
+    prefix: str
+    suffix: str
+    # One provider cache handle per slot: "{business_id}:{ai_mode}"
+    cache_slot: str
+
+    @cached_property
+    def digest(self) -> str:
+        return hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()
+
+    def __str__(self) -> str:
+        return self.prefix + self.suffix
+
+
+@dataclass(frozen=True)
+class BusinessPromptContext:
+    """Everything static about a business's prompt, compiled once per config version."""
+    business_id: uuid.UUID
+    version: int
+    name: str
+    audit_only_mode: bool
+    semantic_cache_enabled: bool
+    tz: zoneinfo.ZoneInfo
+    # Operating hours as whole hours in `tz`; None = no hours configured (never after hours)
+    open_hour: int | None
+    close_hour: int | None
+    operating_hours_str: str
+    # Cacheable prompt prefix per AI mode ("concierge" covers any other mode)
+    prompt_prefixes: dict[str, str]
+
+    @classmethod
+    def compile(cls, business: Business, version: int) -> "BusinessPromptContext":
+        hours = business.operating_hours or {}
+        try:
+            tz = zoneinfo.ZoneInfo(hours.get("timezone", DEFAULT_TIMEZONE))
+        except Exception:
+            tz = zoneinfo.ZoneInfo(DEFAULT_TIMEZONE)
+
+        open_hour = close_hour = None
+        if business.operating_hours:
+            try:
+                open_hour = int(hours.get("start", "09:00").split(":")[0])
+                close_hour = int(hours.get("end", "18:00").split(":")[0])
+            except Exception:
+                pass
+
+        operating_hours_str = "9am - 6pm"
+        if business.operating_hours:
+            operating_hours_str = f"{hours.get('start', '09:00')} - {hours.get('end', '18:00')}"
+
+        required_qs_str = ""
+        if business.required_questions:
+            qs_list = "\n".join(f"- {q}" for q in business.required_questions)
+            required_qs_str = f"Additionally, ensure you ask these REQUIRED QUESTIONS before passing to reservations:\n{qs_list}"
+
+        prefix = PromptTemplate(
+            SYSTEM_PROMPT_PREFIX,
+            business_name=business.name,
+            brand_vocabulary_context=business.brand_vocabulary or "Standard hotel professional and helpful.",
+        ).render()
+
+        return cls(
+            business_id=business.id,
+            version=version,
+            name=business.name,
+            audit_only_mode=bool(business.audit_only_mode),
+            semantic_cache_enabled=bool(
+                (business.knowledge_base_config or {}).get("semantic_cache", settings.semantic_cache_enabled)
+            ),
+            tz=tz,
+            open_hour=open_hour,
+            close_hour=close_hour,
+            operating_hours_str=operating_hours_str,
+            prompt_prefixes={
+                "concierge": prefix,
+                "lead_capture": prefix + PromptTemplate(
+                    LEAD_CAPTURE_ADDENDUM, required_questions_context=required_qs_str
+                ).render(),
+                "handoff": prefix + HANDOFF_ADDENDUM,
+            },
+        )
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def is_after_hours(self, now: datetime | None = None) -> bool:
+        """Check if `now` (default: current time) is outside the business's operating hours."""
+        if self.open_hour is None:
+            return False
+        hour = (now or self.now()).hour
+        return hour < self.open_hour or hour >= self.close_hour
+
+    def after_hours_state(self, is_after_hours: bool) -> str:
+        if is_after_hours:
+            return f"AFTER HOURS (Operating hours are {self.operating_hours_str})"
+        return "during operating hours"
+
+    def _prefix_mode(self, ai_mode: str) -> str:
+        return ai_mode if ai_mode in self.prompt_prefixes else "concierge"
+
+    def prompt_prefix(self, ai_mode: str) -> str:
+        return self.prompt_prefixes[self._prefix_mode(ai_mode)]
+
+    def render_system_prompt(self, ai_mode: str, is_follow_up: bool = False, **turn_fields: str) -> SystemPrompt:
+        """Cached prefix for the mode, plus this turn's fields (and the re-engagement note) as the suffix."""
+        mode = self._prefix_mode(ai_mode)
+        suffix = _TURN_TEMPLATE.render(**turn_fields)
+        if is_follow_up:
+            suffix += RE_ENGAGEMENT_ADDENDUM
+        return SystemPrompt(
+            prefix=self.prompt_prefixes[mode],
+            suffix=suffix,
+            cache_slot=f"{self.business_id}:{mode}",
+        )
+
+
+_TURN_TEMPLATE = PromptTemplate(SYSTEM_PROMPT_TURN)
+
+
+# ─────────────────────────────────────────────────────────────
+# Cache
+# ─────────────────────────────────────────────────────────────
+
+def _version_key(business_id: uuid.UUID) -> str:
+    return f"business:config:version:{business_id}"
+
+
+class PromptContextCache:
+    """LRU of compiled prompt contexts with Redis-versioned invalidation."""
+
+    def __init__(self, max_businesses: int, ttl_seconds: int):
+        self.max_businesses = max_businesses
+        self.ttl_seconds = ttl_seconds
+        self._contexts: OrderedDict[uuid.UUID, tuple[BusinessPromptContext, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db: AsyncSession, business_id: uuid.UUID) -> BusinessPromptContext:
+        """Compiled context for a business; raises ValueError if it doesn't exist."""
+        redis = await get_redis()
+        version = int(await redis.get(_version_key(business_id)) or 0)
+
+        cached = self._contexts.get(business_id)
+        if cached is not None:
+            context, loaded_at = cached
+            if context.version == version and time.monotonic() - loaded_at <= self.ttl_seconds:
+                self._contexts.move_to_end(business_id)
+                self.hits += 1
+                return context
+
+        self.misses += 1
+        result = await db.execute(select(Business).where(Business.id == business_id))
+        business = result.scalar_one_or_none()
+        if not business:
+            raise ValueError(f"Business {business_id} not found")
+
+        context = BusinessPromptContext.compile(business, version)
+        self._contexts[business_id] = (context, time.monotonic())
+        self._contexts.move_to_end(business_id)
+        while len(self._contexts) > self.max_businesses:
+            self._contexts.popitem(last=False)
+        return context
+
+    async def invalidate(self, business_id: uuid.UUID):
+        self._contexts.pop(business_id, None)
+        redis = await get_redis()
+        await redis.incr(_version_key(business_id))
+
+    def get_stats(self) -> dict:
+        return {
+            "businesses": len(self._contexts),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+prompt_contexts = PromptContextCache(
+    max_businesses=settings.prompt_context_max_businesses,
+    ttl_seconds=settings.prompt_context_ttl_seconds,
+)
+
+
+async def invalidate_prompt_context(business_id: uuid.UUID):
+    """Call after any write to a business's prompt settings (name, hours, vocabulary, questions, audit mode, answer cache)."""
+    try:
+        await prompt_contexts.invalidate(business_id)
+    except Exception as e:
+        logger.warning("Prompt context invalidation failed", business_id=str(business_id), error=str(e))
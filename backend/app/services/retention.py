@@ -0,0 +1,246 @@
+"""
+Data Retention — keyset-batched, throttled deletes with an optional cold archive.
+
+Leads older than RETENTION_DAYS are deleted first, then conversations that
+started before the cutoff, together with their messages. A conversation that a
+retained (newer) lead still points to is kept.
+
+Messages themselves expire by calendar month: once a whole month lies before
+the cutoff, its messages are deleted, including those of a conversation kept
+for a lead (it survives with its newer messages). On a partitioned messages
+table that is the monthly partition drop in app.services.partitions; on an
+unpartitioned one this job deletes them in batches.
+
+Every table is walked in keyset order (captured_at/started_at, id), at most
+RETENTION_BATCH_SIZE rows per transaction, sleeping
+RETENTION_BATCH_SLEEP_SECONDS between batches so locks and WAL stay small and
+the write path keeps going. The conversations foreign keys have no ON DELETE
+CASCADE, so messages are deleted explicitly, in batches, before their
+conversations.
+
+With RETENTION_ARCHIVE_URI set, each batch is written to the archive before it
+is deleted, one file per batch:
+
+    {uri}/{table}/{run date}/{table}-{batch:05d}.parquet   (zstd)
+    {uri}/{table}/{run date}/{table}-{batch:05d}.ndjson.gz
+
+The URI is anything pyarrow's filesystem layer accepts: a local path,
+s3://bucket/prefix (S3 or any S3-compatible store) or gs://bucket/prefix. A
+failed archive write aborts the run before that batch is deleted.
+"""
+
+import asyncio
+import gzip
+import io
+import json
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import structlog
+from sqlalchemy import and_, delete, exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models import Conversation, Lead, Message
+from app.services.partitions import expiry_bound, is_partitioned
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+ARCHIVE_FORMATS = ("parquet", "ndjson")
+
+
+def _plain(value, nested_as_json: bool):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if nested_as_json and isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def encode_archive_batch(records: list[dict], fmt: str) -> bytes:
+    """One archive file: zstd Parquet, or gzipped NDJSON."""
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # JSON columns become strings so every file of a table has one schema
+        table = pa.Table.from_pylist([{k: _plain(v, True) for k, v in r.items()} for r in records])
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression="zstd")
+        return buffer.getvalue()
+    lines = (
+        json.dumps({k: _plain(v, False) for k, v in r.items()}, ensure_ascii=False, default=str)
+        for r in records
+    )
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+class RetentionArchive:
+    """Writes each batch to {uri}/{table}/{run_label}/ before it is deleted."""
+
+    def __init__(self, uri: str, fmt: str, run_label: str):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format '{fmt}'. Use one of: {', '.join(ARCHIVE_FORMATS)}")
+        from pyarrow import fs
+
+        self._fs, self._root = fs.FileSystem.from_uri(uri)
+        self._fmt = fmt
+        self._run_label = run_label
+        self._batches: dict[str, int] = {}
+
+    async def write(self, table: str, records: list[dict]) -> str:
+        seq = self._batches.get(table, 0) + 1
+        self._batches[table] = seq
+        extension = "parquet" if self._fmt == "parquet" else "ndjson.gz"
+        directory = f"{self._root.rstrip('/')}/{table}/{self._run_label}"
+        path = f"{directory}/{table}-{seq:05d}.{extension}"
+        data = encode_archive_batch(records, self._fmt)
+        await asyncio.to_thread(self._put, directory, path, data)
+        return path
+
+    def _put(self, directory: str, path: str, data: bytes):
+        self._fs.create_dir(directory, recursive=True)
+        # Payloads are already compressed; don't let pyarrow re-compress by extension
+        with self._fs.open_output_stream(path, compression=None) as out:
+            out.write(data)
+
+
+@dataclass
+class RetentionStats:
+    leads: int = 0
+    conversations: int = 0
+    messages: int = 0
+    batches: int = 0
+    archived_files: int = 0
+
+
+def _after(order_col, id_col, cursor):
+    return or_(order_col > cursor[0], and_(order_col == cursor[0], id_col > cursor[1]))
+
+
+async def _pause():
+    if settings.retention_batch_sleep_seconds > 0:
+        await asyncio.sleep(settings.retention_batch_sleep_seconds)
+
+
+async def _archive(archive: RetentionArchive | None, stats: RetentionStats, table: str, rows: list):
+    if archive is not None and rows:
+        await archive.write(table, [dict(row._mapping) for row in rows])
+        stats.archived_files += 1
+
+
+async def _purge_leads(db: AsyncSession, cutoff: datetime, archive, stats: RetentionStats):
+    cursor = None
+    while True:
+        query = select(*Lead.__table__.columns).where(Lead.captured_at < cutoff)
+        if cursor:
+            query = query.where(_after(Lead.captured_at, Lead.id, cursor))
+        rows = (
+            await db.execute(query.order_by(Lead.captured_at, Lead.id).limit(settings.retention_batch_size))
+        ).all()
+        if not rows:
+            return
+
+        await _archive(archive, stats, "leads", rows)
+        await db.execute(delete(Lead).where(Lead.id.in_([row.id for row in rows])))
+        await db.commit()
+        stats.leads += len(rows)
+        stats.batches += 1
+        cursor = (rows[-1].captured_at, rows[-1].id)
+        if len(rows) < settings.retention_batch_size:
+            return
+        await _pause()
+
+
+async def _purge_messages(db: AsyncSession, condition, archive, stats: RetentionStats):
+    """Delete (and archive) all messages matching `condition`, one batch per transaction."""
+    cursor = None
+    while True:
+        query = select(*Message.__table__.columns).where(condition)
+        if cursor:
+            query = query.where(_after(Message.sent_at, Message.id, cursor))
+        rows = (
+            await db.execute(query.order_by(Message.sent_at, Message.id).limit(settings.retention_batch_size))
+        ).all()
+        if not rows:
+            return
+
+        await _archive(archive, stats, "messages", rows)
+        await db.execute(delete(Message).where(Message.id.in_([row.id for row in rows])))
+        await db.commit()
+        stats.messages += len(rows)
+        stats.batches += 1
+        cursor = (rows[-1].sent_at, rows[-1].id)
+        if len(rows) < settings.retention_batch_size:
+            return
+        await _pause()
+
+
+async def _purge_conversations(db: AsyncSession, cutoff: datetime, archive, stats: RetentionStats):
+    cursor = None
+    while True:
+        query = select(*Conversation.__table__.columns).where(
+            Conversation.started_at < cutoff,
+            ~exists().where(Lead.conversation_id == Conversation.id),
+        )
+        if cursor:
+            query = query.where(_after(Conversation.started_at, Conversation.id, cursor))
+        rows = (
+            await db.execute(
+                query.order_by(Conversation.started_at, Conversation.id).limit(settings.retention_batch_size)
+            )
+        ).all()
+        if not rows:
+            return
+
+        ids = [row.id for row in rows]
+        await _purge_messages(db, Message.conversation_id.in_(ids), archive, stats)
+        await _archive(archive, stats, "conversations", rows)
+        # Re-check for a lead captured since the batch was read
+        result = await db.execute(
+            delete(Conversation).where(
+                Conversation.id.in_(ids),
+                ~exists().where(Lead.conversation_id == Conversation.id),
+            )
+        )
+        await db.commit()
+        stats.conversations += result.rowcount
+        stats.batches += 1
+        cursor = (rows[-1].started_at, rows[-1].id)
+        if len(rows) < settings.retention_batch_size:
+            return
+        await _pause()
+
+
+async def run_retention(now: datetime | None = None) -> RetentionStats:
+    """Delete (and optionally archive) everything older than RETENTION_DAYS."""
+    from app.database import async_session
+
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=settings.retention_days)
+    archive = None
+    if settings.retention_archive_uri:
+        archive = RetentionArchive(
+            settings.retention_archive_uri, settings.retention_archive_format, now.strftime("%Y-%m-%d")
+        )
+    logger.info("Running data retention cleanup", cutoff_date=cutoff, archive=bool(archive))
+
+    stats = RetentionStats()
+    async with async_session() as db:
+        try:
+            await _purge_leads(db, cutoff, archive, stats)
+            await _purge_conversations(db, cutoff, archive, stats)
+            if not await is_partitioned(db):
+                await _purge_messages(db, Message.sent_at < expiry_bound(cutoff), archive, stats)
+        except Exception:
+            await db.rollback()
+            logger.error("Data retention stopped; completed batches stay deleted", **asdict(stats))
+            raise
+
+    logger.info("Data retention cleanup complete", **asdict(stats))
+    return stats
@@ -427,54 +427,41 @@ async def run_daily_reports(report_date: date | None = None):
 
 async def delete_old_leads(db: AsyncSession = None):
     """
-    Weekly job: Delete leads and conversations older than 90 days.
+    Weekly job: Delete leads and conversations older than RETENTION_DAYS (90).
     Complies with PDPA/GDPR data retention policies and fits Supabase 500MB free tier limits.
+    Runs in small throttled batches, optionally archiving each one first (see services/retention.py).
     """
-    from app.database import async_session
-    from app.models import Lead, Conversation
-    from sqlalchemy import delete
+    from app.services.retention import run_retention
 
-    # 90 days retention for Free Tier
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=90)
-    logger.info("Running data retention cleanup", cutoff_date=cutoff_date)
+    try:
+        await run_retention()
+    except Exception as e:
+        logger.error("Data retention job failed", error=str(e))
 
-    async with async_session() as session:
-        try:
-            # 1. Delete old leads
-            result_leads = await session.execute(
-                delete(Lead).where(Lead.captured_at < cutoff_date)
-            )
-            deleted_leads = result_leads.rowcount
 
-            # 2. Delete old conversations (cascades to messages)
-            # define where clause for conversations
-            result_convs = await session.execute(
-                delete(Conversation).where(Conversation.started_at < cutoff_date)
-            )
-            deleted_convs = result_convs.rowcount
+async def maintain_message_partitions():
+    """
+    Daily job: Create upcoming monthly messages partitions and drop the expired
+    ones (see services/partitions.py). Dropping honours the "cleanup" job switch.
+    """
+    from app.services.partitions import maintain_partitions
+    from app.services.system_config import is_job_enabled as _is_job_enabled
 
-            await session.commit()
-            logger.info(
-                "Data retention cleanup complete",
-                deleted_leads=deleted_leads,
-                deleted_conversations=deleted_convs
-            )
+    async with async_session() as _db:
+        drop_expired = await _is_job_enabled("cleanup", _db)
 
-        except Exception as e:
-            logger.error("Data retention job failed", error=str(e))
-            await session.rollback()
+    try:
+        await maintain_partitions(drop_expired=drop_expired)
+    except Exception as e:
+        logger.error("Partition maintenance job failed", error=str(e))
 
 
 async def process_automated_follow_ups(db: AsyncSession = None):
     """
-    Hourly job: Check for active conversations that need 24h/72h/7d follow-ups.
+    Hourly job: Send the 24h/72h/7d follow-ups that are due (see services/follow_ups.py).
     """
-    from app.database import async_session, set_db_context
-    from app.models import Conversation, Business
-    from app.services.conversation import process_guest_message
-    from app.services.whatsapp import send_whatsapp_message
-    from app.services.twilio_whatsapp import send_twilio_message
-    from app.services.email import send_email
+    from app.database import async_session
+    from app.services.follow_ups import run_follow_ups
     from app.services.system_config import is_job_enabled as _is_job_enabled
 
     async with async_session() as _db:
@@ -484,87 +471,11 @@ async def process_automated_follow_ups(db: AsyncSession = None):
 
     logger.info("Running automated follow-ups job")
 
-    async with async_session() as session:
-        try:
-            now = datetime.now(timezone.utc)
-
-            # Fetch all active conversations that haven't exhausted follow-ups
-            result = await session.execute(
-                select(Conversation, Business)
-                .join(Business, Conversation.business_id == Business.id)
-                .where(
-                    Conversation.status == "active",
-                    Conversation.follow_up_stage < 3
-                )
-            )
-
-            pairs = result.all()
-
-            for conv, prop in pairs:
-                if not conv.last_interaction_at:
-                    continue
-
-                age_hours = (now - conv.last_interaction_at).total_seconds() / 3600.0
-
-                target_stage = None
-                if conv.follow_up_stage == 0 and age_hours >= 24:
-                    target_stage = 1
-                elif conv.follow_up_stage == 1 and age_hours >= 72:
-                    target_stage = 2
-                elif conv.follow_up_stage == 2 and age_hours >= 168:
-                    target_stage = 3
-
-                if target_stage:
-                    try:
-                        # Ensure RLS context is set for the tenant if needed
-                        await set_db_context(session, str(prop.id))
-
-                        conv.follow_up_stage = target_stage
-
-                        # Process system triggered follow up
-                        response = await process_guest_message(
-                            db=session,
-                            business_id=prop.id,
-                            guest_identifier=conv.guest_identifier,
-                            channel=conv.channel,
-                            message_text="",  # System triggered
-                            guest_name=conv.guest_name,
-                            is_follow_up=True
-                        )
-
-                        await session.commit()
-
-                        reply_text = response["response"]
-
-                        # Deliver via correct channel integration
-                        if conv.channel == "whatsapp":
-                            if prop.whatsapp_provider == "twilio":
-                                await send_twilio_message(
-                                    to_number=conv.guest_identifier,
-                                    message_text=reply_text,
-                                    from_number=prop.twilio_phone_number
-                                )
-                            else:
-                                await send_whatsapp_message(
-                                    to_number=conv.guest_identifier,
-                                    message_text=reply_text
-                                )
-                        elif conv.channel == "email":
-                            await send_email(
-                                to_email=conv.guest_identifier,
-                                subject="Following up on your inquiry",
-                                content=reply_text,
-                                hotel_name=prop.name
-                            )
-
-                        logger.info("Sent follow-up", conversation_id=str(conv.id), stage=target_stage)
-
-                    except Exception as e:
-                        logger.error("Failed to send follow up", conversation_id=str(conv.id), error=str(e))
-                        await session.rollback()
-
-        except Exception as e:
-            logger.error("Follow-up job failed", error=str(e))
+    try:
+        stats = await run_follow_ups()
+        logger.info("Automated follow-ups complete", **stats)
+    except Exception as e:
+        logger.error("Follow-up job failed", error=str(e))
 
 
 async def generate_monthly_insights(db: AsyncSession = None):
@@ -822,6 +733,14 @@ async def start_scheduler():
         replace_existing=True
     )
 
+    # Schedule messages partition maintenance (Daily at 2:30am)
+    scheduler.add_job(
+        maintain_message_partitions,
+        trigger=CronTrigger(hour=2, minute=30, timezone=settings.timezone),
+        id="partition_maintenance",
+        replace_existing=True
+    )
+
     # Schedule automated follow ups (Hourly)
     scheduler.add_job(
         process_automated_follow_ups,
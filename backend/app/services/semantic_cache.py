@@ -0,0 +1,250 @@
+"""
+Semantic Answer Cache — reuse concierge answers to repeat FAQ questions.
+
+"What time is breakfast", "is parking free" and friends get near-identical
+answers drawn from the same KB rows, so a confident match against an earlier
+question is answered without an LLM call.
+
+Opt-in per business (knowledge_base_config["semantic_cache"], defaulting to
+SEMANTIC_CACHE_ENABLED), and only for short concierge-mode guest turns that
+open a conversation: a reply to a follow-up ("and for kids?") depends on the
+history, so neither its lookup nor its store goes through the cache. Answers
+that contain the guest's details (identifier, name, or any email address or
+phone number) are never stored.
+
+Entries are bucketed by (business, KB version, business-local date, language,
+after-hours). A bucket holds the row-normalized embeddings of earlier questions
+and their answers; a lookup is one dot product, and a hit needs cosine
+similarity of at least SEMANTIC_CACHE_THRESHOLD. Because the KB version is part
+of the key, any KB write (which bumps kb:version:{business_id}) retires the old
+answers at once. The date is part of it because the concierge turns "tomorrow"
+or "this weekend" into calendar dates: an answer is only reused on the day,
+in the business's timezone, it was written.
+
+Eviction: entries expire after SEMANTIC_CACHE_TTL_SECONDS; a full bucket drops
+its least recently used entry; buckets themselves are an LRU capped at
+SEMANTIC_CACHE_MAX_BUCKETS. The cache is per instance.
+"""
+
+import re
+import time
+from collections.abc import Iterable
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+import structlog
+
+from app.config import get_settings
+from app.services.kb_index import get_kb_version
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+MODEL_NAME = "semantic_cache"
+
+# Common Bahasa Malaysia words in guest questions
+_BM_MARKERS = {
+    "ada", "apa", "berapa", "bilik", "boleh", "harga", "pukul", "sarapan", "tak", "tidak",
+    "saya", "nak", "mahu", "untuk", "dengan", "di", "ke", "kah", "ini", "itu", "percuma",
+    "letak", "kereta", "makan", "malam", "pagi", "terima", "kasih", "bila", "mana",
+}
+
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{6,}\d")
+_PHONE_MIN_DIGITS = 8
+
+
+def contains_guest_details(answer: str, details: Iterable[str | None] = ()) -> bool:
+    """True if `answer` mentions one of `details`, an email address or a phone number."""
+    lowered = answer.lower()
+    if any(detail and detail.lower() in lowered for detail in details):
+        return True
+    if _EMAIL.search(answer):
+        return True
+    return any(sum(c.isdigit() for c in match) >= _PHONE_MIN_DIGITS for match in _PHONE.findall(answer))
+
+
+def detect_language(text: str) -> str:
+    """'bm' or 'en' — answers are only reused for questions in the same language."""
+    words = re.findall(r"[a-z]+", text.lower())
+    if not words:
+        return "en"
+    bm = sum(1 for w in words if w in _BM_MARKERS)
+    return "bm" if bm / len(words) >= 0.2 else "en"
+
+
+@dataclass(frozen=True)
+class SemanticCacheKey:
+    """Everything a lookup or store needs, computed once per turn."""
+    business_id: uuid.UUID
+    kb_version: int
+    local_date: date  # Business-local date of the turn
+    language: str
+    is_after_hours: bool
+    vector: np.ndarray = field(compare=False)  # Normalized question embedding
+
+    @property
+    def bucket(self) -> tuple:
+        return (self.business_id, self.kb_version, self.local_date, self.language, self.is_after_hours)
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    answer: str
+    similarity: float
+    age_seconds: float
+
+
+class _Bucket:
+    def __init__(self):
+        self.vectors: list[np.ndarray] = []
+        self.answers: list[str] = []
+        self.created_at: list[float] = []
+        self.last_used: list[float] = []
+        self._matrix: np.ndarray | None = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors)
+        return self._matrix
+
+    def remove(self, index: int):
+        for values in (self.vectors, self.answers, self.created_at, self.last_used):
+            values.pop(index)
+        self._matrix = None
+
+    def add(self, vector: np.ndarray, answer: str):
+        now = time.monotonic()
+        self.vectors.append(vector)
+        self.answers.append(answer)
+        self.created_at.append(now)
+        self.last_used.append(now)
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    """Per-instance LRU of answer buckets keyed by (business, KB version, language, after-hours)."""
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: int,
+        max_entries_per_bucket: int,
+        max_buckets: int,
+        max_question_chars: int,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_bucket = max_entries_per_bucket
+        self.max_buckets = max_buckets
+        self.max_question_chars = max_question_chars
+        self._buckets: OrderedDict[tuple, _Bucket] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.refused = 0
+
+    async def prepare(
+        self, business_id: uuid.UUID, question: str, local_date: date, is_after_hours: bool
+    ) -> SemanticCacheKey | None:
+        """Embed the question and read the KB version; None if this turn can't use the cache."""
+        if not question or len(question) > self.max_question_chars:
+            return None
+        from app.services import generate_query_embedding
+        try:
+            embedding = await generate_query_embedding(question)
+            kb_version = await get_kb_version(business_id)
+        except Exception as e:
+            logger.warning("Semantic cache key failed", business_id=str(business_id), error=str(e))
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        # Zero vectors (demo-mode embeddings) would match everything equally
+        if norm == 0:
+            return None
+        return SemanticCacheKey(
+            business_id, kb_version, local_date, detect_language(question), is_after_hours, vector / norm
+        )
+
+    def lookup(self, key: SemanticCacheKey) -> CachedAnswer | None:
+        bucket = self._buckets.get(key.bucket)
+        if bucket is None:
+            self.misses += 1
+            return None
+        self._expire(bucket)
+        if not bucket.vectors:
+            self.misses += 1
+            return None
+
+        self._buckets.move_to_end(key.bucket)
+        similarities = bucket.matrix() @ key.vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        bucket.last_used[best] = time.monotonic()
+        return CachedAnswer(
+            answer=bucket.answers[best],
+            similarity=float(similarities[best]),
+            age_seconds=time.monotonic() - bucket.created_at[best],
+        )
+
+    def store(self, key: SemanticCacheKey, answer: str, guest_details: Iterable[str | None] = ()):
+        """Cache `answer` unless it mentions the guest (`guest_details`) or any email/phone number."""
+        if contains_guest_details(answer, guest_details):
+            self.refused += 1
+            return
+        bucket = self._buckets.get(key.bucket)
+        if bucket is None:
+            # Answers for older KB versions or past days of this business can never be hit again
+            stale = [
+                b for b in self._buckets
+                if b[0] == key.business_id and (b[1] < key.kb_version or b[2] < key.local_date)
+            ]
+            for bucket_key in stale:
+                del self._buckets[bucket_key]
+            bucket = self._buckets[key.bucket] = _Bucket()
+        self._buckets.move_to_end(key.bucket)
+
+        self._expire(bucket)
+        # A near-duplicate of a stored question adds nothing
+        if bucket.vectors and float(np.max(bucket.matrix() @ key.vector)) >= self.threshold:
+            return
+        if len(bucket.vectors) >= self.max_entries_per_bucket:
+            bucket.remove(int(np.argmin(bucket.last_used)))
+        bucket.add(key.vector, answer)
+        self.stores += 1
+
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+    def _expire(self, bucket: _Bucket):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for i in reversed(range(len(bucket.created_at))):
+            if bucket.created_at[i] < cutoff:
+                bucket.remove(i)
+
+    def get_stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "entries": sum(len(b.vectors) for b in self._buckets.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "refused": self.refused,
+        }
+
+
+semantic_cache = SemanticAnswerCache(
+    threshold=settings.semantic_cache_threshold,
+    ttl_seconds=settings.semantic_cache_ttl_seconds,
+    max_entries_per_bucket=settings.semantic_cache_max_entries_per_business,
+    max_buckets=settings.semantic_cache_max_buckets,
+    max_question_chars=settings.semantic_cache_max_question_chars,
+)
@@ -7,10 +7,17 @@ Includes Live Demo Routing override to ensure real demonstration devices bypass
 import httpx
 import structlog
 from urllib.parse import urlencode
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
 
 from app.config import get_settings
 from app.services.response_formatter import format_response
+from app.services.circuit_breaker import RequestRejected, raise_for_server_status, twilio_breaker
 
 logger = structlog.get_logger()
 
@@ -53,13 +60,16 @@ async def send_twilio_message(to_number: str, message_text: str, from_number: st
         logger.warning("Twilio credentials missing in production", to=to_number)
         return {"status": "skipped", "reason": "missing_credentials"}
 
-    return await _send_twilio_text(to_number, formatted, sender)
+    # Only 5xx responses and timeouts count against the breaker; a 4xx is this request's fault
+    return await twilio_breaker.call(
+        _send_twilio_text, to_number, formatted, sender, excluded=(RequestRejected,)
+    )
 
 
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=1, max=10),
-    retry=retry_if_exception_type(httpx.HTTPStatusError),
+    retry=retry_if_exception_type(httpx.HTTPStatusError) & retry_if_not_exception_type(RequestRejected),
 )
 async def _send_twilio_text(to_number: str, text: str, from_number: str | None = None) -> dict:
     """Send a plain text WhatsApp message via Twilio."""
@@ -86,7 +96,7 @@ async def _send_twilio_text(to_number: str, text: str, from_number: str | None =
     async with httpx.AsyncClient() as client:
         response = await client.post(url, auth=auth, headers=headers, data=payload, timeout=10.0)
         try:
-            response.raise_for_status()
+            raise_for_server_status(response)
         except httpx.HTTPStatusError as e:
             logger.error(
                 "Twilio API Error",
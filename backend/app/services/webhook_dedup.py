@@ -0,0 +1,58 @@
+"""
+Webhook deduplication — drop provider retries before any DB or LLM work.
+
+Meta and Twilio redeliver a webhook whenever our response is slow or non-2xx.
+Each delivery's provider message IDs (wamid / MessageSid) are claimed in a
+short-TTL seen-set (Redis SET NX, or the in-memory fallback); IDs that were
+already claimed are dropped at the webhook.
+
+The seen-set is the fast path only. The authoritative guard is the
+primary key of message_provider_ids (see process_guest_message),
+which also catches retries that arrive after the TTL or while Redis is down.
+"""
+
+import structlog
+
+from app.config import get_settings
+from app.core.redis import get_redis
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+SEEN_PREFIX = "webhook:seen:"
+
+
+def provider_message_id(provider: str, raw_id: str | None) -> str | None:
+    """Namespaced ID stored in Message.metadata_['provider_message_id'] (e.g. 'whatsapp:wamid.HBg...')."""
+    return f"{provider}:{raw_id}" if raw_id else None
+
+
+async def claim_message_ids(message_ids: list[str | None]) -> set[str]:
+    """
+    Mark IDs as seen and return the ones claimed by this call (first delivery).
+    None entries are ignored. If the store fails, every ID counts as new —
+    the database constraint still rejects true duplicates.
+    """
+    claimed = set()
+    try:
+        redis = await get_redis()
+        for message_id in message_ids:
+            if message_id and await redis.set(
+                SEEN_PREFIX + message_id, "1", expire=settings.webhook_dedup_ttl_seconds, nx=True
+            ):
+                claimed.add(message_id)
+    except Exception as e:
+        logger.warning("Webhook dedup unavailable, accepting delivery", error=str(e))
+        return {m for m in message_ids if m}
+    return claimed
+
+
+async def release_message_ids(message_ids: list[str | None]):
+    """Forget claimed IDs (e.g. enqueue failed) so the provider's retry is accepted."""
+    try:
+        redis = await get_redis()
+        for message_id in message_ids:
+            if message_id:
+                await redis.delete(SEEN_PREFIX + message_id)
+    except Exception as e:
+        logger.warning("Webhook dedup release failed", error=str(e))
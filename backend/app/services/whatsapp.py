@@ -4,12 +4,21 @@ WhatsApp Service — Send messages, templates, and read receipts via Meta Cloud
 3-tier branching: demo (simulator) → dev (console log) → production (real API).
 """
 
+from typing import Iterator
+
 import structlog
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
 from app.config import get_settings
 from app.core.normalization import NormalizedMessage
 from app.services.response_formatter import format_response
+from app.services.circuit_breaker import RequestRejected, raise_for_server_status, whatsapp_breaker
 
 logger = structlog.get_logger()
 
@@ -40,13 +49,17 @@ async def send_whatsapp_message(to_number: str, message_text: str):
         logger.warning("WhatsApp credentials missing in production", to=to_number)
         return {"status": "skipped", "reason": "missing_credentials"}
 
-    return await _send_text(to_number, formatted)
+    # Breaker wraps the whole retry loop: while Meta is down we fail fast
+    # instead of spending three attempts with backoff on every reply. A 4xx
+    # (bad number, expired token, closed 24h window) says nothing about Meta's
+    # health, so only 5xx responses and timeouts count as failures.
+    return await whatsapp_breaker.call(_send_text, to_number, formatted, excluded=(RequestRejected,))
 
 
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=1, max=10),
-    retry=retry_if_exception_type(httpx.HTTPStatusError),
+    retry=retry_if_exception_type(httpx.HTTPStatusError) & retry_if_not_exception_type(RequestRejected),
 )
 async def _send_text(to_number: str, text: str) -> dict:
     """Send a plain text WhatsApp message with retry."""
@@ -65,7 +78,7 @@ async def _send_text(to_number: str, text: str) -> dict:
 
     async with httpx.AsyncClient() as client:
         response = await client.post(url, headers=headers, json=payload, timeout=10.0)
-        response.raise_for_status()
+        raise_for_server_status(response)
         data = response.json()
         logger.info("WhatsApp sent", to=to_number, msg_id=data.get("messages", [{}])[0].get("id"))
         return data
@@ -139,70 +152,73 @@ async def mark_message_read(message_id: str):
         logger.warning("Failed to mark message as read", msg_id=message_id, error=str(e))
 
 
-def normalize_whatsapp_message(payload: dict) -> dict:
-    """
-    Parse raw WhatsApp webhook payload into normalized structure.
+def iter_whatsapp_messages(payload: dict) -> Iterator[dict]:
     """
-    try:
-        entry = payload.get("entry", [{}])[0]
-        changes = entry.get("changes", [{}])[0]
-        value = changes.get("value", {})
-        messages = value.get("messages", [])
-
-        if not messages:
-            return None
+    Parse a raw WhatsApp webhook payload into normalized messages.
 
-        msg = messages[0]
+    Meta batches deliveries: one payload can carry several entries (business
+    accounts), each with several changes (phone numbers), each with several
+    messages. Every message is yielded, in delivery order. Malformed parts are
+    logged and skipped without dropping the rest of the batch.
+    """
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            try:
+                yield from _normalize_change_value(change.get("value") or {})
+            except Exception as e:
+                logger.error("Error normalizing WhatsApp payload", error=str(e))
+
+
+def _normalize_change_value(value: dict) -> Iterator[dict]:
+    # Get both phone number identifiers for business lookup
+    meta = value.get("metadata", {})
+    phone_number_id = meta.get("phone_number_id")
+    # display_phone_number is the human-readable number (e.g. +15557220306)
+    # and is the value stored in Business.whatsapp_number
+    display_phone_number = meta.get("display_phone_number")
+
+    # Determine guest names: contacts are keyed by wa_id (== message "from")
+    contacts = value.get("contacts", [])
+    names = {c.get("wa_id"): c.get("profile", {}).get("name") for c in contacts}
+    default_name = contacts[0].get("profile", {}).get("name") if contacts else None
+
+    for msg in value.get("messages", []):
         from_number = msg.get("from")
-        text_body = msg.get("text", {}).get("body")
-
-        # Determine guest name
-        contacts = value.get("contacts", [])
-        guest_name = None
-        if contacts:
-            guest_name = contacts[0].get("profile", {}).get("name")
-
-        # Get both phone number identifiers for business lookup
-        meta = value.get("metadata", {})
-        phone_number_id = meta.get("phone_number_id")
-        # display_phone_number is the human-readable number (e.g. +15557220306)
-        # and is the value stored in Business.whatsapp_number
-        display_phone_number = meta.get("display_phone_number")
-
         if not from_number:
-            return None
+            continue
+        text_body = (msg.get("text") or {}).get("body")
+        guest_name = names.get(from_number) or default_name
+        metadata = {
+            "phone_number_id": phone_number_id,
+            "display_phone_number": display_phone_number,
+            "whatsapp_message_id": msg.get("id"),
+        }
 
         # Handle non-text messages (images, audio, video, location, stickers, etc.)
         msg_type = msg.get("type", "text")
         if not text_body:
             if msg_type != "text":
-                return {
+                yield {
                     "channel": "whatsapp",
                     "guest_identifier": from_number,
                     "guest_name": guest_name,
                     "content": None,
-                    "metadata": {
-                        "phone_number_id": phone_number_id,
-                        "display_phone_number": display_phone_number,
-                        "whatsapp_message_id": msg.get("id"),
-                        "is_unsupported_media": True,
-                        "media_type": msg_type,
-                    },
+                    "metadata": {**metadata, "is_unsupported_media": True, "media_type": msg_type},
                 }
-            return None
+            continue
 
-        return {
+        yield {
             "channel": "whatsapp",
             "guest_identifier": from_number,
             "guest_name": guest_name,
             "content": text_body,
-            "metadata": {
-                "phone_number_id": phone_number_id,
-                "display_phone_number": display_phone_number,
-                "whatsapp_message_id": msg.get("id"),
-            },
+            "metadata": metadata,
         }
 
-    except Exception as e:
-        logger.error("Error normalizing WhatsApp payload", error=str(e))
-        return None
+
+def normalize_whatsapp_message(payload: dict) -> dict | None:
+    """
+    Parse raw WhatsApp webhook payload into normalized structure.
+    Returns only the first message; use iter_whatsapp_messages for the whole batch.
+    """
+    return next(iter_whatsapp_messages(payload), None)
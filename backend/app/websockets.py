@@ -17,7 +17,8 @@ async def websocket_endpoint(websocket: WebSocket, business_id: str, session_id:
     Protocol:
       Client → Server:  {"message": "text...", "business_id": "...", "session_id": "..."}
       Server → Client:  {"type": "typing"}
-      Server → Client:  {"type": "ai_response", "response": "text..."}
+      Server → Client:  {"type": "ai_response_delta", "delta": "text..."}   (0..n, as tokens arrive)
+      Server → Client:  {"type": "ai_response", "response": "text..."}      (full reply, after it is saved)
       Server → Client:  {"type": "error", "detail": "..."}
     """
     await websocket.accept()
@@ -42,7 +43,10 @@ async def websocket_endpoint(websocket: WebSocket, business_id: str, session_id:
             # Send typing indicator
             await websocket.send_text(json.dumps({"type": "typing"}))
 
-            # Process with AI
+            async def send_delta(delta: str):
+                await websocket.send_text(json.dumps({"type": "ai_response_delta", "delta": delta}))
+
+            # Process with AI, streaming tokens to the widget as they arrive
             async with async_session() as db:
                 await set_db_context(db, business_id)
 
@@ -53,15 +57,17 @@ async def websocket_endpoint(websocket: WebSocket, business_id: str, session_id:
                     channel="web",
                     message_text=user_text,
                     guest_name=payload.get("guest_name", "Web Guest"),
+                    on_delta=send_delta,
                 )
+                await db.commit()
 
-                response_text = result.get("response", "Sorry, I could not process that.")
+            response_text = result.get("response", "Sorry, I could not process that.")
 
-                # Send AI response
-                await websocket.send_text(json.dumps({
-                    "type": "ai_response",
-                    "response": response_text,
-                }))
+            # Final frame carries the full persisted reply
+            await websocket.send_text(json.dumps({
+                "type": "ai_response",
+                "response": response_text,
+            }))
 
     except WebSocketDisconnect:
         logger.info("WEBSOCKET_DISCONNECT", session_id=session_id)
@@ -110,6 +110,128 @@ MIGRATIONS = [
         "audit_records_disable_rls",
         "ALTER TABLE audit_records DISABLE ROW LEVEL SECURITY;",
     ),
+    (
+        "kb_documents_content_hash",
+        """
+        ALTER TABLE kb_documents
+            ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+        """,
+    ),
+    (
+        "conversations_lead_extraction",
+        """
+        ALTER TABLE conversations
+            ADD COLUMN IF NOT EXISTS lead_extraction JSONB;
+        """,
+    ),
+    (
+        "conversations_rolling_summary",
+        """
+        ALTER TABLE conversations
+            ADD COLUMN IF NOT EXISTS summary TEXT,
+            ADD COLUMN IF NOT EXISTS summary_state JSONB;
+        """,
+    ),
+    (
+        "conversations_next_follow_up_at",
+        """
+        ALTER TABLE conversations
+            ADD COLUMN IF NOT EXISTS next_follow_up_at TIMESTAMPTZ;
+        UPDATE conversations
+            SET next_follow_up_at = last_interaction_at + CASE follow_up_stage
+                WHEN 0 THEN INTERVAL '24 hours'
+                WHEN 1 THEN INTERVAL '72 hours'
+                ELSE INTERVAL '7 days'
+            END
+            WHERE status = 'active' AND follow_up_stage < 3 AND next_follow_up_at IS NULL;
+        CREATE INDEX IF NOT EXISTS ix_conversations_next_follow_up
+            ON conversations (next_follow_up_at)
+            WHERE status = 'active';
+        """,
+    ),
+    (
+        "retention_keyset_indexes",
+        """
+        CREATE INDEX IF NOT EXISTS ix_leads_captured_at ON leads (captured_at);
+        CREATE INDEX IF NOT EXISTS ix_conversations_started_at ON conversations (started_at);
+        """,
+    ),
+    (
+        "message_provider_ids",
+        """
+        CREATE TABLE IF NOT EXISTS message_provider_ids (
+            provider_message_id VARCHAR(255) PRIMARY KEY,
+            message_id UUID NOT NULL,
+            received_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """,
+    ),
+    (
+        "messages_monthly_partitions",
+        """
+        DO $$
+        DECLARE
+            boundary TIMESTAMPTZ := (date_trunc('month', now() AT TIME ZONE 'UTC') + INTERVAL '1 month') AT TIME ZONE 'UTC';
+            month_start TIMESTAMPTZ;
+            grant_row RECORD;
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'messages'::regclass) THEN
+                RETURN;
+            END IF;
+
+            LOCK TABLE messages IN ACCESS EXCLUSIVE MODE;
+
+            -- Provider message IDs move to message_provider_ids (a unique index on a
+            -- partitioned table would have to include sent_at)
+            INSERT INTO message_provider_ids (provider_message_id, message_id, received_at)
+                SELECT metadata->>'provider_message_id', id, sent_at FROM messages
+                WHERE metadata->>'provider_message_id' IS NOT NULL
+                ON CONFLICT DO NOTHING;
+            DROP INDEX IF EXISTS uq_messages_provider_message_id;
+
+            -- The existing table becomes the partition for everything before next month:
+            -- it still takes this month's inserts, so a bound at this month's start
+            -- would fail ATTACH with "partition constraint is violated"
+            ALTER TABLE messages RENAME TO messages_legacy;
+            ALTER INDEX IF EXISTS ix_messages_conversation RENAME TO ix_messages_legacy_conversation;
+            UPDATE messages_legacy SET sent_at = 'epoch' WHERE sent_at IS NULL;
+            ALTER TABLE messages_legacy ALTER COLUMN sent_at SET NOT NULL;
+            -- ATTACH needs the partition's primary key to match the parent's (id, sent_at)
+            ALTER TABLE messages_legacy DROP CONSTRAINT messages_pkey;
+            ALTER TABLE messages_legacy ADD CONSTRAINT messages_legacy_pkey PRIMARY KEY (id, sent_at);
+
+            CREATE TABLE messages (LIKE messages_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (sent_at);
+            ALTER TABLE messages ADD PRIMARY KEY (id, sent_at);
+            ALTER TABLE messages ADD FOREIGN KEY (conversation_id) REFERENCES conversations (id);
+            CREATE INDEX ix_messages_conversation ON messages (conversation_id, sent_at);
+            EXECUTE 'ALTER TABLE messages ATTACH PARTITION messages_legacy FOR VALUES FROM (MINVALUE) TO ('
+                || quote_literal(boundary) || ')';
+
+            -- Next month and the two after; the daily maintenance job keeps creating ahead
+            FOR i IN 0..2 LOOP
+                month_start := (boundary AT TIME ZONE 'UTC' + make_interval(months => i)) AT TIME ZONE 'UTC';
+                EXECUTE 'CREATE TABLE IF NOT EXISTS '
+                    || quote_ident(to_char(month_start AT TIME ZONE 'UTC', '"messages_y"YYYY"m"MM'))
+                    || ' PARTITION OF messages FOR VALUES FROM (' || quote_literal(month_start)
+                    || ') TO (' || quote_literal((month_start AT TIME ZONE 'UTC' + INTERVAL '1 month') AT TIME ZONE 'UTC')
+                    || ')';
+            END LOOP;
+
+            IF (SELECT relrowsecurity FROM pg_class WHERE oid = 'messages_legacy'::regclass) THEN
+                ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
+                CREATE POLICY tenant_isolation_policy ON messages
+                    USING (conversation_id IN (SELECT id FROM conversations))
+                    WITH CHECK (conversation_id IN (SELECT id FROM conversations));
+            END IF;
+            FOR grant_row IN
+                SELECT grantee, privilege_type FROM information_schema.role_table_grants
+                WHERE table_name = 'messages_legacy' AND grantee NOT IN ('PUBLIC', current_user)
+            LOOP
+                EXECUTE 'GRANT ' || grant_row.privilege_type || ' ON messages TO ' || quote_ident(grant_row.grantee);
+            END LOOP;
+        END $$;
+        """,
+    ),
 ]
 
 
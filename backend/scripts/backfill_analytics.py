@@ -0,0 +1,33 @@
+"""
+Recompute AnalyticsDaily for a date range.
+Usage: python -m scripts.backfill_analytics --start 2026-01-01 --end 2026-01-31 [--business <uuid> ...]
+"""
+
+import argparse
+import asyncio
+import uuid
+from datetime import date
+
+from app.database import async_session
+from app.services.analytics import backfill_analytics
+
+
+async def main(start_date: date, end_date: date, business_ids: list[uuid.UUID] | None):
+    scope = f"{len(business_ids)} business(es)" if business_ids else "all businesses"
+    print(f"Backfilling analytics {start_date} → {end_date} for {scope}...")
+    async with async_session() as db:
+        rows = await backfill_analytics(db, start_date, end_date, business_ids)
+        await db.commit()
+    print(f"Backfill complete: {rows} rows upserted.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill AnalyticsDaily over a date range")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, type=date.fromisoformat, help="Last day, inclusive (YYYY-MM-DD)")
+    parser.add_argument(
+        "--business", action="append", type=uuid.UUID, dest="business_ids",
+        help="Business ID to backfill (repeatable; default: all businesses)",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.start, args.end, args.business_ids))
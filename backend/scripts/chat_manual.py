@@ -93,8 +93,6 @@ async def chat_session():
                 duration = (datetime.now() - start_time).total_seconds()
                 
                 print(f"🤖 AI ({duration:.1f}s): {data['response']}")
-                if data.get('lead_created'):
-                    print("   [LEAD CAPTURED! 🎯]")
                 if data.get('mode') == 'handoff':
                     print("   [HANDOFF TRIGGERED! 👤]")
                     
@@ -331,6 +331,7 @@
         div.textContent = text;
         messagesEl.appendChild(div);
         messagesEl.scrollTop = messagesEl.scrollHeight;
+        return div;
     }
 
     function showTyping(v) {
@@ -357,15 +358,28 @@
             statusEl.textContent = 'Connected';
         };
 
+        let streamingEl = null; // Reply bubble being filled by ai_response_delta frames
+
         ws.onmessage = function (event) {
             showTyping(false);
             try {
                 const data = JSON.parse(event.data);
-                if (data.type === 'ai_response') {
-                    appendMsg('ai', data.response);
+                if (data.type === 'ai_response_delta') {
+                    // Grow the reply bubble token by token
+                    if (!streamingEl) streamingEl = appendMsg('ai', '');
+                    streamingEl.textContent += data.delta;
+                    messagesEl.scrollTop = messagesEl.scrollHeight;
+                } else if (data.type === 'ai_response') {
+                    if (streamingEl) {
+                        streamingEl.textContent = data.response;
+                        streamingEl = null;
+                    } else {
+                        appendMsg('ai', data.response);
+                    }
                 } else if (data.type === 'typing') {
                     showTyping(true);
                 } else if (data.type === 'error') {
+                    streamingEl = null;
                     appendMsg('ai', 'Sorry, something went wrong. Please try again.');
                 }
             } catch (e) {
@@ -0,0 +1,67 @@
+"""
+Unit tests for set-based daily analytics and range backfill.
+"""
+
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.services.analytics import _build_daily_row, _utc_window, backfill_analytics
+
+
+def test_row_derives_all_fields_from_aggregates():
+    bid = uuid.uuid4()
+    conv = {
+        "total_inquiries": 10,
+        "after_hours_inquiries": 6,
+        "after_hours_responded": 5,
+        "handoffs": 2,
+        "avg_response_time_ms": 1500.0,
+        "channel_whatsapp": 7,
+        "channel_web": 3,
+    }
+    leads = {
+        "leads_captured": 4,
+        "after_hours_lead_value": Decimal("1000.00"),
+        "actual_revenue_recovered": Decimal("450.00"),
+    }
+
+    row = _build_daily_row(bid, date(2026, 3, 1), Decimal("30.00"), conv, leads)
+
+    assert row["inquiries_handled_by_ai"] == 8
+    assert row["inquiries_handled_manually"] == 2
+    assert row["avg_response_time_sec"] == Decimal("1.5")
+    assert row["estimated_revenue_recovered"] == Decimal("200.0000")
+    assert row["actual_revenue_recovered"] == Decimal("450.00")
+    assert row["cost_savings"] == Decimal("60.0000")
+    assert row["channel_breakdown"] == {
+        "whatsapp": 7, "email": 0, "web": 3, "facebook": 0, "instagram": 0, "tiktok": 0,
+    }
+
+
+def test_business_without_activity_gets_zeroed_row():
+    row = _build_daily_row(uuid.uuid4(), date(2026, 3, 1), None, None, None)
+
+    assert row["total_inquiries"] == 0
+    assert row["leads_captured"] == 0
+    assert row["avg_response_time_sec"] == Decimal("0")
+    assert row["estimated_revenue_recovered"] == Decimal("0")
+    assert row["cost_savings"] == Decimal("0")
+    assert sum(row["channel_breakdown"].values()) == 0
+
+
+@pytest.mark.asyncio
+async def test_backfill_rejects_invalid_ranges():
+    with pytest.raises(ValueError):
+        await backfill_analytics(None, date(2026, 3, 2), date(2026, 3, 1))
+    with pytest.raises(ValueError):
+        await backfill_analytics(None, date(2024, 1, 1), date(2026, 1, 1))
+
+
+def test_utc_window_covers_every_timezone():
+    start, end = _utc_window(date(2026, 3, 1), date(2026, 3, 1))
+    # UTC+14 local midnight is 10:00 the previous UTC day; UTC-12 local end is 12:00 the next UTC day
+    assert start <= datetime(2026, 2, 28, 10, tzinfo=timezone.utc)
+    assert end >= datetime(2026, 3, 2, 12, tzinfo=timezone.utc)
@@ -0,0 +1,96 @@
+"""
+Unit tests for the webhook business routing cache.
+"""
+
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.business_routing import BusinessRoutingCache
+
+
+def _business(whatsapp=None, twilio=None, slug=None):
+    return SimpleNamespace(
+        id=uuid.uuid4(), slug=slug, whatsapp_number=whatsapp,
+        whatsapp_provider="meta", twilio_phone_number=twilio,
+    )
+
+
+class _FakeDB:
+    """Answers the routing query from a fixed business list, matching on the queried column."""
+
+    def __init__(self, businesses):
+        self.businesses = businesses
+        self.queries = 0
+
+    async def execute(self, query):
+        self.queries += 1
+        clause = query.whereclause
+        column, values = clause.left.key, set(clause.right.value)
+        rows = [b for b in self.businesses if getattr(b, column) in values]
+        return SimpleNamespace(all=lambda: rows)
+
+
+def _cache(**kwargs) -> BusinessRoutingCache:
+    defaults = dict(max_entries=100, ttl_seconds=600, negative_ttl_seconds=60)
+    defaults.update(kwargs)
+    return BusinessRoutingCache(**defaults)
+
+
+@pytest.mark.asyncio
+async def test_route_is_cached_under_every_key():
+    hotel = _business(whatsapp="+60111", twilio="+60222", slug="hotel-a")
+    db = _FakeDB([hotel])
+    cache = _cache()
+
+    route = await cache.resolve(db, "whatsapp", "+60111")
+    assert route.id == hotel.id and route.slug == "hotel-a"
+
+    # Same business by Twilio number and slug: no further queries
+    assert (await cache.resolve(db, "twilio", "+60222")).id == hotel.id
+    assert (await cache.resolve(db, "slug", "hotel-a")).id == hotel.id
+    assert db.queries == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_resolution_and_negative_caching():
+    a, b = _business(whatsapp="+601"), _business(whatsapp="+602")
+    db = _FakeDB([a, b])
+    cache = _cache()
+
+    found = await cache.resolve_many(db, "whatsapp", {"+601", "+602", "+609"})
+    assert {k: r.id for k, r in found.items()} == {"+601": a.id, "+602": b.id}
+
+    # Unknown number is remembered as "no business" too
+    assert await cache.resolve(db, "whatsapp", "+609") is None
+    assert db.queries == 1
+    assert cache.get_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_instances():
+    hotel = _business(slug="hotel-b")
+    db = _FakeDB([hotel])
+    instance_1, instance_2 = _cache(), _cache()
+
+    await instance_1.resolve(db, "slug", "hotel-b")
+    await instance_2.resolve(db, "slug", "hotel-b")
+    assert db.queries == 2
+
+    hotel.slug = "hotel-b-renamed"
+    await instance_1.invalidate()
+
+    # instance_2 sees the bumped Redis version and reloads
+    assert await instance_2.resolve(db, "slug", "hotel-b") is None
+    assert (await instance_2.resolve(db, "slug", "hotel-b-renamed")).id == hotel.id
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_reloaded():
+    db = _FakeDB([_business(slug="hotel-c")])
+    cache = _cache(ttl_seconds=-1)
+
+    await cache.resolve(db, "slug", "hotel-c")
+    await cache.resolve(db, "slug", "hotel-c")
+    assert db.queries == 2
@@ -0,0 +1,97 @@
+"""
+Unit tests for the shared-state circuit breaker (in-memory Redis fallback).
+"""
+
+import uuid
+
+import pytest
+
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    # Unique name per test so shared state never leaks between tests
+    return CircuitBreaker(f"test-{uuid.uuid4().hex[:8]}", **kwargs)
+
+
+async def _boom():
+    raise RuntimeError("provider down")
+
+
+async def _ok():
+    return "ok"
+
+
+@pytest.mark.asyncio
+async def test_opens_after_threshold_and_fails_fast():
+    breaker = _breaker(failure_threshold=2, recovery_timeout=60)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await breaker.call(_boom)
+
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(_ok)
+
+
+@pytest.mark.asyncio
+async def test_state_is_shared_between_breaker_instances():
+    """Two instances (think: two Cloud Run workers) see the same circuit."""
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    worker_a = CircuitBreaker(name, failure_threshold=1, recovery_timeout=60)
+    worker_b = CircuitBreaker(name, failure_threshold=1, recovery_timeout=60)
+
+    with pytest.raises(RuntimeError):
+        await worker_a.call(_boom)
+
+    assert await worker_b.can_execute() is False
+
+
+@pytest.mark.asyncio
+async def test_half_open_allows_single_probe_then_closes():
+    breaker = _breaker(failure_threshold=1, recovery_timeout=0)
+
+    with pytest.raises(RuntimeError):
+        await breaker.call(_boom)
+
+    # recovery_timeout=0 → immediately half-open; only one probe at a time
+    assert await breaker.can_execute() is True
+    assert await breaker.can_execute() is False
+
+    await breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+    assert await breaker.call(_ok) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_excluded_exceptions_do_not_count():
+    breaker = _breaker(failure_threshold=1)
+
+    with pytest.raises(ValueError):
+        async def _empty():
+            raise ValueError("empty answer")
+        await breaker.call(_empty, excluded=(ValueError,))
+
+    assert await breaker.can_execute() is True
+
+
+@pytest.mark.asyncio
+async def test_only_server_errors_count_for_http_calls():
+    import httpx
+
+    from app.services.circuit_breaker import RequestRejected, raise_for_server_status
+
+    breaker = _breaker(failure_threshold=1)
+    request = httpx.Request("POST", "https://provider.test/messages")
+
+    async def _respond(status: int):
+        raise_for_server_status(httpx.Response(status, request=request))
+
+    with pytest.raises(RequestRejected):
+        await breaker.call(_respond, 400, excluded=(RequestRejected,))
+    assert await breaker.can_execute() is True
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await breaker.call(_respond, 503, excluded=(RequestRejected,))
+    assert breaker.state == CircuitState.OPEN
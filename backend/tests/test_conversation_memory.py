@@ -0,0 +1,147 @@
+"""
+Unit tests for token-budgeted prompt packing and the rolling conversation summary.
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.services import conversation_memory
+from app.services.conversation_memory import pack_context, summary_due, update_summary
+
+
+@pytest.fixture(autouse=True)
+def length_based_estimates():
+    """Use the length heuristic (len // 4 + 1) so tests never fetch tiktoken's BPE file."""
+    with patch.object(conversation_memory, "_encoding", None), \
+            patch.object(conversation_memory, "_encoding_loaded", True):
+        yield
+
+
+def _message(role: str, content: str, minute: int = 0):
+    return SimpleNamespace(
+        id=uuid.uuid4(), role=role, content=content,
+        sent_at=datetime(2025, 1, 6, 9, tzinfo=timezone.utc) + timedelta(minutes=minute),
+    )
+
+
+def _doc(title: str, size: int):
+    return SimpleNamespace(doc_type="faq", title=title, content="x" * size)
+
+
+def test_newest_message_summary_and_kb_fit_the_budget():
+    # Newest first, as fetch_recent_messages returns them
+    recent = [_message("guest", "g" * 40), *(_message("ai" if i % 2 else "guest", "m" * 400) for i in range(20))]
+
+    packed = pack_context(600, recent, summary="Wedding on 14 March for 120 guests.", kb_docs=[_doc("Ballroom", 200)])
+
+    assert packed.summary.startswith("Wedding")
+    assert "Ballroom" in packed.kb_context
+    assert packed.tokens <= 600
+    # Only a few of the 400-char messages fit, but the newest is always last in the history
+    assert 1 < len(packed.history) < 21
+    assert packed.history[-1]["content"] == f"<guest_message>{'g' * 40}</guest_message>"
+    assert packed.history[0]["role"] == "user"
+
+
+def test_kb_share_is_capped_and_newest_message_always_sent():
+    huge = _message("guest", "h" * 8000)
+    with patch.object(conversation_memory.settings, "llm_kb_budget_share", 0.5):
+        packed = pack_context(1000, [huge], summary=None, kb_docs=[_doc("A", 1200), _doc("B", 1200)])
+
+    assert [m.content for m in packed.messages] == [huge.content]
+    assert packed.kb_context == "No business information available yet."
+
+    with patch.object(conversation_memory.settings, "llm_kb_budget_share", 0.5):
+        packed = pack_context(2000, [_message("guest", "hi")], summary=None, kb_docs=[_doc("A", 2400), _doc("B", 2400)])
+    assert "A:" in packed.kb_context and "B:" not in packed.kb_context
+
+
+class _FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, query):
+        return SimpleNamespace(all=lambda: list(self.rows))
+
+
+@pytest.mark.asyncio
+async def test_summary_folds_older_messages_and_keeps_recent_verbatim():
+    rows = [_message("guest" if i % 2 == 0 else "ai", f"message {i}", minute=i) for i in range(10)]
+    conversation = SimpleNamespace(id=uuid.uuid4(), summary=None, summary_state=None, message_count=8)
+    assert summary_due(conversation)
+
+    prompts = []
+
+    async def fake_llm(prompt: str) -> str:
+        prompts.append(prompt)
+        return "Guest is planning a stay."
+
+    with patch.object(conversation_memory, "_call_summary_llm", fake_llm), \
+            patch.object(conversation_memory.settings, "conversation_summary_keep_recent", 6):
+        assert await update_summary(_FakeDB(rows), conversation)
+
+    assert "message 3" in prompts[0] and "message 4" not in prompts[0]
+    assert conversation.summary == "Guest is planning a stay."
+    assert conversation.summary_state["cursor"] == [rows[3].sent_at.isoformat(), str(rows[3].id)]
+    assert not summary_due(conversation)
+
+
+@pytest.mark.asyncio
+async def test_failed_summary_leaves_state_untouched():
+    rows = [_message("guest", f"message {i}", minute=i) for i in range(10)]
+    conversation = SimpleNamespace(id=uuid.uuid4(), summary="old", summary_state={"turns": 2}, message_count=12)
+
+    async def failing_llm(prompt: str) -> None:
+        return None
+
+    with patch.object(conversation_memory, "_call_summary_llm", failing_llm):
+        assert not await update_summary(_FakeDB(rows), conversation)
+    assert conversation.summary == "old" and conversation.summary_state == {"turns": 2}
+
+
+@pytest.mark.asyncio
+async def test_truncated_summary_is_rejected_and_thinking_is_off():
+    from google.genai import types
+
+    configs = []
+
+    class _Models:
+        async def generate_content(self, model, contents, config):
+            configs.append(config)
+            return SimpleNamespace(
+                text="Guest wants two nights from the",
+                candidates=[SimpleNamespace(finish_reason=types.FinishReason.MAX_TOKENS)],
+            )
+
+    gemini = SimpleNamespace(aio=SimpleNamespace(models=_Models()))
+    with patch("app.services.conversation.gemini_client", gemini), \
+            patch("app.services.conversation.openai_client", None), \
+            patch.object(conversation_memory.settings, "gemini_api_key", "key"):
+        assert await conversation_memory._call_summary_llm("summarize") is None
+
+    assert configs[0].thinking_config.thinking_budget == 0
+    assert configs[0].max_output_tokens == conversation_memory.settings.conversation_summary_max_output_tokens
+
+
+@pytest.mark.asyncio
+async def test_summary_skips_providers_whose_circuit_is_open():
+    from app.services.circuit_breaker import CircuitOpenError
+
+    class _OpenBreaker:
+        async def call(self, fn, *args, **kwargs):
+            raise CircuitOpenError("gemini")
+
+    class _Models:
+        async def generate_content(self, **kwargs):
+            raise AssertionError("called Gemini through an open circuit")
+
+    gemini = SimpleNamespace(aio=SimpleNamespace(models=_Models()))
+    with patch("app.services.conversation.gemini_client", gemini), \
+            patch("app.services.conversation.openai_client", None), \
+            patch.object(conversation_memory.settings, "gemini_api_key", "key"), \
+            patch.object(conversation_memory, "gemini_breaker", _OpenBreaker()):
+        assert await conversation_memory._call_summary_llm("summarize") is None
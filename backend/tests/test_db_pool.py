@@ -0,0 +1,54 @@
+"""
+Unit tests for the instrumented in-process connection pool.
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+from pydantic import ValidationError
+
+from app.config import Settings
+from app.database import InstrumentedQueuePool, PoolMetrics, pool_metrics
+
+
+def test_metrics_track_waits_and_timeouts():
+    metrics = PoolMetrics()
+    metrics.record(0.002)
+    metrics.record(0.010)
+    metrics.record(30.0, timed_out=True)
+
+    assert metrics.checkouts == 2
+    assert metrics.timeouts == 1
+    assert metrics.max_wait_seconds == 0.010
+    assert round(metrics.total_wait_seconds, 3) == 0.012
+
+
+def test_checkouts_are_counted_and_connections_reused():
+    created = []
+
+    def _creator():
+        conn = MagicMock()
+        created.append(conn)
+        return conn
+
+    pool = InstrumentedQueuePool(creator=_creator, pool_size=1, max_overflow=1, timeout=0.01)
+    before = pool_metrics.checkouts
+
+    first = pool.connect()
+    second = pool.connect()
+    assert pool.checkedout() == 2
+    assert pool.overflow() == 1
+
+    first.close()
+    second.close()
+    pool.connect().close()
+
+    assert pool_metrics.checkouts - before == 3
+    # The pooled connection was reused rather than re-created
+    assert len(created) == 2
+
+
+@pytest.mark.parametrize("mode", ["Queue", "queued", "pool"])
+def test_unknown_pool_mode_fails_at_startup(mode):
+    with pytest.raises(ValidationError):
+        Settings(db_pool_mode=mode)
@@ -0,0 +1,47 @@
+"""
+Unit tests for batched KB embedding (generate_embeddings_batch).
+"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.services import generate_embeddings_batch, settings
+
+
+@pytest.mark.asyncio
+async def test_batches_preserve_order_and_report_progress():
+    calls, in_flight, peak = [], 0, 0
+
+    async def _fake_batch(texts):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        calls.append(list(texts))
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [[float(t)] for t in texts], "fake-model"
+
+    progress = []
+
+    with patch("app.services._embed_batch_with_model", side_effect=_fake_batch), \
+         patch.object(settings, "embedding_batch_size", 3), \
+         patch.object(settings, "embedding_batch_concurrency", 2):
+        vectors = await generate_embeddings_batch(
+            [str(i) for i in range(10)],
+            progress=lambda done, total: progress.append((done, total)),
+        )
+
+    assert vectors == [[float(i)] for i in range(10)]
+    assert [len(c) for c in calls] == [3, 3, 3, 1]
+    assert peak <= 2
+    assert progress[-1] == (10, 10)
+    assert len(progress) == 4
+
+
+@pytest.mark.asyncio
+async def test_empty_input_makes_no_requests():
+    with patch("app.services._embed_batch_with_model") as fake:
+        assert await generate_embeddings_batch([]) == []
+    fake.assert_not_called()
@@ -0,0 +1,42 @@
+"""
+Unit tests for the query embedding cache.
+"""
+
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache, normalize_query
+
+
+def test_normalize_query_folds_case_whitespace_and_trailing_punctuation():
+    assert normalize_query("  What time is   CHECK-IN?? ") == "what time is check-in"
+    assert normalize_query("Ada bilik kosong?") == normalize_query("ada bilik kosong")
+
+
+@pytest.mark.asyncio
+async def test_hit_miss_counters_and_model_keying():
+    cache = EmbeddingCache(max_size=10)
+
+    assert await cache.get("what time is check-in", "m1", 3) is None
+    await cache.set("what time is check-in", "m1", 3, [0.1, 0.2, 0.3])
+
+    assert await cache.get("What time is check-in?", "m1", 3) == [0.1, 0.2, 0.3]
+    # Different model or dimension is a different key
+    assert await cache.get("what time is check-in", "m2", 3) is None
+    assert await cache.get("what time is check-in", "m1", 4) is None
+
+    stats = cache.get_stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 3
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_size=2)
+    await cache.set("a", "m", 1, [1.0])
+    await cache.set("b", "m", 1, [2.0])
+    await cache.get("a", "m", 1)          # 'a' becomes most recent
+    await cache.set("c", "m", 1, [3.0])   # evicts 'b'
+
+    assert await cache.get("b", "m", 1) is None
+    assert await cache.get("a", "m", 1) == [1.0]
+    assert cache.get_stats()["evictions"] == 1
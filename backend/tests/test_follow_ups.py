@@ -0,0 +1,101 @@
+"""
+Unit tests for SQL-selected automated follow-ups and their worker pool.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services import follow_ups
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_next_follow_up_at_per_stage():
+    last = datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+    assert follow_ups.next_follow_up_at(last, 0) == last + timedelta(hours=24)
+    assert follow_ups.next_follow_up_at(last, 1) == last + timedelta(hours=72)
+    assert follow_ups.next_follow_up_at(last, 2) == last + timedelta(days=7)
+    assert follow_ups.next_follow_up_at(last, 3) is None
+    assert follow_ups.next_follow_up_at(None, 0) is None
+
+
+@pytest.mark.asyncio
+async def test_due_selection_is_ranked_per_business():
+    captured = {}
+
+    class _DB:
+        async def execute(self, query):
+            captured["sql"] = str(query.compile(dialect=postgresql.dialect()))
+
+            class _Result:
+                def all(self):
+                    return []
+            return _Result()
+
+    await follow_ups.select_due_follow_ups(_DB(), datetime.now(timezone.utc))
+    sql = captured["sql"]
+    assert "row_number() OVER (PARTITION BY conversations.business_id" in sql
+    assert "conversations.next_follow_up_at <=" in sql
+    assert "ORDER BY anon_1.business_rank, anon_1.next_follow_up_at" in sql
+
+
+async def _run(due, handler, workers=2, budget=600):
+    async def select_due(db, now):
+        return due
+
+    async def load_deliveries(db, business_ids):
+        return {b: follow_ups._Delivery("Hotel", None, None) for b in business_ids}
+
+    with patch("app.database.async_session", _Session), \
+            patch.object(follow_ups, "select_due_follow_ups", select_due), \
+            patch.object(follow_ups, "_load_deliveries", load_deliveries), \
+            patch.object(follow_ups, "_follow_up_conversation", handler), \
+            patch.object(follow_ups.settings, "follow_up_workers", workers), \
+            patch.object(follow_ups.settings, "follow_up_time_budget_seconds", budget):
+        return await follow_ups.run_follow_ups()
+
+
+@pytest.mark.asyncio
+async def test_pool_is_bounded_and_isolates_failures():
+    business = uuid.uuid4()
+    due = [(uuid.uuid4(), business) for _ in range(6)]
+    in_flight, peak = 0, 0
+
+    async def handler(conversation_id, business_id, delivery, now):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if conversation_id == due[2][0]:
+            raise RuntimeError("send failed")
+        return conversation_id != due[3][0]
+
+    stats = await _run(due, handler, workers=2)
+    assert peak == 2
+    assert (stats["sent"], stats["skipped"], stats["failed"]) == (4, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_time_budget_defers_remaining_work():
+    due = [(uuid.uuid4(), uuid.uuid4()) for _ in range(3)]
+    handled = []
+
+    async def handler(conversation_id, business_id, delivery, now):
+        handled.append(conversation_id)
+        return True
+
+    stats = await _run(due, handler, budget=0)
+    assert handled == []
+    assert stats["deferred"] == 3
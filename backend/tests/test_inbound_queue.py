@@ -0,0 +1,346 @@
+"""
+Unit tests for the inbound message queue (in-process stand-in).
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services.inbound_queue import InboundQueue
+
+
+def _queue(**kwargs) -> InboundQueue:
+    defaults = dict(
+        partitions=4, workers=2, max_attempts=3, retry_backoff_seconds=0.0,
+        lease_seconds=30, dead_letter_max=100,
+    )
+    defaults.update(kwargs)
+    return InboundQueue(**defaults)
+
+
+async def _drain(queue: InboundQueue):
+    for _ in range(200):
+        if queue.processed + queue.dead_lettered + queue.coalesced >= queue.enqueued and queue.in_flight == 0:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_same_conversation_is_processed_in_order_and_never_concurrently():
+    queue = _queue()
+    seen, active = [], set()
+
+    async def handler(key: str, n: int):
+        assert key not in active, "two jobs for one conversation ran concurrently"
+        active.add(key)
+        await asyncio.sleep(0.005 * (3 - n % 3))  # later messages finish faster
+        seen.append((key, n))
+        active.discard(key)
+
+    queue.register_handler("msg", handler)
+    await queue.enqueue_many(
+        [("msg", key, {"key": key, "n": n}) for n in range(6) for key in ("guest-a", "guest-b")]
+    )
+    await _drain(queue)
+
+    for key in ("guest-a", "guest-b"):
+        assert [n for k, n in seen if k == key] == list(range(6))
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_bounds_concurrency():
+    queue = _queue(partitions=16, workers=2)
+    running, peak = 0, 0
+
+    async def handler(n: int):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    queue.register_handler("msg", handler)
+    await queue.enqueue_many([("msg", f"guest-{n}", {"n": n}) for n in range(12)])
+    await _drain(queue)
+
+    assert queue.processed == 12
+    assert peak <= 2
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_retries_then_dead_letters_and_runs_hook():
+    queue = _queue(max_attempts=3)
+    attempts, hook_calls = [], []
+
+    async def flaky(n: int):
+        attempts.append(n)
+        if n == 1 and attempts.count(1) < 2:
+            raise RuntimeError("transient")
+        if n == 2:
+            raise RuntimeError("always broken")
+
+    async def on_dead(n: int):
+        hook_calls.append(n)
+
+    queue.register_handler("msg", flaky, on_dead_letter=on_dead)
+    await queue.enqueue_many([("msg", "g1", {"n": 1}), ("msg", "g2", {"n": 2})])
+    await _drain(queue)
+
+    assert attempts.count(1) == 2
+    assert attempts.count(2) == 3
+    assert hook_calls == [2]
+    dead = await queue.get_dead_letters()
+    assert [d["job"]["payload"] for d in dead] == [{"n": 2}]
+    assert queue.get_stats()["retries"] == 3
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_unknown_kind_is_rejected_at_enqueue():
+    queue = _queue()
+    with pytest.raises(ValueError):
+        await queue.enqueue("nope", "g", {})
+
+
+@pytest.mark.asyncio
+async def test_rapid_fire_jobs_are_coalesced_until_the_conversation_is_quiet():
+    queue = _queue(coalesce_window_seconds=0.1, coalesce_max_wait_seconds=1.0)
+    calls = []
+
+    async def handler(key: str, texts: list[str]):
+        calls.append((key, texts))
+
+    def merge(payloads: list[dict]) -> dict:
+        return {"key": payloads[0]["key"], "texts": [t for p in payloads for t in p["texts"]]}
+
+    queue.register_handler("msg", handler, coalesce=merge)
+    await queue.enqueue("msg", "guest-a", {"key": "guest-a", "texts": ["hi"]})
+    await asyncio.sleep(0.03)
+    await queue.enqueue("msg", "guest-a", {"key": "guest-a", "texts": ["room for 2?"]})
+    await queue.enqueue("msg", "guest-b", {"key": "guest-b", "texts": ["hello"]})
+    await asyncio.sleep(0.03)
+    await queue.enqueue("msg", "guest-a", {"key": "guest-a", "texts": ["this weekend"]})
+    await _drain(queue)
+
+    assert sorted(calls) == [
+        ("guest-a", ["hi", "room for 2?", "this weekend"]),
+        ("guest-b", ["hello"]),
+    ]
+    assert queue.get_stats()["coalesced"] == 2
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_coalescing_stops_at_a_different_kind_for_the_same_conversation():
+    queue = _queue(coalesce_window_seconds=0.05, coalesce_max_wait_seconds=0.5)
+    seen = []
+
+    async def text_handler(texts: list[str]):
+        seen.append(("text", texts))
+
+    async def media_handler(n: int):
+        seen.append(("media", n))
+
+    queue.register_handler(
+        "text", text_handler, coalesce=lambda ps: {"texts": [t for p in ps for t in p["texts"]]}
+    )
+    queue.register_handler("media", media_handler)
+    await queue.enqueue_many([
+        ("text", "guest-a", {"texts": ["a"]}),
+        ("text", "guest-a", {"texts": ["b"]}),
+        ("media", "guest-a", {"n": 1}),
+        ("text", "guest-a", {"texts": ["c"]}),
+    ])
+    await _drain(queue)
+
+    assert seen == [("text", ["a", "b"]), ("media", 1), ("text", ["c"])]
+    await queue.stop()
+
+
+class _LeaseRedis:
+    """Just enough of a Redis client for partition leases and the instance heartbeat."""
+
+    def __init__(self):
+        self.values: dict[str, str] = {}
+        self.instances: dict[str, float] = {}
+        self.fail_renewals = False
+        self.streams: dict[str, list] = {}
+        self.arrivals: dict[str, asyncio.Event] = {}
+        self.blocked = 0
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, owner, *args):
+        if "expire" in script and self.fail_renewals:
+            raise ConnectionError("redis timeout")
+        if self.values.get(key) != owner:
+            return 0
+        if "del" in script:
+            del self.values[key]
+        return 1
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (stream, last_id), = streams.items()
+        entries = self.streams.setdefault(stream, [])
+        if last_id != ">":
+            return []
+        if not entries and block:
+            # Like XREADGROUP BLOCK: wait for an entry on this stream, or the timeout
+            arrived = self.arrivals.setdefault(stream, asyncio.Event())
+            arrived.clear()
+            self.blocked += 1
+            try:
+                await asyncio.wait_for(arrived.wait(), block / 1000)
+            except asyncio.TimeoutError:
+                return []
+            finally:
+                self.blocked -= 1
+        batch, entries[:] = entries[:count], entries[count:]
+        return [(stream, batch)] if batch else []
+
+    def add_entry(self, stream, entry_id, job):
+        self.streams.setdefault(stream, []).append((entry_id, {"job": json.dumps(job)}))
+        self.arrivals.setdefault(stream, asyncio.Event()).set()
+
+    async def zrem(self, key, member):
+        self.instances.pop(member, None)
+
+    def pipeline(self, transaction=True):
+        redis, ops = self, []
+
+        class _Pipeline:
+            def zadd(self, key, mapping):
+                ops.append(lambda: redis.instances.update(mapping))
+
+            def zremrangebyscore(self, key, low, high):
+                ops.append(lambda: [redis.instances.pop(m) for m, s in list(redis.instances.items()) if s <= high])
+
+            def zcard(self, key):
+                ops.append(lambda: len(redis.instances))
+
+            def xack(self, stream, group, entry_id):
+                pass
+
+            def xdel(self, stream, entry_id):
+                pass
+
+            async def execute(self):
+                return [op() for op in ops]
+
+        return _Pipeline()
+
+
+def _redis_queue(redis: _LeaseRedis) -> InboundQueue:
+    queue = _queue(partitions=8)
+    queue._redis = redis
+    return queue
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_shared_fairly_between_live_instances():
+    redis = _LeaseRedis()
+    first, second = _redis_queue(redis), _redis_queue(redis)
+
+    await first._balance_leases()
+    assert len(first._owned) == 8
+
+    # A second instance joins: the first hands off its surplus, the second takes it
+    await second._balance_leases()
+    await first._balance_leases()
+    await second._balance_leases()
+
+    assert len(first._owned) == len(second._owned) == 4
+    assert first._owned.isdisjoint(second._owned)
+    for queue in (first, second):
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_busy_partitions_are_handed_off_after_their_job():
+    redis = _LeaseRedis()
+    first, second = _redis_queue(redis), _redis_queue(redis)
+    await first._balance_leases()
+    first._busy = set(first._owned)
+
+    await second._balance_leases()
+    await first._balance_leases()
+    assert len(first._owned) == 8
+
+    first._busy.clear()
+    await first._balance_leases()
+    assert len(first._owned) == 4
+    for queue in (first, second):
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_lease_renewal_drops_local_ownership():
+    redis = _LeaseRedis()
+    queue = _redis_queue(redis)
+    await queue._balance_leases()
+
+    redis.fail_renewals = True
+    await queue._renew_leases()
+
+    assert queue._owned == set()
+    assert queue._partition_tasks == {}
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_a_coalescing_burst_does_not_hold_up_other_guests_on_its_partition():
+    queue = _queue(partitions=1, coalesce_window_seconds=0.2, coalesce_max_wait_seconds=1.0)
+    seen = []
+
+    async def text_handler(key: str, texts: list[str]):
+        seen.append((key, texts))
+
+    async def media_handler(key: str):
+        seen.append((key, "media"))
+
+    queue.register_handler(
+        "text", text_handler, coalesce=lambda ps: {"key": ps[0]["key"], "texts": [t for p in ps for t in p["texts"]]}
+    )
+    queue.register_handler("media", media_handler)
+    await queue.enqueue("text", "guest-a", {"key": "guest-a", "texts": ["hi"]})
+    await queue.enqueue("media", "guest-b", {"key": "guest-b"})
+    await asyncio.sleep(0.05)
+
+    # guest-b went straight through while guest-a's burst is still open
+    assert seen == [("guest-b", "media")]
+    assert queue.get_stats()["held_for_coalescing"] == 1
+    await _drain(queue)
+    assert seen == [("guest-b", "media"), ("guest-a", ["hi"])]
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_a_message_is_delivered_while_other_partitions_stay_idle():
+    redis = _LeaseRedis()
+    queue = _redis_queue(redis)
+    seen = []
+
+    async def handler(n: int):
+        seen.append(n)
+
+    queue.register_handler("msg", handler)
+    await queue._balance_leases()
+    await asyncio.sleep(0.05)
+    assert redis.blocked == 8  # One blocking read per owned partition
+
+    partition = queue.partition_for("guest-a")
+    job = {"id": "j1", "kind": "msg", "ordering_key": "guest-a", "payload": {"n": 1}, "enqueued_at": time.time()}
+    redis.add_entry(queue._stream(partition), "1-0", job)
+    await asyncio.sleep(0.1)
+
+    # Delivered well before the idle partitions' 2s blocking reads time out
+    assert seen == [1]
+    await queue.stop()
@@ -0,0 +1,150 @@
+"""
+Unit tests for the map-reduce monthly insights pipeline.
+"""
+
+import asyncio
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+from app.services import conversation_memory, insights
+
+
+@pytest.fixture(autouse=True)
+def _length_based_tokens():
+    # tiktoken's encoding may not be downloadable here; use the length fallback
+    with patch.object(conversation_memory, "_encoding", None), \
+            patch.object(conversation_memory, "_encoding_loaded", True):
+        yield
+
+
+def _conversation(n: int, lines: int = 2, words: int = 10):
+    """Conversation with ID int n (so n % every decides content-defined boundaries)."""
+    cid = uuid.UUID(int=n)
+    text = " ".join(["word"] * words)
+    return cid, [f"--- Conversation {cid} ---", *(f"guest: {text} {i}" for i in range(lines))]
+
+
+async def _stream(conversations):
+    for item in conversations:
+        yield item
+
+
+def _stats():
+    return {"conversations": 0, "words": 0, "chunks": 0, "cached_chunks": 0, "summarized_chunks": 0, "failed_chunks": 0}
+
+
+async def _chunks(conversations):
+    return [chunk async for chunk in insights.iter_transcript_chunks(_stream(conversations), _stats())]
+
+
+@pytest.mark.asyncio
+async def test_chunks_respect_budget_and_split_oversized_conversations():
+    with patch.object(insights.settings, "insights_chunk_tokens", 100), \
+            patch.object(insights.settings, "insights_chunk_conversations", 0):
+        chunks = await _chunks([_conversation(1), _conversation(2), _conversation(3, lines=20), _conversation(4)])
+
+    assert all(conversation_memory.estimate_tokens(c.text) <= 110 for c in chunks)
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    # The oversized conversation went into its own pieces, the small ones stayed whole
+    assert chunks[0].conversations == 2 and "guest" in chunks[0].text
+    assert sum("Conversation 00000000-0000-0000-0000-000000000003" in c.text for c in chunks) == 1
+    assert len(chunks) > 3
+
+
+@pytest.mark.asyncio
+async def test_content_defined_boundaries_keep_chunks_stable_when_window_moves():
+    conversations = [_conversation(n) for n in range(1, 13)]
+    with patch.object(insights.settings, "insights_chunk_tokens", 10_000), \
+            patch.object(insights.settings, "insights_chunk_conversations", 4):
+        before = await _chunks(conversations)
+        # Oldest conversation leaves the window, a new one arrives
+        after = await _chunks(conversations[1:] + [_conversation(13)])
+
+    # Boundaries after conversations 4, 8 and 12: only the first and last chunks change
+    assert [c.conversations for c in before] == [4, 4, 4]
+    assert before[1].digest == after[1].digest
+    assert before[0].digest != after[0].digest
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, expire=None, nx=False):
+        self.store[key] = value
+        return True
+
+
+@pytest.mark.asyncio
+async def test_map_is_bounded_and_cached_across_runs():
+    redis = _FakeRedis()
+    in_flight = peak = calls = 0
+
+    async def fake_generate(contents, instruction, temperature=0.3):
+        nonlocal in_flight, peak, calls
+        calls += 1
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return f"summary of {len(contents)}"
+
+    async def get_redis():
+        return redis
+
+    chunks = [insights.TranscriptChunk(i, f"chunk text {i}", 1) for i in range(7)]
+
+    async def run():
+        stats = _stats()
+        with patch.object(insights, "_generate", fake_generate), \
+                patch.object(insights, "get_redis", get_redis), \
+                patch.object(insights.settings, "insights_map_concurrency", 3):
+            summaries = await insights.map_chunks(_stream(chunks), stats)
+        return summaries, stats
+
+    summaries, stats = await run()
+    assert len(summaries) == 7 and peak <= 3
+    assert stats["summarized_chunks"] == 7
+
+    summaries_again, stats = await run()
+    assert summaries_again == summaries
+    assert stats["cached_chunks"] == 7 and calls == 7
+
+
+@pytest.mark.asyncio
+async def test_reduce_merges_until_summaries_fit():
+    calls = []
+
+    async def fake_generate(contents, instruction, temperature=0.3):
+        calls.append(instruction)
+        return "merged " + "x" * 20
+
+    summaries = ["y" * 200 for _ in range(8)]
+    with patch.object(insights, "_generate", fake_generate), \
+            patch.object(insights.settings, "insights_reduce_tokens", 120):
+        report = await insights.reduce_summaries(summaries)
+
+    assert report.startswith("merged")
+    assert calls[-1] == insights.INSIGHT_SYSTEM_INSTRUCTION
+    assert insights.MERGE_SYSTEM_INSTRUCTION in calls[:-1]
+
+
+@pytest.mark.asyncio
+async def test_tiny_transcripts_skip_the_llm():
+    async def stream(db, business_id, cutoff_date):
+        yield _conversation(1, lines=1, words=3)
+
+    async def fail_generate(*args, **kwargs):
+        raise AssertionError("LLM should not be called")
+
+    with patch.object(insights, "gemini_client", object()), \
+            patch.object(insights, "_stream_conversations", stream), \
+            patch.object(insights, "_generate", fail_generate):
+        report = await insights.compute_monthly_insights(None, uuid.uuid4())
+
+    assert report == "Insufficient conversational data to extract meaningful insights."
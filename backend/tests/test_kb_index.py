@@ -0,0 +1,64 @@
+"""
+Unit tests for the in-memory per-business KB vector index.
+"""
+
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.kb_index import BusinessVectorIndex, KnowledgeBaseIndex, get_kb_version
+
+
+def _row(business_id, title, embedding):
+    return SimpleNamespace(
+        id=uuid.uuid4(), business_id=business_id, doc_type="faqs",
+        title=title, content=f"{title} content", embedding=embedding,
+    )
+
+
+def test_search_ranks_by_cosine_and_applies_distance_cutoff():
+    bid = uuid.uuid4()
+    rows = [
+        _row(bid, "exact", [1.0, 0.0, 0.0]),
+        _row(bid, "close", [0.9, 0.1, 0.0]),
+        _row(bid, "orthogonal", [0.0, 1.0, 0.0]),   # distance 1.0 → filtered
+        _row(bid, "no-embedding", None),
+        _row(bid, "zero", [0.0, 0.0, 0.0]),
+    ]
+    index = BusinessVectorIndex.build(bid, version=0, rows=rows)
+
+    results = index.search([2.0, 0.0, 0.0], limit=5)
+    assert [d.title for d in results] == ["exact", "close"]
+
+    assert [d.title for d in index.search([1.0, 0.0, 0.0], limit=1)] == ["exact"]
+    assert index.search([0.0, 0.0, 0.0], limit=5) == []
+
+
+def test_search_matches_brute_force_top_k():
+    bid = uuid.uuid4()
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(50, 16))
+    index = BusinessVectorIndex.build(bid, 0, [_row(bid, str(i), v.tolist()) for i, v in enumerate(vectors)])
+
+    query = rng.normal(size=16)
+    sims = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)) @ (query / np.linalg.norm(query))
+    expected = [str(i) for i in np.argsort(-sims) if 1 - sims[i] < 0.8][:5]
+
+    assert [d.title for d in index.search(query.tolist(), limit=5)] == expected
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bumps_version_and_forces_miss():
+    bid = uuid.uuid4()
+    kb = KnowledgeBaseIndex(max_businesses=10, ttl_seconds=600, max_docs=100)
+    kb._schedule_warm = lambda business_id: None  # no DB in unit tests
+
+    version = await get_kb_version(bid)
+    kb._indexes[bid] = BusinessVectorIndex.build(bid, version, [_row(bid, "a", [1.0, 0.0])])
+    assert [d.title for d in await kb.search(bid, [1.0, 0.0], 5)] == ["a"]
+
+    await kb.invalidate(bid)
+    assert await get_kb_version(bid) == version + 1
+    assert await kb.search(bid, [1.0, 0.0], 5) is None
@@ -0,0 +1,89 @@
+"""
+Unit tests for the content-hashed, diffing KB ingest.
+"""
+
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services import ingest_knowledge_base, kb_content_hash
+
+
+def _doc(title, content, doc_type="faqs"):
+    return {"doc_type": doc_type, "title": title, "content": content}
+
+
+def _db_with_rows(rows):
+    db = MagicMock()
+    existing = MagicMock()
+    existing.all.return_value = rows
+    db.execute = AsyncMock(side_effect=[existing, MagicMock(), MagicMock()])
+    return db
+
+
+def test_content_hash_depends_on_model_and_fields():
+    base = kb_content_hash("faqs", "Check-in", "3pm", "m1")
+    assert base == kb_content_hash("faqs", "Check-in", "3pm", "m1")
+    assert base != kb_content_hash("faqs", "Check-in", "2pm", "m1")
+    assert base != kb_content_hash("rates", "Check-in", "3pm", "m1")
+    assert base != kb_content_hash("faqs", "Check-in", "3pm", "m2")
+    assert kb_content_hash("faqs", "Check-in", "3pm", None) is None
+
+
+@pytest.mark.asyncio
+async def test_only_changed_chunks_are_embedded_and_removed_chunks_deleted():
+    bid = uuid.uuid4()
+    kept_id, changed_id, legacy_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    rows = [
+        SimpleNamespace(id=kept_id, content_hash=kb_content_hash("faqs", "Check-in", "3pm", "m1")),
+        SimpleNamespace(id=changed_id, content_hash=kb_content_hash("rates", "Deluxe", "RM 200", "m1")),
+        SimpleNamespace(id=legacy_id, content_hash=None),
+    ]
+    db = _db_with_rows(rows)
+    embedded, after_commit = [], []
+
+    async def _fake_batch(texts):
+        embedded.extend(texts)
+        return [[1.0] for _ in texts], "m1"
+
+    with patch("app.services._primary_embedding_model", return_value="m1"), \
+         patch("app.services._embed_batch_with_model", side_effect=_fake_batch), \
+         patch("app.services.invalidate_kb_index", new=AsyncMock()) as invalidate, \
+         patch("app.services.run_after_commit", lambda session, job: after_commit.append(job)):
+        count = await ingest_knowledge_base(
+            db, bid, [_doc("Check-in", "3pm"), _doc("Deluxe", "RM 250", doc_type="rates")]
+        )
+        # The index is only invalidated once the caller commits the ingest
+        invalidate.assert_not_awaited()
+        for job in after_commit:
+            await job()
+
+    assert count == 2
+    assert embedded == ["Deluxe\nRM 250"]
+
+    delete_stmt = db.execute.await_args_list[1].args[0]
+    deleted = set(delete_stmt.whereclause.right.value)
+    assert deleted == {changed_id, legacy_id}
+
+    inserted = db.execute.await_args_list[2].args[1]
+    assert [r["title"] for r in inserted] == ["Deluxe"]
+    assert inserted[0]["content_hash"] == kb_content_hash("rates", "Deluxe", "RM 250", "m1")
+    invalidate.assert_awaited_once_with(bid)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_kb_does_no_writes():
+    bid = uuid.uuid4()
+    rows = [SimpleNamespace(id=uuid.uuid4(), content_hash=kb_content_hash("faqs", "Wifi", "Free", "m1"))]
+    db = _db_with_rows(rows)
+
+    with patch("app.services._primary_embedding_model", return_value="m1"), \
+         patch("app.services._embed_batch_with_model") as fake_batch, \
+         patch("app.services.run_after_commit") as after_commit:
+        assert await ingest_knowledge_base(db, bid, [_doc("Wifi", "Free")]) == 1
+
+    fake_batch.assert_not_called()
+    assert db.execute.await_count == 1
+    after_commit.assert_not_called()
@@ -0,0 +1,79 @@
+"""
+Unit tests for the streaming lead export encoders.
+"""
+
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.services.lead_export import LeadExportFilters, check_export_format, stream_leads_export
+
+
+def _lead(name, value):
+    return SimpleNamespace(
+        id=uuid.uuid4(), guest_name=name, guest_phone="+60123456789", guest_email=None,
+        intent="room_booking", status="new", estimated_value=value, actual_revenue=None,
+        priority="standard", source_channel="whatsapp", is_after_hours=True,
+        captured_at=datetime(2026, 3, 1, 22, 15, tzinfo=timezone.utc),
+    )
+
+
+def _fake_batches(*batches):
+    async def _iter(filters, batch_size):
+        for batch in batches:
+            yield batch
+    return _iter
+
+
+async def _collect(fmt, gzipped=False, batches=()):
+    filters = LeadExportFilters(business_id=uuid.uuid4())
+    with patch("app.services.lead_export.iter_lead_batches", _fake_batches(*batches)):
+        chunks = [c async for c in stream_leads_export(filters, fmt=fmt, gzipped=gzipped)]
+    return chunks
+
+
+@pytest.mark.asyncio
+async def test_csv_streams_one_chunk_per_batch_with_header():
+    batches = [[_lead("Aisyah", Decimal("450.00"))], [_lead("Ben", None)]]
+    chunks = await _collect("csv", batches=batches)
+
+    assert len(chunks) == 3  # header + two batches
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert rows[0][0] == "Name"
+    assert rows[1][:2] == ["Aisyah", "+60123456789"]
+    assert rows[1][5] == "450.0"
+    assert rows[2][5] == ""
+
+
+@pytest.mark.asyncio
+async def test_gzip_ndjson_round_trips():
+    chunks = await _collect("ndjson", gzipped=True, batches=[[_lead("Aisyah", Decimal("450.00"))]])
+
+    lines = gzip.decompress(b"".join(chunks)).decode().splitlines()
+    record = json.loads(lines[0])
+    assert record["guest_name"] == "Aisyah"
+    assert record["estimated_value"] == 450.0
+    assert record["captured_at"].startswith("2026-03-01T22:15")
+
+
+@pytest.mark.asyncio
+async def test_parquet_output_is_readable():
+    pq = pytest.importorskip("pyarrow.parquet")
+    chunks = await _collect("parquet", batches=[[_lead("A", Decimal("1"))], [_lead("B", None)]])
+
+    table = pq.read_table(io.BytesIO(b"".join(chunks)))
+    assert table.num_rows == 2
+    assert table.column("guest_name").to_pylist() == ["A", "B"]
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        check_export_format("xlsx")
@@ -0,0 +1,193 @@
+"""
+Unit tests for incremental post-reply lead extraction.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.services import lead_extraction
+
+
+class _Thread:
+    """Messages of one conversation, served after a (sent_at, id) cursor like the SQL query."""
+
+    def __init__(self):
+        self.rows = []
+        self.start = datetime(2025, 1, 6, 9, tzinfo=timezone.utc)
+
+    def add(self, role: str, content: str):
+        self.rows.append(SimpleNamespace(
+            id=uuid.uuid4(), role=role, content=content,
+            sent_at=self.start + timedelta(minutes=len(self.rows)),
+        ))
+
+    async def new_messages(self, db, conversation_id, cursor, limit):
+        rows = self.rows
+        if cursor:
+            after = (datetime.fromisoformat(cursor[0]), cursor[1])
+            rows = [r for r in rows if (r.sent_at, str(r.id)) > after]
+        return rows[:limit]
+
+
+class _FakeDB:
+    def __init__(self):
+        self.added = []
+
+    def add(self, obj):
+        self.added.append(obj)
+
+
+def _conversation(channel="web"):
+    return SimpleNamespace(
+        id=uuid.uuid4(), business_id=uuid.uuid4(), lead_extraction=None,
+        guest_name=None, is_after_hours=True, message_count=0, channel=channel,
+    )
+
+
+async def _extract(thread, conversation, replies, channel="web", guest="web:abc"):
+    """Run one extraction; the fake LLM answers from `replies` and records what it was sent."""
+    calls = []
+
+    async def fake_llm(known, new_messages):
+        calls.append((dict(known), new_messages))
+        return replies.pop(0)
+
+    with patch.object(lead_extraction, "_new_messages", thread.new_messages), \
+            patch.object(lead_extraction, "_call_extraction_llm", fake_llm):
+        lead = await lead_extraction.extract_lead_incrementally(_FakeDB(), conversation, guest, channel)
+    return lead, calls
+
+
+_EMPTY = dict(guest_name=None, guest_email=None, guest_phone=None, intent=None, estimated_nights=None)
+
+
+@pytest.mark.asyncio
+async def test_only_new_messages_are_sent_and_state_is_kept():
+    thread, conversation = _Thread(), _conversation()
+    thread.add("guest", "Hi, do you have rooms for our wedding party?")
+    thread.add("ai", "Congratulations! For which dates?")
+
+    lead, calls = await _extract(thread, conversation, [{**_EMPTY, "intent": "event"}])
+    assert lead is None
+    assert conversation.lead_extraction["details"] == {"intent": "event"}
+    assert conversation.lead_extraction["messages_read"] == 2
+
+    thread.add("guest", "12-14 March. I'm Aisyah, aisyah@example.com")
+    thread.add("ai", "Thank you Aisyah!")
+    lead, calls = await _extract(
+        thread, conversation,
+        [{**_EMPTY, "guest_name": "Aisyah", "guest_email": "aisyah@example.com", "estimated_nights": 2}],
+    )
+
+    # Second run saw the earlier details but only the two new messages
+    (known, new_messages), = calls
+    assert known == {"intent": "event"}
+    assert "wedding" not in new_messages and "Aisyah" in new_messages
+
+    assert lead.guest_name == "Aisyah" and lead.intent == "event"
+    # The keyword from the first run still counts for scoring
+    assert lead.priority == "high_value"
+    assert conversation.guest_name == "Aisyah"
+
+
+@pytest.mark.asyncio
+async def test_long_threads_are_read_in_batches():
+    thread, conversation = _Thread(), _conversation(channel="whatsapp")
+    for i in range(5):
+        thread.add("guest", f"message {i}")
+
+    with patch.object(lead_extraction.settings, "lead_extraction_batch_messages", 2):
+        lead, calls = await _extract(thread, conversation, [dict(_EMPTY) for _ in range(3)], channel="whatsapp", guest="+60123")
+
+    assert [c[1].count("guest:") for c in calls] == [2, 2, 1]
+    # WhatsApp number is enough for a lead once extraction has run
+    assert lead.guest_phone == "+60123"
+
+
+@pytest.mark.asyncio
+async def test_failed_llm_call_keeps_cursor():
+    thread, conversation = _Thread(), _conversation(channel="whatsapp")
+    thread.add("guest", "Any rooms tonight?")
+
+    lead, _ = await _extract(thread, conversation, [None], channel="whatsapp", guest="+60123")
+    assert lead is None
+    assert conversation.lead_extraction is None
+
+
+@pytest.mark.asyncio
+async def test_extraction_is_queued_only_after_commit():
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    enqueued = []
+
+    async def fake_enqueue(kind, ordering_key, payload):
+        enqueued.append((kind, ordering_key, payload))
+
+    conversation = _conversation()
+    db = AsyncSession()
+    with patch.object(lead_extraction.post_reply_queue, "enqueue", fake_enqueue):
+        db.sync_session.begin()
+        lead_extraction.schedule_lead_extraction(db, conversation, "web:abc", "web")
+        await db.rollback()
+        await asyncio.sleep(0)
+        assert enqueued == []
+
+        db.sync_session.begin()
+        lead_extraction.schedule_lead_extraction(db, conversation, "web:abc", "web")
+        assert enqueued == []
+        await db.commit()
+        await asyncio.sleep(0)
+
+    assert enqueued == [(
+        lead_extraction.JOB_KIND,
+        f"lead:{conversation.id}",
+        {
+            "business_id": str(conversation.business_id),
+            "conversation_id": str(conversation.id),
+            "guest_identifier": "web:abc",
+            "channel": "web",
+        },
+    )]
+
+
+@pytest.mark.asyncio
+async def test_extraction_call_goes_through_the_breaker_with_thinking_off():
+    from app.services.circuit_breaker import CircuitOpenError
+
+    configs, breaker_calls = [], []
+
+    class _Breaker:
+        def __init__(self, name, is_open=False):
+            self.name, self.is_open = name, is_open
+
+        async def call(self, fn, *args, **kwargs):
+            breaker_calls.append(self.name)
+            if self.is_open:
+                raise CircuitOpenError(self.name)
+            return await fn(*args, **kwargs)
+
+    class _Models:
+        async def generate_content(self, model, contents, config):
+            configs.append(config)
+            return SimpleNamespace(text='{"guest_name": "Aisyah"}')
+
+    gemini = SimpleNamespace(aio=SimpleNamespace(models=_Models()))
+    with patch("app.services.conversation.gemini_client", gemini), \
+            patch("app.services.conversation.openai_client", None), \
+            patch.object(lead_extraction.settings, "gemini_api_key", "key"), \
+            patch.object(lead_extraction, "gemini_breaker", _Breaker("gemini")):
+        assert await lead_extraction._call_extraction_llm({}, "guest: I'm Aisyah") == {"guest_name": "Aisyah"}
+    assert configs[0].thinking_config.thinking_budget == 0
+
+    # An open circuit fails fast without calling Gemini
+    with patch("app.services.conversation.gemini_client", gemini), \
+            patch("app.services.conversation.openai_client", None), \
+            patch.object(lead_extraction.settings, "gemini_api_key", "key"), \
+            patch.object(lead_extraction, "gemini_breaker", _Breaker("gemini", is_open=True)):
+        assert await lead_extraction._call_extraction_llm({}, "guest: hi") is None
+    assert len(configs) == 1 and breaker_calls == ["gemini", "gemini"]
@@ -0,0 +1,118 @@
+"""
+Unit tests for hedged multi-provider LLM dispatch in _call_llm.
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import patch
+
+from app.services import conversation
+from app.services.llm_latency import LatencyHistogram, MIN_SAMPLES_FOR_PERCENTILE
+
+
+def _provider(text: str, delay: float = 0.0, fail: bool = False):
+    """Build a fake provider call that sleeps, then answers or raises."""
+    calls = {"started": 0, "cancelled": False}
+
+    async def call(messages, max_tokens, temperature):
+        calls["started"] += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            calls["cancelled"] = True
+            raise
+        if fail:
+            raise RuntimeError(f"{text} down")
+        return text, None, text
+
+    return call, calls
+
+
+@pytest.mark.asyncio
+async def test_hedge_races_second_provider_when_primary_is_slow():
+    slow, slow_calls = _provider("gemini", delay=5)
+    fast, fast_calls = _provider("anthropic", delay=0.01)
+
+    with patch.object(conversation, "_llm_providers", return_value=[("gemini", slow), ("anthropic", fast)]), \
+         patch.object(conversation, "get_hedge_delay_seconds", return_value=0.05), \
+         patch.object(conversation.settings, "llm_hedging_enabled", True):
+        text, _, model = await conversation._call_llm([{"role": "user", "content": "hi"}])
+
+    assert text == "anthropic"
+    assert fast_calls["started"] == 1
+    await asyncio.sleep(0)
+    assert slow_calls["cancelled"] is True
+
+
+@pytest.mark.asyncio
+async def test_cancelled_hedge_loser_still_records_its_latency():
+    slow, _ = _provider("gemini", delay=5)
+    fast, _ = _provider("anthropic", delay=0.01)
+    histograms = {"gemini": LatencyHistogram("gemini"), "anthropic": LatencyHistogram("anthropic")}
+
+    with patch.object(conversation, "_llm_providers", return_value=[("gemini", slow), ("anthropic", fast)]), \
+         patch.object(conversation, "get_hedge_delay_seconds", return_value=0.05), \
+         patch.object(conversation, "get_histogram", histograms.__getitem__), \
+         patch.object(conversation.settings, "llm_hedging_enabled", True):
+        await conversation._call_llm([{"role": "user", "content": "hi"}])
+        await asyncio.sleep(0)
+
+    # The loser ran for at least the hedge delay before it was cancelled
+    assert histograms["gemini"].total_count == 1
+    assert histograms["gemini"]._samples[0] >= 50
+    assert histograms["anthropic"].total_count == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_not_fired_when_primary_answers_in_time():
+    primary, _ = _provider("gemini", delay=0.01)
+    backup, backup_calls = _provider("anthropic")
+
+    with patch.object(conversation, "_llm_providers", return_value=[("gemini", primary), ("anthropic", backup)]), \
+         patch.object(conversation, "get_hedge_delay_seconds", return_value=1.0), \
+         patch.object(conversation.settings, "llm_hedging_enabled", True):
+        text, _, _ = await conversation._call_llm([{"role": "user", "content": "hi"}])
+
+    assert text == "gemini"
+    assert backup_calls["started"] == 0
+
+
+@pytest.mark.asyncio
+async def test_primary_failure_falls_through_immediately():
+    broken, _ = _provider("gemini", fail=True)
+    backup, _ = _provider("openai")
+
+    with patch.object(conversation, "_llm_providers", return_value=[("gemini", broken), ("openai", backup)]), \
+         patch.object(conversation, "get_hedge_delay_seconds", return_value=10.0), \
+         patch.object(conversation.settings, "llm_hedging_enabled", True):
+        text, _, _ = await asyncio.wait_for(
+            conversation._call_llm([{"role": "user", "content": "hi"}]), timeout=1.0
+        )
+
+    assert text == "openai"
+
+
+@pytest.mark.asyncio
+async def test_all_providers_fail_returns_template():
+    a, _ = _provider("gemini", fail=True)
+    b, _ = _provider("anthropic", fail=True)
+
+    with patch.object(conversation, "_llm_providers", return_value=[("gemini", a), ("anthropic", b)]), \
+         patch.object(conversation.settings, "llm_hedging_enabled", True):
+        text, _, model = await conversation._call_llm([{"role": "user", "content": "hi"}])
+
+    assert text == conversation.FALLBACK_RESPONSE
+    assert model == "fallback_template"
+
+
+def test_histogram_percentile_needs_minimum_samples():
+    histogram = LatencyHistogram("gemini")
+    for _ in range(MIN_SAMPLES_FOR_PERCENTILE - 1):
+        histogram.record(100)
+    assert histogram.percentile(0.95) is None
+
+    histogram = LatencyHistogram("gemini")
+    for ms in range(1, 101):
+        histogram.record(ms)
+    assert histogram.percentile(0.95) == 95
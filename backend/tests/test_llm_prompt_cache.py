@@ -0,0 +1,200 @@
+"""
+Unit tests for provider-side prompt prefix caching.
+"""
+
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from google.genai import errors
+
+from app.core.redis import get_redis
+from app.services import conversation
+from app.services.llm_prompt_cache import GeminiPrefixCache, LLMUsage, PromptCacheStats, is_stale_handle_error
+from app.services.prompt_context import SystemPrompt
+
+
+def _prompt(prefix="Rules for Hotel Seri", slot=None) -> SystemPrompt:
+    return SystemPrompt(prefix=prefix, suffix="Now: Monday", cache_slot=slot or f"{uuid.uuid4()}:concierge")
+
+
+class _FakeCaches:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created = []
+
+    async def create(self, model, config):
+        if self.fail:
+            raise RuntimeError("Cached content is too small")
+        self.created.append(config.system_instruction)
+        return SimpleNamespace(
+            name=f"cachedContents/{uuid.uuid4().hex}",
+            expire_time=datetime.now(timezone.utc) + timedelta(seconds=int(config.ttl.rstrip("s"))),
+        )
+
+
+def _client(caches):
+    return SimpleNamespace(aio=SimpleNamespace(caches=caches))
+
+
+@pytest.mark.asyncio
+async def test_gemini_handle_reused_until_prefix_changes():
+    caches = _FakeCaches()
+    cache = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+    prompt = _prompt()
+
+    first = await cache.resolve(_client(caches), "gemini-test", prompt)
+    assert await cache.resolve(_client(caches), "gemini-test", prompt) == first
+    assert caches.created == ["Rules for Hotel Seri"]
+
+    # A config change produces a new prefix for the same slot → new handle
+    changed = _prompt("Rules for Hotel Seri Baru", slot=prompt.cache_slot)
+    assert await cache.resolve(_client(caches), "gemini-test", changed) != first
+    assert len(caches.created) == 2
+
+
+@pytest.mark.asyncio
+async def test_gemini_handle_shared_across_instances():
+    caches = _FakeCaches()
+    prompt = _prompt(prefix=f"Rules {uuid.uuid4()}")
+    instance_1 = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+    instance_2 = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+
+    name = await instance_1.resolve(_client(caches), "gemini-test", prompt)
+    assert await instance_2.resolve(_client(caches), "gemini-test", prompt) == name
+    assert len(caches.created) == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_handle_keeps_its_creators_expiry():
+    caches = _FakeCaches()
+    prompt = _prompt(prefix=f"Rules {uuid.uuid4()}")
+    redis = await get_redis()
+    key = f"llm:prefix:gemini:gemini-test:{prompt.digest}"
+
+    # Created by another instance a while ago: usable for 5 more seconds only
+    await redis.set(key, json.dumps({"name": "cachedContents/old", "usable_until": time.time() + 5}), expire=5)
+    cache = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+    assert await cache.resolve(_client(caches), "gemini-test", prompt) == "cachedContents/old"
+    assert cache._handles[prompt.cache_slot].expires_at - time.monotonic() <= 5
+
+    # Past its usable time (or in the pre-expiry format): replaced, not reused
+    await redis.set(key, json.dumps({"name": "cachedContents/old", "usable_until": time.time() - 1}), expire=5)
+    fresh = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+    assert await fresh.resolve(_client(caches), "gemini-test", prompt) != "cachedContents/old"
+    assert len(caches.created) == 1
+
+
+@pytest.mark.asyncio
+async def test_evicted_handle_is_replaced():
+    caches = _FakeCaches()
+    prompt = _prompt(prefix=f"Rules {uuid.uuid4()}")
+    cache = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+
+    name = await cache.resolve(_client(caches), "gemini-test", prompt)
+    await cache.evict("gemini-test", prompt, name)
+    other_instance = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+
+    assert await other_instance.resolve(_client(caches), "gemini-test", prompt) not in (None, name)
+    assert cache.get_stats()["evicted"] == 1
+
+
+def _stale_handle_error():
+    return errors.ClientError(403, {"error": {"message": "CachedContent not found (or permission denied)", "status": "PERMISSION_DENIED"}})
+
+
+def test_stale_handle_errors_are_recognized():
+    assert is_stale_handle_error(_stale_handle_error())
+    assert not is_stale_handle_error(errors.ClientError(400, {"error": {"message": "Invalid argument", "status": "INVALID_ARGUMENT"}}))
+    assert not is_stale_handle_error(RuntimeError("CachedContent not found"))
+
+
+@pytest.mark.asyncio
+async def test_gemini_call_with_stale_handle_evicts_and_retries_uncached():
+    calls = []
+
+    async def generate_content(model, contents, config):
+        calls.append(config.cached_content)
+        if config.cached_content:
+            raise _stale_handle_error()
+        return SimpleNamespace(text="Breakfast is 7-10am.", usage_metadata=None)
+
+    async def resolve(client, model, prompt):
+        return "cachedContents/expired"
+
+    evicted = []
+
+    async def evict(model, prompt, name):
+        evicted.append(name)
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    messages = [{"role": "system", "content": _prompt()}, {"role": "user", "content": "Breakfast?"}]
+    with patch.object(conversation, "gemini_client", client), \
+            patch.object(conversation.settings, "llm_prompt_cache_enabled", True), \
+            patch.object(conversation.gemini_prefix_cache, "resolve", resolve), \
+            patch.object(conversation.gemini_prefix_cache, "evict", evict):
+        text, _, _ = await conversation._call_gemini(messages, 256, 0.3)
+
+    assert text == "Breakfast is 7-10am."
+    assert calls == ["cachedContents/expired", None]
+    assert evicted == ["cachedContents/expired"]
+
+
+@pytest.mark.asyncio
+async def test_refused_prefix_falls_back_without_retrying():
+    caches = _FakeCaches(fail=True)
+    cache = GeminiPrefixCache(ttl_seconds=3600, max_handles=10)
+    prompt = _prompt(prefix=f"Short {uuid.uuid4()}")
+
+    assert await cache.resolve(_client(caches), "gemini-test", prompt) is None
+    caches.fail = False
+    assert await cache.resolve(_client(caches), "gemini-test", prompt) is None
+    assert caches.created == []
+    assert cache.get_stats()["failures"] == 1
+
+
+def test_provider_request_layouts():
+    prompt = _prompt()
+    messages = [{"role": "system", "content": prompt}, {"role": "user", "content": "hi"}]
+
+    system, claude_messages = conversation._anthropic_request(messages)
+    assert system[0] == {"type": "text", "text": prompt.prefix, "cache_control": {"type": "ephemeral"}}
+    assert system[1]["text"] == prompt.suffix
+    assert claude_messages == [{"role": "user", "content": "hi"}]
+
+    assert [m["content"] for m in conversation._openai_messages(messages)] == [
+        prompt.prefix, prompt.suffix, "hi"
+    ]
+
+    # With a handle, Gemini gets no system instruction and the suffix leads the contents
+    contents, config = conversation._gemini_request(messages, 100, 0.5, cached_content="cachedContents/1")
+    assert config.cached_content == "cachedContents/1" and config.system_instruction is None
+    assert [c.parts[0].text for c in contents] == [prompt.suffix, "hi"]
+
+    contents, config = conversation._gemini_request(messages, 100, 0.5)
+    assert config.system_instruction == str(prompt)
+    assert [c.parts[0].text for c in contents] == ["hi"]
+
+
+def test_usage_normalization_and_stats():
+    anthropic_usage = LLMUsage.from_anthropic(SimpleNamespace(
+        input_tokens=50, output_tokens=20, cache_read_input_tokens=1500, cache_creation_input_tokens=0
+    ))
+    assert anthropic_usage.prompt_tokens == 1550 and anthropic_usage.cached_tokens == 1500
+    assert anthropic_usage.cache_metadata()["hit"] is True
+
+    openai_usage = LLMUsage.from_openai(SimpleNamespace(
+        prompt_tokens=1200, completion_tokens=30, prompt_tokens_details=None
+    ))
+    assert openai_usage.cached_tokens == 0 and openai_usage.total_tokens == 1230
+
+    stats = PromptCacheStats()
+    stats.record("claude", anthropic_usage)
+    stats.record("claude", openai_usage)
+    stats.record("claude", None)
+    assert stats.get_stats()["claude"]["hit_rate"] == 0.5
+    assert stats.get_stats()["claude"]["cached_tokens"] == 1500
@@ -0,0 +1,103 @@
+"""
+Unit tests for token-streamed replies via _call_llm(on_delta=...).
+"""
+
+import uuid
+
+import pytest
+from unittest.mock import patch
+
+from app.services import conversation
+from app.services.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture(autouse=True)
+def isolated_breakers():
+    """Fresh breaker names per test so failures here never open the shared provider circuits."""
+    suffix = uuid.uuid4().hex[:8]
+    breakers = {}
+
+    def get_breaker(provider: str) -> CircuitBreaker:
+        return breakers.setdefault(provider, CircuitBreaker(f"test-{provider}-{suffix}"))
+
+    with patch.object(conversation, "get_breaker", get_breaker):
+        yield
+
+
+def _stream(*chunks, fail_after: int | None = None):
+    """Build a fake provider token iterator that yields `chunks`, optionally raising after N of them."""
+    async def stream(messages, max_tokens, temperature):
+        for i, chunk in enumerate(chunks):
+            if fail_after is not None and i == fail_after:
+                raise RuntimeError("stream dropped")
+            yield chunk
+        if fail_after is not None and fail_after >= len(chunks):
+            raise RuntimeError("stream dropped")
+
+    return stream
+
+
+async def _run(providers, on_delta=None):
+    deltas = []
+
+    async def collect(delta: str):
+        deltas.append(delta)
+
+    with patch.object(conversation, "_llm_providers", return_value=providers):
+        result = await conversation._call_llm(
+            [{"role": "user", "content": "hi"}], on_delta=on_delta or collect
+        )
+    return result, deltas
+
+
+@pytest.mark.asyncio
+async def test_deltas_are_forwarded_and_full_text_returned():
+    (text, _, model), deltas = await _run([("gemini", _stream("  Hello", ", we have", " rooms. "))])
+
+    assert deltas == ["Hello", ", we have", " rooms. "]
+    assert text == "Hello, we have rooms."
+    assert model == conversation.settings.gemini_model
+
+
+@pytest.mark.asyncio
+async def test_failure_before_first_token_falls_through_to_next_provider():
+    (text, _, model), deltas = await _run([
+        ("gemini", _stream("never", fail_after=0)),
+        ("anthropic", _stream("", "   ")),  # empty answer also falls through
+        ("openai", _stream("Hi there")),
+    ])
+
+    assert deltas == ["Hi there"]
+    assert model == conversation.settings.openai_model
+
+
+@pytest.mark.asyncio
+async def test_mid_stream_failure_keeps_partial_text():
+    (text, _, model), deltas = await _run([
+        ("gemini", _stream("Check-in is ", "at 3pm", "!", fail_after=2)),
+        ("openai", _stream("should not be used")),
+    ])
+
+    assert text == "Check-in is at 3pm"
+    assert deltas == ["Check-in is ", "at 3pm"]
+    assert model == conversation.settings.gemini_model
+
+
+@pytest.mark.asyncio
+async def test_all_providers_fail_streams_template():
+    (text, _, model), deltas = await _run([("gemini", _stream("x", fail_after=0))])
+
+    assert text == conversation.FALLBACK_RESPONSE
+    assert deltas == [conversation.FALLBACK_RESPONSE]
+    assert model == "fallback_template"
+
+
+@pytest.mark.asyncio
+async def test_listener_failure_does_not_abort_the_reply():
+    async def closed_socket(delta: str):
+        raise ConnectionError("client went away")
+
+    (text, _, model), _ = await _run([("gemini", _stream("Sure", ", done"))], on_delta=closed_socket)
+
+    assert text == "Sure, done"
+    assert model == conversation.settings.gemini_model
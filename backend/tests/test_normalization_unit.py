@@ -1,6 +1,6 @@
 
 import pytest
-from app.services.whatsapp import normalize_whatsapp_message
+from app.services.whatsapp import normalize_whatsapp_message, iter_whatsapp_messages
 from app.services.email import normalize_email_message
 
 def test_normalize_whatsapp():
@@ -40,6 +40,49 @@ def test_normalize_whatsapp():
     assert normalized["content"] == "Hello world"
     assert normalized["metadata"]["phone_number_id"] == "PHONE_NUMBER_ID"
 
+def _wa_change(display_number, contacts, messages):
+    return {
+        "value": {
+            "messaging_product": "whatsapp",
+            "metadata": {"display_phone_number": display_number, "phone_number_id": f"id-{display_number}"},
+            "contacts": [{"profile": {"name": name}, "wa_id": wa_id} for wa_id, name in contacts],
+            "messages": messages,
+        },
+        "field": "messages",
+    }
+
+
+def test_iter_whatsapp_messages_reads_every_entry_change_and_message():
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"changes": [
+                _wa_change("111", [("601", "Aina"), ("602", "Ben")], [
+                    {"from": "601", "id": "m1", "type": "text", "text": {"body": "Hi"}},
+                    {"from": "602", "id": "m2", "type": "text", "text": {"body": "Room rates?"}},
+                    {"from": "601", "id": "m3", "type": "image", "image": {}},
+                ]),
+                # Status-only change: no messages
+                {"value": {"metadata": {"display_phone_number": "111"}, "statuses": [{}]}, "field": "messages"},
+            ]},
+            {"changes": [
+                _wa_change("222", [("603", "Chen")], [
+                    {"from": "603", "id": "m4", "type": "text", "text": {"body": "Parking?"}},
+                ]),
+            ]},
+        ],
+    }
+
+    messages = list(iter_whatsapp_messages(payload))
+
+    assert [m["metadata"]["whatsapp_message_id"] for m in messages] == ["m1", "m2", "m3", "m4"]
+    assert [m["guest_name"] for m in messages] == ["Aina", "Ben", "Aina", "Chen"]
+    assert messages[2]["metadata"]["is_unsupported_media"] is True
+    assert messages[3]["metadata"]["display_phone_number"] == "222"
+    # Backwards-compatible single-message view
+    assert normalize_whatsapp_message(payload)["content"] == "Hi"
+
+
 def test_normalize_email():
     payload = {
         "from": "John Doe <john@example.com>",
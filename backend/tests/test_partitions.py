@@ -0,0 +1,171 @@
+"""
+Unit tests for monthly messages partition maintenance.
+"""
+
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateTable
+
+from app.models import Message
+from app.services import partitions
+from app.services.partitions import Partition, add_months, missing_months, parse_partition_bound, partition_name
+
+UTC = timezone.utc
+NOW = datetime(2025, 6, 15, 12, tzinfo=UTC)
+
+
+def test_month_helpers():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert partition_name(date(2025, 3, 1)) == "messages_y2025m03"
+
+
+def test_parse_partition_bounds():
+    monthly = parse_partition_bound(
+        "messages_y2025m03",
+        "FOR VALUES FROM ('2025-03-01 00:00:00+00') TO ('2025-04-01 00:00:00+00')",
+    )
+    assert monthly.lower == datetime(2025, 3, 1, tzinfo=UTC)
+    assert monthly.upper == datetime(2025, 4, 1, tzinfo=UTC)
+
+    legacy = parse_partition_bound("messages_legacy", "FOR VALUES FROM (MINVALUE) TO ('2025-05-01 00:00:00+00')")
+    assert legacy.lower is None and legacy.upper == datetime(2025, 5, 1, tzinfo=UTC)
+    assert parse_partition_bound("messages_default", "DEFAULT") == Partition("messages_default", None, None)
+
+
+def test_missing_months_skip_ranges_covered_by_legacy():
+    existing = [
+        Partition("messages_legacy", None, datetime(2025, 5, 1, tzinfo=UTC)),
+        Partition("messages_y2025m05", datetime(2025, 5, 1, tzinfo=UTC), datetime(2025, 6, 1, tzinfo=UTC)),
+    ]
+    assert missing_months(existing, date(2025, 3, 1), date(2025, 7, 1)) == [date(2025, 6, 1), date(2025, 7, 1)]
+
+
+def test_message_table_is_range_partitioned_on_sent_at():
+    ddl = str(CreateTable(Message.__table__).compile(dialect=postgresql.dialect()))
+    assert "PRIMARY KEY (id, sent_at)" in ddl
+    assert "PARTITION BY RANGE (sent_at)" in ddl
+    # The ORM still identifies messages by id alone
+    assert [c.name for c in Message.__mapper__.primary_key] == ["id"]
+
+
+class _DB:
+    def __init__(self, existing):
+        self.existing = existing
+        self.statements = []
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        self.statements.append("ROLLBACK")
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        return SimpleNamespace(all=lambda: [])
+
+    def ddl(self):
+        return [s for s in self.statements if not s.startswith("SET LOCAL")]
+
+
+@pytest.mark.asyncio
+async def test_ensure_creates_from_cutoff_month_through_ahead_window():
+    db = _DB([])
+
+    async def existing(_db):
+        return [Partition("messages_legacy", None, datetime(2025, 5, 1, tzinfo=UTC))]
+
+    with patch.object(partitions, "list_partitions", existing), \
+            patch.object(partitions.settings, "retention_days", 90), \
+            patch.object(partitions.settings, "message_partitions_ahead_months", 2):
+        created = await partitions.ensure_partitions(db, NOW)
+
+    # Cutoff is 2025-03-17; March and April are covered by the legacy partition
+    assert created == ["messages_y2025m05", "messages_y2025m06", "messages_y2025m07", "messages_y2025m08"]
+    assert db.statements[0] == "SET LOCAL lock_timeout = '2000ms'"
+    assert "FOR VALUES FROM ('2025-05-01T00:00:00+00:00') TO ('2025-06-01T00:00:00+00:00')" in db.statements[1]
+
+
+class _LockTimeout(Exception):
+    sqlstate = "55P03"
+
+
+@pytest.mark.asyncio
+async def test_partition_ddl_retries_after_lock_timeout():
+    db = _DB([])
+    failures = [DBAPIError("CREATE", None, _LockTimeout())]
+    sleeps = []
+
+    async def execute(statement, params=None):
+        db.statements.append(str(statement))
+        if str(statement).startswith("CREATE") and failures:
+            raise failures.pop()
+        return SimpleNamespace(all=lambda: [])
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    db.execute = execute
+    with patch.object(partitions.asyncio, "sleep", fake_sleep):
+        await partitions._execute_ddl(db, "CREATE TABLE IF NOT EXISTS messages_y2025m07 PARTITION OF messages")
+
+    assert db.ddl() == [
+        "CREATE TABLE IF NOT EXISTS messages_y2025m07 PARTITION OF messages",
+        "ROLLBACK",
+        "CREATE TABLE IF NOT EXISTS messages_y2025m07 PARTITION OF messages",
+    ]
+    assert sleeps == [2]
+
+
+@pytest.mark.asyncio
+async def test_partition_ddl_does_not_retry_other_errors():
+    db = _DB([])
+
+    async def execute(statement, params=None):
+        if str(statement).startswith("DROP"):
+            raise DBAPIError("DROP", None, Exception("permission denied"))
+
+    db.execute = execute
+    with pytest.raises(DBAPIError):
+        await partitions._execute_ddl(db, "DROP TABLE IF EXISTS messages_y2025m03")
+
+
+@pytest.mark.asyncio
+async def test_expired_partitions_are_dropped_not_deleted():
+    db = _DB([])
+
+    async def existing(_db):
+        return [
+            Partition("messages_y2025m03", datetime(2025, 3, 1, tzinfo=UTC), datetime(2025, 4, 1, tzinfo=UTC)),
+            Partition("messages_legacy", None, datetime(2025, 3, 1, tzinfo=UTC)),
+            Partition("messages_y2025m04", datetime(2025, 4, 1, tzinfo=UTC), datetime(2025, 5, 1, tzinfo=UTC)),
+        ]
+
+    async def detached(_db):
+        return ["messages_y2025m02", "messages_y2025m04", "messages_archive"]
+
+    async def detach(partition):
+        db.statements.append(f"DETACH {partition.name}")
+
+    with patch.object(partitions, "list_partitions", existing), \
+            patch.object(partitions, "list_detached_tables", detached), \
+            patch.object(partitions, "_detach_partition", detach), \
+            patch.object(partitions.settings, "retention_days", 60), \
+            patch.object(partitions.settings, "retention_archive_uri", ""):
+        dropped = await partitions.drop_expired_partitions(db, NOW)
+
+    # Cutoff is 2025-04-16: April still holds retained rows. February was
+    # detached by an earlier run whose DROP failed.
+    assert dropped == ["messages_legacy", "messages_y2025m03", "messages_y2025m02"]
+    assert db.ddl() == [
+        "DETACH messages_legacy",
+        "DROP TABLE IF EXISTS messages_legacy",
+        "DETACH messages_y2025m03",
+        "DROP TABLE IF EXISTS messages_y2025m03",
+        "DROP TABLE IF EXISTS messages_y2025m02",
+    ]
@@ -0,0 +1,132 @@
+"""
+Unit tests for compiled per-business prompt contexts.
+"""
+
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.prompt_context import (
+    BusinessPromptContext,
+    PromptContextCache,
+    PromptTemplate,
+)
+
+
+def _business(**overrides):
+    fields = dict(
+        id=uuid.uuid4(),
+        name="Hotel Seri",
+        audit_only_mode=False,
+        operating_hours={"start": "09:00", "end": "18:00", "timezone": "Asia/Kuala_Lumpur"},
+        brand_vocabulary="Warm, uses 'Selamat datang'",
+        required_questions=["Arrival time?"],
+        knowledge_base_config=None,
+    )
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+_TURN = dict(
+    current_datetime="Monday",
+    guest_context="Channel: Website live chat",
+    lead_progress="- Name: Not yet provided",
+    conversation_summary="Guest asked about a March wedding",
+    tomorrow_date="Tuesday",
+    after_hours_state="during operating hours",
+    knowledge_base_context="Deluxe Room RM 300",
+)
+
+
+class _FakeDB:
+    def __init__(self, business):
+        self.business = business
+        self.queries = 0
+
+    async def execute(self, query):
+        self.queries += 1
+        return SimpleNamespace(scalar_one_or_none=lambda: self.business)
+
+
+def test_bound_fields_are_literal_text():
+    template = PromptTemplate("Hi {name}, {vocab} / {kb}", vocab="use {braces} freely")
+    assert template.fields == {"name", "kb"}
+    assert template.render(name="Ali", kb="{x}") == "Hi Ali, use {braces} freely / {x}"
+
+
+def test_render_includes_business_sections_and_addenda():
+    context = BusinessPromptContext.compile(_business(brand_vocabulary="Say {hello}"), version=0)
+
+    prompt = context.render_system_prompt("lead_capture", **_TURN)
+    assert "AI Concierge for Hotel Seri" in prompt.prefix
+    assert "Say {hello}" in prompt.prefix
+    assert "- Arrival time?" in prompt.prefix
+    assert "Deluxe Room RM 300" in prompt.suffix
+    assert "RE-ENGAGEMENT MODE" not in str(prompt)
+
+    prompt = context.render_system_prompt("concierge", is_follow_up=True, **_TURN)
+    assert "ACTIVE LEAD CAPTURE MODE" not in str(prompt)
+    assert "RE-ENGAGEMENT MODE" in prompt.suffix
+
+
+def test_prefix_is_stable_across_turns():
+    business = _business()
+    context = BusinessPromptContext.compile(business, version=0)
+
+    first = context.render_system_prompt("lead_capture", **_TURN)
+    second = context.render_system_prompt(
+        "lead_capture", **{**_TURN, "current_datetime": "Tuesday", "knowledge_base_context": "Pool"}
+    )
+    assert first.prefix == second.prefix and first.digest == second.digest
+    assert first.suffix != second.suffix
+    assert first.cache_slot == f"{business.id}:lead_capture"
+    for value in _TURN.values():
+        assert value not in first.prefix
+
+    # Each mode has its own prefix; unknown modes share the concierge one
+    handoff = context.render_system_prompt("handoff", **_TURN)
+    other = context.render_system_prompt("something_else", **_TURN)
+    assert handoff.digest != first.digest
+    assert other.cache_slot == f"{business.id}:concierge"
+
+
+def test_after_hours_uses_business_timezone():
+    context = BusinessPromptContext.compile(_business(), version=0)
+    assert not context.is_after_hours(datetime(2025, 1, 6, 10, tzinfo=context.tz))
+    assert context.is_after_hours(datetime(2025, 1, 6, 18, tzinfo=context.tz))
+    assert context.is_after_hours(datetime(2025, 1, 6, 2, tzinfo=context.tz))
+    assert "AFTER HOURS (Operating hours are 09:00 - 18:00)" == context.after_hours_state(True)
+
+    no_hours = BusinessPromptContext.compile(_business(operating_hours=None), version=0)
+    assert not no_hours.is_after_hours(datetime(2025, 1, 6, 2, tzinfo=no_hours.tz))
+
+
+@pytest.mark.asyncio
+async def test_cache_reuses_context_until_invalidated():
+    business = _business()
+    db = _FakeDB(business)
+    instance_1 = PromptContextCache(max_businesses=10, ttl_seconds=900)
+    instance_2 = PromptContextCache(max_businesses=10, ttl_seconds=900)
+
+    first = await instance_1.get(db, business.id)
+    assert await instance_1.get(db, business.id) is first
+    await instance_2.get(db, business.id)
+    assert db.queries == 2
+
+    business.name = "Hotel Seri Baru"
+    await instance_1.invalidate(business.id)
+
+    # The other instance sees the bumped version and recompiles
+    refreshed = await instance_2.get(db, business.id)
+    assert refreshed.name == "Hotel Seri Baru"
+    assert refreshed.version == first.version + 1
+    assert db.queries == 3
+
+
+@pytest.mark.asyncio
+async def test_missing_business_raises():
+    cache = PromptContextCache(max_businesses=10, ttl_seconds=900)
+    with pytest.raises(ValueError):
+        await cache.get(_FakeDB(None), uuid.uuid4())
@@ -0,0 +1,112 @@
+"""
+Unit tests for batched data retention and its cold archive.
+"""
+
+import gzip
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.sql import Delete
+
+from app.services import retention
+
+
+def _record(i: int) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "guest_name": f"Guest {i}",
+        "estimated_value": Decimal("450.00"),
+        "captured_at": datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i),
+        "metadata": {"channel": "web"},
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fmt", ["parquet", "ndjson"])
+async def test_archive_writes_one_readable_file_per_batch(tmp_path, fmt):
+    archive = retention.RetentionArchive(str(tmp_path), fmt, "2025-04-06")
+    first = await archive.write("leads", [_record(0), _record(1)])
+    second = await archive.write("leads", [_record(2)])
+
+    assert first.endswith("leads/2025-04-06/leads-00001." + ("parquet" if fmt == "parquet" else "ndjson.gz"))
+    assert second.endswith("leads-00002." + ("parquet" if fmt == "parquet" else "ndjson.gz"))
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        rows = pq.read_table(first).to_pylist()
+    else:
+        with open(first, "rb") as f:
+            rows = [json.loads(line) for line in gzip.decompress(f.read()).splitlines()]
+    assert [r["guest_name"] for r in rows] == ["Guest 0", "Guest 1"]
+    assert rows[0]["estimated_value"] == 450.0
+    metadata = json.loads(rows[0]["metadata"]) if fmt == "parquet" else rows[0]["metadata"]
+    assert metadata == {"channel": "web"}
+
+
+def test_unknown_archive_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        retention.RetentionArchive(str(tmp_path), "csv", "2025-04-06")
+
+
+class _Row(SimpleNamespace):
+    @property
+    def _mapping(self):
+        return vars(self)
+
+
+class _LeadsDB:
+    """Serves old leads in keyset order and records the delete batches."""
+
+    def __init__(self, count: int, batch: int):
+        self.batch = batch
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.rows = [_Row(id=uuid.uuid4(), captured_at=start + timedelta(minutes=i)) for i in range(count)]
+        self.events = []
+
+    async def execute(self, query):
+        if isinstance(query, Delete):
+            self.events.append("delete")
+            return SimpleNamespace(rowcount=None)
+        deleted = self.events.count("delete") * self.batch
+        batch = self.rows[deleted: deleted + self.batch]
+        return SimpleNamespace(all=lambda: batch)
+
+    async def commit(self):
+        self.events.append("commit")
+
+
+class _Archive:
+    def __init__(self, events):
+        self.events = events
+
+    async def write(self, table, records):
+        self.events.append(f"archive:{table}:{len(records)}")
+
+
+@pytest.mark.asyncio
+async def test_leads_are_archived_then_deleted_in_throttled_batches():
+    db = _LeadsDB(5, batch=2)
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    stats = retention.RetentionStats()
+    with patch.object(retention.settings, "retention_batch_size", 2), \
+            patch.object(retention.settings, "retention_batch_sleep_seconds", 0.25), \
+            patch.object(retention.asyncio, "sleep", fake_sleep):
+        await retention._purge_leads(db, datetime.now(timezone.utc), _Archive(db.events), stats)
+
+    assert db.events == [
+        "archive:leads:2", "delete", "commit",
+        "archive:leads:2", "delete", "commit",
+        "archive:leads:1", "delete", "commit",
+    ]
+    # Sleeps only between full batches
+    assert sleeps == [0.25, 0.25]
+    assert (stats.leads, stats.batches, stats.archived_files) == (5, 3, 3)
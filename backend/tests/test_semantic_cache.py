@@ -0,0 +1,148 @@
+"""
+Unit tests for the semantic answer cache.
+"""
+
+import uuid
+from datetime import date
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services import semantic_cache as semantic_cache_module
+from app.services.semantic_cache import SemanticAnswerCache, SemanticCacheKey, detect_language
+
+
+def _cache(**overrides):
+    options = dict(threshold=0.95, ttl_seconds=3600, max_entries_per_bucket=4, max_buckets=10, max_question_chars=300)
+    options.update(overrides)
+    return SemanticAnswerCache(**options)
+
+
+def _vector(*values):
+    vector = np.zeros(8, dtype=np.float32)
+    vector[: len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+
+def _key(vector, business_id=None, kb_version=1, language="en", is_after_hours=False, local_date=None):
+    return SemanticCacheKey(
+        business_id or BUSINESS, kb_version, local_date or TODAY, language, is_after_hours, vector
+    )
+
+
+BUSINESS = uuid.uuid4()
+TODAY = date(2025, 3, 14)
+
+
+def test_hit_needs_similarity_above_threshold():
+    cache = _cache()
+    cache.store(_key(_vector(1, 0)), "Breakfast is 7-10am.")
+
+    hit = cache.lookup(_key(_vector(1, 0.1)))
+    assert hit.answer == "Breakfast is 7-10am." and hit.similarity > 0.99
+    assert cache.lookup(_key(_vector(1, 1))) is None
+    assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 1
+
+
+def test_buckets_isolate_business_kb_version_language_and_after_hours():
+    cache = _cache()
+    cache.store(_key(_vector(1)), "Parking is free.")
+
+    assert cache.lookup(_key(_vector(1), language="bm")) is None
+    assert cache.lookup(_key(_vector(1), is_after_hours=True)) is None
+    assert cache.lookup(_key(_vector(1), business_id=uuid.uuid4())) is None
+    assert cache.lookup(_key(_vector(1), kb_version=2)) is None
+
+    # A newer KB version retires the business's older bucket
+    cache.store(_key(_vector(1), kb_version=2), "Parking is RM5.")
+    assert cache.lookup(_key(_vector(1))) is None
+    assert cache.get_stats()["buckets"] == 1
+
+
+def test_answers_are_only_reused_on_the_day_they_were_written():
+    cache = _cache()
+    cache.store(_key(_vector(1)), "Yes, we have rooms tomorrow, Saturday, March 15.")
+    assert cache.lookup(_key(_vector(1))) is not None
+
+    # The next day "tomorrow" is another date: miss, and the past day's bucket is retired
+    next_day = date(2025, 3, 15)
+    assert cache.lookup(_key(_vector(1), local_date=next_day)) is None
+    cache.store(_key(_vector(1), local_date=next_day), "Yes, we have rooms tomorrow, Sunday, March 16.")
+    assert cache.get_stats()["buckets"] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = _cache(ttl_seconds=60)
+    with patch.object(semantic_cache_module.time, "monotonic", return_value=1000.0):
+        cache.store(_key(_vector(1)), "Check-in is 3pm.")
+    with patch.object(semantic_cache_module.time, "monotonic", return_value=1030.0):
+        assert cache.lookup(_key(_vector(1))).age_seconds == 30.0
+    with patch.object(semantic_cache_module.time, "monotonic", return_value=1061.0):
+        assert cache.lookup(_key(_vector(1))) is None
+
+
+def test_full_bucket_evicts_least_recently_used():
+    cache = _cache(max_entries_per_bucket=2)
+    clock = iter(range(100))
+    with patch.object(semantic_cache_module.time, "monotonic", side_effect=lambda: float(next(clock))):
+        cache.store(_key(_vector(1, 0, 0)), "a")
+        cache.store(_key(_vector(0, 1, 0)), "b")
+        assert cache.lookup(_key(_vector(1, 0, 0))).answer == "a"
+        cache.store(_key(_vector(0, 0, 1)), "c")
+
+        assert cache.lookup(_key(_vector(0, 1, 0))) is None
+        assert cache.lookup(_key(_vector(1, 0, 0))).answer == "a"
+        assert cache.lookup(_key(_vector(0, 0, 1))).answer == "c"
+
+
+def test_near_duplicate_questions_are_stored_once():
+    cache = _cache()
+    cache.store(_key(_vector(1, 0)), "first")
+    cache.store(_key(_vector(1, 0.05)), "second")
+    assert cache.get_stats()["entries"] == 1
+    assert cache.lookup(_key(_vector(1, 0))).answer == "first"
+
+
+@pytest.mark.asyncio
+async def test_prepare_skips_long_questions_and_zero_embeddings():
+    cache = _cache(max_question_chars=20)
+
+    async def zero_embedding(text):
+        return [0.0] * 8
+
+    async def kb_version(business_id):
+        return 3
+
+    with patch("app.services.generate_query_embedding", zero_embedding), \
+            patch.object(semantic_cache_module, "get_kb_version", kb_version):
+        assert await cache.prepare(BUSINESS, "x" * 21, TODAY, False) is None
+        assert await cache.prepare(BUSINESS, "Is parking free?", TODAY, False) is None
+
+
+@pytest.mark.parametrize("answer", [
+    "Hi Aisyah, breakfast is 7-10am.",
+    "We'll message you on +60123456789 shortly.",
+    "We'll reply to aisyah@example.com shortly.",
+    "Call the front desk at 03-2145 6789.",
+])
+def test_answers_with_guest_details_are_not_stored(answer):
+    cache = _cache()
+    cache.store(_key(_vector(1)), answer, ("+60123456789", "Aisyah"))
+
+    assert cache.lookup(_key(_vector(1))) is None
+    assert cache.get_stats()["refused"] == 1
+
+
+def test_prices_and_times_are_not_mistaken_for_phone_numbers():
+    cache = _cache()
+    cache.store(_key(_vector(1)), "A deluxe room is RM 250 - 300, check-in from 15:00.", ("+60123456789", None))
+
+    assert cache.lookup(_key(_vector(1))).answer.startswith("A deluxe room")
+
+
+def test_detect_language():
+    assert detect_language("What time is breakfast?") == "en"
+    assert detect_language("Pukul berapa sarapan?") == "bm"
+    assert detect_language("Ada parking percuma tak?") == "bm"
+    assert detect_language("") == "en"
@@ -0,0 +1,39 @@
+"""
+Unit tests for webhook deduplication (in-memory Redis fallback).
+"""
+
+import uuid
+
+import pytest
+
+from app.services.webhook_dedup import claim_message_ids, provider_message_id, release_message_ids
+
+
+def _wamid() -> str:
+    return provider_message_id("whatsapp", f"wamid.{uuid.uuid4().hex}")
+
+
+def test_provider_message_id_is_namespaced_and_skips_missing_ids():
+    assert provider_message_id("twilio", "SM123") == "twilio:SM123"
+    assert provider_message_id("whatsapp", None) is None
+    assert provider_message_id("whatsapp", "") is None
+
+
+@pytest.mark.asyncio
+async def test_retry_of_a_claimed_id_is_rejected():
+    first, second = _wamid(), _wamid()
+
+    assert await claim_message_ids([first, None]) == {first}
+    # Meta redelivers the batch with one new message added
+    assert await claim_message_ids([first, second]) == {second}
+
+
+@pytest.mark.asyncio
+async def test_released_ids_can_be_claimed_again():
+    message_id = _wamid()
+    assert await claim_message_ids([message_id]) == {message_id}
+
+    await release_message_ids([message_id])
+
+    assert await claim_message_ids([message_id]) == {message_id}
+
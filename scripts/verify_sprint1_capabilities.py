@@ -8,11 +8,12 @@ from decimal import Decimal
 # Add backend to path
 sys.path.append(os.path.join(os.path.dirname(__file__), "../backend"))
 
-from app.models import Property, Conversation, Message
+from app.models import Property, Conversation, Message, Lead
 from app.services.conversation import process_guest_message
 from app.services import ingest_knowledge_base
 from app.config import get_settings
 from app.database import set_db_context
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
@@ -91,7 +92,17 @@ async def main():
         print(f"   🤖 AI: {response['response']}")
         print(f"   ✅ AI Mode: {response['mode']}")
         
-        if response['lead_created']:
+        # Lead extraction is queued once the turn commits and runs after the reply
+        await db.commit()
+        lead = None
+        for _ in range(30):
+            await asyncio.sleep(1)
+            result = await db.execute(select(Lead).where(Lead.business_id == prop_id))
+            lead = result.scalars().first()
+            if lead:
+                break
+
+        if lead:
              print("   ✅ Lead successfully created in DB.")
         else:
              print("   ⚠️  Lead NOT created (might need more info).")